@@ -23,6 +23,10 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"  # Algoritmo para firmar tokens JWT
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 480  # Duracion de tokens de acceso una jornada laboral
     SYNC_TOKEN_EXPIRE_MINUTES: int = 5  # Duracion de tokens de acceso para sincronizaciones
+    # Hilos dedicados a Argon2 (CPU-bound). Acotado para no saturar el threadpool de requests
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    # Cache en memoria de grupos de ventas por usuario (permisos). 0 = sin cache entre requests
+    GROUP_MEMBERSHIP_CACHE_TTL_SECONDS: int = int(os.getenv("GROUP_MEMBERSHIP_CACHE_TTL_SECONDS", "60"))
     
     # === CONFIGURACION DE LA API ===
     PROJECT_NAME: str = "Farmacruz API"
@@ -31,6 +35,11 @@ class Settings(BaseSettings):
     
     # === CONFIGURACION DE CLOUDFLARE TURNSTILE ===
     TURNSTILE_SECRET_KEY: str = os.getenv("TURNSTILE_SECRET_KEY", "")  # Clave secreta de Turnstile
+    # URL de verificacion (se puede apuntar al stub local de tests/turnstile_stub_server.py)
+    TURNSTILE_VERIFY_URL: str = os.getenv("TURNSTILE_VERIFY_URL", "https://challenges.cloudflare.com/turnstile/v0/siteverify")
+    TURNSTILE_TIMEOUT_SECONDS: float = float(os.getenv("TURNSTILE_TIMEOUT_SECONDS", "2.0"))  # Tope de espera por login
+    TURNSTILE_BREAKER_FAILURES: int = int(os.getenv("TURNSTILE_BREAKER_FAILURES", "3"))  # Fallos seguidos para abrir el circuito
+    TURNSTILE_BREAKER_COOLDOWN_SECONDS: int = int(os.getenv("TURNSTILE_BREAKER_COOLDOWN_SECONDS", "60"))  # Tiempo con el circuito abierto
     
     # === CONFIGURACION DE EMAIL (SMTP) ===
     # Se usa para enviar correos de contacto y notificaciones
@@ -40,6 +49,31 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: str = os.getenv("SMTP_PASSWORD", "")
     SENDER: str = os.getenv("SENDER", "notificaciones@farmacruz.com.mx")
     CONTACT_EMAIL: str = os.getenv("CONTACT_EMAIL", "contacto@farmacruz.com")
+    SMTP_USE_TLS: bool = os.getenv("SMTP_USE_TLS", "true").lower() == "true"  # false solo para el stub local de tests
+    # Envios por segundo; 0 = automatico segun proveedor (Gmail conservador, SES su cuota por defecto)
+    SMTP_RATE_PER_SECOND: float = float(os.getenv("SMTP_RATE_PER_SECOND", "0"))
+    
+    # === COLA DE CORREOS SALIENTES ===
+    EMAIL_WORKER_ENABLED: bool = os.getenv("EMAIL_WORKER_ENABLED", "true").lower() == "true"
+    EMAIL_QUEUE_BATCH_SIZE: int = int(os.getenv("EMAIL_QUEUE_BATCH_SIZE", "20"))  # Correos por lote
+    EMAIL_QUEUE_MAX_ATTEMPTS: int = int(os.getenv("EMAIL_QUEUE_MAX_ATTEMPTS", "6"))  # Reintentos antes de marcar como fallido
+    EMAIL_QUEUE_POLL_SECONDS: int = int(os.getenv("EMAIL_QUEUE_POLL_SECONDS", "30"))  # Revision periodica de pendientes
+    
+    # === NOTIFICACIONES EN TIEMPO REAL (SSE + LISTEN/NOTIFY) ===
+    REALTIME_ENABLED: bool = os.getenv("REALTIME_ENABLED", "true").lower() == "true"
+    REALTIME_HEARTBEAT_SECONDS: int = int(os.getenv("REALTIME_HEARTBEAT_SECONDS", "25"))  # Keep-alive para proxies/CloudFront
+    # Duracion maxima de un stream; el navegador reconecta solo (revalida token y grupos)
+    REALTIME_MAX_STREAM_SECONDS: int = int(os.getenv("REALTIME_MAX_STREAM_SECONDS", "900"))
+    REALTIME_QUEUE_SIZE: int = int(os.getenv("REALTIME_QUEUE_SIZE", "100"))  # Eventos en espera por conexion
+    
+    # === TRABAJOS DE SINCRONIZACION ===
+    SYNC_CLEANUP_CHUNK_SIZE: int = int(os.getenv("SYNC_CLEANUP_CHUNK_SIZE", "5000"))  # Filas por transaccion en la limpieza
+    # Un trabajo activo sin latido en este tiempo se da por muerto (reinicio del servidor)
+    SYNC_JOB_STALE_MINUTES: int = int(os.getenv("SYNC_JOB_STALE_MINUTES", "30"))
+    # Una corrida abierta mas de este tiempo se abandona (sin limpieza) al abrir la siguiente
+    SYNC_RUN_STALE_MINUTES: int = int(os.getenv("SYNC_RUN_STALE_MINUTES", "360"))
+    # Tamano maximo (descomprimido) de un chunk NDJSON de /sync-upload/sessions
+    SYNC_UPLOAD_MAX_CHUNK_BYTES: int = int(os.getenv("SYNC_UPLOAD_MAX_CHUNK_BYTES", str(16 * 1024 * 1024)))
     
     class Config:
         case_sensitive = True
@@ -54,7 +88,13 @@ SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 SYNC_TOKEN_EXPIRE_MINUTES = settings.SYNC_TOKEN_EXPIRE_MINUTES
+PASSWORD_HASH_WORKERS = settings.PASSWORD_HASH_WORKERS
+GROUP_MEMBERSHIP_CACHE_TTL_SECONDS = settings.GROUP_MEMBERSHIP_CACHE_TTL_SECONDS
 PROJECT_NAME = settings.PROJECT_NAME
 API_V1_STR = settings.API_V1_STR
 FRONTEND_URL = settings.FRONTEND_URL
-TURNSTILE_SECRET_KEY = settings.TURNSTILE_SECRET_KEY
\ No newline at end of file
+TURNSTILE_SECRET_KEY = settings.TURNSTILE_SECRET_KEY
+TURNSTILE_VERIFY_URL = settings.TURNSTILE_VERIFY_URL
+TURNSTILE_TIMEOUT_SECONDS = settings.TURNSTILE_TIMEOUT_SECONDS
+TURNSTILE_BREAKER_FAILURES = settings.TURNSTILE_BREAKER_FAILURES
+TURNSTILE_BREAKER_COOLDOWN_SECONDS = settings.TURNSTILE_BREAKER_COOLDOWN_SECONDS
\ No newline at end of file
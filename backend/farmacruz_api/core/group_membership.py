@@ -0,0 +1,133 @@
+"""
+Cache de pertenencia a grupos de ventas (user_id → ids de grupos).
+
+Los permisos de pedidos, clientes, tickets y dashboards preguntan por los grupos
+del usuario varias veces por request. Se resuelven en dos niveles:
+
+1. Por request: memo en session.info (cada request tiene su propia Session).
+2. Por proceso: dict con la version de cache_versions con la que se cargo cada
+   entrada. Cualquier cambio de membresias llama mark_dirty, que incrementa el
+   contador en la BD dentro de la misma transaccion: al hacer COMMIT todas las
+   entradas anteriores quedan invalidas en TODOS los workers a la vez.
+
+Cada request lee el contador una vez (una query por llave primaria) en lugar de
+consultar las membresias; GROUP_MEMBERSHIP_CACHE_TTL_SECONDS solo acota cuanto
+vive una entrada (0 = sin cache entre requests).
+
+Uso:
+    groups = group_membership.get(db, user_id)     # None si no esta en cache
+    group_membership.put(db, user_id, group_membership.current_version(db), groups)
+    group_membership.mark_dirty(db)                  # al modificar membresias, antes del commit
+"""
+
+import threading
+import time
+from typing import FrozenSet, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from db.base import CacheVersion
+
+CACHE_NAME = "group_membership"  # fila en cache_versions
+
+_SESSION_MEMO_KEY = "group_memberships"
+_SESSION_VERSION_KEY = "group_memberships_version"
+_SESSION_DIRTY_KEY = "group_memberships_dirty"
+
+_entries: dict[int, tuple[int, float, FrozenSet[int]]] = {}   # user_id → (version, cargado_en, grupos)
+_lock = threading.Lock()
+
+
+def _enabled() -> bool:
+    return settings.GROUP_MEMBERSHIP_CACHE_TTL_SECONDS > 0
+
+
+def current_version(db: Session) -> int:
+    """Version vigente en la BD (leida una vez por transaccion, memo en la sesion)."""
+    if not _enabled():
+        return 0
+    version = db.info.get(_SESSION_VERSION_KEY)
+    if version is None:
+        version = db.execute(select(CacheVersion.version).where(CacheVersion.name == CACHE_NAME)).scalar() or 0
+        db.info[_SESSION_VERSION_KEY] = version
+    return version
+
+
+def get(db: Session, user_id: int) -> Optional[FrozenSet[int]]:
+    """Grupos del usuario si estan en el memo del request o en la cache vigente."""
+    memo = db.info.get(_SESSION_MEMO_KEY)
+    if memo is not None and user_id in memo:
+        return memo[user_id]
+    if not _enabled() or db.info.get(_SESSION_DIRTY_KEY):
+        return None
+
+    version = current_version(db)
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is None:
+            return None
+        entry_version, loaded_at, groups = entry
+        if entry_version != version or time.monotonic() - loaded_at > settings.GROUP_MEMBERSHIP_CACHE_TTL_SECONDS:
+            del _entries[user_id]
+            return None
+
+    db.info.setdefault(_SESSION_MEMO_KEY, {})[user_id] = groups
+    return groups
+
+
+def put(db: Session, user_id: int, version: int, groups: FrozenSet[int]) -> None:
+    """
+    Guarda el resultado de la query. `version` es la que habia ANTES de consultar:
+    si hubo un cambio en medio, la entrada nace vencida.
+    """
+    db.info.setdefault(_SESSION_MEMO_KEY, {})[user_id] = groups
+    if _enabled() and not db.info.get(_SESSION_DIRTY_KEY):
+        with _lock:
+            _entries[user_id] = (version, time.monotonic(), groups)
+
+
+def mark_dirty(db: Session) -> None:
+    """
+    Marca que esta sesion modifica membresias e incrementa cache_versions en su
+    transaccion (una vez por transaccion): el cambio y la invalidacion se confirman juntos.
+    """
+    db.info.pop(_SESSION_MEMO_KEY, None)
+    db.info.pop(_SESSION_VERSION_KEY, None)
+    if db.info.get(_SESSION_DIRTY_KEY):
+        return
+    db.info[_SESSION_DIRTY_KEY] = True
+    db.execute(
+        insert(CacheVersion).values(name=CACHE_NAME, version=1)
+        .on_conflict_do_update(index_elements=["name"], set_={"version": CacheVersion.version + 1})
+    )
+
+
+def invalidate_local() -> None:
+    """Vacia la cache de este proceso (las entradas igual se validan contra la BD)."""
+    with _lock:
+        _entries.clear()
+
+
+def size() -> int:
+    """Numero de usuarios en cache (util para metricas)."""
+    with _lock:
+        return len(_entries)
+
+
+@event.listens_for(Session, "after_commit")
+def _reset_on_commit(session: Session) -> None:
+    # La siguiente transaccion vuelve a leer la version (otro worker pudo cambiarla)
+    session.info.pop(_SESSION_VERSION_KEY, None)
+    if session.info.pop(_SESSION_DIRTY_KEY, False):
+        invalidate_local()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_on_rollback(session: Session, previous_transaction) -> None:
+    session.info.pop(_SESSION_VERSION_KEY, None)
+    # Los cambios no se guardaron: el memo del request puede tener datos no confirmados
+    if session.info.pop(_SESSION_DIRTY_KEY, False):
+        session.info.pop(_SESSION_MEMO_KEY, None)
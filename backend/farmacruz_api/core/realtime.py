@@ -0,0 +1,222 @@
+"""
+Notificaciones en tiempo real (Server-Sent Events) alimentadas por LISTEN/NOTIFY
+
+Flujo:
+1. Las funciones CRUD llaman publish(db, tipo, datos, temas) ANTES de su commit.
+   En Postgres se ejecuta pg_notify dentro de la misma transaccion: el aviso solo
+   sale si el COMMIT se confirma, y lo reciben todos los workers de gunicorn.
+2. Cada proceso tiene un hilo (iniciado en el lifespan) con una conexion dedicada
+   haciendo LISTEN; reparte cada evento a las conexiones SSE abiertas en ese
+   proceso cuyo conjunto de temas coincide.
+3. Temas: customer:{id}, user:{id}, group:{sales_group_id}, admin, staff.
+   Se calculan una vez al abrir el stream: un dashboard abierto sin cambios no
+   hace ninguna query (solo recibe un comentario de keep-alive).
+
+Sin Postgres (SQLite en desarrollo) los eventos se reparten en el mismo proceso
+despues del COMMIT.
+
+Uso:
+    realtime.publish(db, "order.updated", {"order_id": 1, "status": "approved"},
+                     realtime.order_topics(order))
+    db.commit()
+"""
+
+import asyncio
+import json
+import logging
+import select
+import threading
+from typing import Iterable, Optional
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "farmacruz_events"
+_PENDING_KEY = "realtime_pending"   # eventos en espera del COMMIT (solo sin Postgres)
+
+# pg_notify acepta hasta 8000 bytes por aviso: los eventos solo llevan ids y estados
+MAX_PAYLOAD_BYTES = 7900
+
+
+class Subscription:
+    """Una conexion SSE: cola propia y los temas que puede ver."""
+
+    def __init__(self, topics: Iterable[str]):
+        self.topics = frozenset(topics)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.REALTIME_QUEUE_SIZE)
+        self.overflowed = False
+
+
+_subscribers: dict[str, set[Subscription]] = {}   # tema → conexiones
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_listener: Optional["NotifyListener"] = None
+
+
+""" Temas de un pedido: su cliente, el grupo del cliente, el vendedor asignado y admins """
+def order_topics(order, customer_group_id: Optional[int] = None) -> list[str]:
+    topics = ["admin", f"customer:{order.customer_id}"]
+    if customer_group_id:
+        topics.append(f"group:{customer_group_id}")
+    if order.assigned_seller_id:
+        topics.append(f"user:{order.assigned_seller_id}")
+    return topics
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+""" Publicar un evento (se entrega al confirmar la transaccion de `db`) """
+def publish(db: Session, event_type: str, data: dict, topics: Iterable[str]) -> None:
+    if not settings.REALTIME_ENABLED:
+        return
+    payload = json.dumps({"type": event_type, "data": data, "topics": sorted(set(topics))}, default=str)
+    if len(payload.encode()) > MAX_PAYLOAD_BYTES:
+        logger.warning(f"Evento {event_type} demasiado grande para NOTIFY ({len(payload)} bytes), descartado")
+        return
+
+    if _is_postgres(db):
+        db.execute(func.pg_notify(CHANNEL, payload).select())
+    else:
+        db.info.setdefault(_PENDING_KEY, []).append(payload)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_pending(session: Session) -> None:
+    for payload in session.info.pop(_PENDING_KEY, []):
+        _deliver(payload)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _deliver(payload: str) -> None:
+    """Llamado desde cualquier hilo: pasa el evento al event loop de la app."""
+    if _loop is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_dispatch, payload)
+
+
+def _dispatch(payload: str) -> None:
+    try:
+        message = json.loads(payload)
+    except ValueError:
+        logger.warning(f"Aviso con payload invalido en {CHANNEL}: {payload[:200]}")
+        return
+
+    targets = set()
+    for topic in message.get("topics", []):
+        targets |= _subscribers.get(topic, set())
+
+    event_data = {"type": message["type"], "data": message.get("data", {})}
+    for subscription in targets:
+        _offer(subscription, event_data)
+
+
+def _offer(subscription: Subscription, event_data: dict) -> None:
+    try:
+        subscription.queue.put_nowait(event_data)
+    except asyncio.QueueFull:
+        # Cliente lento: se descartan eventos y se le pide recargar todo una vez
+        subscription.overflowed = True
+
+
+def _broadcast_resync() -> None:
+    """Tras perder la conexion LISTEN pudo haber eventos perdidos: todos recargan."""
+    for subscription in {s for subs in _subscribers.values() for s in subs}:
+        _offer(subscription, {"type": "resync", "data": {}})
+
+
+def subscribe(topics: Iterable[str]) -> Subscription:
+    """Registrar una conexion SSE (llamar desde el event loop)."""
+    subscription = Subscription(topics)
+    for topic in subscription.topics:
+        _subscribers.setdefault(topic, set()).add(subscription)
+    return subscription
+
+
+def unsubscribe(subscription: Subscription) -> None:
+    for topic in subscription.topics:
+        subs = _subscribers.get(topic)
+        if subs is not None:
+            subs.discard(subscription)
+            if not subs:
+                del _subscribers[topic]
+
+
+def connection_count() -> int:
+    """Conexiones SSE abiertas en este proceso (util para metricas)."""
+    return len({s for subs in _subscribers.values() for s in subs})
+
+
+class NotifyListener(threading.Thread):
+    """Hilo con una conexion propia (fuera del pool) haciendo LISTEN; reconecta con backoff."""
+
+    def __init__(self, engine):
+        super().__init__(name="realtime-listen", daemon=True)
+        self.engine = engine
+        self._stop_event = threading.Event()
+
+    def _connect(self):
+        dialect = self.engine.dialect
+        cargs, cparams = dialect.create_connect_args(self.engine.url)
+        conn = dialect.connect(*cargs, **cparams)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        return conn
+
+    def run(self) -> None:
+        backoff = 1
+        first = True
+        while not self._stop_event.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                if not first and _loop is not None:
+                    _loop.call_soon_threadsafe(_broadcast_resync)
+                first = False
+                backoff = 1
+                while not self._stop_event.is_set():
+                    # Espera con timeout para poder detener el hilo
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        _deliver(conn.notifies.pop(0).payload)
+            except Exception as e:
+                logger.error(f"Conexion LISTEN perdida, reintento en {backoff}s: {e}")
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, 60)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+def startup(engine) -> None:
+    """Guarda el event loop y arranca el LISTEN (llamado desde el lifespan)."""
+    global _loop, _listener
+    _loop = asyncio.get_running_loop()
+    if settings.REALTIME_ENABLED and engine.dialect.name == "postgresql" and _listener is None:
+        _listener = NotifyListener(engine)
+        _listener.start()
+
+
+def shutdown() -> None:
+    global _listener, _loop
+    if _listener is not None:
+        _listener.stop()
+        _listener.join(timeout=6)
+        _listener = None
+    _loop = None
@@ -3,14 +3,17 @@ Modulo de seguridad para FARMACRUZ
 
 Aqui se manejan todas las funciones relacionadas con:
 - Hash y verificacion de contraseñas usando Argon2
+- Executor dedicado para Argon2 (no bloquea el event loop ni el threadpool de requests)
 - Creacion y decodificacion de tokens JWT para autenticacion
 """
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from core.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from core.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, PASSWORD_HASH_WORKERS
 
 # Contexto de hashing de contraseñas usando Argon2 
 pwd_context = CryptContext(
@@ -24,6 +27,38 @@ def get_password_hash(password: str) -> str: # Genera un hash seguro para una co
 def verify_password(plain_password: str, hashed_password: str) -> bool: # Verifica si la contraseña proporcionada coincide con el hash almacenado
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    # Verifica y, si los parametros de pwd_context cambiaron, devuelve un hash nuevo (rehash-on-login)
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+# Executor acotado para Argon2: en tormentas de login las verificaciones hacen cola aqui
+# en lugar de ocupar todos los hilos del threadpool de Starlette (que atiende el resto de requests)
+_hash_executor: Optional[ThreadPoolExecutor] = None
+
+def _get_hash_executor() -> ThreadPoolExecutor:
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(
+            max_workers=max(1, PASSWORD_HASH_WORKERS),
+            thread_name_prefix="argon2"
+        )
+    return _hash_executor
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    # Igual que verify_and_update_password pero ejecutado en el executor dedicado
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_hash_executor(), verify_and_update_password, plain_password, hashed_password
+    )
+
+def shutdown_hash_executor() -> None:
+    # Libera los hilos del executor (llamar al apagar la app)
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False)
+        _hash_executor = None
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str: # Crea un token JWT con los datos proporcionados y tiempo de expiracion opcional
     import uuid
     to_encode = data.copy()
@@ -0,0 +1,114 @@
+"""
+Trabajos de sincronizacion en segundo plano (tabla sync_jobs).
+
+Un solo hilo dedicado (executor) procesa EN ORDEN todo lo que envia la
+sincronizacion: los uploads de /sync-upload y la limpieza final de /sync/cleanup.
+Asi la limpieza nunca corre antes que los lotes que todavia estan en cola.
+
+Cada trabajo queda registrado en sync_jobs con su estado y su progreso, que el
+propio trabajo actualiza en cada lote (en la misma transaccion que el lote).
+
+Uso:
+    job = sync_jobs.create_job(db, "cleanup", {"last_sync": ...})
+    sync_jobs.submit(job.job_id, fn)       # fn(db, job) -> dict con el resultado
+    sync_jobs.set_progress(db, job, "productos", {"productos_desactivados": 5000})
+"""
+
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from db.base import SyncJob, SyncJobStatus
+from db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Hilo dedicado (independiente de los workers de Uvicorn); los trabajos esperan en cola
+executor = ThreadPoolExecutor(
+    max_workers=1,
+    thread_name_prefix="sync_thread_"
+)
+
+_ACTIVE_STATUSES = (SyncJobStatus.pending, SyncJobStatus.running)
+
+
+def create_job(db: Session, kind: str, params: Optional[dict] = None) -> SyncJob:
+    """Registra un trabajo pendiente (hace commit para que el hilo lo vea)."""
+    job = SyncJob(kind=kind, status=SyncJobStatus.pending, params=params or {}, progress={})
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_job(db: Session, job_id: int) -> Optional[SyncJob]:
+    return db.query(SyncJob).filter(SyncJob.job_id == job_id).first()
+
+
+def find_active_job(db: Session, kind: str) -> Optional[SyncJob]:
+    """
+    Trabajo pendiente o en curso de ese tipo. Los que no dan latido desde hace
+    SYNC_JOB_STALE_MINUTES (el proceso se reinicio) se marcan como fallidos.
+    """
+    stale_before = datetime.now(timezone.utc) - timedelta(minutes=settings.SYNC_JOB_STALE_MINUTES)
+    active = None
+    for job in db.query(SyncJob).filter(SyncJob.kind == kind, SyncJob.status.in_(_ACTIVE_STATUSES)).order_by(SyncJob.job_id):
+        updated_at = job.updated_at if job.updated_at.tzinfo else job.updated_at.replace(tzinfo=timezone.utc)
+        if updated_at < stale_before:
+            job.status = SyncJobStatus.failed
+            job.error = "Trabajo abandonado (sin actividad; el servidor se reinicio)"
+            job.finished_at = datetime.now(timezone.utc)
+        elif active is None:
+            active = job
+    db.commit()
+    return active
+
+
+def set_progress(db: Session, job: SyncJob, step: str, counters: dict) -> None:
+    """Actualiza paso y contadores (sin commit: se guarda junto con el lote)."""
+    job.step = step
+    # Reasignar (no mutar) para que el ORM detecte el cambio en la columna JSON
+    job.progress = {**(job.progress or {}), **counters}
+
+
+def run_job(job_id: int, fn: Callable[[Session, SyncJob], dict]) -> None:
+    """Ejecuta fn(db, job) con su propia sesion y registra el resultado."""
+    db = SessionLocal()
+    try:
+        job = get_job(db, job_id)
+        if job is None:
+            return
+        job.status = SyncJobStatus.running
+        job.started_at = datetime.now(timezone.utc)
+        db.commit()
+
+        result = fn(db, job)
+
+        job.progress = {**(job.progress or {}), **(result or {})}
+        job.status = SyncJobStatus.completed
+        job.step = None
+        job.finished_at = datetime.now(timezone.utc)
+        db.commit()
+        logger.info(f"[SYNC-JOB] {job.kind} #{job_id} completado: {job.progress}")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"[SYNC-JOB] Error en el trabajo #{job_id}: {e}")
+        traceback.print_exc()
+        job = get_job(db, job_id)
+        if job is not None:
+            job.status = SyncJobStatus.failed
+            job.error = str(e)[:2000]
+            job.finished_at = datetime.now(timezone.utc)
+            db.commit()
+    finally:
+        db.close()
+
+
+def submit(job_id: int, fn: Callable[[Session, SyncJob], dict]):
+    """Encola el trabajo en el hilo de sincronizacion."""
+    return executor.submit(run_job, job_id, fn)
@@ -0,0 +1,148 @@
+"""
+Verificacion de Cloudflare Turnstile (CAPTCHA) no bloqueante.
+
+- Un solo httpx.AsyncClient con keep-alive, creado y cerrado por el lifespan de la app
+  (startup() / shutdown()), en lugar de abrir una conexion TLS nueva por login.
+- Tope de espera por verificacion (TURNSTILE_TIMEOUT_SECONDS) para acotar el p99 del login.
+- Circuit breaker: tras TURNSTILE_BREAKER_FAILURES fallos seguidos (timeout, red, 5xx/429)
+  el circuito se abre y durante TURNSTILE_BREAKER_COOLDOWN_SECONDS se omite la llamada
+  remota (fail-open, igual que antes cuando Cloudflare no responde). Pasado el cooldown
+  se deja pasar una sola verificacion de prueba (half-open).
+
+El estado es en memoria por worker, igual que token_blacklist.
+
+Uso:
+    outcome = await turnstile.verify(captcha_token)
+    # "ok" | "invalid" | "missing" | "bypass"
+"""
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import httpx
+
+from core.config import (
+    TURNSTILE_SECRET_KEY,
+    TURNSTILE_VERIFY_URL,
+    TURNSTILE_TIMEOUT_SECONDS,
+    TURNSTILE_BREAKER_FAILURES,
+    TURNSTILE_BREAKER_COOLDOWN_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Resultados posibles de verify()
+OK = "ok"            # Token valido
+INVALID = "invalid"  # Cloudflare rechazo el token
+MISSING = "missing"  # No se envio token y Cloudflare esta en linea
+BYPASS = "bypass"    # Cloudflare no disponible (o circuito abierto) -> fail-open
+
+_client: Optional[httpx.AsyncClient] = None
+
+# Estado del circuit breaker (cache del estado de salud de Cloudflare)
+_consecutive_failures = 0
+_open_until = 0.0          # monotonic; mientras now < _open_until el circuito esta abierto
+_probe_in_flight = False   # half-open: solo una verificacion de prueba a la vez
+
+
+def startup() -> None:
+    """Crea el cliente HTTP compartido (llamado desde el lifespan)."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(TURNSTILE_TIMEOUT_SECONDS),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60),
+        )
+
+
+async def shutdown() -> None:
+    """Cierra el cliente HTTP compartido (llamado desde el lifespan)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def is_healthy() -> bool:
+    """False mientras el circuito esta abierto (util para /health y metricas)."""
+    return time.monotonic() >= _open_until
+
+
+def _record_success() -> None:
+    global _consecutive_failures, _open_until
+    if _open_until:
+        logger.info("Turnstile respondio de nuevo. Circuito cerrado.")
+    _consecutive_failures = 0
+    _open_until = 0.0
+
+
+def _record_failure(reason: str) -> None:
+    global _consecutive_failures, _open_until
+    _consecutive_failures += 1
+    if _consecutive_failures >= TURNSTILE_BREAKER_FAILURES:
+        _open_until = time.monotonic() + TURNSTILE_BREAKER_COOLDOWN_SECONDS
+        logger.warning(
+            f"Turnstile con {_consecutive_failures} fallos seguidos ({reason}). "
+            f"Circuito abierto por {TURNSTILE_BREAKER_COOLDOWN_SECONDS}s, login en fail-open."
+        )
+    else:
+        logger.warning(f"Turnstile fallo ({reason}). Permitiendo login por fallback de seguridad.")
+
+
+async def verify(captcha_token: str) -> str:
+    """Verifica el token contra Cloudflare con estrategia Fail-Open."""
+    global _probe_in_flight
+
+    now = time.monotonic()
+    if now < _open_until:
+        # Circuito abierto: no esperamos a un servicio que sabemos caido
+        return BYPASS
+
+    half_open = _open_until > 0
+    if half_open:
+        if _probe_in_flight:
+            return BYPASS
+        _probe_in_flight = True
+
+    if _client is None:
+        startup()
+
+    try:
+        # Si el token falta, mandamos un valor dummy para verificar si el servicio está en línea.
+        response = await asyncio.wait_for(
+            _client.post(
+                TURNSTILE_VERIFY_URL,
+                data={
+                    "secret": TURNSTILE_SECRET_KEY,
+                    "response": captcha_token or "ping-healthcheck",
+                },
+            ),
+            timeout=TURNSTILE_TIMEOUT_SECONDS,
+        )
+    except (httpx.HTTPError, asyncio.TimeoutError) as e:
+        _record_failure(type(e).__name__)
+        return BYPASS
+    finally:
+        if half_open:
+            _probe_in_flight = False
+
+    if response.status_code != 200:
+        # 5xx o rate limit (429): permitimos el paso por precaución operativa
+        _record_failure(f"status {response.status_code}")
+        return BYPASS
+
+    try:
+        result = response.json()
+    except ValueError:
+        _record_failure("respuesta no JSON")
+        return BYPASS
+    _record_success()
+
+    if captcha_token and not result.get("success"):
+        logger.warning(f"Turnstile rechazó el token: {result.get('error-codes')}")
+        return INVALID
+    if not captcha_token:
+        return MISSING
+    return OK
@@ -1,7 +1,8 @@
 """
 Funciones para manejar el carrito temporal de clientes:
-- Ver items del carrito
+- Ver items del carrito (una sola query con precios y totales calculados en el servidor)
 - Agregar productos al carrito
+- Fusionar muchas lineas de una vez (import Excel / listas de favoritos): merge_into_cart
 - Actualizar cantidades
 - Eliminar items
 - Vaciar carrito completo
@@ -10,60 +11,85 @@ El carrito se limpia cuando se crea un pedido.
 """
 
 from decimal import Decimal
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timezone
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
-from utils.price_utils import get_catalog_product_info
+from sqlalchemy.orm import Session, joinedload, contains_eager
+from sqlalchemy import func, and_
+from sqlalchemy.dialects.postgresql import insert
+from utils.price_utils import calculate_final_price_with_markup, apply_iva, build_catalog_product_dict
 from db.base import CartCache, CustomerInfo, PriceListItem, Product
 import pandas as pd
 import io
 
-"""Obtiene todos los items en el carrito de un cliente con detalles del producto y precios"""
-def get_cart(db: Session, customer_id: int) -> List[dict]: 
-    cart_items = db.query(CartCache).options(
-        joinedload(CartCache.product).joinedload(Product.category)
+"""Construye el dict de producto para el carrito cuando no hay precio en la lista del cliente"""
+def _build_unpriced_product_dict(product: Product) -> dict:
+    product_data = build_catalog_product_dict(product, Decimal('0'))
+    product_data['final_price'] = None
+    return product_data
+
+"""Hidrata el carrito en UNA query y calcula precios y totales en una sola pasada"""
+def get_cart_snapshot(db: Session, customer_id: int) -> dict:
+    """
+    Un solo SELECT: cartcache + products + categories + customerinfo + pricelistitems
+    (este ultimo filtrado por la lista de precios del cliente via el JOIN).
+
+    Retorna:
+        {
+            "items": [...],            # mismo formato que get_cart
+            "item_count": int,         # lineas del carrito
+            "total_quantity": int,     # unidades
+            "subtotal": float,         # SIN IVA (solo lineas con precio)
+            "iva_amount": float,
+            "total": float,            # CON IVA (sin envio, se calcula al hacer el pedido)
+            "unpriced_items": int      # lineas sin precio en la lista del cliente
+        }
+    """
+    rows = db.query(CartCache, PriceListItem).join(
+        CartCache.product
+    ).outerjoin(
+        Product.category
+    ).outerjoin(
+        CustomerInfo, CustomerInfo.customer_id == CartCache.customer_id
+    ).outerjoin(
+        PriceListItem, and_(
+            PriceListItem.price_list_id == CustomerInfo.price_list_id,
+            PriceListItem.product_id == CartCache.product_id
+        )
+    ).options(
+        contains_eager(CartCache.product).contains_eager(Product.category)
     ).filter(
         CartCache.customer_id == customer_id
-    ).all()
-    
-    customer_info = db.query(CustomerInfo).filter(
-        CustomerInfo.customer_id == customer_id
-    ).first()
-    
-    # Enriquecer con informacion del producto en formato anidado usando middleware
-    result = []
-    for item in cart_items:
-        if not item.product:
-            continue
-            
-        product_data = None
-        if customer_info and customer_info.price_list_id:
-            product_data = get_catalog_product_info(db, item.product, customer_info.price_list_id)
-        
-        # Si no hay lista de precios o no se encontro el item, construir dict basico seguro
-        if not product_data:
-            product_data = {
-                'product_id': item.product.product_id,
-                'codebar': item.product.codebar,
-                'name': item.product.name,
-                'description': item.product.description,
-                'descripcion_2': item.product.descripcion_2,
-                'unidad_medida': item.product.unidad_medida,
-                'iva_percentage': float(item.product.iva_percentage or 0),
-                'image_url': item.product.image_url,
-                'stock_count': item.product.stock_count,
-                'is_active': item.product.is_active,
-                'category_id': item.product.category_id,
-                'category': {
-                    'category_id': item.product.category.category_id,
-                    'name': item.product.category.name
-                } if item.product.category else None,
-                'final_price': None,
-                'image_version': item.product.image_version,
-            }
-            
-        result.append({
+    ).order_by(CartCache.added_at, CartCache.cart_cache_id).all()
+
+    items = []
+    total_quantity = 0
+    unpriced_items = 0
+    subtotal = Decimal('0')
+    total = Decimal('0')
+
+    for item, price_item in rows:
+        product = item.product
+        total_quantity += item.quantity
+
+        if price_item is not None:
+            # Misma formula que get_catalog_product_info / create_order_from_cart
+            price_without_iva = calculate_final_price_with_markup(
+                base_price=Decimal(str(product.base_price or 0)),
+                markup_percentage=Decimal(str(price_item.markup_percentage or 0)),
+                stored_final_price=Decimal(str(price_item.final_price)) if price_item.final_price else None
+            )
+            final_price = apply_iva(price_without_iva, Decimal(str(product.iva_percentage or 0)))
+            product_data = build_catalog_product_dict(product, final_price)
+
+            if product.is_active:
+                subtotal += price_without_iva * item.quantity
+                total += final_price * item.quantity
+        else:
+            # Sin lista de precios o producto fuera de la lista
+            product_data = _build_unpriced_product_dict(product)
+            unpriced_items += 1
+
+        items.append({
             "cart_cache_id": item.cart_cache_id,
             "customer_id": item.customer_id,
             "product_id": item.product_id,
@@ -72,8 +98,20 @@ def get_cart(db: Session, customer_id: int) -> List[dict]:
             "updated_at": item.updated_at,
             "product": product_data
         })
-    
-    return result
+
+    return {
+        "items": items,
+        "item_count": len(items),
+        "total_quantity": total_quantity,
+        "subtotal": float(subtotal),
+        "iva_amount": float(total - subtotal),
+        "total": float(total),
+        "unpriced_items": unpriced_items,
+    }
+
+"""Obtiene todos los items en el carrito de un cliente con detalles del producto y precios"""
+def get_cart(db: Session, customer_id: int) -> List[dict]: 
+    return get_cart_snapshot(db, customer_id)["items"]
 
 """Agrega un producto al carrito o incrementa su cantidad si ya existe"""
 def add_to_cart(db: Session, customer_id: int, product_id: str, quantity: int = 1, cap_at_stock: bool = False) -> CartCache:
@@ -170,95 +208,155 @@ def get_cart_item_count(db: Session, customer_id: int) -> int:
         CartCache.customer_id == customer_id
     ).scalar() or 0
 
-"""Importa productos al carrito desde un archivo Excel"""
-def import_cart_from_excel(db: Session, customer_id: int, file_content: bytes) -> dict:
-    try:
-        df = pd.read_excel(io.BytesIO(file_content), header=None)
-    except Exception as e:
-        raise ValueError(f"Error al leer el archivo Excel: {str(e)}")
+"""Fusiona muchas lineas en el carrito con UNA lectura y UN upsert (motor compartido Excel / favoritos)"""
+def merge_into_cart(db: Session, customer_id: int, lines: List[Tuple[Optional[Product], int]],
+                    current_quantities: Optional[Dict[str, int]] = None) -> List[dict]:
+    """
+    lines: [(producto o None si no existe, cantidad solicitada), ...] en el orden del origen.
+    current_quantities: {product_id: cantidad en carrito}; si es None se lee en una sola query.
 
-    notifications = []
-    
-    for index, row in df.iterrows():
-        # Validar que existan al menos 2 columnas
-        if len(row) < 2:
-            continue
-            
-        codebar_raw = row[0]
-        qty_raw = row[1]
-        
-        # Ignorar filas vacías o donde la cantidad no sea un número (posible header)
-        if pd.isna(codebar_raw) or pd.isna(qty_raw):
-            continue
-            
-        try:
-            qty = int(qty_raw)
-            if qty <= 0:
-                continue
-        except (ValueError, TypeError):
-            # Si la cantidad no se puede convertir a int, probablemente sea un header
-            continue
-            
-        codebar = str(codebar_raw).strip()
-        if codebar.endswith(".0"):
-            codebar = codebar[:-2]
-            
-        # Buscar el producto
-        product = db.query(Product).filter(
-            Product.codebar == codebar
-        ).first()
-        
-        if not product:
-            notifications.append(f"❌ Código '{codebar}': Producto no encontrado.")
-            continue
+    Las cantidades se acumulan en memoria, asi un producto repetido en el origen
+    se suma a lo ya agregado por las lineas anteriores (igual que el flujo fila por fila).
 
-            
+    Retorna un resultado por linea (en el mismo orden) para que cada llamador arme sus notificaciones:
+        {"product", "requested", "added", "quantity", "status"}
+        status: not_found | inactive | no_stock | maxed | capped | added
+
+    NO hace commit: el llamador arma sus notificaciones y luego hace commit
+    (despues del commit los productos quedan expirados y leerlos dispara una query por producto).
+    """
+    product_ids = {product.product_id for product, _ in lines if product is not None}
+
+    if current_quantities is None:
+        current_quantities = {}
+        if product_ids:
+            current_quantities = dict(db.query(CartCache.product_id, CartCache.quantity).filter(
+                CartCache.customer_id == customer_id,
+                CartCache.product_id.in_(product_ids)
+            ).all())
+    running = dict(current_quantities)
+
+    outcomes = []
+    changed: Dict[str, int] = {}
+
+    for product, qty in lines:
+        outcome = {"product": product, "requested": qty, "added": 0, "quantity": None, "status": None}
+        outcomes.append(outcome)
+
+        if product is None:
+            outcome["status"] = "not_found"
+            continue
         if not product.is_active:
-            notifications.append(f"❌ '{product.name}': El producto no está activo.")
+            outcome["status"] = "inactive"
             continue
 
-            
-        if product.stock_count <= 0:
-            notifications.append(f"❌ '{product.name}': Producto sin stock disponible.")
+        stock = product.stock_count or 0
+        if stock <= 0:
+            outcome["status"] = "no_stock"
             continue
 
-            
-        # Verificar si el item ya está en el carrito
-        cart_item = db.query(CartCache).filter(
-            CartCache.customer_id == customer_id,
-            CartCache.product_id == product.product_id
-        ).first()
-        
-        current_qty = cart_item.quantity if cart_item else 0
+        current_qty = running.get(product.product_id, 0)
         total_qty = current_qty + qty
-        
-        # Ajustar por límite de stock
-        if total_qty > product.stock_count:
-            added_qty = product.stock_count - current_qty
-            if added_qty <= 0:
-                notifications.append(f"⚠️ '{product.name}': Ya tienes el máximo stock en tu carrito.")
+        outcome["status"] = "added"
+
+        # Ajustar por limite de stock
+        if total_qty > stock:
+            if stock - current_qty <= 0:
+                outcome["status"] = "maxed"
+                outcome["quantity"] = current_qty
                 continue
-            else:
-                total_qty = product.stock_count
-                notifications.append(f"⚠️ '{product.name}': Cantidad ajustada al máximo disponible ({product.stock_count}).")
+            total_qty = stock
+            outcome["status"] = "capped"
+
+        outcome["added"] = total_qty - current_qty
+        outcome["quantity"] = total_qty
+        running[product.product_id] = total_qty
+        changed[product.product_id] = total_qty
+
+    if changed:
+        now = datetime.now(timezone.utc)
+        stmt = insert(CartCache).values([
+            {
+                "customer_id": customer_id,
+                "product_id": product_id,
+                "quantity": quantity,
+                "added_at": now,
+                "updated_at": now,
+            }
+            for product_id, quantity in changed.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['customer_id', 'product_id'],
+            set_={
+                'quantity': stmt.excluded.quantity,
+                'updated_at': stmt.excluded.updated_at,
+            }
+        )
+        db.execute(stmt)
+
+    return outcomes
+
+"""Lee el Excel (col 0 = codigo de barras, col 1 = cantidad) y regresa [(codebar, cantidad)] validos"""
+def _parse_cart_excel(file_content: bytes) -> List[Tuple[str, int]]:
+    try:
+        df = pd.read_excel(io.BytesIO(file_content), header=None)
+    except Exception as e:
+        raise ValueError(f"Error al leer el archivo Excel: {str(e)}")
+
+    # Validar que existan al menos 2 columnas
+    if df.shape[1] < 2 or df.empty:
+        return []
+
+    # Ignorar filas vacías o donde la cantidad no sea un número (posible header)
+    qty = pd.to_numeric(df[1], errors='coerce').replace([float('inf'), float('-inf')], float('nan'))
+    valid = df[0].notna() & qty.notna()
+    qty = qty[valid].astype('int64')
+    valid_qty = qty > 0
+
+    codebars = df.loc[valid, 0][valid_qty].astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+    return list(zip(codebars.tolist(), qty[valid_qty].tolist()))
+
+"""Importa productos al carrito desde un archivo Excel"""
+def import_cart_from_excel(db: Session, customer_id: int, file_content: bytes) -> dict:
+    """
+    Una query IN para todos los codigos + una para el carrito + un upsert.
+    Es sincrona (pandas + DB): la ruta la ejecuta en el threadpool.
+    """
+    rows = _parse_cart_excel(file_content)
+
+    # Buscar todos los productos de una vez (si un codigo se repite se prefiere el activo)
+    products_by_codebar: Dict[str, Product] = {}
+    codebars = {codebar for codebar, _ in rows}
+    if codebars:
+        products = db.query(Product).filter(
+            Product.codebar.in_(codebars)
+        ).order_by(Product.is_active.desc(), Product.product_id).all()
+        for product in products:
+            products_by_codebar.setdefault(product.codebar, product)
+
+    outcomes = merge_into_cart(
+        db, customer_id, [(products_by_codebar.get(codebar), qty) for codebar, qty in rows]
+    )
+
+    notifications = []
+    for (codebar, qty), outcome in zip(rows, outcomes):
+        product = outcome["product"]
+        result = outcome["status"]
+        if result == "not_found":
+            notifications.append(f"❌ Código '{codebar}': Producto no encontrado.")
+        elif result == "inactive":
+            notifications.append(f"❌ '{product.name}': El producto no está activo.")
+        elif result == "no_stock":
+            notifications.append(f"❌ '{product.name}': Producto sin stock disponible.")
+        elif result == "maxed":
+            notifications.append(f"⚠️ '{product.name}': Ya tienes el máximo stock en tu carrito.")
+        elif result == "capped":
+            notifications.append(f"⚠️ '{product.name}': Cantidad ajustada al máximo disponible ({product.stock_count}).")
         else:
             notifications.append(f"✅ '{product.name}': {qty} unidades agregadas.")
 
-            
-        # Actualizar o crear item en el carrito
-        if cart_item:
-            cart_item.quantity = total_qty
-            cart_item.updated_at = datetime.now(timezone.utc)
-        else:
-            new_cart_item = CartCache(
-                customer_id=customer_id,
-                product_id=product.product_id,
-                quantity=total_qty
-            )
-            db.add(new_cart_item)
-            
     db.commit()
-    
+
     return {
         "message": "Importación finalizada",
         "notifications": notifications
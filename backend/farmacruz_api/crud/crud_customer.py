@@ -17,6 +17,7 @@ from sqlalchemy import or_, func
 
 from core.security import get_password_hash, verify_password
 from db.base import Customer, CustomerInfo
+from crud.crud_ticket import refresh_ticket_visibility
 from schemas.customer import CustomerCreate, CustomerUpdate
 from utils.sales_group_utils import assign_customer_to_agent_group
 
@@ -212,6 +213,9 @@ def create_or_update_customer_info(db: Session, customer_info: CustomerInfo, cus
         for field, value in update_data.items():
             if field != 'customer_info_id':  # No actualizar el ID
                 setattr(existing_info, field, value)
+        if 'sales_group_id' in update_data:
+            db.flush()
+            refresh_ticket_visibility(db, [customer_id])
         db.commit()
         return existing_info
     # Crear nuevo CustomerInfo
@@ -228,6 +232,8 @@ def create_or_update_customer_info(db: Session, customer_info: CustomerInfo, cus
         telefono_2=customer_info.telefono_2
     )
     db.add(new_info)
+    db.flush()
+    refresh_ticket_visibility(db, [customer_id])
     db.commit()
     db.refresh(new_info)
     return new_info
\ No newline at end of file
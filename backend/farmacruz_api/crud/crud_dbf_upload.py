@@ -12,23 +12,42 @@ import math
 from sqlalchemy.orm import Session
 from sqlalchemy.dialects.postgresql import insert
 import logging
-from sqlalchemy import text
+from sqlalchemy import or_, text
 
-from db.base import Product, Category, PriceList, PriceListItem, User, Customer, CustomerInfo
+from db.base import Product, Category, PriceList, PriceListItem, User, Customer, CustomerInfo, SyncUploadChunk
+from core import sync_jobs
 from crud.crud_customer import get_password_hash
+from crud.crud_sync import (
+    RUN_CATEGORIAS, RUN_ITEMS, RUN_LISTAS, RUN_PRODUCTOS, llave_item_corrida, registrar_en_corrida
+)
 from utils.sales_group_utils import bulk_assign_customers_to_agent_groups, bulk_ensure_seller_groups
 
 # Configurar logger para este módulo
 logger = logging.getLogger(__name__)
 
 
+def _solo_si_cambia(stmt, columnas: List[str]):
+    """
+    WHERE del ON CONFLICT DO UPDATE: solo reescribe la fila si algun valor cambio.
+    Con corridas de sincronizacion updated_at ya no decide la limpieza, asi que las
+    filas iguales (la gran mayoria en cada sync) no generan tuplas nuevas ni WAL.
+    """
+    return or_(*[
+        stmt.table.c[columna].is_distinct_from(stmt.excluded[columna]) for columna in columnas
+    ])
+
+
 def process_productos_from_json(
     categorias: List[str],
     productos: List[Dict],
-    db: Session
+    db: Session,
+    run_id: Optional[int] = None
 ) -> Dict[str, int]:
     """
     Process pre-parsed products JSON.
+
+    Con run_id (corrida abierta) se registran las llaves en la corrida y no se
+    reescriben los productos/categorias sin cambios.
     """
     fecha_sync = datetime.now(timezone.utc)
     
@@ -48,12 +67,16 @@ def process_productos_from_json(
     
     if categorias_data:
         stmt = insert(Category).values(categorias_data)
-        stmt = stmt.on_conflict_do_update(
-            index_elements=['name'],
-            set_={
-                'updated_at': stmt.excluded.updated_at
-            }
-        )
+        if run_id is not None:
+            # Solo se toca updated_at: con corrida no hace falta reescribir la fila
+            stmt = stmt.on_conflict_do_nothing(index_elements=['name'])
+        else:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['name'],
+                set_={
+                    'updated_at': stmt.excluded.updated_at
+                }
+            )
         db.execute(stmt)
         db.commit()
     
@@ -66,6 +89,9 @@ def process_productos_from_json(
     # Update map: Name -> ID
     cat_map = {c.name: c.category_id for c in db_categories}
     logger.info(f"Mapped {len(cat_map)} categories to IDs")
+    if run_id is not None and cat_map:
+        registrar_en_corrida(db, run_id, RUN_CATEGORIAS, list(cat_map.values()))
+        db.commit()
     
     # 2. UPSERT PRODUCTOS
     logger.info(f"Upserting {len(productos)} products...")
@@ -95,6 +121,7 @@ def process_productos_from_json(
         }
         productos_cleaned.append(updated_prod)
     
+    escritos = 0
     if productos_cleaned:
         # Process in chunks
         CHUNK_SIZE = 1000
@@ -103,6 +130,8 @@ def process_productos_from_json(
             
             try:
                 stmt = insert(Product).values(chunk)
+                columnas = ['codebar', 'name', 'description', 'unidad_medida', 'base_price', 'iva_percentage',
+                            'stock_count', 'is_active', 'category_id', 'image_url']
                 stmt = stmt.on_conflict_do_update(
                     index_elements=['product_id'],
                     set_={
@@ -117,9 +146,12 @@ def process_productos_from_json(
                         'category_id': stmt.excluded.category_id,
                         'image_url': stmt.excluded.image_url,
                         'updated_at': stmt.excluded.updated_at
-                    }
+                    },
+                    where=_solo_si_cambia(stmt, columnas) if run_id is not None else None
                 )
-                db.execute(stmt)
+                escritos += db.execute(stmt).rowcount
+                if run_id is not None:
+                    registrar_en_corrida(db, run_id, RUN_PRODUCTOS, [p["product_id"] for p in chunk])
                 db.commit()
                 logger.info(f"[THREAD-SYNC] Products chunk processed: {len(chunk)} items at {datetime.now()}")
             except Exception as e:
@@ -130,6 +162,13 @@ def process_productos_from_json(
     
     db.commit()
     
+    if run_id is not None:
+        return {
+            "creados": 0,
+            "actualizados": escritos,
+            "sin_cambios": len(productos_cleaned) - escritos,
+            "errores": 0
+        }
     return {
         "creados": 0,  
         "actualizados": len(productos_cleaned),
@@ -139,10 +178,12 @@ def process_productos_from_json(
 
 def process_listas_precios_from_json(
     listas: List[Dict],
-    db: Session
+    db: Session,
+    run_id: Optional[int] = None
 ) -> Dict[str, int]:
     """
     Process unique price lists (Header information).
+    Con run_id se registran en la corrida y no se reescriben las listas sin cambios.
     """
     fecha_sync = datetime.now(timezone.utc)
     logger.info(f"Upserting {len(listas)} price lists headers...")
@@ -157,15 +198,26 @@ def process_listas_precios_from_json(
         for lista in listas if lista.get("price_list_id")
     ]
     
+    escritos = 0
     if listas_data:
         stmt = insert(PriceList).values(listas_data)
         stmt = stmt.on_conflict_do_update(
             index_elements=['price_list_id'],
-            set_={c.name: c for c in stmt.excluded if c.name not in('price_list_id')}
+            set_={c.name: c for c in stmt.excluded if c.name not in('price_list_id')},
+            where=_solo_si_cambia(stmt, ['list_name', 'is_active']) if run_id is not None else None
         )
-        db.execute(stmt)
+        escritos = db.execute(stmt).rowcount
+        if run_id is not None:
+            registrar_en_corrida(db, run_id, RUN_LISTAS, [l["price_list_id"] for l in listas_data])
         db.commit()
     
+    if run_id is not None:
+        return {
+            "creados": 0,
+            "actualizados": escritos,
+            "sin_cambios": len(listas_data) - escritos,
+            "errores": 0
+        }
     return {
         "creados": 0,
         "actualizados": len(listas_data),
@@ -173,13 +225,24 @@ def process_listas_precios_from_json(
     }
 
 
+def _ids_existentes(db: Session, columna, ids: set, chunk_size: int = 5000) -> set:
+    """Cuales de los ids existen en la tabla (IN por lotes)."""
+    ids = list(ids)
+    existentes = set()
+    for i in range(0, len(ids), chunk_size):
+        existentes.update(flat_id for (flat_id,) in db.query(columna).filter(columna.in_(ids[i:i + chunk_size])))
+    return existentes
+
+
 def process_items_precios_from_json(
     items: List[Dict],
-    db: Session
+    db: Session,
+    run_id: Optional[int] = None
 ) -> Dict[str, int]:
     """
     Process price list items (Product relations).
     Validates logical consistency between markup and final price roughly.
+    Con run_id se registran en la corrida y no se reescriben los items sin cambios.
     """
     fecha_sync = datetime.now(timezone.utc)
     logger.info(f"Processing {len(items)} price list items...")
@@ -214,8 +277,9 @@ def process_items_precios_from_json(
         # This is CRITICAL because step 1 filters out obsolete products, but step 3
         # DBF source might still contain prices for them.
         # ---------------------------------------------------------------------
-        valid_product_ids = set(flat_id for (flat_id,) in db.query(Product.product_id).all())
-        valid_list_ids = set(flat_id for (flat_id,) in db.query(PriceList.price_list_id).all())
+        # Solo se consultan los ids que vienen en el payload (no todo el catalogo por chunk)
+        valid_product_ids = _ids_existentes(db, Product.product_id, {item["product_id"] for item in items_data})
+        valid_list_ids = _ids_existentes(db, PriceList.price_list_id, {item["price_list_id"] for item in items_data})
         
         original_count = len(items_data)
         items_data = [
@@ -228,6 +292,7 @@ def process_items_precios_from_json(
         # Process in chunks
         # Passing data to db.execute() instead of values() avoids 'gkpj' error with on_conflict
         CHUNK_SIZE = 1000
+        escritos = 0
         for i in range(0, len(items_data), CHUNK_SIZE):
             chunk = items_data[i:i + CHUNK_SIZE]
             
@@ -235,11 +300,25 @@ def process_items_precios_from_json(
             stmt = insert(PriceListItem).values(chunk)
             stmt = stmt.on_conflict_do_update(
                 index_elements=['price_list_id', 'product_id'],
-                set_={c.name: c for c in stmt.excluded if c.name not in ['price_list_id', 'product_id']}
+                set_={c.name: c for c in stmt.excluded if c.name not in ['price_list_id', 'product_id']},
+                where=_solo_si_cambia(stmt, ['markup_percentage', 'final_price']) if run_id is not None else None
             )
             # Execute without parameters (values are already in stmt)
-            db.execute(stmt)
+            escritos += db.execute(stmt).rowcount
+            if run_id is not None:
+                registrar_en_corrida(db, run_id, RUN_ITEMS, [
+                    llave_item_corrida(item["price_list_id"], item["product_id"]) for item in chunk
+                ])
             db.commit()
+
+        if run_id is not None:
+            return {
+                "creados": 0,
+                "actualizados": escritos,
+                "sin_cambios": len(items_data) - escritos,
+                "errores": 0,
+                "total_items": len(items_data)
+            }
     
 
     return {
@@ -250,6 +329,56 @@ def process_items_precios_from_json(
     }
 
 
+# ============================================================================
+# SUBIDAS POR CHUNKS (/sync-upload/sessions)
+# ============================================================================
+
+ENTIDADES_SUBIDA = ("productos", "listas", "items")
+
+
+def _procesar_filas(entidad: str, filas: List[Dict], db: Session, run_id: Optional[int]) -> Dict[str, int]:
+    if entidad == "productos":
+        # Cada chunk trae sus propias categorias (las de sus productos)
+        categorias = sorted({p["category_name"] for p in filas if p.get("category_name")})
+        return process_productos_from_json(categorias, filas, db, run_id=run_id)
+    if entidad == "listas":
+        return process_listas_precios_from_json(filas, db, run_id=run_id)
+    return process_items_precios_from_json(filas, db, run_id=run_id)
+
+
+def aplicar_chunk_subida(db: Session, job, seq: int, filas: List[Dict], run_id: Optional[int] = None) -> Dict:
+    """
+    Aplica un chunk de una subida por partes (job = sesion de subida) y lo
+    registra en sync_upload_chunks junto con el progreso de la sesion.
+
+    Si el chunk ya se habia aplicado (el cliente reintento porque perdio el ack)
+    se confirma como duplicado sin procesarlo otra vez.
+    """
+    if db.get(SyncUploadChunk, (job.job_id, seq)) is not None:
+        return {"seq": seq, "estado": "duplicado"}
+
+    entidad = job.params["entidad"]
+    resultado = _procesar_filas(entidad, filas, db, run_id)
+
+    db.add(SyncUploadChunk(job_id=job.job_id, seq=seq, rows=len(filas)))
+    progreso = job.progress or {}
+    sync_jobs.set_progress(db, job, entidad, {
+        "chunks": progreso.get("chunks", 0) + 1,
+        "filas": progreso.get("filas", 0) + len(filas),
+        "actualizados": progreso.get("actualizados", 0) + resultado.get("actualizados", 0),
+        "sin_cambios": progreso.get("sin_cambios", 0) + resultado.get("sin_cambios", 0),
+        "errores": progreso.get("errores", 0) + resultado.get("errores", 0),
+    })
+    db.commit()
+    return {"seq": seq, "estado": "aplicado", **resultado}
+
+
+def chunks_faltantes(db: Session, job_id: int, total_chunks: int) -> List[int]:
+    """Numeros de chunk (0..total_chunks-1) que todavia no se aplicaron."""
+    recibidos = {seq for (seq,) in db.query(SyncUploadChunk.seq).filter(SyncUploadChunk.job_id == job_id)}
+    return [seq for seq in range(total_chunks) if seq not in recibidos]
+
+
 # ============================================================================
 # SELLERS & CUSTOMERS (GZIP OPTIMIZED)
 # ============================================================================
@@ -455,7 +584,9 @@ def process_customers_from_json(
         ]
         
         if customers_with_agents:
-            bulk_assign_customers_to_agent_groups(db, customers_with_agents)
+            asignacion = bulk_assign_customers_to_agent_groups(db, customers_with_agents)
+            logger.info(f"Grupos de clientes: {asignacion['reasignados']} reasignados de {asignacion['solicitados']} "
+                        f"({asignacion['sin_grupo']} sin vendedor valido)")
 
         db.commit()
         return {"creados": creados, "actualizados": actualizados, "errores": 0}
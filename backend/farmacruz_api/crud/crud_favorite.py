@@ -1,5 +1,7 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+import logging
+
+from sqlalchemy.orm import Session, contains_eager
+from sqlalchemy import and_, func, select
 from sqlalchemy.exc import IntegrityError
 
 from typing import List, Optional
@@ -8,9 +10,15 @@ from uuid import UUID
 
 from db.base import FavoriteList, FavoriteListItem, Product, CartCache, CustomerInfo, PriceListItem
 from schemas.favorite import FavoriteListCreate, FavoriteListUpdate, FavoriteListItemCreate
-from crud.crud_cart import add_to_cart
+from crud.crud_cart import merge_into_cart
+from db.session import SessionLocal
 from utils.price_utils import calculate_catalog_price
 
+logger = logging.getLogger(__name__)
+
+# Items borrados por sentencia al purgar favoritos de productos inactivos
+FAVORITES_PURGE_BATCH_SIZE = 5000
+
 def get_favorite_lists(db: Session, customer_id: int) -> List[FavoriteList]:
     return db.query(FavoriteList).filter(FavoriteList.customer_id == customer_id).all()
 
@@ -36,32 +44,52 @@ def get_favorite_list(db: Session, list_id: UUID, customer_id: int) -> Optional[
     ).first()
 
 def get_favorite_list_details(db: Session, list_id: UUID, customer_id: int, skip: int = 0, limit: int = 15) -> Optional[dict]:
-    # Limpiar automáticamente productos inactivos
-    db.query(FavoriteListItem).filter(
-        FavoriteListItem.list_id == list_id,
-        FavoriteListItem.product_id.in_(
-            db.query(Product.product_id).filter(Product.is_active == False)
-        )
-    ).delete(synchronize_session=False)
-    db.commit()
-    
     # Obtener lista base
     fav_list = get_favorite_list(db, list_id, customer_id)
     if not fav_list:
         return None
-        
-    # Obtener total de items
-    total_items = db.query(func.count(FavoriteListItem.list_item_id)).filter(FavoriteListItem.list_id == list_id).scalar()
-    
-    # Obtener items paginados
-    items = db.query(FavoriteListItem).filter(
-        FavoriteListItem.list_id == list_id
+
+    # Items paginados + total en UNA query (count(*) OVER ()).
+    # Los productos inactivos se ocultan con el JOIN; su borrado lo hace purge_inactive_favorite_items
+    # cuando se desactivan (sync / admin), ya no en cada lectura.
+    rows = db.query(
+        FavoriteListItem, PriceListItem, func.count().over().label("total_items")
+    ).join(
+        FavoriteListItem.product
+    ).outerjoin(
+        CustomerInfo, CustomerInfo.customer_id == customer_id
+    ).outerjoin(
+        PriceListItem, and_(
+            PriceListItem.price_list_id == CustomerInfo.price_list_id,
+            PriceListItem.product_id == FavoriteListItem.product_id
+        )
+    ).options(
+        contains_eager(FavoriteListItem.product)
+    ).filter(
+        FavoriteListItem.list_id == list_id,
+        Product.is_active == True
+    ).order_by(
+        FavoriteListItem.added_at, FavoriteListItem.list_item_id
     ).offset(skip).limit(limit).all()
-    
-    # Enriquecer items con el precio final para el cliente
-    for item in items:
-        _enrich_favorite_item(db, item, customer_id)
-    
+
+    items = []
+    for item, price_item, _ in rows:
+        # Enriquecer con el precio final para el cliente
+        if price_item:
+            item.final_price = float(calculate_catalog_price(item.product, price_item))
+        items.append(item)
+
+    if rows:
+        total_items = rows[0].total_items
+    else:
+        # Pagina fuera de rango (o lista vacia): el total sale de un count aparte
+        total_items = db.query(func.count(FavoriteListItem.list_item_id)).join(
+            FavoriteListItem.product
+        ).filter(
+            FavoriteListItem.list_id == list_id,
+            Product.is_active == True
+        ).scalar()
+
     # Construir objeto para el schema
     return {
         "list_id": fav_list.list_id,
@@ -74,6 +102,47 @@ def get_favorite_list_details(db: Session, list_id: UUID, customer_id: int, skip
     }
 
 
+""" Elimina de las listas de favoritos los productos inactivos (por lotes) """
+def purge_inactive_favorite_items(db: Session, product_ids: Optional[List[str]] = None,
+                                  batch_size: int = FAVORITES_PURGE_BATCH_SIZE) -> int:
+    """
+    Se llama cuando se desactivan productos (sync, cleanup o edicion del admin).
+    product_ids limita la busqueda a esos productos; None = todos los inactivos.
+    Hace commit por lote para no mantener locks largos. Retorna cuantos items se borraron.
+    """
+    total_deleted = 0
+    while True:
+        batch = select(FavoriteListItem.list_item_id).join(
+            Product, Product.product_id == FavoriteListItem.product_id
+        ).where(Product.is_active == False)
+        if product_ids is not None:
+            batch = batch.where(Product.product_id.in_(product_ids))
+        batch = batch.limit(batch_size)
+
+        deleted = db.query(FavoriteListItem).filter(
+            FavoriteListItem.list_item_id.in_(batch)
+        ).delete(synchronize_session=False)
+        db.commit()
+
+        total_deleted += deleted
+        if deleted < batch_size:
+            return total_deleted
+
+
+""" Version para BackgroundTasks: abre su propia sesion """
+def purge_inactive_favorite_items_job(product_ids: Optional[List[str]] = None) -> None:
+    db = SessionLocal()
+    try:
+        deleted = purge_inactive_favorite_items(db, product_ids)
+        if deleted:
+            logger.info(f"Favoritos: {deleted} items de productos inactivos eliminados")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error limpiando favoritos de productos inactivos: {e}", exc_info=True)
+    finally:
+        db.close()
+
+
 def create_favorite_list(db: Session, customer_id: int, obj_in: FavoriteListCreate) -> FavoriteList:
     db_obj = FavoriteList(
         customer_id=customer_id,
@@ -179,40 +248,52 @@ def remove_item_from_favorite_list(db: Session, list_id: UUID, customer_id: int,
 def load_favorite_list_to_cart(db: Session, list_id: UUID, customer_id: int) -> dict:
     """
     Carga todos los productos de una lista de favoritos al carrito de compras actual.
+
+    Una sola query (items + productos + cantidad actual en el carrito), los topes de
+    stock se calculan en memoria con merge_into_cart y se aplican con un upsert y un commit.
     """
-    fav_list = get_favorite_list(db, list_id, customer_id)
-    if not fav_list:
+    rows = db.query(FavoriteListItem, Product, CartCache.quantity).join(
+        FavoriteList, FavoriteList.list_id == FavoriteListItem.list_id
+    ).outerjoin(
+        Product, Product.product_id == FavoriteListItem.product_id
+    ).outerjoin(
+        CartCache, and_(
+            CartCache.customer_id == customer_id,
+            CartCache.product_id == FavoriteListItem.product_id
+        )
+    ).filter(
+        FavoriteList.list_id == list_id,
+        FavoriteList.customer_id == customer_id
+    ).order_by(FavoriteListItem.added_at, FavoriteListItem.list_item_id).all()
+
+    # Sin filas: lista vacia o que no existe / no es del cliente
+    if not rows and not get_favorite_list(db, list_id, customer_id):
         raise ValueError("Lista no encontrada")
-        
+
+    current_quantities = {item.product_id: cart_qty for item, _, cart_qty in rows if cart_qty is not None}
+    outcomes = merge_into_cart(
+        db, customer_id, [(product, item.quantity) for item, product, _ in rows],
+        current_quantities=current_quantities
+    )
+
     notifications = []
     added_count = 0
-    
-    for item in fav_list.items:
-        try:
-            prod_name = item.product.name if item.product else item.product_id
-            
-            # Obtener cantidad actual en carrito para comparar después
-            current_cart_item = db.query(CartCache).filter(
-                CartCache.customer_id == customer_id,
-                CartCache.product_id == item.product_id
-            ).first()
-            current_qty = current_cart_item.quantity if current_cart_item else 0
-            
-            # Intentar agregar
-            db_cart = add_to_cart(db, customer_id=customer_id, product_id=item.product_id, quantity=item.quantity, cap_at_stock=True)
-            
-            # Si lo que hay ahora es menos de lo que debería haber (actual + pedido), es que hubo ajuste
-            if db_cart.quantity < (current_qty + item.quantity):
-                notifications.append(f"⚠️ '{prod_name}': Cantidad ajustada al máximo disponible ({db_cart.quantity}).")
+
+    for (item, product, _), outcome in zip(rows, outcomes):
+        result = outcome["status"]
+        if result in ("not_found", "inactive"):
+            notifications.append(f"❌ No se pudo agregar '{item.product_id}': Producto no disponible")
+        elif result in ("no_stock", "maxed"):
+            notifications.append(f"❌ No se pudo agregar '{item.product_id}': Ya tienes el máximo stock disponible en el carrito")
+        else:
+            if result == "capped":
+                notifications.append(f"⚠️ '{product.name}': Cantidad ajustada al máximo disponible ({outcome['quantity']}).")
             else:
-                notifications.append(f"✅ '{prod_name}' agregado al carrito.")
-                
+                notifications.append(f"✅ '{product.name}' agregado al carrito.")
             added_count += 1
-        except ValueError as e:
-            notifications.append(f"❌ No se pudo agregar '{item.product_id}': {str(e)}")
 
+    db.commit()
 
-            
     return {
         "added_count": added_count,
         "notifications": notifications
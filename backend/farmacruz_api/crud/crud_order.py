@@ -27,19 +27,30 @@ from fastapi import HTTPException, status
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, and_, or_, cast, String
 
+from core import realtime
 from db.base import Order, OrderItem, OrderStatus, Product, CartCache, CustomerInfo, PriceListItem, User, Customer
 from schemas.order import OrderAssign, OrderCreate, OrderUpdate, OrderItemCreate
 from utils.price_utils import calculate_final_price_with_markup, apply_iva
 
+# Exportacion masiva de TXT: maximo de pedidos por descarga y filas por fetch del cursor
+ORDER_EXPORT_MAX_ORDERS = 500
+ORDER_EXPORT_ROWS_PER_FETCH = 1000
+
 
 """ Obtener pedidos por ID con relaciones """
 def get_order(db: Session, order_id: int) -> Optional[Order]:
+    # customer_info viene en el mismo JOIN para validar permisos por grupo sin otra query
     return db.query(Order).options(
         joinedload(Order.items).joinedload(OrderItem.product),
-        joinedload(Order.customer),
+        joinedload(Order.customer).joinedload(Customer.customer_info),
         joinedload(Order.assigned_seller)
     ).filter(Order.order_id == order_id).first()
 
+""" Grupo de ventas del cliente de un pedido cargado con get_order (None si no tiene) """
+def get_order_customer_group_id(order: Order) -> Optional[int]:
+    customer_info = order.customer.customer_info if order.customer else None
+    return customer_info.sales_group_id if customer_info else None
+
 """ Obtener pedidos de un cliente especifico con relaciones """
 def get_orders_by_customer(db: Session, customer_id: int, skip: int = 0, limit: int = 100, status: Optional[OrderStatus] = None) -> List[Order]:    
     query = db.query(Order).options(
@@ -197,6 +208,8 @@ def create_order_from_cart(db: Session, customer_id: int, shipping_address_numbe
     # === LIMPIAR CARRITO ===
     db.query(CartCache).filter(CartCache.customer_id == customer_id).delete()
     
+    realtime.publish(db, "order.created", {"order_id": db_order.order_id, "status": db_order.status.value},
+                     realtime.order_topics(db_order, customer_info.sales_group_id))
     db.commit()
     db.refresh(db_order)
     return db_order
@@ -324,6 +337,8 @@ def create_order_direct(db: Session, customer_id: int, items: List[dict], shippi
     db_order.total_amount = float(total + shipping_cost)
     db_order.order_profit = float(profit)
     
+    realtime.publish(db, "order.created", {"order_id": db_order.order_id, "status": db_order.status.value},
+                     realtime.order_topics(db_order, customer_info.sales_group_id))
     db.commit()
     db.refresh(db_order)
     return db_order
@@ -341,11 +356,14 @@ def update_order_status(db: Session, order_id: int, status: OrderStatus, seller_
     if seller_id and status == OrderStatus.approved:
         db_order.validated_at = datetime.now(timezone.utc)
     
+    realtime.publish(db, "order.updated", {"order_id": db_order.order_id, "status": status.value},
+                     realtime.order_topics(db_order, get_order_customer_group_id(db_order)))
     db.commit()
     db.refresh(db_order)
 
     # TODO: Notificar al cliente y a su marketing de grupo que cambio el estatus de su pedido
-    # from utils.email_utils import send_email_background
+    # Usar la cola persistente (una conexion SMTP reutilizada por el worker, con reintentos):
+    # from utils.email_queue import enqueue_email
     # from db.base import CustomerInfo, GroupMarketingManager, User
     # 
     # client_email = db_order.customer.email if db_order.customer else None
@@ -353,7 +371,7 @@ def update_order_status(db: Session, order_id: int, status: OrderStatus, seller_
     # html_body = f"<p>Su pedido ha cambiado al estatus: <strong>{status.name if hasattr(status, 'name') else status}</strong></p>"
     # 
     # if client_email:
-    #     # send_email_background(to_email=client_email, subject=subject, html_body=html_body)
+    #     # enqueue_email(db, to_email=client_email, subject=subject, html_body=html_body)
     #     pass
     # 
     # # Obtener emails de los marketing managers asociados al grupo del cliente
@@ -371,7 +389,7 @@ def update_order_status(db: Session, order_id: int, status: OrderStatus, seller_
     #         marketing_emails = [m[0] for m in managers if m[0]]
     # 
     # for m_email in marketing_emails:
-    #     # send_email_background(to_email=m_email, subject=subject, html_body=html_body)
+    #     # enqueue_email(db, to_email=m_email, subject=subject, html_body=html_body)
     #     pass
 
     return db_order
@@ -404,6 +422,8 @@ def cancel_order(db: Session, order_id: int) -> Optional[Order]:
     
     # Cambiar estado a cancelado
     db_order.status = OrderStatus.cancelled
+    realtime.publish(db, "order.cancelled", {"order_id": db_order.order_id, "status": OrderStatus.cancelled.value},
+                     realtime.order_topics(db_order, get_order_customer_group_id(db_order)))
     db.commit()
     db.refresh(db_order)
     return db_order
@@ -518,6 +538,8 @@ def calculate_order_shipping_address(db: Session, order: Order) -> str:
 
 """ Asignar un pedido a un vendedor """
 def assign_order_seller(db: Session, order: Order, assign_data: OrderAssign, current_user: User) -> Optional[Order]:
+    previous_seller_id = order.assigned_seller_id
+
     # Asignación final
     order.assigned_seller_id = assign_data.assigned_seller_id
     order.assigned_by_user_id = current_user.user_id
@@ -526,15 +548,16 @@ def assign_order_seller(db: Session, order: Order, assign_data: OrderAssign, cur
     if assign_data.assignment_notes:
         order.assignment_notes = assign_data.assignment_notes
 
+    realtime.publish(db, "order.assigned", {"order_id": order.order_id, "assigned_seller_id": order.assigned_seller_id},
+                     realtime.order_topics(order, get_order_customer_group_id(order))
+                     + ([f"user:{previous_seller_id}"] if previous_seller_id else []))
     db.commit()
     db.refresh(order)
     return order
 
-""" Generar archivo TXT del pedido en formato de ancho fijo """
-def generate_order_txt(db: Session, order_id: int) -> str:
+""" Una linea del TXT de ancho fijo para el ERP """
+def format_order_txt_line(product_id: str, unidad_medida: Optional[str], quantity: int, price_without_iva) -> str:
     """
-    Genera el contenido TXT del pedido en formato de ancho fijo.
-    
     Formato por línea (basado en EJEMPLOPED.txt):
     - Product ID (40 chars, left-aligned)
     - Unit "PZ" (7 chars, centered/aligned)
@@ -545,65 +568,137 @@ def generate_order_txt(db: Session, order_id: int) -> str:
     - Precio total (20 chars, 8 decimales)
     - Precio unitario (20 chars, 8 decimales)
     - Trailing spaces hasta ~400 chars
-    
+
     Total: ~400 caracteres por línea
     """
+    unit_price = Decimal(str(price_without_iva))  # Precio SIN IVA para ERP
+
+    # 1. Product ID (40 chars, alineado izquierda)
+    product_id_field = (product_id or "")[:40].ljust(40)
+
+    # 2. Unidad (7 chars, alineado izquierda)
+    unit = unidad_medida or "PZ"  # Default a "PZ" si es None
+    unit_field = unit[:7].ljust(7)  # Truncar a 7 chars y alinear izquierda
+
+    # 3 y 4. Decimales fijos (12 chars c/u, incluye espaciado)
+    decimal1_field = "0.00000000  "
+    decimal2_field = "0.00000000  "
+
+    # 5. Espaciado central (28 espacios)
+    spaces_field = " " * 28
+
+    # 6. Columna auxiliar (10 chars, alineado derecha)
+    other_field = str(1).rjust(10)
+
+    # 7. Cantidad (20 chars, 8 decimales, alineado derecha)
+    quantity_str = f"{float(quantity):.8f}".rjust(20)
+
+    # 8. Precio Unitario (20 chars, 8 decimales, alineado derecha)
+    total_price_str = f"{float(unit_price):.8f}".rjust(20)
+
+    # Construir línea completa
+    line = (
+        product_id_field +
+        unit_field +
+        decimal1_field +
+        decimal2_field +
+        spaces_field +
+        other_field +
+        quantity_str +
+        total_price_str
+    )
+
+    # Agregar trailing spaces hasta ~404 chars (longitud total de linea en archivo valido)
+    return line.ljust(405)
+
+""" Generar archivo TXT del pedido en formato de ancho fijo """
+def generate_order_txt(db: Session, order_id: int) -> str:
     # Obtener pedido con items y productos
     order = get_order(db, order_id)
     if not order:
         raise ValueError(f"Pedido {order_id} no encontrado")
-    
-    lines = []
-    
-    for item in order.items:
-        if not item.product:
-            continue
-        
-        # Obtener datos del producto y item
-        product_id = item.product.product_id or ""
-        quantity = item.quantity
-        unit_price = Decimal(str(item.price_without_iva))  # Precio SIN IVA para ERP
-        total_price = unit_price * Decimal(str(quantity))
-        
-        # 1. Product ID (40 chars, alineado izquierda)
-        product_id_field = product_id[:40].ljust(40)
-        
-        # 2. Unidad (7 chars, alineado izquierda)
-        unit = item.product.unidad_medida or "PZ"  # Default a "PZ" si es None
-        unit_field = unit[:7].ljust(7)  # Truncar a 7 chars y alinear izquierda
-        
-        # 3 y 4. Decimales fijos (12 chars c/u, incluye espaciado)
-        decimal1_field = "0.00000000  "
-        decimal2_field = "0.00000000  "
-        
-        # 5. Espaciado central (28 espacios)
-        spaces_field = " " * 28
-        
-        # 6. Columna auxiliar (10 chars, alineado derecha)
-        other_field = str(1).rjust(10)
-        
-        # 7. Cantidad (20 chars, 8 decimales, alineado derecha)
-        quantity_str = f"{float(quantity):.8f}".rjust(20)
-        
-        # 8. Precio Unitario (20 chars, 8 decimales, alineado derecha)
-        total_price_str = f"{float(unit_price):.8f}".rjust(20)
-        
-        # Construir línea completa
-        line = (
-            product_id_field +
-            unit_field +
-            decimal1_field + 
-            decimal2_field +
-            spaces_field +
-            other_field +
-            quantity_str +
-            total_price_str
-        )
-        
-        # Agregar trailing spaces hasta ~404 chars (longitud total de linea en archivo valido)
-        line = line.ljust(405)
-        
-        lines.append(line)
-    
+
+    lines = [
+        format_order_txt_line(item.product.product_id, item.product.unidad_medida, item.quantity, item.price_without_iva)
+        for item in order.items if item.product
+    ]
+
     # Unir todas las líneas con salto de línea Windows (\r\n)
-    return "\r\n".join(lines) + "\r\n"
\ No newline at end of file
+    return "\r\n".join(lines) + "\r\n"
+
+""" IDs de pedidos a exportar en TXT segun filtros y permisos del usuario """
+def get_order_ids_for_export(
+    db: Session,
+    current_user: User,
+    status: OrderStatus = OrderStatus.approved,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    seller_id: Optional[int] = None,
+    only_new: bool = True,
+    limit: int = ORDER_EXPORT_MAX_ORDERS
+) -> List[int]:
+    from db.base import UserRole
+    from crud.crud_sales_group import get_user_groups
+
+    query = db.query(Order.order_id).filter(Order.status == status)
+
+    # Mismos permisos que GET /all
+    if current_user.role == UserRole.seller:
+        query = query.filter(Order.assigned_seller_id == current_user.user_id)
+    elif current_user.role != UserRole.admin:
+        user_group_ids = get_user_groups(db, current_user.user_id)
+        if not user_group_ids:
+            return []
+        query = query.join(CustomerInfo, Order.customer_id == CustomerInfo.customer_id).filter(
+            CustomerInfo.sales_group_id.in_(user_group_ids)
+        )
+
+    if only_new:
+        query = query.filter(Order.exported_at.is_(None))
+    if date_from:
+        query = query.filter(Order.created_at >= date_from)
+    if date_to:
+        query = query.filter(Order.created_at < date_to)
+    if seller_id:
+        query = query.filter(Order.assigned_seller_id == seller_id)
+
+    return [order_id for (order_id,) in query.order_by(Order.order_id).limit(limit).all()]
+
+""" Generar los TXT de varios pedidos en una sola query (un (order_id, contenido) por pedido) """
+def iter_orders_txt(db: Session, order_ids: List[int]):
+    """
+    Recorre los items de todos los pedidos con un solo SELECT (items + producto),
+    ordenado por pedido, y entrega el TXT de cada pedido en cuanto se completa.
+    Mismo formato que generate_order_txt. Pedidos sin items no se incluyen.
+    """
+    if not order_ids:
+        return
+
+    rows = db.query(
+        OrderItem.order_id,
+        Product.product_id,
+        Product.unidad_medida,
+        OrderItem.quantity,
+        OrderItem.price_without_iva
+    ).join(Product, OrderItem.product_id == Product.product_id).filter(
+        OrderItem.order_id.in_(order_ids)
+    ).order_by(OrderItem.order_id, OrderItem.order_item_id).yield_per(ORDER_EXPORT_ROWS_PER_FETCH)
+
+    current_order_id = None
+    lines = []
+    for order_id, product_id, unidad_medida, quantity, price_without_iva in rows:
+        if order_id != current_order_id:
+            if lines:
+                yield current_order_id, "\r\n".join(lines) + "\r\n"
+            current_order_id, lines = order_id, []
+        lines.append(format_order_txt_line(product_id, unidad_medida, quantity, price_without_iva))
+    if lines:
+        yield current_order_id, "\r\n".join(lines) + "\r\n"
+
+""" Marcar pedidos como exportados al ERP (no hace commit) """
+def mark_orders_exported(db: Session, order_ids: List[int]) -> int:
+    if not order_ids:
+        return 0
+    return db.query(Order).filter(Order.order_id.in_(order_ids)).update(
+        {Order.exported_at: datetime.now(timezone.utc)}, synchronize_session=False
+    )
@@ -7,151 +7,195 @@ Funciones para que marketing/admin puedan editar pedidos:
 - Recalcular precios automaticamente
 
 Los precios se calculan segun la lista de precios del cliente.
+
+Flujo de edit_order_items (numero fijo de queries, sin importar cuantas lineas tenga):
+1. Pedido con bloqueo de fila (SELECT ... FOR UPDATE) y verificacion de version
+2. Productos + markup de la lista del cliente para TODAS las lineas (una query)
+3. Items actuales del pedido (una query)
+4. Diff: inserts / updates (solo lineas que cambian) / deletes, en sentencias bulk
+5. Totales del pedido en una pasada y version + 1
+
+Concurrencia optimista: el cliente envia la `version` del pedido que abrio; si
+otro usuario guardo antes, la version ya no coincide y se responde 409.
 """
 
-from typing import List
+from typing import Dict, List, Optional
 
 from decimal import Decimal
 from fastapi import HTTPException, status
+from sqlalchemy import delete, insert, update
 from sqlalchemy.orm import Session
 from utils.price_utils import calculate_final_price_with_markup, apply_iva
 
 
+from core import realtime
 from db.base import Order, OrderItem, Product, PriceListItem, CustomerInfo, OrderStatus
 from schemas.order_edit import OrderItemEdit
 
+# Campos de precio/cantidad que definen si una linea existente cambio
+_ITEM_FIELDS = ("product_id", "quantity", "base_price", "markup_percentage", "iva_percentage", "price_without_iva", "final_price")
+
+
+""" Precios de todas las lineas: {product_id: datos del producto + markup de la lista} """
+def _load_line_prices(db: Session, product_ids: List[str], price_list_id: int) -> Dict[str, dict]:
+    rows = db.query(
+        Product.product_id,
+        Product.name,
+        Product.is_active,
+        Product.base_price,
+        Product.iva_percentage,
+        PriceListItem.markup_percentage,
+        PriceListItem.final_price
+    ).outerjoin(
+        PriceListItem,
+        (PriceListItem.product_id == Product.product_id) & (PriceListItem.price_list_id == price_list_id)
+    ).filter(Product.product_id.in_(product_ids)).all()
+
+    prices = {}
+    for row in rows:
+        line = {"name": row.name, "is_active": row.is_active, "in_price_list": row.markup_percentage is not None}
+        if line["in_price_list"]:
+            base_price = Decimal(str(row.base_price or 0))
+            iva_percentage = Decimal(str(row.iva_percentage or 0))
+            # Precio con markup, SIN IVA (misma utilidad que el checkout)
+            price_without_iva = calculate_final_price_with_markup(
+                base_price=base_price,
+                markup_percentage=Decimal(str(row.markup_percentage or 0)),
+                stored_final_price=Decimal(str(row.final_price)) if row.final_price else None
+            )
+            line.update({
+                "base_price": base_price,
+                "markup_percentage": Decimal(str(row.markup_percentage or 0)),
+                "iva_percentage": iva_percentage,
+                "price_without_iva": price_without_iva,
+                # Precio con markup Y con IVA
+                "final_price": apply_iva(price_without_iva, iva_percentage),
+            })
+        prices[row.product_id] = line
+    return prices
+
+
+def _validate_line(product_id: str, line: Optional[dict]) -> None:
+    if line is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Producto '{product_id}' no encontrado"
+        )
+    if not line["is_active"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El producto '{line['name']}' no esta activo"
+        )
+    if not line["in_price_list"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El producto '{line['name']}' no esta en la lista de precios del cliente"
+        )
+
+
 """Edita los items de un pedido existente"""
-def edit_order_items(db: Session, order_id: int, items: List[OrderItemEdit], customer_id: int, shipping_cost: float = None, assignment_notes: str = None) -> Order:    
-    # Obtener el pedido
-    order = db.query(Order).filter(Order.order_id == order_id).first()
+def edit_order_items(db: Session, order_id: int, items: List[OrderItemEdit], customer_id: int, shipping_cost: float = None,
+                     assignment_notes: str = None, expected_version: Optional[int] = None) -> Order:
+    # 1. Pedido bloqueado hasta el commit: dos ediciones simultaneas se serializan.
+    # populate_existing: si la ruta ya cargo el pedido, releer la version ya bloqueada
+    order = db.query(Order).filter(Order.order_id == order_id).with_for_update().populate_existing().first()
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Pedido no encontrado"
         )
-    
+
     # Validar que el pedido NO este cancelado o entregado
     if order.status in [OrderStatus.cancelled, OrderStatus.delivered]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"No se puede editar un pedido en estado '{order.status.value}'"
         )
-    
-    # Obtener la lista de precios del cliente
-    customer_info = db.query(CustomerInfo).filter(
+
+    # Otro usuario guardo cambios despues de que se abrio el editor
+    if expected_version is not None and order.version != expected_version:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="El pedido fue modificado por otro usuario. Recarga el pedido para ver los cambios."
+        )
+
+    # Obtener la lista de precios (y grupo, para notificar) del cliente
+    customer_info = db.query(CustomerInfo.price_list_id, CustomerInfo.sales_group_id).filter(
         CustomerInfo.customer_id == customer_id
     ).first()
-    
+
     if not customer_info or not customer_info.price_list_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="El cliente no tiene una lista de precios asignada"
         )
-    
-    price_list_id = customer_info.price_list_id
-    
-    # Obtener items existentes del pedido
-    existing_items = {item.order_item_id: item for item in order.items}
-    
-    # IDs de items que se mantendran/actualizaran
-    items_to_keep = set()
-    
-    # Procesar cada item de la solicitud
+
+    # 2. Productos y precios de todas las lineas en una sola query
+    line_prices = _load_line_prices(db, list({item.product_id for item in items}), customer_info.price_list_id)
+
+    # 3. Items actuales del pedido (solo columnas, sin cargar la relacion)
+    existing_items = {
+        row.order_item_id: row for row in db.query(
+            OrderItem.order_item_id, *[getattr(OrderItem, field) for field in _ITEM_FIELDS]
+        ).filter(OrderItem.order_id == order_id).all()
+    }
+
+    # 4. Diff contra lo solicitado
+    to_insert, to_update, items_to_keep = [], [], set()
     new_total = Decimal('0.00')
     new_profit = Decimal('0.00')
-    
+
     for item_data in items:
-        # Obtener informacion del producto
-        product = db.query(Product).filter(Product.product_id == item_data.product_id).first()
-        if not product:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Producto '{item_data.product_id}' no encontrado"
-            )
-        
-        if not product.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"El producto '{product.name}' no esta activo"
-            )
-        
-        # Obtener markup de la lista de precios
-        price_item = db.query(PriceListItem).filter(
-            PriceListItem.price_list_id == price_list_id,
-            PriceListItem.product_id == item_data.product_id
-        ).first()
-        
-        if not price_item:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"El producto '{product.name}' no esta en la lista de precios del cliente"
-            )
-        
-        # Calcular precio final usando utilidad centralizada        
-        base_price = Decimal(str(product.base_price or 0))
-        markup_percentage = Decimal(str(price_item.markup_percentage or 0))
-        stored_final_price = Decimal(str(price_item.final_price)) if price_item.final_price else None
-        iva_percentage = Decimal(str(product.iva_percentage or 0))
-        
-        # Precio con markup, SIN IVA
-        price_without_iva = calculate_final_price_with_markup(
-            base_price=base_price,
-            markup_percentage=markup_percentage,
-            stored_final_price=stored_final_price
-        )
-        
-        # Precio con markup Y con IVA
-        final_price = apply_iva(price_without_iva, iva_percentage)
-        
-        # Si el item ya existe, actualizarlo
-        if item_data.order_item_id and item_data.order_item_id in existing_items:
-            existing_item = existing_items[item_data.order_item_id]
-            existing_item.quantity = item_data.quantity
-            existing_item.product_id = item_data.product_id
-            existing_item.base_price = base_price
-            existing_item.markup_percentage = markup_percentage
-            existing_item.iva_percentage = iva_percentage
-            existing_item.price_without_iva = price_without_iva
-            existing_item.final_price = final_price
-            
-            items_to_keep.add(item_data.order_item_id)
+        line = line_prices.get(item_data.product_id)
+        _validate_line(item_data.product_id, line)
+
+        values = {field: line[field] for field in _ITEM_FIELDS if field in line}
+        values["product_id"] = item_data.product_id
+        values["quantity"] = item_data.quantity
+
+        item_id = item_data.order_item_id
+        if item_id and item_id in existing_items:
+            if item_id in items_to_keep:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"El item '{item_id}' viene repetido en la solicitud"
+                )
+            items_to_keep.add(item_id)
+            current = existing_items[item_id]
+            # Solo se reescriben las lineas con algun cambio (cantidad, producto o precio)
+            if any(getattr(current, field) != values[field] for field in _ITEM_FIELDS):
+                to_update.append({"order_item_id": item_id, **values})
         else:
-            # Crear nuevo item
-            new_item = OrderItem(
-                order_id=order_id,
-                product_id=item_data.product_id,
-                quantity=item_data.quantity,
-                base_price=base_price,
-                markup_percentage=markup_percentage,
-                iva_percentage=iva_percentage,
-                price_without_iva=price_without_iva,
-                final_price=final_price
-            )
-            db.add(new_item)
-        
+            to_insert.append({"order_id": order_id, **values})
+
         # Sumar al total (con IVA) y ganancia (markup)
-        new_total += final_price * item_data.quantity
-        new_profit += (price_without_iva - base_price) * item_data.quantity
-    
-    # Eliminar items que ya no estan en la lista
-    for item_id, item in existing_items.items():
-        if item_id not in items_to_keep:
-            db.delete(item)
-    
-    # Actualizar shipping_cost si se proporciona
+        new_total += values["final_price"] * item_data.quantity
+        new_profit += (values["price_without_iva"] - values["base_price"]) * item_data.quantity
+
+    to_delete = [item_id for item_id in existing_items if item_id not in items_to_keep]
+
+    # Aplicar el diff con sentencias bulk
+    if to_delete:
+        db.execute(delete(OrderItem).where(OrderItem.order_item_id.in_(to_delete)))
+    if to_update:
+        db.execute(update(OrderItem), to_update)
+    if to_insert:
+        db.execute(insert(OrderItem), to_insert)
+
+    # 5. Totales y datos del pedido
     if shipping_cost is not None:
         order.shipping_cost = shipping_cost
-    
-    # Actualizar assignment_notes si se proporciona
+
     if assignment_notes is not None:
         order.assignment_notes = assignment_notes
-    
-    # Actualizar el total y ganancia del pedido
+
     shipping_cost_decimal = Decimal(str(order.shipping_cost or 0))
     order.total_amount = new_total + shipping_cost_decimal
     order.order_profit = new_profit
-    
+    order.version = (order.version or 0) + 1
+
+    realtime.publish(db, "order.updated", {"order_id": order.order_id, "status": order.status.value, "version": order.version},
+                     realtime.order_topics(order, customer_info.sales_group_id))
     db.commit()
-    db.refresh(order)
-    
+
     return order
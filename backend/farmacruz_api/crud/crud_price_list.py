@@ -15,15 +15,16 @@ El markup se aplica al precio base:
 precio_final = (base_price * (1 + markup/100)) * (1 + iva/100)
 """
 
-from typing import List, Optional
+from typing import Dict, List, Optional
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, func
+from sqlalchemy import Numeric, String, and_, case, column, exists, func, literal, or_, select, update, values
+from sqlalchemy.dialects.postgresql import insert
 from decimal import Decimal
 
 from db.base import PriceList, PriceListItem, Product
 from schemas.price_list import (
     PriceListCreate, PriceListUpdate,
-    PriceListItemCreate, PriceListItemUpdate
+    PriceListItemCreate, PriceListItemUpdate, PriceListRepricing
 )
 from utils.price_utils import (
     get_product_final_price, 
@@ -32,6 +33,17 @@ from utils.price_utils import (
     calculate_catalog_price
 )
 
+# Filas por sentencia en el upsert masivo de markups (2 parametros por fila)
+PRICE_LIST_UPSERT_CHUNK_SIZE = 10000
+
+# Repreciado masivo: items de muestra en dry_run y tope de markup_percentage (Numeric(5,2))
+REPRICING_SAMPLE_SIZE = 20
+MAX_MARKUP_PERCENTAGE = Decimal("999.99")
+
+# Columnas del producto que se devuelven en el detalle de la lista (modal de administracion)
+_DETAIL_PRODUCT_FIELDS = ("product_id", "codebar", "name", "description", "unidad_medida", "base_price",
+                          "iva_percentage", "image_url", "image_version", "stock_count", "is_active", "category_id")
+
 """ Obtiene una lista de precios por ID """
 def get_price_list(db: Session, price_list_id: int) -> Optional[PriceList]:
     # Obtiene una lista de precios por ID
@@ -156,13 +168,126 @@ def delete_price_list_item(db: Session, price_list_id: int, product_id: str) ->
         return True
     return False
 
-""" Actualizacion masiva de items en la lista de precios """
-def bulk_update_price_list_items(db: Session, price_list_id: int, items: List[PriceListItemCreate]) -> List[PriceListItem]:
-    result = []
-    for item in items:
-        db_item = create_price_list_item(db, price_list_id, item)
-        result.append(db_item)
-    return result
+""" Alta/actualizacion masiva de markups (un INSERT ... ON CONFLICT por lote, un solo commit) """
+def bulk_update_price_list_items(db: Session, price_list_id: int, items: List[PriceListItemCreate]) -> Dict[str, object]:
+    """
+    El final_price (sin IVA) se calcula en la misma sentencia a partir de products.base_price,
+    igual que create_price_list_item: round(base_price * (1 + markup/100), 2).
+
+    Returns:
+        {"procesados": int, "no_encontrados": [product_id, ...]}
+    """
+    # Si un producto viene repetido gana el ultimo (ON CONFLICT no admite dos filas iguales)
+    markups = {item.product_id: item.markup_percentage for item in items}
+    rows = list(markups.items())
+    applied = set()
+
+    for start in range(0, len(rows), PRICE_LIST_UPSERT_CHUNK_SIZE):
+        targets = values(
+            column('product_id', String), column('markup_percentage', Numeric(5, 2)), name='targets'
+        ).data(rows[start:start + PRICE_LIST_UPSERT_CHUNK_SIZE]).cte('targets')
+
+        source = select(
+            literal(price_list_id).label('price_list_id'),
+            Product.product_id,
+            targets.c.markup_percentage,
+            func.round(func.coalesce(Product.base_price, 0) * (1 + targets.c.markup_percentage / 100), 2),
+            func.now()
+        ).where(Product.product_id == targets.c.product_id)
+
+        stmt = insert(PriceListItem).from_select(
+            ['price_list_id', 'product_id', 'markup_percentage', 'final_price', 'updated_at'], source
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['price_list_id', 'product_id'],
+            set_={
+                'markup_percentage': stmt.excluded.markup_percentage,
+                'final_price': stmt.excluded.final_price,
+                'updated_at': stmt.excluded.updated_at,
+            }
+        ).returning(PriceListItem.product_id)
+        applied.update(db.execute(stmt).scalars().all())
+    db.commit()
+
+    return {
+        "procesados": len(applied),
+        "no_encontrados": [product_id for product_id in markups if product_id not in applied],
+    }
+
+""" Markup nuevo, final_price nuevo y filtros de una regla de repreciado (expresiones SQL) """
+def _repricing_expressions(price_list_id: int, rule: PriceListRepricing):
+    current_markup = func.coalesce(PriceListItem.markup_percentage, 0)
+    value = literal(rule.value, Numeric(10, 4))
+    if rule.operation == "set":
+        new_markup = value
+    elif rule.operation == "add":
+        new_markup = current_markup + value
+    else:
+        new_markup = current_markup * value
+    new_markup = func.round(new_markup, 2)
+    # markup_percentage es Numeric(5,2)
+    new_markup = case((new_markup < 0, 0), (new_markup > MAX_MARKUP_PERCENTAGE, MAX_MARKUP_PERCENTAGE), else_=new_markup)
+
+    # Igual que calculate_final_price_with_markup: base * (1 + markup/100) a 2 decimales
+    new_final_price = func.round(func.coalesce(Product.base_price, 0) * (1 + new_markup / 100), 2)
+    if rule.keep_erp_price:
+        # final_price (precio del ERP) no se modifica: la proteccion de margen
+        # max(calculado, ERP) se aplica al leer. Si se guardara el maximo, un recorte
+        # de markup posterior ya no podria bajar el precio. Para la muestra se
+        # reporta el precio efectivo.
+        new_final_price = case(
+            (PriceListItem.final_price > new_final_price, PriceListItem.final_price),
+            else_=new_final_price
+        )
+        changed = PriceListItem.markup_percentage != new_markup
+    else:
+        changed = or_(PriceListItem.markup_percentage != new_markup, PriceListItem.final_price != new_final_price)
+
+    conditions = [
+        PriceListItem.price_list_id == price_list_id,
+        PriceListItem.product_id == Product.product_id,
+        # Solo filas que realmente cambian
+        changed,
+    ]
+    if rule.category_id is not None:
+        conditions.append(Product.category_id == rule.category_id)
+    if rule.product_ids is not None:
+        conditions.append(Product.product_id.in_(rule.product_ids))
+    search_condition = _product_search_condition(rule.search)
+    if search_condition is not None:
+        conditions.append(search_condition)
+
+    return new_markup, new_final_price, conditions
+
+""" Repreciado masivo de una lista con un solo UPDATE ... FROM products (o simulacion con dry_run) """
+def reprice_price_list(db: Session, price_list_id: int, rule: PriceListRepricing) -> Dict[str, object]:
+    """
+    Returns:
+        {"afectados": int, "dry_run": bool, "muestra": [...]}  (muestra solo en dry_run)
+    """
+    new_markup, new_final_price, conditions = _repricing_expressions(price_list_id, rule)
+
+    if rule.dry_run:
+        affected = db.query(func.count(PriceListItem.price_list_item_id)).filter(*conditions).scalar()
+        sample = db.query(
+            Product.product_id,
+            Product.name,
+            PriceListItem.markup_percentage,
+            new_markup.label("new_markup_percentage"),
+            PriceListItem.final_price,
+            new_final_price.label("new_final_price")
+        ).filter(*conditions).order_by(Product.product_id).limit(REPRICING_SAMPLE_SIZE).all()
+        return {"afectados": affected, "dry_run": True, "muestra": [row._asdict() for row in sample]}
+
+    new_values = {"markup_percentage": new_markup, "updated_at": func.now()}
+    if not rule.keep_erp_price:
+        new_values["final_price"] = new_final_price
+    result = db.execute(
+        update(PriceListItem).where(*conditions).values(**new_values),
+        execution_options={"synchronize_session": False}
+    )
+    db.commit()
+    return {"afectados": result.rowcount, "dry_run": False, "muestra": []}
 
 """ Obtiene el markup de un producto en una lista de precios """
 def get_product_markup(db: Session, price_list_id: int, product_id: str) -> Optional[Decimal]:
@@ -171,85 +296,100 @@ def get_product_markup(db: Session, price_list_id: int, product_id: str) -> Opti
         return Decimal(str(item.markup_percentage))
     return None
 
+""" Condicion de busqueda multi-palabra (clave, nombre o codigo de barras); None si no hay busqueda """
+def _product_search_condition(search: Optional[str]):
+    search_terms = search.strip().lower().split() if search else []
+    if not search_terms:
+        return None
+    word_filters = []
+    for term in search_terms:
+        pattern = f"%{term}%"
+        word_filters.append(
+            (Product.product_id.ilike(pattern)) |
+            (Product.name.ilike(pattern)) |
+            (Product.codebar.ilike(pattern))
+        )
+    return and_(*word_filters)
+
+def _filter_product_search(query, search: Optional[str]):
+    condition = _product_search_condition(search)
+    return query.filter(condition) if condition is not None else query
+
 """ Obtiene productos que NO estan en una lista de precios """
 def get_products_not_in_price_list(db: Session, price_list_id: int, skip: int = 0, limit: int = 10, search: Optional[str] = None) -> List[Product]:
-    product_ids_in_list = db.query(PriceListItem.product_id).filter(
-        PriceListItem.price_list_id == price_list_id
-    ).scalar_subquery()
-    
-    # Query: productos que NO estan en esa subquery
+    # Anti-join con NOT EXISTS: usa el indice unico (price_list_id, product_id) por producto
+    in_list = exists().where(
+        PriceListItem.price_list_id == price_list_id,
+        PriceListItem.product_id == Product.product_id
+    )
     query = db.query(Product).filter(
-        ~Product.product_id.in_(product_ids_in_list),
+        ~in_list,
         Product.is_active == True  # Solo productos activos
     )
-    # Busqueda opcional
-    if search:
-        search_terms = search.strip().lower().split()
-        if search_terms:
-            word_filters = []
-            for term in search_terms:
-                pattern = f"%{term}%"
-                word_filters.append(
-                    (Product.product_id.ilike(pattern)) |
-                    (Product.name.ilike(pattern)) |
-                    (Product.codebar.ilike(pattern))
-                )
-            query = query.filter(and_(*word_filters))
-    return query.offset(skip).limit(limit).all()
+    query = _filter_product_search(query, search)
+    return query.order_by(Product.product_id).offset(skip).limit(limit).all()
 
 """ Obtiene productos que SI estan en una lista de precios con detalles calculados """
-def get_products_in_price_list_with_details(db: Session, price_list_id: int, skip: int = 0, limit: int = 100, search: Optional[str] = None) -> List[dict]:
-    query = db.query(PriceListItem, Product).join(
+def get_products_in_price_list_with_details(db: Session, price_list_id: int, skip: int = 0, limit: int = 100, search: Optional[str] = None,
+                                            sort_by: Optional[str] = None, sort_order: Optional[str] = "asc") -> List[dict]:
+    # Mismas reglas que utils.price_utils.calculate_catalog_price, pero calculadas en SQL
+    # para poder ordenar por precio y paginar sin traer la lista completa
+    base_price = func.coalesce(Product.base_price, 0)
+    iva_percentage = func.coalesce(Product.iva_percentage, 0)
+    markup_percentage = func.coalesce(PriceListItem.markup_percentage, 0)
+    calculated_price = func.round(base_price * (1 + markup_percentage / 100), 2)
+    # Proteccion de margen: el mayor entre el calculado y el final_price guardado
+    price_with_markup = case(
+        (PriceListItem.final_price > calculated_price, PriceListItem.final_price),
+        else_=calculated_price
+    )
+    final_price = func.round(price_with_markup * (1 + iva_percentage / 100), 2)
+
+    sort_columns = {
+        "product_id": Product.product_id,
+        "name": Product.name,
+        "base_price": base_price,
+        "markup_percentage": markup_percentage,
+        "price_with_markup": price_with_markup,
+        "final_price": final_price,
+    }
+
+    query = db.query(
+        PriceListItem.price_list_item_id,
+        *[getattr(Product, field) for field in _DETAIL_PRODUCT_FIELDS],
+        markup_percentage.label("item_markup_percentage"),
+        price_with_markup.label("price_with_markup"),
+        final_price.label("final_price_with_iva")
+    ).join(
         Product,
         PriceListItem.product_id == Product.product_id
     ).filter(
         PriceListItem.price_list_id == price_list_id,
         Product.is_active == True
     )
-    
-    # Busqueda opcional
-    if search:
-        search_terms = search.strip().lower().split()
-        if search_terms:
-            word_filters = []
-            for term in search_terms:
-                pattern = f"%{term}%"
-                word_filters.append(
-                    (Product.product_id.ilike(pattern)) |
-                    (Product.name.ilike(pattern)) |
-                    (Product.codebar.ilike(pattern))
-                )
-            query = query.filter(and_(*word_filters))
-    
-    # Ejecutar query con paginacion
-    results = query.offset(skip).limit(limit).all()
-    
-    # Formatear resultados con cálculo de precios unificado
+    query = _filter_product_search(query, search)
+
+    # Ordenamiento (product_id desempata para que la paginacion sea estable)
+    sort_column = sort_columns.get(sort_by, Product.name)
+    query = query.order_by(sort_column.desc() if sort_order == "desc" else sort_column.asc(), Product.product_id.asc())
+
     formatted_results = []
-    for price_list_item, product in results:
-        # Usar el middleware centralizado para el catálogo (CON IVA)
-        final_price_with_iva = calculate_catalog_price(product, price_list_item)
-        
-        # También calculamos el subtotal (SIN IVA) para que el admin vea el desglose
-        base_price = Decimal(str(product.base_price or 0))
-        markup_percentage = Decimal(str(price_list_item.markup_percentage or 0))
-        stored_final_price = Decimal(str(price_list_item.final_price)) if price_list_item.final_price else None
-        
-        price_without_iva = calculate_final_price_with_markup(
-            base_price=base_price,
-            markup_percentage=markup_percentage,
-            stored_final_price=stored_final_price
-        )
-        
+    for row in query.offset(skip).limit(limit).all():
+        product = {field: getattr(row, field) for field in _DETAIL_PRODUCT_FIELDS}
+        product["base_price"] = float(row.base_price or 0)
+        product["iva_percentage"] = float(row.iva_percentage or 0)
+        base = float(row.base_price or 0)
+        price_without_iva = float(row.price_with_markup)
+
         formatted_results.append({
             "product": product,
-            "base_price": round(float(base_price), 2),
-            "markup_percentage": round(float(markup_percentage), 2),
-            "markup_amount": round(float(price_without_iva - base_price), 2), # Ganancia sin IVA
-            "price_with_markup": round(float(price_without_iva), 2), # Subtotal sin IVA
-            "iva_percentage": float(product.iva_percentage or 0),
-            "final_price": round(float(final_price_with_iva), 2), # Total con IVA (Middleware)
-            "price_list_item_id": price_list_item.price_list_item_id
+            "base_price": round(base, 2),
+            "markup_percentage": round(float(row.item_markup_percentage), 2),
+            "markup_amount": round(price_without_iva - base, 2), # Ganancia sin IVA
+            "price_with_markup": round(price_without_iva, 2), # Subtotal sin IVA
+            "iva_percentage": float(row.iva_percentage or 0),
+            "final_price": round(float(row.final_price_with_iva), 2), # Total con IVA
+            "price_list_item_id": row.price_list_item_id
         })
-    
+
     return formatted_results
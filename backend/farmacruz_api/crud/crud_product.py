@@ -9,15 +9,18 @@ Funciones para manejar productos del catalogo:
 - Productos similares basados en componentes activos
 """
 
-from typing import List, Optional
+from typing import Dict, List, Optional
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_
+from sqlalchemy import String, and_, column, func, literal, or_, select, update, values
 from utils.price_utils import get_product_final_price, format_price_info, apply_iva
 
-from db.base import Product, ProductRecommendation
+from db.base import FavoriteListItem, Product, ProductRecommendation
 from schemas.product import ProductCreate, ProductUpdate
 from utils.product_similarity import extract_active_components, calculate_similarity_score
 
+# Filas por sentencia en el update masivo de versiones de imagen (2 parametros por fila)
+IMAGE_VERSION_CHUNK_SIZE = 5000
+
 
 """ Obtiene un producto por ID con su categoria """
 def get_product(db: Session, product_id: str) -> Optional[Product]:
@@ -116,8 +119,15 @@ def update_product(db: Session, product_id: str, product: ProductUpdate) -> Opti
     # Normalizar image_url: guardar NULL en vez de string vacío
     if "image_url" in update_data and not update_data["image_url"]:
         update_data["image_url"] = None
+    was_active = db_product.is_active
     for field, value in update_data.items():
         setattr(db_product, field, value)
+
+    # Al desactivarlo se quita de las listas de favoritos (en la misma transaccion)
+    if was_active and db_product.is_active is False:
+        db.query(FavoriteListItem).filter(
+            FavoriteListItem.product_id == product_id
+        ).delete(synchronize_session=False)
     
     db.commit()
     db.refresh(db_product)
@@ -152,6 +162,60 @@ def increment_image_version(db: Session, product_id: str) -> Optional[Product]:
         db.refresh(db_product)
     return db_product
 
+""" Incrementa la version de imagen de muchos productos (un UPDATE ... FROM (VALUES ...) por lote) """
+def bulk_increment_image_versions(
+    db: Session,
+    hashes: Dict[str, Optional[str]],
+    image_base_url: Optional[str] = None
+) -> Dict[str, List[str]]:
+    """
+    Args:
+        hashes: {product_id: hash del archivo original o None}. Con hash, solo se
+                incrementa si difiere del guardado; sin hash, siempre se incrementa.
+        image_base_url: Si viene, image_url = "{image_base_url}/{product_id}.webp"
+
+    Returns:
+        {"actualizados": [...], "sin_cambios": [...], "no_encontrados": [...]}
+    """
+    rows = list(hashes.items())
+    updated = set()
+    for start in range(0, len(rows), IMAGE_VERSION_CHUNK_SIZE):
+        targets = values(
+            column('product_id', String), column('image_hash', String), name='targets'
+        ).data(rows[start:start + IMAGE_VERSION_CHUNK_SIZE]).cte('targets')
+
+        new_values = {
+            'image_version': func.coalesce(Product.image_version, 0) + 1,
+            'image_hash': func.coalesce(targets.c.image_hash, Product.image_hash),
+            'updated_at': func.now(),
+        }
+        if image_base_url:
+            new_values['image_url'] = literal(f"{image_base_url.rstrip('/')}/") + Product.product_id + literal(".webp")
+
+        result = db.execute(
+            update(Product).where(
+                Product.product_id == targets.c.product_id,
+                or_(targets.c.image_hash.is_(None), Product.image_hash.is_distinct_from(targets.c.image_hash))
+            ).values(**new_values).returning(Product.product_id),
+            execution_options={"synchronize_session": False}
+        )
+        updated.update(result.scalars().all())
+    db.commit()
+
+    # Solo si faltan filas: distinguir "hash igual" de "no existe"
+    pending = [product_id for product_id in hashes if product_id not in updated]
+    existing = set()
+    for start in range(0, len(pending), IMAGE_VERSION_CHUNK_SIZE):
+        existing.update(db.execute(
+            select(Product.product_id).where(Product.product_id.in_(pending[start:start + IMAGE_VERSION_CHUNK_SIZE]))
+        ).scalars().all())
+
+    return {
+        "actualizados": [product_id for product_id in hashes if product_id in updated],
+        "sin_cambios": [product_id for product_id in pending if product_id in existing],
+        "no_encontrados": [product_id for product_id in pending if product_id not in existing],
+    }
+
 
 from utils.price_utils import get_catalog_product_info
 
@@ -20,9 +20,11 @@ Esto permite segmentacion de clientes y asignacion de equipos.
 
 from typing import List, Optional
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, or_, and_
+from sqlalchemy import func, or_, and_, select, union_all
 from fastapi import HTTPException, status
 
+from core import group_membership
+
 from db.base import (
     SalesGroup, GroupMarketingManager, GroupSeller,
     User, UserRole, Customer, CustomerInfo
@@ -82,6 +84,7 @@ def delete_sales_group(db: Session, group_id: int) -> Optional[SalesGroup]:
     db_group = get_sales_group(db, group_id)
     if db_group:
         db.delete(db_group)
+        group_membership.mark_dirty(db)  # CASCADE borra las membresias del grupo
         db.commit()
     return db_group
 
@@ -158,6 +161,7 @@ def assign_marketing_to_group(db: Session, group_id: int, marketing_id: int) ->
         marketing_id=marketing_id
     )
     db.add(assignment)
+    group_membership.mark_dirty(db)
     db.commit()
     db.refresh(assignment)
     return assignment
@@ -173,6 +177,7 @@ def remove_marketing_from_group(db: Session, group_id: int, marketing_id: int) -
     
     if assignment:
         db.delete(assignment)
+        group_membership.mark_dirty(db)
         db.commit()
         return True
     return False
@@ -252,6 +257,7 @@ def assign_seller_to_group(db: Session, group_id: int, user_id: int) -> GroupSel
         seller_id=user_id
     )
     db.add(assignment)
+    group_membership.mark_dirty(db)
     db.commit()
     db.refresh(assignment)
     return assignment
@@ -267,6 +273,7 @@ def remove_seller_from_group(db: Session, group_id: int, seller_id: int) -> bool
     
     if assignment:
         db.delete(assignment)
+        group_membership.mark_dirty(db)
         db.commit()
         return True
     return False
@@ -314,6 +321,11 @@ def get_group_sellers_paginated(db: Session, group_id: int, skip: int = 0, limit
     return query.offset(skip).limit(limit).all()
 
 ### FUNCIONES PARA CUSTOMERS ###
+""" Mantiene tickets.visible_group_id alineado con el grupo del cliente (misma transaccion) """
+def _refresh_customer_tickets(db: Session, customer_id: int) -> None:
+    from crud.crud_ticket import refresh_ticket_visibility  # crud_ticket importa este modulo
+    refresh_ticket_visibility(db, [customer_id])
+
 """ Asigna un cliente a un grupo (N:1) """
 def assign_customer_to_sales_group(db: Session, group_id: int, customer_id: int) -> CustomerInfo:
     group = get_sales_group(db, group_id)
@@ -342,6 +354,8 @@ def assign_customer_to_sales_group(db: Session, group_id: int, customer_id: int)
             rfc=" "
         )
         db.add(customer)
+        db.flush()
+        _refresh_customer_tickets(db, customer_id)
         db.commit()
         db.refresh(customer)
         return customer
@@ -361,6 +375,8 @@ def assign_customer_to_sales_group(db: Session, group_id: int, customer_id: int)
 
     # Actualizar asignacion
     customer.sales_group_id = group_id
+    db.flush()
+    _refresh_customer_tickets(db, customer_id)
     db.commit()
     db.refresh(customer)
     return customer
@@ -407,6 +423,8 @@ def remove_customer_from_sales_group(db: Session, group_id: int, customer_id: in
         return False
     
     customer_info.sales_group_id = None
+    db.flush()
+    _refresh_customer_tickets(db, customer_id)
     db.commit()
     return True
 
@@ -490,41 +508,44 @@ def get_available_customers(db: Session, group_id: int, skip: int = 0, limit: in
 # UTILIDADES
 """ Obtiene IDs de grupos donde esta asignado un usuario """
 def get_user_groups(db: Session, user_id: int) -> List[int]:
-    group_ids = []
-    
-    # Buscar en marketing managers
-    marketing_groups = db.query(GroupMarketingManager.sales_group_id).filter(
-        GroupMarketingManager.marketing_id == user_id
-    ).all()
-    group_ids.extend([g[0] for g in marketing_groups])
-    
-    # Buscar en sellers
-    seller_groups = db.query(GroupSeller.sales_group_id).filter(
-        GroupSeller.seller_id == user_id
-    ).all()
-    group_ids.extend([g[0] for g in seller_groups])
-    
-    # Eliminar duplicados y retornar
-    return list(set(group_ids))
+    # Una vez por request (memo en la sesion) y cacheado por proceso; ver core/group_membership.py
+    groups = group_membership.get(db, user_id)
+    if groups is None:
+        version = group_membership.current_version(db)
+
+        # Marketing managers + sellers en una sola query
+        memberships = union_all(
+            select(GroupMarketingManager.sales_group_id).where(GroupMarketingManager.marketing_id == user_id),
+            select(GroupSeller.sales_group_id).where(GroupSeller.seller_id == user_id),
+        )
+        groups = frozenset(db.execute(memberships).scalars().all())
+        group_membership.put(db, user_id, version, groups)
+
+    return list(groups)
 
 """ Verifica si un usuario puede gestionar pedidos de un cliente """
-def user_can_manage_order(db: Session, user_id: int, customer_id: int, user_role) -> bool:        
+def user_can_manage_order(db: Session, user_id: int, customer_id: int, user_role,
+                          customer_group_id: Optional[int] = None) -> bool:
+    """
+    customer_group_id: grupo del cliente si ya viene cargado en la query principal
+    (ej. get_order hace JOIN con customerinfo); asi no se consulta de nuevo.
+    """
     # Admin puede gestionar todo
     if user_role == UserRole.admin:
         return True
-    
-    # Obtener grupo del cliente
-    customer_info = db.query(CustomerInfo).filter(
-        CustomerInfo.customer_id == customer_id
-    ).first()
-    
-    if not customer_info or not customer_info.sales_group_id:
-        # Cliente sin grupo - solo admin puede gestionar
-        return False
-    
-    # Verificar si el usuario esta en el grupo del cliente
+
     user_groups = get_user_groups(db, user_id)
-    return customer_info.sales_group_id in user_groups
+    if not user_groups:
+        return False
+
+    # Obtener grupo del cliente
+    if customer_group_id is None:
+        customer_group_id = db.query(CustomerInfo.sales_group_id).filter(
+            CustomerInfo.customer_id == customer_id
+        ).scalar()
+
+    # Cliente sin grupo - solo admin puede gestionar
+    return customer_group_id is not None and customer_group_id in user_groups
 
 """ Verifica si un usuario pertenece a un grupo especifico """
 def user_belongs_to_group(db: Session, user_id: int, group_id: int) -> bool:    
@@ -559,6 +580,7 @@ def assign_user_groups_bulk(db: Session, user_id: int, group_ids: List[int]) ->
             new_memberships = [GroupSeller(sales_group_id=g_id, seller_id=user_id) for g_id in set(group_ids)]
             db.bulk_save_objects(new_memberships)
 
+    group_membership.mark_dirty(db)
     db.commit()
     return {
         "message": f"Grupos asignados exitosamente a {user.full_name}",
@@ -8,17 +8,22 @@ Usa UPSERT (insert si no existe, update si existe) para mantener
 sincronizados los IDs del DBF con PostgreSQL.
 """
 
-from typing import List, Dict, Tuple
+import logging
+from typing import List, Dict, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy.dialects.postgresql import insert
-from sqlalchemy import select, column
-from datetime import datetime, timezone
+from sqlalchemy import String, and_, cast, delete, exists, func, select, column, update
+from datetime import datetime, timedelta, timezone
 
-from db.base import PriceList, Product, PriceListItem, Category, Customer, CustomerInfo, User
+from db.base import PriceList, Product, PriceListItem, Category, Customer, CustomerInfo, User, SyncRun, SyncRunItem, SyncRunStatus
+from core import sync_jobs
+from core.config import settings
 from crud.crud_customer import get_password_hash
 
 from utils.sales_group_utils import bulk_ensure_seller_groups
 
+logger = logging.getLogger(__name__)
+
 # CATEGORiAS
 """ Guarda una nueva categoria si no existe (basado en nombre) """
 def guardar_o_actualizar_categoria(db: Session, name: str, description: str = None, updated_at: datetime = None) -> Tuple[bool, str]:
@@ -352,7 +357,9 @@ def bulk_upsert_customers(db: Session, customers: List[dict]) -> Tuple[int, int,
         ]
         if customers_with_agents:
             from utils.sales_group_utils import bulk_assign_customers_to_agent_groups
-            bulk_assign_customers_to_agent_groups(db, customers_with_agents)
+            asignacion = bulk_assign_customers_to_agent_groups(db, customers_with_agents)
+            logger.info(f"Grupos de clientes: {asignacion['reasignados']} reasignados de {asignacion['solicitados']} "
+                        f"({asignacion['sin_grupo']} sin vendedor valido)")
         
         return creados, actualizados, errores
         
@@ -439,53 +446,316 @@ def bulk_upsert_sellers(db: Session, sellers: List[dict]) -> Tuple[int, int, Lis
         return 0, 0, errores
 
 
-def limpiar_items_no_sincronizados(db: Session, last_sync: datetime, force: bool = False):
+# CORRIDAS DE SINCRONIZACION (sync_runs)
+# Cada upload con run_id registra las llaves que recibio; la limpieza quita lo que
+# no esta en la corrida (anti-join), sin depender de updated_at ni de relojes.
+# Las subidas se cuentan al aceptarlas y al aplicarlas: la limpieza de la corrida
+# no corre mientras alguna siga en la cola de cualquier worker. Una corrida que no
+# puede limpiarse (subida fallida o abandonada) se aborta: a mano (POST
+# /sync/runs/{run_id}/abort) o sola despues de SYNC_RUN_STALE_MINUTES.
+
+# Entidades registradas en sync_run_items
+RUN_PRODUCTOS = "products"
+RUN_CATEGORIAS = "categories"
+RUN_LISTAS = "pricelists"
+RUN_ITEMS = "pricelistitems"
+
+
+def abrir_corrida(db: Session) -> SyncRun:
+    """Abre una corrida de sincronizacion (el cliente manda su run_id en cada upload)."""
+    abortar_corridas_vencidas(db)
+    corrida = SyncRun(status=SyncRunStatus.open)
+    db.add(corrida)
+    db.commit()
+    db.refresh(corrida)
+    return corrida
+
+
+def obtener_corrida_abierta(db: Session, run_id: Optional[int]) -> Optional[SyncRun]:
+    if run_id is None:
+        return None
+    return db.query(SyncRun).filter(SyncRun.run_id == run_id, SyncRun.status == SyncRunStatus.open).first()
+
+
+def registrar_en_corrida(db: Session, run_id: int, entidad: str, llaves: List[str]) -> None:
+    """
+    Registra las llaves recibidas en la corrida (sin commit: va en la misma
+    transaccion que el lote que las escribio). Repetidas se ignoran.
+    """
+    filas = [{"run_id": run_id, "entity": entidad, "item_key": str(llave)} for llave in dict.fromkeys(llaves)]
+    if not filas:
+        return
+    # executemany: la sentencia se compila una vez y SQLAlchemy la envia en lotes
+    # multi-VALUES (insertmanyvalues), sin armar un VALUES gigante por lote
+    stmt = insert(SyncRunItem).on_conflict_do_nothing(index_elements=["run_id", "entity", "item_key"])
+    db.execute(stmt, filas)
+
+
+def aceptar_subida_en_corrida(db: Session, run_id: Optional[int]) -> Optional[int]:
+    """
+    Cuenta una subida aceptada con run_id (payload *-json o sesion de chunks) antes
+    de encolarla. Retorna el run_id si la corrida esta abierta; si no existe o ya se
+    cerro retorna None y la subida se procesa sin corrida. Sin commit.
+    """
+    if run_id is None:
+        return None
+    aceptada = db.execute(
+        update(SyncRun)
+        .where(SyncRun.run_id == run_id, SyncRun.status == SyncRunStatus.open)
+        .values(uploads_accepted=SyncRun.uploads_accepted + 1)
+    ).rowcount
+    return run_id if aceptada else None
+
+
+def terminar_subida_en_corrida(db: Session, run_id: Optional[int], aplicada: bool = True) -> None:
+    """Cuenta una subida aceptada como aplicada (o fallida). Sin commit."""
+    if run_id is None:
+        return
+    columna = SyncRun.uploads_applied if aplicada else SyncRun.uploads_failed
+    db.execute(update(SyncRun).where(SyncRun.run_id == run_id).values({columna: columna + 1}))
+
+
+def subidas_pendientes(corrida: SyncRun) -> Optional[str]:
+    """
+    Mensaje si la corrida todavia no puede limpiarse: subidas aceptadas que siguen
+    en la cola (de este u otro worker) o que fallaron. None si todas se aplicaron.
+    """
+    pendientes = corrida.uploads_accepted - corrida.uploads_applied - corrida.uploads_failed
+    if pendientes > 0:
+        return f"La corrida {corrida.run_id} tiene {pendientes} subidas sin aplicar todavia"
+    if corrida.uploads_failed:
+        return f"La corrida {corrida.run_id} tiene {corrida.uploads_failed} subidas que fallaron"
+    return None
+
+
+def llave_item_corrida(price_list_id, product_id) -> str:
+    """Llave de un item de lista en sync_run_items (debe coincidir con _LLAVES_SQL)."""
+    return f"{price_list_id}:{product_id}"
+
+
+# Misma llave calculada del lado de SQL, para el anti-join de la limpieza
+_LLAVES_SQL = {
+    RUN_PRODUCTOS: lambda: Product.product_id,
+    RUN_CATEGORIAS: lambda: cast(Category.category_id, String),
+    RUN_LISTAS: lambda: cast(PriceList.price_list_id, String),
+    RUN_ITEMS: lambda: cast(PriceListItem.price_list_id, String) + ":" + PriceListItem.product_id,
+}
+
+
+def _no_en_corrida(run_id: int, entidad: str):
+    return ~exists().where(
+        SyncRunItem.run_id == run_id,
+        SyncRunItem.entity == entidad,
+        SyncRunItem.item_key == _LLAVES_SQL[entidad]()
+    )
+
+
+def cerrar_corrida(db: Session, run_id: int) -> None:
+    """Marca la corrida como cerrada y vacia sus llaves (y las de corridas anteriores)."""
+    db.query(SyncRun).filter(SyncRun.run_id == run_id).update(
+        {SyncRun.status: SyncRunStatus.closed, SyncRun.closed_at: datetime.now(timezone.utc)},
+        synchronize_session=False
+    )
+    db.execute(delete(SyncRunItem).where(SyncRunItem.run_id <= run_id))
+    db.commit()
+
+
+def corrida_en_limpieza(db: Session) -> Optional[int]:
+    """run_id de la limpieza en cola o en curso (None si no hay o es por fecha)."""
+    job = sync_jobs.find_active_job(db, "cleanup")
+    return job.params.get("run_id") if job else None
+
+
+def abortar_corrida(db: Session, run_id: int) -> Optional[SyncRun]:
+    """
+    Abandona una corrida abierta sin limpiar nada: deja de aceptar subidas (las que
+    lleguen se procesan sin corrida) y vacia sus llaves. None si no estaba abierta.
+    No llamar con su limpieza en curso (ver corrida_en_limpieza): el anti-join
+    perderia las llaves a medio camino.
+    """
+    corrida = obtener_corrida_abierta(db, run_id)
+    if corrida is None:
+        return None
+    corrida.status = SyncRunStatus.aborted
+    corrida.closed_at = datetime.now(timezone.utc)
+    db.execute(delete(SyncRunItem).where(SyncRunItem.run_id == run_id))
+    db.commit()
+    db.refresh(corrida)
+    logger.warning(f"Corrida {run_id} abortada sin limpieza ({corrida.uploads_accepted} subidas aceptadas, "
+                   f"{corrida.uploads_applied} aplicadas, {corrida.uploads_failed} fallidas)")
+    return corrida
+
+
+def abortar_corridas_vencidas(db: Session) -> List[int]:
+    """
+    Aborta las corridas abiertas desde hace mas de SYNC_RUN_STALE_MINUTES (una subida
+    que fallo o que el cliente no termino nunca deja limpiarlas). Respeta la corrida
+    cuya limpieza esta en curso. Retorna los run_id abortados.
+    """
+    vencen = datetime.now(timezone.utc) - timedelta(minutes=settings.SYNC_RUN_STALE_MINUTES)
+    en_limpieza = corrida_en_limpieza(db)
+    vencidas = db.query(SyncRun.run_id).filter(
+        SyncRun.status == SyncRunStatus.open, SyncRun.started_at < vencen
+    ).all()
+    return [run_id for (run_id,) in vencidas if run_id != en_limpieza and abortar_corrida(db, run_id)]
+
+
+# LIMPIEZA POST-SINCRONIZACION
+
+# Buffer contra carreras con lotes que todavia se estaban procesando en segundo plano
+LIMPIEZA_BUFFER = timedelta(minutes=20)
+# Si se desactivaria mas de este porcentaje del catalogo se aborta (salvo force=True)
+LIMPIEZA_LIMITE_SEGURIDAD = 0.20
+
+
+def calcular_corte_limpieza(last_sync: datetime) -> datetime:
+    """Todo lo no actualizado antes de esta fecha se considera fuera del DBF."""
+    return last_sync - LIMPIEZA_BUFFER
+
+
+def condiciones_no_sincronizados(db: Session, corte: Optional[datetime] = None, run_id: Optional[int] = None) -> Dict[str, object]:
+    """
+    Condicion "no vino en esta sincronizacion" por entidad.
+
+    Con run_id: no esta registrado en la corrida. Las entidades de las que la
+    corrida no recibio nada (ej: no se subieron las listas) no aparecen en el
+    resultado y no se limpian.
+    Sin run_id: updated_at anterior al corte (comportamiento anterior).
+    """
+    if run_id is None:
+        return {
+            RUN_PRODUCTOS: Product.updated_at < corte,
+            RUN_CATEGORIAS: Category.updated_at < corte,
+            RUN_ITEMS: PriceListItem.updated_at < corte,
+            RUN_LISTAS: PriceList.updated_at < corte,
+        }
+    condiciones = {}
+    for entidad in (RUN_PRODUCTOS, RUN_CATEGORIAS, RUN_ITEMS, RUN_LISTAS):
+        recibio = db.query(exists().where(SyncRunItem.run_id == run_id, SyncRunItem.entity == entidad)).scalar()
+        if recibio:
+            condiciones[entidad] = _no_en_corrida(run_id, entidad)
+    return condiciones
+
+
+def verificar_seguridad_limpieza(db: Session, no_sincronizado, force: bool = False) -> Optional[str]:
+    """
+    Cuenta en una sola query cuantos productos se desactivarian
+    (no_sincronizado: condicion de condiciones_no_sincronizados para productos).
+    Retorna el mensaje de aborto si se supera el limite de seguridad, o None.
+    """
+    if no_sincronizado is None:
+        return None
+    total_products, to_deactivate = db.query(
+        func.count(Product.product_id),
+        func.count(Product.product_id).filter(and_(no_sincronizado, Product.is_active == True))
+    ).one()
+
+    if total_products > 100 and to_deactivate > (total_products * LIMPIEZA_LIMITE_SEGURIDAD) and not force:
+        return (
+            f"SAFETY ABORT: Se intentaron desactivar {to_deactivate} productos de un total de {total_products} "
+            f"({(to_deactivate/total_products)*100:.1f}%). El límite de seguridad es {LIMPIEZA_LIMITE_SEGURIDAD:.0%}. "
+            f"Esto ocurre si solo sincronizaste una parte pequeña del catálogo. "
+            f"Usa force=True en la petición para confirmar que deseas desactivar el resto."
+        )
+    return None
+
+
+def _procesar_por_lotes(db: Session, key, condiciones: list, aplicar, chunk_size: int, avance=None) -> int:
+    """
+    Recorre las filas que cumplen las condiciones en orden de llave primaria
+    (keyset: key > ultima) y aplica `aplicar(ids)` por lote, con un commit por lote.
+    Cada transaccion toca a lo mas chunk_size filas: los locks duran milisegundos.
+    """
+    total = 0
+    ultima = None
+    while True:
+        lote = select(key).where(*condiciones)
+        if ultima is not None:
+            lote = lote.where(key > ultima)
+        ids = db.execute(lote.order_by(key).limit(chunk_size)).scalars().all()
+        if not ids:
+            break
+
+        # Las condiciones se repiten en el UPDATE/DELETE: si la sync toco la fila
+        # entre el SELECT y el cambio, ya no se toca
+        total += db.execute(
+            aplicar(ids), execution_options={"synchronize_session": False}
+        ).rowcount
+        if avance:
+            avance(total)
+        db.commit()
+
+        ultima = ids[-1]
+        if len(ids) < chunk_size:
+            break
+    return total
+
+
+def limpiar_items_no_sincronizados(db: Session, last_sync: Optional[datetime] = None, force: bool = False,
+                                   chunk_size: int = 5000, job=None, run_id: Optional[int] = None):
     """
-    Desactiva o elimina productos, categorias, listas y items que no fueron 
-    actualizados desde la fecha de ultima sincronizacion.
+    Desactiva o elimina productos, categorias, listas y items que no vinieron
+    en la ultima sincronizacion.
+
+    Con run_id (corrida de sincronizacion): se limpia lo que no quedo registrado
+    en la corrida; no depende de updated_at ni de la hora del cliente.
+    Sin run_id (clientes anteriores): lo no actualizado desde last_sync.
     
     SEGURIDAD: 
-    1. Restamos 20 minutos adicionales a last_sync para evitar race conditions 
-       con hilos de procesamiento en segundo plano (async).
+    1. Sin run_id, restamos 20 minutos adicionales a last_sync para evitar race
+       conditions con hilos de procesamiento en segundo plano (async).
     2. Si el cleanup desactivaría más del 20% del catálogo, abortamos por seguridad
        a menos que se pase force=True.
+
+    Se procesa por lotes de chunk_size filas (orden de llave primaria) con un commit
+    por lote; si se pasa `job` (SyncJob) se guarda el progreso en cada lote.
+
+    Returns:
+        False si se aborto por seguridad; si no, los contadores de cada paso.
     """
-    from datetime import timedelta
-    # Aplicar buffer de seguridad de 20 minutos
-    last_sync_buffered = last_sync - timedelta(minutes=20)
-    
+    corte = calcular_corte_limpieza(last_sync) if run_id is None else None
+    no_sincronizado = condiciones_no_sincronizados(db, corte, run_id)
+
     # 1. SEGURIDAD: Contar cuántos se desactivarían
-    total_products = db.query(Product).count()
-    to_deactivate = db.query(Product).filter(
-        Product.updated_at < last_sync_buffered,
-        Product.is_active == True
-    ).count()
-    
-    if total_products > 100 and to_deactivate > (total_products * 0.20) and not force:
-        msg = (
-            f"SAFETY ABORT: Se intentaron desactivar {to_deactivate} productos de un total de {total_products} "
-            f"({(to_deactivate/total_products)*100:.1f}%). El límite de seguridad es 20%. "
-            f"Esto ocurre si solo sincronizaste una parte pequeña del catálogo. "
-            f"Usa force=True en la petición para confirmar que deseas desactivar el resto."
-        )
+    msg = verificar_seguridad_limpieza(db, no_sincronizado.get(RUN_PRODUCTOS), force)
+    if msg:
         print(msg)
         return False
-        
-    # Proceder con la desactivación/eliminación
-    # Desactivar productos no actualizados
-    db.query(Product).filter(Product.updated_at < last_sync_buffered).update({Product.is_active: False})
-    
-    # Eliminar categorias no actualizadas SOLO si no tienen productos asociados
-    subq = select(Product.category_id).distinct()
-    db.query(Category).filter(
-        Category.updated_at < last_sync_buffered,
-        ~Category.category_id.in_(subq)
-    ).delete(synchronize_session=False)
-    
-    # Eliminar relaciones producto-lista no actualizadas
-    db.query(PriceListItem).filter(PriceListItem.updated_at < last_sync_buffered).delete(synchronize_session=False)
 
-    # Desactivar listas de precios no actualizadas
-    db.query(PriceList).filter(PriceList.updated_at < last_sync_buffered).update({PriceList.is_active: False})
-    
-    return True
\ No newline at end of file
+    resultado = {}
+
+    def paso(nombre, contador, entidad, key, condiciones, aplicar):
+        resultado[contador] = 0
+        if entidad not in no_sincronizado:
+            return
+
+        def avance(total):
+            resultado[contador] = total
+            if job is not None:
+                sync_jobs.set_progress(db, job, nombre, {contador: total})
+        _procesar_por_lotes(db, key, condiciones, aplicar, chunk_size, avance)
+
+    # Desactivar productos no sincronizados
+    condiciones = [no_sincronizado.get(RUN_PRODUCTOS), Product.is_active == True]
+    paso("productos", "productos_desactivados", RUN_PRODUCTOS, Product.product_id, condiciones,
+         lambda ids: update(Product).where(Product.product_id.in_(ids), *condiciones).values(is_active=False))
+
+    # Eliminar categorias no sincronizadas SOLO si no tienen productos asociados
+    condiciones = [
+        no_sincronizado.get(RUN_CATEGORIAS),
+        ~exists().where(Product.category_id == Category.category_id)
+    ]
+    paso("categorias", "categorias_eliminadas", RUN_CATEGORIAS, Category.category_id, condiciones,
+         lambda ids: delete(Category).where(Category.category_id.in_(ids), *condiciones))
+
+    # Eliminar relaciones producto-lista no sincronizadas
+    condiciones = [no_sincronizado.get(RUN_ITEMS)]
+    paso("items", "items_eliminados", RUN_ITEMS, PriceListItem.price_list_item_id, condiciones,
+         lambda ids: delete(PriceListItem).where(PriceListItem.price_list_item_id.in_(ids), *condiciones))
+
+    # Desactivar listas de precios no sincronizadas
+    condiciones = [no_sincronizado.get(RUN_LISTAS), PriceList.is_active == True]
+    paso("listas", "listas_desactivadas", RUN_LISTAS, PriceList.price_list_id, condiciones,
+         lambda ids: update(PriceList).where(PriceList.price_list_id.in_(ids), *condiciones).values(is_active=False))
+
+    return resultado
@@ -1,10 +1,20 @@
+import base64
+from datetime import datetime
 from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, desc
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import and_, desc, func, select, tuple_, union_all, update
 from db.base import Ticket, TicketMessage, TicketStatus, CreatorType, SenderType, UserRole, CustomerInfo, GroupSeller, User as UserModel, Customer
 from schemas.ticket import TicketCreate, TicketUpdate, TicketMessageCreate
+from core import realtime
 from crud.crud_sales_group import get_user_groups
 
+CreatorUser = aliased(UserModel)
+AssigneeUser = aliased(UserModel)
+SenderUser = aliased(UserModel)
+
+# Mensajes por pagina al abrir un ticket / al pedir mensajes anteriores
+TICKET_MESSAGES_PAGE_SIZE = 50
+
 def create_ticket(db: Session, ticket: TicketCreate, creator_id: int, creator_type: CreatorType) -> Ticket:
     db_ticket = Ticket(
         title=ticket.title,
@@ -14,6 +24,11 @@ def create_ticket(db: Session, ticket: TicketCreate, creator_id: int, creator_ty
         creator_type=creator_type,
         status=TicketStatus.open
     )
+    if creator_type == CreatorType.customer:
+        # Visibilidad para Marketing: grupo actual del cliente (subquery dentro del mismo INSERT)
+        db_ticket.visible_group_id = select(CustomerInfo.sales_group_id).where(
+            CustomerInfo.customer_id == creator_id
+        ).scalar_subquery()
     db.add(db_ticket)
     db.commit()
     db.refresh(db_ticket)
@@ -46,12 +61,12 @@ def attach_names_to_tickets(db: Session, tickets: List[Ticket]) -> List[Ticket]:
 
     return tickets
 
-def attach_names_to_ticket_messages(db: Session, ticket: Ticket) -> Ticket:
-    if not ticket or not ticket.messages: return ticket
+def attach_names_to_ticket_messages(db: Session, messages: List[TicketMessage]) -> List[TicketMessage]:
+    if not messages: return messages
     
     user_ids = set()
     customer_ids = set()
-    for m in ticket.messages:
+    for m in messages:
         if m.sender_type == SenderType.user: user_ids.add(m.sender_id)
         elif m.sender_type == SenderType.customer: customer_ids.add(m.sender_id)
 
@@ -61,80 +76,196 @@ def attach_names_to_ticket_messages(db: Session, ticket: Ticket) -> Ticket:
     if customer_ids:
         customer_map = {c.customer_id: c.full_name or c.username for c in db.query(Customer.customer_id, Customer.full_name, Customer.username).filter(Customer.customer_id.in_(customer_ids)).all()}
 
-    for m in ticket.messages:
+    for m in messages:
         if m.sender_type == SenderType.user: m.sender_name = user_map.get(m.sender_id)
         elif m.sender_type == SenderType.customer: m.sender_name = customer_map.get(m.sender_id)
+        m.cursor = encode_message_cursor(m)
 
+    return messages
+
+def _display_name(full_name, username):
+    # Igual que attach_names_to_tickets: full_name o, si esta vacio, username
+    return func.coalesce(func.nullif(full_name, ''), username)
+
+""" SELECT de tickets con nombre de creador/asignado y total (count OVER) """
+def _ticket_query(db: Session):
+    return db.query(
+        Ticket,
+        func.coalesce(
+            _display_name(CreatorUser.full_name, CreatorUser.username),
+            _display_name(Customer.full_name, Customer.username)
+        ).label("creator_name"),
+        _display_name(AssigneeUser.full_name, AssigneeUser.username).label("assigned_to_name"),
+        func.count().over().label("total")
+    )
+
+def _with_ticket_names(query):
+    return query.outerjoin(
+        CreatorUser, and_(Ticket.creator_type == CreatorType.user, CreatorUser.user_id == Ticket.creator_id)
+    ).outerjoin(
+        Customer, and_(Ticket.creator_type == CreatorType.customer, Customer.customer_id == Ticket.creator_id)
+    ).outerjoin(
+        AssigneeUser, AssigneeUser.user_id == Ticket.assigned_to
+    )
+
+def _set_ticket_names(row) -> Ticket:
+    ticket, creator_name, assigned_to_name, _ = row
+    ticket.creator_name = creator_name
+    if ticket.assigned_to:
+        ticket.assigned_to_name = assigned_to_name
     return ticket
 
+""" Ticket con nombres (sin mensajes; ver get_ticket_messages) """
 def get_ticket(db: Session, ticket_id: int) -> Optional[Ticket]:
-    ticket = db.query(Ticket).filter(Ticket.ticket_id == ticket_id).first()
-    if ticket:
-        ticket = attach_names_to_tickets(db, [ticket])[0]
-        ticket = attach_names_to_ticket_messages(db, ticket)
-    return ticket
+    row = _with_ticket_names(_ticket_query(db)).filter(Ticket.ticket_id == ticket_id).first()
+    return _set_ticket_names(row) if row else None
+
+""" Pagina de tickets con nombres de creador/asignado y total en UN solo SELECT """
+def _ticket_page(db: Session, skip: int, limit: int, *criteria, visible=None) -> tuple[List[Ticket], int]:
+    """
+    criteria: filtros sobre Ticket; visible: subquery con los ticket_id visibles (UNION ALL).
+    El total sale de count(*) OVER (); solo si la pagina viene vacia se cuenta aparte.
+    """
+    query = _ticket_query(db)
+    if visible is not None:
+        query = query.join(visible, visible.c.ticket_id == Ticket.ticket_id)
+    query = _with_ticket_names(query).filter(*criteria)
+
+    rows = query.order_by(desc(Ticket.created_at), desc(Ticket.ticket_id)).offset(skip).limit(limit).all()
+
+    tickets = [_set_ticket_names(row) for row in rows]
+
+    if rows:
+        total = rows[0].total
+    elif skip == 0:
+        total = 0
+    else:
+        # Pagina fuera de rango: contar aparte
+        count_query = db.query(func.count(Ticket.ticket_id))
+        if visible is not None:
+            count_query = count_query.join(visible, visible.c.ticket_id == Ticket.ticket_id)
+        total = count_query.filter(*criteria).scalar()
+    return tickets, total
 
 def get_tickets_for_admin(db: Session, skip: int = 0, limit: int = 100, status_filter: Optional[TicketStatus] = None) -> tuple[List[Ticket], int]:
-    query = db.query(Ticket)
-    if status_filter: query = query.filter(Ticket.status == status_filter)
-    total = query.count()
-    tickets = query.order_by(desc(Ticket.created_at)).offset(skip).limit(limit).all()
-    return attach_names_to_tickets(db, tickets), total
+    criteria = [Ticket.status == status_filter] if status_filter else []
+    return _ticket_page(db, skip, limit, *criteria)
 
-def get_tickets_for_marketing(db: Session, marketing_id: int, skip: int = 0, limit: int = 100, status_filter: Optional[TicketStatus] = None) -> tuple[List[Ticket], int]:
+""" ticket_ids visibles para un usuario de Marketing (ramas disjuntas unidas con UNION ALL) """
+def _marketing_visible_ticket_ids(db: Session, marketing_id: int, status_filter: Optional[TicketStatus] = None):
     # Marketing can see:
-    # 1. Tickets they created
-    # 2. Tickets assigned to them
-    # 3. Tickets from Customers in their groups
+    # 1. Tickets assigned to them
+    # 2. Tickets they created
+    # 3. Tickets from Customers in their groups (visible_group_id precalculado)
     # 4. Tickets from Sellers in their groups
-    
+    # Cada rama excluye lo que ya cubre la rama 1 (y la 4 lo de la 2), asi no hay duplicados
+    # y cada una puede usar su propio indice en lugar de un OR sobre toda la tabla.
     group_ids = get_user_groups(db, marketing_id)
-    if not group_ids:
-        # Se solo ve a si mismo o los suyos
-        query = db.query(Ticket).filter(
-            or_(
-                and_(Ticket.creator_id == marketing_id, Ticket.creator_type == CreatorType.user),
-                Ticket.assigned_to == marketing_id
-            )
+    not_mine = Ticket.assigned_to.is_distinct_from(marketing_id)
+    status_criteria = [Ticket.status == status_filter] if status_filter else []
+
+    branches = [
+        select(Ticket.ticket_id).where(Ticket.assigned_to == marketing_id, *status_criteria),
+        select(Ticket.ticket_id).where(
+            Ticket.creator_id == marketing_id, Ticket.creator_type == CreatorType.user, not_mine, *status_criteria
+        ),
+    ]
+    if group_ids:
+        branches.append(select(Ticket.ticket_id).where(
+            Ticket.visible_group_id.in_(group_ids), Ticket.creator_type == CreatorType.customer,
+            not_mine, *status_criteria
+        ))
+        branches.append(select(Ticket.ticket_id).join(
+            GroupSeller, GroupSeller.seller_id == Ticket.creator_id
+        ).where(
+            GroupSeller.sales_group_id.in_(group_ids), Ticket.creator_type == CreatorType.user,
+            Ticket.creator_id != marketing_id, not_mine, *status_criteria
+        ).distinct())  # un seller puede estar en varios de los grupos
+
+    return union_all(*branches).subquery("visible_tickets")
+
+def get_tickets_for_marketing(db: Session, marketing_id: int, skip: int = 0, limit: int = 100, status_filter: Optional[TicketStatus] = None) -> tuple[List[Ticket], int]:
+    visible = _marketing_visible_ticket_ids(db, marketing_id, status_filter)
+    return _ticket_page(db, skip, limit, visible=visible)
+
+def get_tickets_for_user_or_customer(db: Session, entity_id: int, entity_type: CreatorType, skip: int=0, limit: int=100) -> tuple[List[Ticket], int]:
+    return _ticket_page(db, skip, limit, Ticket.creator_id == entity_id, Ticket.creator_type == entity_type)
+
+""" Recalcula tickets.visible_group_id desde el grupo actual de los clientes """
+def refresh_ticket_visibility(db: Session, customer_ids: Optional[List[int]] = None) -> int:
+    """
+    Llamar cuando cambia customerinfo.sales_group_id (asignacion manual o por sync).
+    Un solo UPDATE ... FROM que solo toca los tickets cuyo grupo cambio. NO hace commit.
+    """
+    stmt = update(Ticket).where(
+        Ticket.creator_type == CreatorType.customer,
+        Ticket.creator_id == CustomerInfo.customer_id,
+        Ticket.visible_group_id.is_distinct_from(CustomerInfo.sales_group_id)
+    ).values(visible_group_id=CustomerInfo.sales_group_id)
+    if customer_ids is not None:
+        if not customer_ids:
+            return 0
+        stmt = stmt.where(CustomerInfo.customer_id.in_(customer_ids))
+    return db.execute(stmt, execution_options={"synchronize_session": False}).rowcount
+
+""" Cursor opaco de un mensaje: (created_at, message_id) """
+def encode_message_cursor(message: TicketMessage) -> str:
+    raw = f"{message.created_at.isoformat()}|{message.message_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_message_cursor(cursor: str) -> tuple[datetime, int]:
+    """ValueError si el cursor no es valido"""
+    try:
+        created_at, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(message_id)
+    except Exception as e:
+        raise ValueError("Cursor invalido") from e
+
+""" Pagina de mensajes de un ticket por cursor (created_at, message_id) """
+def get_ticket_messages(db: Session, ticket_id: int, limit: int = TICKET_MESSAGES_PAGE_SIZE,
+                        before: Optional[str] = None, since: Optional[str] = None) -> tuple[List[TicketMessage], bool]:
+    """
+    - Sin cursores: los `limit` mensajes mas recientes.
+    - before: mensajes anteriores al cursor (scroll hacia arriba).
+    - since: mensajes posteriores al cursor (polling), del mas viejo al mas nuevo.
+    Siempre regresa la pagina en orden cronologico y si hay mas mensajes en esa direccion.
+    Los nombres de los remitentes se resuelven en el mismo SELECT, solo para la pagina.
+    Usa idx_ticket_messages_thread (ticket_id, created_at, message_id).
+    """
+    key = tuple_(TicketMessage.created_at, TicketMessage.message_id)
+    query = db.query(
+        TicketMessage,
+        func.coalesce(
+            _display_name(SenderUser.full_name, SenderUser.username),
+            _display_name(Customer.full_name, Customer.username)
+        ).label("sender_name")
+    ).outerjoin(
+        SenderUser, and_(TicketMessage.sender_type == SenderType.user, SenderUser.user_id == TicketMessage.sender_id)
+    ).outerjoin(
+        Customer, and_(TicketMessage.sender_type == SenderType.customer, Customer.customer_id == TicketMessage.sender_id)
+    ).filter(TicketMessage.ticket_id == ticket_id)
+
+    if since:
+        query = query.filter(key > tuple_(*decode_message_cursor(since))).order_by(
+            TicketMessage.created_at, TicketMessage.message_id
         )
     else:
-        # Get Customers in those groups
-        customer_ids_subquery = db.query(CustomerInfo.customer_id).filter(
-            CustomerInfo.sales_group_id.in_(group_ids)
-        ).scalar_subquery()
-        
-        # Get Sellers in those groups
-        seller_ids_subquery = db.query(GroupSeller.seller_id).filter(
-            GroupSeller.sales_group_id.in_(group_ids)
-        ).scalar_subquery()
-        
-        query = db.query(Ticket).filter(
-            or_(
-                # Own tickets or assigned
-                and_(Ticket.creator_id == marketing_id, Ticket.creator_type == CreatorType.user),
-                Ticket.assigned_to == marketing_id,
-                # Customers in groups
-                and_(Ticket.creator_id.in_(customer_ids_subquery), Ticket.creator_type == CreatorType.customer),
-                # Sellers in groups
-                and_(Ticket.creator_id.in_(seller_ids_subquery), Ticket.creator_type == CreatorType.user)
-            )
-        )
-        
-    if status_filter:
-        query = query.filter(Ticket.status == status_filter)
-        
-    total = query.count()
-    tickets = query.order_by(desc(Ticket.created_at)).offset(skip).limit(limit).all()
-    return attach_names_to_tickets(db, tickets), total
+        if before:
+            query = query.filter(key < tuple_(*decode_message_cursor(before)))
+        query = query.order_by(desc(TicketMessage.created_at), desc(TicketMessage.message_id))
 
-def get_tickets_for_user_or_customer(db: Session, entity_id: int, entity_type: CreatorType, skip: int=0, limit: int=100) -> tuple[List[Ticket], int]:
-    query = db.query(Ticket).filter(
-        Ticket.creator_id == entity_id,
-        Ticket.creator_type == entity_type
-    )
-    total = query.count()
-    tickets = query.order_by(desc(Ticket.created_at)).offset(skip).limit(limit).all()
-    return attach_names_to_tickets(db, tickets), total
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not since:
+        rows.reverse()
+
+    messages = []
+    for message, sender_name in rows:
+        message.sender_name = sender_name
+        message.cursor = encode_message_cursor(message)
+        messages.append(message)
+    return messages, has_more
 
 def update_ticket(db: Session, ticket_id: int, update_data: TicketUpdate) -> Optional[Ticket]:
     db_ticket = get_ticket(db, ticket_id)
@@ -149,6 +280,21 @@ def update_ticket(db: Session, ticket_id: int, update_data: TicketUpdate) -> Opt
     db.refresh(db_ticket)
     return db_ticket
 
+""" Temas de tiempo real de un ticket: creador, asignado, grupos que lo ven y admins """
+def ticket_topics(db: Session, ticket: Ticket) -> List[str]:
+    topics = ["admin"]
+    if ticket.creator_type == CreatorType.customer:
+        topics.append(f"customer:{ticket.creator_id}")
+        if ticket.visible_group_id:
+            topics.append(f"group:{ticket.visible_group_id}")
+    else:
+        topics.append(f"user:{ticket.creator_id}")
+        # Tickets de sellers: los ve Marketing de cualquiera de los grupos del seller (cacheado)
+        topics.extend(f"group:{group_id}" for group_id in get_user_groups(db, ticket.creator_id))
+    if ticket.assigned_to:
+        topics.append(f"user:{ticket.assigned_to}")
+    return topics
+
 def add_ticket_message(db: Session, ticket_id: int, sender_id: int, sender_type: SenderType, content: str) -> TicketMessage:
     msg = TicketMessage(
         ticket_id=ticket_id,
@@ -157,6 +303,11 @@ def add_ticket_message(db: Session, ticket_id: int, sender_id: int, sender_type:
         content=content
     )
     db.add(msg)
+    db.flush()
+    ticket = db.get(Ticket, ticket_id)
+    if ticket:
+        realtime.publish(db, "ticket.message", {"ticket_id": ticket_id, "message_id": msg.message_id},
+                         ticket_topics(db, ticket))
     db.commit()
     db.refresh(msg)
     return msg
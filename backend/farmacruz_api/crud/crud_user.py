@@ -19,10 +19,11 @@ from .crud_sales_group import get_user_groups, create_sales_group, assign_seller
 from utils.sales_group_utils import auto_crear_grupo_seller
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, func, and_
+from sqlalchemy import or_, func, and_, select, literal, union_all, update, cast, String
 from schemas.sales_group import SalesGroupCreate        
+from core import group_membership
 from core.security import get_password_hash, verify_password
-from db.base import GroupSeller, User, UserRole, SalesGroup
+from db.base import GroupSeller, User, UserRole, SalesGroup, Customer
 from schemas.user import UserCreate, UserUpdate
 
 """ Obtener un usuario interno por ID """
@@ -234,6 +235,7 @@ def delete_user(db: Session, user_id: int) -> Optional[User]:
     db_user = get_user(db, user_id)
     if db_user:
         db.delete(db_user)
+        group_membership.mark_dirty(db)  # CASCADE borra sus membresias de grupos
         db.commit()
     return db_user
 
@@ -249,6 +251,49 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[Use
     
     return user
 
+""" Resolver el principal de login (customer o user) en una sola query """
+def get_login_principal(db: Session, username: str):
+    """
+    UNION ALL sobre customers y users por username (cada rama usa su indice unico).
+    Devuelve una fila ligera: principal_type, principal_id, username, password_hash, is_active, role
+
+    Si el username existe en ambas tablas gana el customer (mismo orden que el login original),
+    asi el login verifica exactamente UN hash Argon2.
+    """
+    customers_q = select(
+        literal("customer").label("principal_type"),
+        Customer.customer_id.label("principal_id"),
+        Customer.username,
+        Customer.password_hash,
+        Customer.is_active,
+        literal(None, String).label("role"),
+        literal(0).label("priority"),
+    ).where(Customer.username == username)
+
+    users_q = select(
+        literal("user").label("principal_type"),
+        User.user_id.label("principal_id"),
+        User.username,
+        User.password_hash,
+        User.is_active,
+        cast(User.role, String).label("role"),
+        literal(1).label("priority"),
+    ).where(User.username == username)
+
+    principals = union_all(customers_q, users_q).subquery()
+    return db.execute(
+        select(principals).order_by(principals.c.priority).limit(1)
+    ).first()
+
+""" Guardar un hash re-generado (rehash-on-login) """
+def update_principal_password_hash(db: Session, principal_type: str, principal_id: int, new_hash: str) -> None:
+    if principal_type == "customer":
+        stmt = update(Customer).where(Customer.customer_id == principal_id)
+    else:
+        stmt = update(User).where(User.user_id == principal_id)
+    db.execute(stmt.values(password_hash=new_hash))
+    db.commit()
+
 """ Obtener todos los usuarios de un rol especifico """
 def get_users_by_role(db: Session, role: UserRole) -> List[User]:
     # Obtiene todos los usuarios de un rol especifico
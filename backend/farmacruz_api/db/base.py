@@ -13,7 +13,7 @@ import enum
 from datetime import datetime, timezone
 from sqlalchemy import (
     Column, Integer, BigInteger, String, Boolean, Enum as SQLAlchemyEnum, 
-    ForeignKey, Numeric, TIMESTAMP, func, Text, UniqueConstraint, CheckConstraint
+    ForeignKey, Numeric, TIMESTAMP, func, Text, UniqueConstraint, CheckConstraint, Index, JSON
 )
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 import uuid6
@@ -52,6 +52,23 @@ class SenderType(str, enum.Enum):
     customer = "customer"
     user = "user"
 
+class EmailStatus(str, enum.Enum):
+    pending = "pending"  # En cola (o esperando reintento)
+    sending = "sending"  # Reclamado por el worker mientras se envia
+    sent = "sent"
+    failed = "failed"    # Agoto los reintentos
+
+class SyncJobStatus(str, enum.Enum):
+    pending = "pending"      # En cola detras de los uploads de la sincronizacion
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+class SyncRunStatus(str, enum.Enum):
+    open = "open"        # Recibiendo datos
+    closed = "closed"    # Limpieza terminada
+    aborted = "aborted"  # Abandonada sin limpieza (subida fallida, cliente caido o vencida)
+
 class OrderStatus(str, enum.Enum):
     """
     Estados del ciclo de vida de un pedido
@@ -170,6 +187,8 @@ class SalesGroup(Base):
     group_name = Column(String(255), nullable=False)  # Ej: "Farmacias Zona Norte"
     description = Column(Text)  # Descripcion opcional del grupo
     is_active = Column(Boolean, default=True)  # Para desactivar sin eliminar
+    # Vendedor dueño del grupo automatico "Grupo {nombre}" (estable aunque el vendedor cambie de nombre)
+    owner_seller_id = Column(Integer, ForeignKey("users.user_id", ondelete="SET NULL"), nullable=True, unique=True)
     created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc))
 
     # Relaciones N:M (muchos a muchos)
@@ -266,6 +285,7 @@ class Product(Base):
     iva_percentage = Column(Numeric(5, 2), default=0.00)  # % de IVA (ej: 16.00)
     image_url = Column(String(255), default=None)  # URL de la imagen del producto (puede ser None)
     image_version = Column(Integer, default=1)  # Version de la imagen para control de cache
+    image_hash = Column(String(64), nullable=True)  # Hash del archivo original (evita subir version si no cambio)
     stock_count = Column(Integer, default=0)  # Cantidad en inventario
     is_active = Column(Boolean, default=True, index=True)  # Para ocultar productos sin eliminarlos
     category_id = Column(Integer, ForeignKey("categories.category_id"), index=True)
@@ -389,10 +409,14 @@ class Order(Base):
     created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
     assigned_at = Column(TIMESTAMP(timezone=True))  # Cuando se asigno vendedor
     validated_at = Column(TIMESTAMP(timezone=True))  # Cuando el vendedor lo aprobo
+    exported_at = Column(TIMESTAMP(timezone=True))  # Cuando se exporto el TXT al ERP (NULL = pendiente)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Se incrementa en cada edicion (concurrencia optimista)
 
     # Constraint: numero de direccion debe ser 1, 2 o 3
     __table_args__ = (
         CheckConstraint('shipping_address_number BETWEEN 1 AND 3', name='check_address_number'),
+        # Exportacion masiva: pedidos de un status aun no exportados
+        Index('idx_orders_export', 'status', 'exported_at', 'created_at'),
     )
 
     # Relaciones
@@ -498,9 +522,18 @@ class Ticket(Base):
     creator_id = Column(Integer, nullable=False, index=True)
     creator_type = Column(SQLAlchemyEnum(CreatorType), nullable=False)
     assigned_to = Column(Integer, ForeignKey("users.user_id"), nullable=True, index=True)  # Marketing o Admin
+    # Grupo de ventas por el que Marketing ve el ticket (grupo del cliente creador).
+    # Se fija al crear el ticket y se actualiza cuando el cliente cambia de grupo.
+    visible_group_id = Column(Integer, ForeignKey("salesgroups.sales_group_id", ondelete="SET NULL"), nullable=True)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), index=True)
     updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        # Bandeja de Marketing: cada rama del UNION ALL usa su indice (grupo / asignado) ya ordenado
+        Index('idx_tickets_visibility', 'visible_group_id', 'status', 'created_at'),
+        Index('idx_tickets_assigned_status', 'assigned_to', 'status', 'created_at'),
+    )
+
     assignee = relationship("User", foreign_keys=[assigned_to])
     messages = relationship("TicketMessage", back_populates="ticket", cascade="all, delete-orphan", order_by="TicketMessage.created_at")
 
@@ -513,7 +546,7 @@ class TicketMessage(Base):
     __tablename__ = "ticket_messages"
 
     message_id = Column(Integer, primary_key=True, autoincrement=True)
-    ticket_id = Column(Integer, ForeignKey("tickets.ticket_id", ondelete="CASCADE"), nullable=False, index=True)
+    ticket_id = Column(Integer, ForeignKey("tickets.ticket_id", ondelete="CASCADE"), nullable=False)
     sender_id = Column(Integer, nullable=False)
     sender_type = Column(SQLAlchemyEnum(SenderType), nullable=False)
     content = Column(Text, nullable=False)
@@ -521,6 +554,11 @@ class TicketMessage(Base):
 
     ticket = relationship("Ticket", back_populates="messages")
 
+    __table_args__ = (
+        # Paginacion/polling del hilo por cursor (created_at, message_id) sin ordenar en memoria
+        Index('idx_ticket_messages_thread', 'ticket_id', 'created_at', 'message_id'),
+    )
+
 
 class FavoriteList(Base):
     """
@@ -586,4 +624,126 @@ class FavoriteListItem(Base):
     @property
     def is_active(self):
         return self.product.is_active if self.product else False
-
\ No newline at end of file
+
+
+
+class OutboundEmail(Base):
+    """
+    Cola persistente de correos salientes.
+
+    Los endpoints solo insertan filas (enqueue_email); un unico worker
+    (utils/email_queue.py) las envia por lotes reutilizando la conexion SMTP,
+    con reintentos y backoff exponencial.
+    """
+    __tablename__ = "outbound_emails"
+
+    email_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    to_email = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    html_body = Column(Text, nullable=False)
+    reply_to = Column(String(255))
+    status = Column(SQLAlchemyEnum(EmailStatus), nullable=False, default=EmailStatus.pending)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc))
+    last_error = Column(Text)
+    created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc))
+    sent_at = Column(TIMESTAMP(timezone=True))
+
+    __table_args__ = (
+        # El worker solo busca pendientes ya vencidos
+        Index('idx_outbound_emails_pending', 'status', 'next_attempt_at'),
+    )
+
+
+class SyncJob(Base):
+    """
+    Trabajos de sincronizacion en segundo plano (ej: limpieza post-sincronizacion).
+
+    El endpoint crea la fila y responde de inmediato; el hilo de sincronizacion
+    (core/sync_jobs.py) la ejecuta y va guardando el progreso en cada lote.
+    """
+    __tablename__ = "sync_jobs"
+
+    job_id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)  # Tipo de trabajo: "cleanup"
+    status = Column(SQLAlchemyEnum(SyncJobStatus), nullable=False, default=SyncJobStatus.pending)
+    params = Column(JSON)  # Parametros con los que se lanzo (ej: last_sync, force)
+    step = Column(String(50))  # Paso en curso
+    progress = Column(JSON)  # Contadores por paso, se actualiza en cada lote
+    error = Column(Text)
+    created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc))
+    started_at = Column(TIMESTAMP(timezone=True))
+    finished_at = Column(TIMESTAMP(timezone=True))
+    # Latido: si un trabajo activo deja de actualizarse, el proceso que lo corria murio
+    updated_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        # Busqueda del trabajo activo de cada tipo
+        Index('idx_sync_jobs_kind_status', 'kind', 'status'),
+    )
+
+
+class SyncUploadChunk(Base):
+    """
+    Chunks ya aplicados de una subida por partes (/sync-upload/sessions).
+
+    La sesion de subida es un SyncJob (upload_id = job_id); si el cliente reintenta
+    un chunk que ya se aplico (se perdio el ack) se confirma sin procesarlo otra vez.
+    """
+    __tablename__ = "sync_upload_chunks"
+
+    job_id = Column(Integer, ForeignKey("sync_jobs.job_id", ondelete="CASCADE"), primary_key=True)
+    seq = Column(Integer, primary_key=True)  # Numero de chunk (0, 1, 2, ...)
+    rows = Column(Integer, nullable=False)
+    received_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+
+class SyncRun(Base):
+    """
+    Corrida de sincronizacion desde el DBF.
+
+    El cliente abre una corrida (POST /sync/runs) y manda su run_id en cada upload;
+    cada fila recibida se registra en sync_run_items. La limpieza elimina/desactiva
+    lo que NO esta en la corrida, sin depender de relojes ni de updated_at.
+    """
+    __tablename__ = "sync_runs"
+
+    run_id = Column(Integer, primary_key=True)
+    status = Column(SQLAlchemyEnum(SyncRunStatus), nullable=False, default=SyncRunStatus.open)
+    started_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc))
+    closed_at = Column(TIMESTAMP(timezone=True))
+    # Subidas con este run_id: la limpieza espera a que todas las aceptadas esten aplicadas
+    # (pueden estar en la cola de otro worker de gunicorn)
+    uploads_accepted = Column(Integer, nullable=False, default=0)
+    uploads_applied = Column(Integer, nullable=False, default=0)
+    uploads_failed = Column(Integer, nullable=False, default=0)
+
+
+class SyncRunItem(Base):
+    """
+    Filas recibidas en una corrida: (run_id, entidad, llave).
+
+    En Postgres es UNLOGGED (ver db_init.sql): se llena y se vacia en cada corrida,
+    no necesita WAL ni llave foranea a sync_runs (se revisaria en cada fila). Las
+    llaves son texto: product_id, category_id, price_list_id y
+    "price_list_id:product_id" para los items.
+    """
+    __tablename__ = "sync_run_items"
+
+    run_id = Column(Integer, primary_key=True)  # sin FK: cerrar_corrida vacia las llaves
+    entity = Column(String(20), primary_key=True)  # products, categories, pricelists, pricelistitems
+    item_key = Column(String(120), primary_key=True)
+
+
+class CacheVersion(Base):
+    """
+    Contadores de version para caches en memoria compartidos entre workers.
+
+    Quien modifica los datos subyacentes incrementa el contador en la misma
+    transaccion; cada proceso compara su cache contra este valor (ver
+    core/group_membership.py).
+    """
+    __tablename__ = "cache_versions"
+
+    name = Column(String(50), primary_key=True)  # ej: group_membership
+    version = Column(BigInteger, nullable=False, default=0)
@@ -1,14 +1,29 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from core import config
+from core import config, realtime, turnstile
 from db.session import engine 
 from routes.router import api_router
+from core.security import shutdown_hash_executor
+from utils import email_queue
 import os
 import logging
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title=config.PROJECT_NAME)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Recursos compartidos que viven lo mismo que el proceso
+    turnstile.startup()
+    email_queue.start_worker()
+    realtime.startup(engine)
+    yield
+    realtime.shutdown()
+    email_queue.stop_worker()
+    await turnstile.shutdown()
+    shutdown_hash_executor()
+
+app = FastAPI(title=config.PROJECT_NAME, lifespan=lifespan)
 
 # Configurar CORS para permitir múltiples orígenes
 allowed_origins = []
@@ -33,7 +48,7 @@ app.include_router(api_router, prefix=config.API_V1_STR)
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok"}
+    return {"status": "ok", "turnstile": "up" if turnstile.is_healthy() else "degraded"}
 
 @app.get("/")
 def read_root():
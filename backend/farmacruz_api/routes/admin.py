@@ -18,6 +18,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from typing import List, Optional
 from sqlalchemy.orm import Session
 
+from core import group_membership
 from dependencies import get_db, get_current_admin_user
 from db.base import User, UserRole
 from crud.crud_customer import get_customer_by_email, get_customer_by_username
@@ -213,6 +214,7 @@ def promote_user(
         user.role = UserRole.seller
         new_role = "seller"
 
+    group_membership.mark_dirty(db)
     db.commit()
     db.refresh(user)
 
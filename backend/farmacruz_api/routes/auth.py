@@ -13,8 +13,8 @@ Sistema de Autenticacion:
 - Expiracion configurable (default: 30 minutos)
 
 Flujo de Login:
-1. Intenta autenticar como Customer
-2. Si falla, intenta como User interno
+1. Resuelve Customer o User con una sola query (UNION ALL por username)
+2. Verifica un solo hash Argon2 en un executor dedicado (rehash si cambian parametros)
 3. Genera token con role apropiado
 """
 
@@ -22,17 +22,20 @@ from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
 import logging
-import httpx
 
 from dependencies import get_db, get_current_user, get_current_admin_user
 from core.config import ACCESS_TOKEN_EXPIRE_MINUTES, SYNC_TOKEN_EXPIRE_MINUTES, TURNSTILE_SECRET_KEY
-from core.security import create_access_token, verify_password, decode_access_token
-from core import token_blacklist
-from crud.crud_user import authenticate_user, create_user, get_user_by_username, get_user_by_email
+from core.security import create_access_token, decode_access_token, verify_and_update_password_async
+from core import token_blacklist, turnstile
+from crud.crud_user import (
+    authenticate_user, create_user, get_user_by_username, get_user_by_email,
+    get_login_principal, update_principal_password_hash
+)
 from schemas.user import User, UserCreate
 from db.base import Customer
 
@@ -78,7 +81,7 @@ def register(
 
 """ POST /login - Login (customers o users internos) """
 @router.post("/login", response_model=Token)
-def login(
+async def login(
     request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
@@ -86,73 +89,35 @@ def login(
     # Validar Turnstile CAPTCHA (si está configurado)
     if TURNSTILE_SECRET_KEY:
         captcha_token = request.headers.get("X-Turnstile-Token", "")
+        outcome = await turnstile.verify(captcha_token)
         
-        # Validar contra la API de Cloudflare con estrategia Fail-Open
-        try:
-            # Siempre intentamos contactar a Cloudflare. 
-            # Si el token falta, mandamos un valor dummy para verificar si el servicio está en línea.
-            response = httpx.post(
-                "https://challenges.cloudflare.com/turnstile/v0/siteverify",
-                data={
-                    "secret": TURNSTILE_SECRET_KEY,
-                    "response": captcha_token or "ping-healthcheck"
-                },
-                timeout=5.0 # Timeout reducido para no bloquear al usuario en caso de lentitud de red
+        # Token enviado pero Cloudflare dice que es INVÁLIDO (posible ataque o token expirado)
+        if outcome == turnstile.INVALID:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Verificación CAPTCHA fallida. Intenta de nuevo."
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                
-                # Caso 1: El usuario envió un token pero Cloudflare dice que es INVÁLIDO
-                # Bloqueamos porque es un posible ataque o token expirado.
-                if captcha_token and not result.get("success"):
-                    logger.warning(f"Turnstile rechazó el token: {result.get('error-codes')}")
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Verificación CAPTCHA fallida. Intenta de nuevo."
-                    )
-                
-                # Caso 2: NO se envió token y Cloudflare está FUNCIONANDO (respondió 200 OK)
-                # Bloqueamos porque el usuario se saltó el captcha intencionalmente.
-                elif not captcha_token:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Verificación CAPTCHA requerida"
-                    )
-                
-                # Caso 3: Todo bien (token válido) -> El flujo continúa normal.
-            else:
-                # Si Cloudflare responde un error 500 o rate limit (429), permitimos el paso por precaución operativa
-                logger.warning(f"Turnstile API falló con status {response.status_code}. Permitiendo login por fallback de seguridad.")
-                
-        except (httpx.RequestError, httpx.TimeoutException) as e:
-            # FALLBACK CRÍTICO: Si no se puede contactar a Cloudflare (caída de red, DNS, caída de CF), 
-            # permitimos el login para no detener la operación del negocio.
-            logger.warning(f"Cloudflare inalcanzable ({type(e).__name__}). Bypass de seguridad activado por resiliencia.")
-            pass
-    
-    # Autenticacion con username y password
-    authenticated_user = None
-    is_customer = False
-    
-    # Intentar como customer
-    customer = db.query(Customer).filter(
-        Customer.username == form_data.username
-    ).first()
+        # NO se envió token y Cloudflare está FUNCIONANDO: el usuario se saltó el captcha
+        if outcome == turnstile.MISSING:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Verificación CAPTCHA requerida"
+            )
+        # OK o BYPASS (Cloudflare caído / circuito abierto) -> el flujo continúa
     
-    if customer and verify_password(form_data.password, customer.password_hash):
-        authenticated_user = customer
-        is_customer = True
+    # Resolver customer/user en UNA query (UNION ALL por username)
+    principal = await run_in_threadpool(get_login_principal, db, form_data.username)
     
-    # Si no es customer, es user
-    if not authenticated_user:
-        user = authenticate_user(db, form_data.username, form_data.password)
-        if user:
-            authenticated_user = user
-            is_customer = False
+    # Verificar exactamente UN hash Argon2, en el executor dedicado (no en el threadpool de requests)
+    authenticated = False
+    new_hash = None
+    if principal:
+        authenticated, new_hash = await verify_and_update_password_async(
+            form_data.password, principal.password_hash
+        )
     
     # Validar auth
-    if not authenticated_user:
+    if not authenticated:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuario o contraseña incorrectos",
@@ -160,30 +125,36 @@ def login(
         )
     
     # Validar que este activo
-    if not authenticated_user.is_active:
+    if not principal.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Usuario inactivo. Contacta al administrador."
         )
     
+    # Rehash-on-login: si cambiaron los parametros de pwd_context se guarda el hash nuevo
+    if new_hash:
+        await run_in_threadpool(
+            update_principal_password_hash, db, principal.principal_type, principal.principal_id, new_hash
+        )
+    
     # Generar token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    if is_customer:
+    if principal.principal_type == "customer":
         # Token para Customer
         token_data = {
-            "sub": authenticated_user.username,
+            "sub": principal.username,
             "role": "customer",
             "user_type": "customer",
-            "customer_id": authenticated_user.customer_id
+            "customer_id": principal.principal_id
         }
     else:
         # Token para User interno
         token_data = {
-            "sub": authenticated_user.username,
-            "role": authenticated_user.role.value,
+            "sub": principal.username,
+            "role": principal.role,
             "user_type": "user",
-            "user_id": authenticated_user.user_id
+            "user_id": principal.principal_id
         }
     
     access_token = create_access_token(
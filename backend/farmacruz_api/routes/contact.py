@@ -5,7 +5,7 @@ Endpoint para envio de emails de contacto:
 - POST /send - Enviar mensaje de contacto
 
 Sistema de Email:
-- Usa SMTP configurado en settings
+- Se encola en outbound_emails (utils/email_queue.py) y lo envia el worker SMTP
 - Formato HTML con diseño profesional
 - Reply-To apunta al email del remitente
 - Validacion de email con EmailStr
@@ -13,12 +13,14 @@ Sistema de Email:
 No requiere autenticacion (publico).
 """
 
-from fastapi import APIRouter, HTTPException, status, BackgroundTasks, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request
 from pydantic import BaseModel, EmailStr, Field
+from sqlalchemy.orm import Session
 import logging
 
 from core.config import settings, TURNSTILE_SECRET_KEY
-from utils.email_utils import send_email_background
+from dependencies import get_db
+from utils.email_queue import enqueue_email
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -34,7 +36,7 @@ class ContactMessage(BaseModel):
 
 """ POST /send - Enviar mensaje de contacto """
 @router.post("/send")
-def send_contact_email(contact: ContactMessage, request: Request, background_tasks: BackgroundTasks):
+def send_contact_email(contact: ContactMessage, request: Request, db: Session = Depends(get_db)):
     
     # Validar Cloudflare Turnstile (si está configurado)
     if TURNSTILE_SECRET_KEY:
@@ -108,9 +110,9 @@ def send_contact_email(contact: ContactMessage, request: Request, background_tas
         
         logger.info(f"Encolando envío de email de contacto de {contact.name} ({contact.email})")
         
-        # Enviar email de forma asíncrona real con BackgroundTasks
-        background_tasks.add_task(
-            send_email_background,
+        # Encolar en outbound_emails; el worker de la cola lo envia con reintentos
+        enqueue_email(
+            db,
             to_email=settings.CONTACT_EMAIL,
             subject=f"Contacto Web: {contact.subject}",
             html_body=html_body,
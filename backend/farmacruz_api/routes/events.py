@@ -0,0 +1,100 @@
+"""
+Rutas de Notificaciones en Tiempo Real (Server-Sent Events)
+
+GET /events/stream?token=<jwt>
+
+El navegador abre un EventSource y recibe eventos cuando cambia algo que el
+usuario puede ver, en lugar de volver a consultar listas cada N segundos:
+- order.created / order.updated / order.assigned / order.cancelled  {order_id, ...}
+- ticket.message                                                   {ticket_id, message_id}
+- sync.completed                                                   {step, ...}
+- resync: se perdieron eventos (reconexion / cliente lento), recargar todo
+
+EventSource no permite headers, por eso el JWT va en el query string.
+Los temas (cliente, usuario, grupos) se calculan al conectar; cada
+REALTIME_MAX_STREAM_SECONDS se cierra el stream y el navegador reconecta,
+lo que revalida el token y actualiza los grupos.
+"""
+
+import asyncio
+import json
+import time
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from core import realtime
+from core.config import settings
+from crud.crud_sales_group import get_user_groups
+from db.base import UserRole
+from db.session import SessionLocal
+from dependencies import get_current_user
+
+router = APIRouter()
+
+
+def _topics_for(db, current_user) -> list[str]:
+    # Clientes: solo sus pedidos y tickets
+    if not hasattr(current_user, 'role'):
+        return [f"customer:{current_user.customer_id}"]
+
+    topics = [f"user:{current_user.user_id}", "staff"]
+    if current_user.role == UserRole.admin:
+        topics.append("admin")
+    elif current_user.role == UserRole.marketing:
+        # Marketing ve pedidos y tickets de los clientes/sellers de sus grupos
+        topics.extend(f"group:{group_id}" for group_id in get_user_groups(db, current_user.user_id))
+    return topics
+
+
+def _format(event_type: str, data: dict) -> str:
+    return f"event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+""" GET /stream - Stream SSE con los eventos visibles para el usuario """
+@router.get("/stream")
+async def event_stream(request: Request, token: str = Query(...)):
+    if not settings.REALTIME_ENABLED:
+        raise HTTPException(status_code=503, detail="Notificaciones en tiempo real deshabilitadas")
+
+    # La sesion se usa solo para autenticar y calcular temas; NO se mantiene abierta durante el stream
+    db = SessionLocal()
+    try:
+        current_user = await get_current_user(token=token, db=db)
+        topics = await run_in_threadpool(_topics_for, db, current_user)
+    finally:
+        db.close()
+
+    subscription = realtime.subscribe(topics)
+
+    async def stream():
+        deadline = time.monotonic() + settings.REALTIME_MAX_STREAM_SECONDS
+        try:
+            # El navegador espera 5s antes de reconectar si se corta
+            yield "retry: 5000\n\n"
+            while time.monotonic() < deadline:
+                if await request.is_disconnected():
+                    break
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=settings.REALTIME_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+
+                if subscription.overflowed:
+                    # Se descartaron eventos: vaciar la cola y pedir una recarga completa
+                    while not subscription.queue.empty():
+                        subscription.queue.get_nowait()
+                    subscription.overflowed = False
+                    yield _format("resync", {})
+                    continue
+
+                yield _format(event["type"], event["data"])
+        finally:
+            realtime.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # Nginx: no acumular el stream
+    })
@@ -5,6 +5,7 @@ Endpoints para el ciclo completo de pedidos:
 
 CARRITO (Clientes):
 - GET /cart - Ver carrito
+- GET /cart/summary - Ver carrito con totales (subtotal, IVA, total)
 - POST /cart - Agregar producto
 - PUT /cart/{id} - Actualizar cantidad
 - DELETE /cart/{id} - Eliminar item
@@ -20,6 +21,8 @@ PEDIDOS (Admin/Marketing/Seller):
 - GET /all - Ver todos los pedidos (segun permisos)
 - PUT /{id}/status - Actualizar estado
 - POST /{id}/assign - Asignar vendedor
+- GET /{id}/download-txt - Descargar TXT de un pedido para el ERP
+- POST /export-txt - Descargar ZIP con los TXT de varios pedidos (marca exportados)
 
 Sistema de Permisos:
 - Clientes: Solo sus propios pedidos
@@ -28,14 +31,19 @@ Sistema de Permisos:
 - Admin: Todos los pedidos
 """
 
+import zipfile
+from datetime import datetime, timezone
 from decimal import Decimal
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
 
 from dependencies import get_db, get_current_user, get_current_seller_user
+from db.session import SessionLocal
 from crud.crud_customer import get_customer_info
 from crud.crud_user import get_user
 from schemas.order import Order, OrderUpdate, OrderWithAddress, OrderAssign
@@ -44,12 +52,13 @@ from schemas.order_direct import DirectOrderCreate
 from schemas.cart import CartItem
 from db.base import OrderStatus, User, UserRole, Customer, CustomerInfo, PriceListItem
 
-from crud.crud_order import (assign_order_seller, calculate_order_shipping_address, get_order, get_orders_by_customer, get_orders, 
-    get_orders_for_user_groups, create_order_from_cart, create_order_direct, update_order_status, cancel_order, generate_order_txt)
+from crud.crud_order import (assign_order_seller, calculate_order_shipping_address, get_order, get_order_customer_group_id, get_orders_by_customer, get_orders, 
+    get_orders_for_user_groups, create_order_from_cart, create_order_direct, update_order_status, cancel_order, generate_order_txt,
+    get_order_ids_for_export, iter_orders_txt, mark_orders_exported, ORDER_EXPORT_MAX_ORDERS)
 
 from crud.crud_order_edit import edit_order_items
 
-from crud.crud_cart import (get_cart, add_to_cart, update_cart_item, remove_from_cart, clear_cart, import_cart_from_excel)
+from crud.crud_cart import (get_cart, get_cart_snapshot, add_to_cart, update_cart_item, remove_from_cart, clear_cart, import_cart_from_excel)
 
 from crud.crud_sales_group import get_user_groups, user_can_manage_order
 
@@ -92,6 +101,22 @@ def read_cart(current_user = Depends(get_current_user), db: Session = Depends(ge
     cart_items = get_cart(db, customer_id=customer_id)
     return cart_items
 
+""" GET /cart/summary - Carrito con totales calculados en el servidor """
+@router.get("/cart/summary")
+def read_cart_summary(current_user = Depends(get_current_user), db: Session = Depends(get_db)):
+    if isinstance(current_user, Customer):
+        customer_id = current_user.customer_id
+    else:
+        customer_id = getattr(current_user, 'user_id', None)
+    
+    if not customer_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No se pudo identificar el cliente"
+        )
+    
+    return get_cart_snapshot(db, customer_id=customer_id)
+
 """ POST /cart - Agregar producto al carrito """
 @router.post("/cart")
 def add_item_to_cart(item: CartItemAdd, current_user = Depends(get_current_user), db: Session = Depends(get_db)):    
@@ -125,9 +150,12 @@ async def import_excel_to_cart(file: UploadFile = File(...), current_user = Depe
         
     try:
         content = await file.read()
-        result = import_cart_from_excel(db, customer_id=customer_id, file_content=content)
-        # Refrescar carrito para enviarlo actualizado
-        result["cart"] = get_cart(db, customer_id=customer_id)
+        # pandas + DB son sincronos: se ejecutan en el threadpool para no bloquear el event loop
+        result = await run_in_threadpool(import_cart_from_excel, db, customer_id=customer_id, file_content=content)
+        # Refrescar carrito (items + totales) para enviarlo actualizado
+        snapshot = await run_in_threadpool(get_cart_snapshot, db, customer_id=customer_id)
+        result["cart"] = snapshot.pop("items")
+        result["cart_totals"] = snapshot
         return result
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -392,7 +420,8 @@ def read_order(order_id: int, current_user = Depends(get_current_user), db: Sess
         pass  # Permitir
     # Si es marketing/seller/admin, verificar permisos por grupo
     elif user_role and user_role in [UserRole.admin, UserRole.seller, UserRole.marketing]:
-        if not user_can_manage_order(db, current_user_id, order.customer_id, user_role):
+        if not user_can_manage_order(db, current_user_id, order.customer_id, user_role,
+                                     customer_group_id=get_order_customer_group_id(order)):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="No tiene permiso para ver este pedido"
@@ -429,7 +458,8 @@ def update_order_status_route(order_id: int, order_update: OrderUpdate,
     
     # Verificar permisos por grupo (si no es admin)
     if not is_admin:
-        if not user_can_manage_order(db, current_user.user_id, order.customer_id, current_user.role):
+        if not user_can_manage_order(db, current_user.user_id, order.customer_id, current_user.role,
+                                     customer_group_id=get_order_customer_group_id(order)):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                 detail="No tiene permiso para gestionar este pedido. El cliente no pertenece a sus grupos.")
         
@@ -547,18 +577,16 @@ def assign_order_to_seller(order_id: int, assign_data: OrderAssign,
     if seller.role != UserRole.seller:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"El usuario seleccionado no es un vendedor (rol: {seller.role.value})")
 
-    # Obtener el grupo del cliente del pedido
-    customer_info = get_customer_info(db, order.customer_id)
+    # Obtener el grupo del cliente del pedido (ya viene en el JOIN de get_order)
+    customer_group_id = get_order_customer_group_id(order)
     
-    if not customer_info or not customer_info.sales_group_id:
+    if not customer_group_id:
         # Cliente sin grupo - solo admin puede gestionar, pero no puede asignar
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="El cliente no pertenece a ningun grupo de ventas. Asigne el cliente a un grupo primero."
         )
     
-    customer_group_id = customer_info.sales_group_id
-    
     # Obtener los grupos del vendedor a asignar
     seller_groups = get_user_groups(db, seller.user_id)
     
@@ -572,7 +600,8 @@ def assign_order_to_seller(order_id: int, assign_data: OrderAssign,
     # Si es marketing, verificar permisos adicionales
     if current_user.role == UserRole.marketing:
         # Marketing solo puede asignar pedidos de clientes en sus grupos
-        if not user_can_manage_order(db, current_user.user_id, order.customer_id, current_user.role):
+        if not user_can_manage_order(db, current_user.user_id, order.customer_id, current_user.role,
+                                     customer_group_id=get_order_customer_group_id(order)):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="No tiene permiso para asignar este pedido. El cliente no pertenece a sus grupos."
@@ -616,7 +645,8 @@ def cancel_order_route(order_id: int, current_user: User = Depends(get_current_u
         pass  # Permitir, validaciones de estado mas abajo
     # Si es marketing/seller/admin, verificar permisos por grupo
     elif user_role and user_role in [UserRole.admin, UserRole.seller, UserRole.marketing]:
-        if not user_can_manage_order(db, current_user_id, order.customer_id, user_role):
+        if not user_can_manage_order(db, current_user_id, order.customer_id, user_role,
+                                     customer_group_id=get_order_customer_group_id(order)):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="No tiene permiso para cancelar este pedido. El cliente no pertenece a sus grupos."
@@ -703,7 +733,8 @@ def edit_order_route(order_id: int, edit_data: OrderEditRequest, current_user: U
     # Verificar permisos por grupo (si no es admin)
     is_admin = current_user.role == UserRole.admin
     if not is_admin:
-        if not user_can_manage_order(db, current_user.user_id, order.customer_id, current_user.role):
+        if not user_can_manage_order(db, current_user.user_id, order.customer_id, current_user.role,
+                                     customer_group_id=get_order_customer_group_id(order)):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="No tiene permiso para editar este pedido. El cliente no pertenece a sus grupos."
@@ -717,9 +748,11 @@ def edit_order_route(order_id: int, edit_data: OrderEditRequest, current_user: U
             items=edit_data.items, 
             customer_id=order.customer_id,
             shipping_cost=edit_data.shipping_cost,
-            assignment_notes=edit_data.assignment_notes
+            assignment_notes=edit_data.assignment_notes,
+            expected_version=edit_data.version
         )
-        return edited_order
+        # Respuesta con items, cliente y vendedor en una sola query
+        return get_order(db, order_id=edited_order.order_id)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -749,7 +782,8 @@ def download_order_txt(
     # Verificar permisos por grupo (si no es admin)
     is_admin = current_user.role == UserRole.admin
     if not is_admin:
-        if not user_can_manage_order(db, current_user.user_id, order.customer_id, current_user.role):
+        if not user_can_manage_order(db, current_user.user_id, order.customer_id, current_user.role,
+                                     customer_group_id=get_order_customer_group_id(order)):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="No tiene permiso para descargar este pedido. El cliente no pertenece a sus grupos."
@@ -777,3 +811,90 @@ def download_order_txt(
         }
     )
 
+
+class _ZipStream:
+    """Destino sin seek para zipfile: acumula lo escrito y se vacia en cada chunk del stream."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+""" POST /export-txt - Exportar los TXT de varios pedidos en un ZIP (para el ERP) """
+@router.post("/export-txt")
+def export_orders_txt(
+    order_status: str = Query("approved", alias="status", description="Status de los pedidos a exportar"),
+    date_from: Optional[datetime] = Query(None, description="Creados desde (inclusive)"),
+    date_to: Optional[datetime] = Query(None, description="Creados antes de (exclusivo)"),
+    seller_id: Optional[int] = Query(None, description="Solo pedidos de este vendedor"),
+    only_new: bool = Query(True, description="Solo pedidos aun no exportados"),
+    mark_exported: bool = Query(True, description="Marcar los pedidos como exportados al terminar"),
+    limit: int = Query(ORDER_EXPORT_MAX_ORDERS, ge=1, le=ORDER_EXPORT_MAX_ORDERS),
+    current_user: User = Depends(get_current_seller_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Un archivo pedido_{id}.txt por pedido (mismo formato que /{id}/download-txt).
+    Los TXT se generan con una sola query y el ZIP se envia mientras se arma.
+    Con mark_exported, exported_at se guarda solo si el ZIP se genero completo;
+    con only_new (default) las siguientes corridas traen solo pedidos nuevos.
+    Solo admin y marketing: exported_at es global y lo usa la siguiente exportacion al ERP.
+    """
+    if current_user.role not in [UserRole.admin, UserRole.marketing]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo administradores y marketing pueden exportar pedidos"
+        )
+
+    try:
+        status_value = OrderStatus(order_status)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Status inválido: {order_status}"
+        )
+
+    order_ids = get_order_ids_for_export(db, current_user, status=status_value, date_from=date_from,
+        date_to=date_to, seller_id=seller_id, only_new=only_new, limit=limit)
+    if not order_ids:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No hay pedidos para exportar con esos filtros"
+        )
+
+    def stream():
+        # Sesion propia: la de Depends(get_db) se cierra antes de enviar la respuesta
+        export_db = SessionLocal()
+        try:
+            buffer = _ZipStream()
+            exported = []
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+                for order_id, content in iter_orders_txt(export_db, order_ids):
+                    zf.writestr(f"pedido_{order_id}.txt", content.encode())
+                    exported.append(order_id)
+                    yield buffer.pop()
+            yield buffer.pop()
+
+            # Solo se llega aqui si el ZIP se envio completo (si el cliente corta, el generador se cierra antes)
+            if mark_exported and exported:
+                mark_orders_exported(export_db, exported)
+                export_db.commit()
+        finally:
+            export_db.close()
+
+    filename = f"pedidos_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.zip"
+    return StreamingResponse(stream(), media_type="application/zip", headers={
+        "Content-Disposition": f"attachment; filename={filename}",
+        "X-Export-Count": str(len(order_ids)),
+    })
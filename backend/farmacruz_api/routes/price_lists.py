@@ -14,6 +14,7 @@ ITEMS (Markups por producto):
 - GET /{id}/items - Ver todos los items
 - POST /{id}/items - Agregar/actualizar item
 - POST /{id}/items/bulk - Agregar/actualizar multiples items
+- POST /{id}/reprice - Repreciado masivo por regla (con dry_run)
 - PUT /{id}/items/{product_id} - Actualizar markup especifico
 - DELETE /{id}/items/{product_id} - Eliminar item
 
@@ -39,7 +40,8 @@ from db.base import User
 from schemas.price_list import (
     PriceList, PriceListCreate, PriceListUpdate, PriceListWithItems,
     PriceListItem, PriceListItemCreate, PriceListItemUpdate,
-    PriceListItemsBulkUpdate
+    PriceListItemsBulkUpdate, PriceListItemsBulkResult,
+    PriceListRepricing, PriceListRepricingResult
 )
 from schemas.product import Product as ProductSchema
 from crud import crud_price_list
@@ -173,7 +175,7 @@ def create_price_list_item(
     return crud_price_list.create_price_list_item(db, price_list_id, item)
 
 """ POST /{id}/items/bulk - Crear o actualizar multiples items en la lista de precios """
-@router.post("/{price_list_id}/items/bulk", response_model=List[PriceListItem])
+@router.post("/{price_list_id}/items/bulk", response_model=PriceListItemsBulkResult)
 def bulk_update_price_list_items(
     price_list_id: int,
     bulk_update: PriceListItemsBulkUpdate,
@@ -181,6 +183,7 @@ def bulk_update_price_list_items(
     current_user: User = Depends(get_current_admin_user)
 ):
     # Crear o actualizar multiples items en la lista de precios (solo admin)
+    # Un solo INSERT ... ON CONFLICT por lote y un solo commit para todos los items
     
     # Verify price list exists
     price_list = crud_price_list.get_price_list(db, price_list_id)
@@ -192,6 +195,25 @@ def bulk_update_price_list_items(
     
     return crud_price_list.bulk_update_price_list_items(db, price_list_id, bulk_update.items)
 
+""" POST /{id}/reprice - Repreciado masivo de la lista (set/add/multiply markup) """
+@router.post("/{price_list_id}/reprice", response_model=PriceListRepricingResult)
+def reprice_price_list(
+    price_list_id: int,
+    rule: PriceListRepricing,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    # Aplica la regla a todos los items que cumplan los filtros con un solo UPDATE (solo admin)
+    # Con dry_run=true solo devuelve cuantos items cambian y una muestra
+    price_list = crud_price_list.get_price_list(db, price_list_id)
+    if not price_list:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Lista de precios no encontrada"
+        )
+    
+    return crud_price_list.reprice_price_list(db, price_list_id, rule)
+
 """ PUT /{id}/items/{product_id} - Actualizar un item especifico en la lista de precios """
 @router.put("/{price_list_id}/items/{product_id}", response_model=PriceListItem)
 def update_price_list_item(
@@ -269,10 +291,13 @@ def get_items_with_details(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
     search: Optional[str] = Query(None),
+    sort_by: Optional[str] = Query(None, description="Ordenar por: name, product_id, base_price, markup_percentage, price_with_markup, final_price"),
+    sort_order: Optional[str] = Query("asc", description="Orden: asc o desc"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_admin_user)
 ):
     # Obtener items de la lista de precios con info completa del producto
+    # Los precios se calculan y ordenan en SQL
     # Verificar que la lista de precios exista
     price_list = crud_price_list.get_price_list(db, price_list_id)
     if not price_list:
@@ -286,5 +311,7 @@ def get_items_with_details(
         price_list_id=price_list_id,
         skip=skip,
         limit=limit,
-        search=search
+        search=search,
+        sort_by=sort_by,
+        sort_order=sort_order
     )
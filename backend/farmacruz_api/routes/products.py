@@ -10,6 +10,8 @@ Endpoints CRUD para gestion de productos del catalogo:
 - PUT /{id} - Actualizar producto
 - DELETE /{id} - Eliminar producto (soft delete)
 - PATCH /{id}/stock - Ajustar inventario
+- PATCH /{id}/image-version - Incrementar version de imagen
+- PATCH /image-versions - Incrementar version de imagen de muchos productos
 
 Permisos:
 - GET: Todos los usuarios
@@ -26,7 +28,7 @@ from pydantic import BaseModel
 
 from dependencies import get_db, get_current_admin_user, get_current_user
 from db.base import User
-from schemas.product import ProductCreate, ProductUpdate, Product
+from schemas.product import ProductCreate, ProductUpdate, Product, ImageVersionBulkUpdate, ImageVersionBulkResult
 from crud.crud_product import (
     get_products, 
     get_product, 
@@ -36,7 +38,8 @@ from crud.crud_product import (
     delete_product,
     update_stock,
     get_similar_products,
-    increment_image_version
+    increment_image_version,
+    bulk_increment_image_versions
 )
 
 router = APIRouter()
@@ -257,7 +260,6 @@ def increment_image_version_route(
     current_user = Depends(get_current_admin_user)
 ):
     # Incrementa la version de la imagen para forzar refresco de cache
-    from crud.crud_product import increment_image_version
     db_product = increment_image_version(db, product_id=product_id)
     if not db_product:
         raise HTTPException(
@@ -267,6 +269,24 @@ def increment_image_version_route(
     return db_product
 
 
+""" PATCH /image-versions - Incrementar la version de imagen de muchos productos """
+@router.patch("/image-versions", response_model=ImageVersionBulkResult)
+def bulk_increment_image_versions_route(
+    payload: ImageVersionBulkUpdate,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_admin_user)
+):
+    # Usado por el compresor de imagenes: una peticion por corrida en lugar de una por producto
+    hashes = {product_id: None for product_id in payload.product_ids}
+    hashes.update(payload.hashes)
+    if not hashes:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Se requiere product_ids o hashes"
+        )
+    return bulk_increment_image_versions(db, hashes, image_base_url=payload.image_base_url)
+
+
 """ GET /{product_id}/similar - Obtiene productos similares basados en componentes activos """
 @router.get("/{product_id}/similar")
 def read_similar_products(
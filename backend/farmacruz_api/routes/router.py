@@ -19,6 +19,7 @@ Estructura de la API:
   ├── /sales-groups   - Grupos de ventas
   └── /price-lists    - Listas de precios
   └── /sync           - Sincronizacion DBF
+  └── /events         - Notificaciones en tiempo real (SSE)
 
 Tags en Swagger:
 - Los tags organizan los endpoints en la documentacion API
@@ -42,7 +43,8 @@ from . import (
     sync_dbf,
     sync_dbf_upload,
     tickets,
-    favorites
+    favorites,
+    events
 )
 
 # Router principal que agrupa todos los modulos
@@ -155,3 +157,10 @@ api_router.include_router(
     prefix="/favorites",
     tags=["Favoritos"]
 )
+
+# === NOTIFICACIONES EN TIEMPO REAL ===
+api_router.include_router(
+    events.router,
+    prefix="/events",
+    tags=["Notificaciones"]
+)
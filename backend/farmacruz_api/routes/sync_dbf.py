@@ -24,20 +24,23 @@ Solo administradores pueden usar estos endpoints.
 """
 
 from datetime import datetime, timezone
-from typing import List
+from typing import Dict, List, Optional
 import logging
 from schemas.category import CategorySync
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 
+from core import realtime, sync_jobs
+from core.config import settings
 from dependencies import get_db, get_current_admin_user
-from db.base import User
+from db.base import SyncJobStatus, SyncRunStatus, User
 from schemas.price_list import PriceListCreate, PriceListItemCreate, PriceListItemCreateBulk, PriceListItemSync
 from schemas.product import ProductCreate2
 from schemas.customer import CustomerSync  
 from schemas.user import SellerSync  
 from crud import crud_sync
+from crud.crud_favorite import purge_inactive_favorite_items, purge_inactive_favorite_items_job
 
 
 # Crear router con prefijo /sync
@@ -47,9 +50,37 @@ logger = logging.getLogger(__name__)
 
 # SCHEMAS DE RESPUESTA
 class CleanupSchema(BaseModel):
-    last_sync: datetime
+    last_sync: Optional[datetime] = None  # Clientes anteriores: limpieza por updated_at
+    run_id: Optional[int] = None  # Corrida (POST /sync/runs): limpieza por lo recibido
     force: bool = False
 
+    @model_validator(mode="after")
+    def requiere_corrida_o_fecha(self):
+        if self.run_id is None and self.last_sync is None:
+            raise ValueError("Se requiere run_id o last_sync")
+        return self
+
+class CorridaSincronizacion(BaseModel):
+    run_id: int
+    status: SyncRunStatus  # open, closed, aborted
+    started_at: datetime
+    closed_at: Optional[datetime] = None
+
+    model_config = {"from_attributes": True}
+
+class TrabajoSincronizacion(BaseModel):
+    job_id: int
+    kind: str  # Tipo de trabajo (ej: "cleanup")
+    status: SyncJobStatus  # pending, running, completed, failed
+    step: Optional[str] = None  # Paso en curso
+    progress: Dict[str, int] = {}  # Contadores por paso (filas procesadas)
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    model_config = {"from_attributes": True}
+
 class ResultadoSincronizacion(BaseModel):
     total_recibidos: int  # Total de registros enviados
     creados: int  # Registros nuevos que se crearon
@@ -145,7 +176,8 @@ def sincronizar_categorias(categorias: List[CategorySync], usuario_actual: User
 
 """ POST /products - Sincronizar productos """
 @router.post("/products", response_model=ResultadoSincronizacion)
-def sincronizar_productos(productos: List[ProductCreate2], usuario_actual: User = Depends(get_current_admin_user), db: Session = Depends(get_db)):
+def sincronizar_productos(productos: List[ProductCreate2], background_tasks: BackgroundTasks,
+                          usuario_actual: User = Depends(get_current_admin_user), db: Session = Depends(get_db)):
     # Convertir productos de Pydantic a dict para bulk upsert
     productos_dict = [
         {
@@ -187,6 +219,11 @@ def sincronizar_productos(productos: List[ProductCreate2], usuario_actual: User
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"No se pudieron guardar los cambios: {str(error_commit)}"
         )
+
+    # Productos que llegaron inactivos: quitarlos de favoritos despues de responder
+    inactivos = [p["product_id"] for p in productos_dict if not p["is_active"]]
+    if inactivos:
+        background_tasks.add_task(purge_inactive_favorite_items_job, inactivos)
     
     return resultado
 
@@ -323,31 +360,130 @@ def sincronizar_vendedores(vendedores: List[SellerSync], usuario_actual: User =
     return resultado
 
 
+""" Trabajo de limpieza (corre en el hilo de sincronizacion, ver core/sync_jobs.py) """
+def _cleanup_job(db: Session, job) -> dict:
+    run_id = job.params.get("run_id")
+    last_sync = datetime.fromisoformat(job.params["last_sync"]) if job.params.get("last_sync") else None
+    if run_id is not None:
+        # Se vuelve a revisar: el trabajo pudo esperar en la cola detras de otras subidas
+        corrida = crud_sync.obtener_corrida_abierta(db, run_id)
+        pendientes = crud_sync.subidas_pendientes(corrida) if corrida else f"La corrida {run_id} ya no esta abierta"
+        if pendientes:
+            raise ValueError(pendientes)
+    # La seguridad ya se valido al crear el trabajo; force evita abortar a medias si
+    # mientras tanto cambio el conteo
+    resultado = crud_sync.limpiar_items_no_sincronizados(
+        db=db, last_sync=last_sync, force=True, chunk_size=settings.SYNC_CLEANUP_CHUNK_SIZE, job=job,
+        run_id=run_id
+    )
+    if run_id is not None:
+        crud_sync.cerrar_corrida(db, run_id)
+    # Quitar de favoritos los productos recien desactivados (por lotes)
+    sync_jobs.set_progress(db, job, "favoritos", {})
+    resultado["favoritos_eliminados"] = purge_inactive_favorite_items(db)
+
+    # Ultimo paso de la sincronizacion: avisar a los dashboards (se envia con el commit)
+    realtime.publish(db, "sync.completed", {"step": "cleanup", "last_sync": job.params.get("last_sync"),
+                                            "run_id": run_id, "job_id": job.job_id}, ["staff"])
+    db.commit()
+    return resultado
+
+
+""" POST /runs - Abrir una corrida de sincronizacion """
+@router.post("/runs", response_model=CorridaSincronizacion, status_code=status.HTTP_201_CREATED)
+def abrir_corrida_sincronizacion(
+    usuario_actual: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """El cliente manda el run_id en cada upload de /sync-upload y al final en /sync/cleanup:
+    la limpieza quita exactamente lo que no se recibio en la corrida."""
+    return crud_sync.abrir_corrida(db)
+
+
+""" POST /runs/{run_id}/abort - Abandonar una corrida sin limpieza """
+@router.post("/runs/{run_id}/abort", response_model=CorridaSincronizacion)
+def abortar_corrida_sincronizacion(
+    run_id: int,
+    usuario_actual: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Para una corrida que no puede limpiarse (una subida fallo o no se termino): no se
+    desactiva nada y la siguiente corrida arranca limpia. Las corridas abiertas por mas
+    de SYNC_RUN_STALE_MINUTES se abortan solas al abrir una nueva."""
+    if crud_sync.corrida_en_limpieza(db) == run_id:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="La limpieza de la corrida ya esta en curso"
+        )
+    corrida = crud_sync.abortar_corrida(db, run_id)
+    if corrida is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Corrida de sincronizacion no encontrada o ya cerrada"
+        )
+    return corrida
+
+
 """ POST /cleanup - Limpiar productos, categorias, listas y items no sincronizados """
-@router.post("/cleanup", response_model=CleanupSchema)
+@router.post("/cleanup", response_model=TrabajoSincronizacion, status_code=status.HTTP_202_ACCEPTED)
 def limpieza_post_sincronizacion(
     last_sync: CleanupSchema,
     usuario_actual: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """Desactiva o elimina productos, categorias, listas y items que no fueron sincronizados.
-    NO toca usuarios (customers ni sellers)."""
+    NO toca usuarios (customers ni sellers).
+
+    Valida el limite de seguridad y responde de inmediato con el trabajo (202);
+    la limpieza corre por lotes en segundo plano. Progreso: GET /sync/jobs/{job_id}."""
     logger.debug(f"CLEANUP: Received last_sync={last_sync}")
-    try:
-        exitoso = crud_sync.limpiar_items_no_sincronizados(db=db, last_sync=last_sync.last_sync, force=last_sync.force)
-        if not exitoso:
-             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Operación cancelada por seguridad: se desactivarían demasiados productos. Use force=true para confirmar."
+    if last_sync.run_id is not None:
+        corrida = crud_sync.obtener_corrida_abierta(db, last_sync.run_id)
+        if corrida is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Corrida de sincronizacion no encontrada o ya cerrada"
             )
-        db.commit()
-    except HTTPException:
-        raise
-    except Exception as error:
-        db.rollback()
+        # Las subidas aceptadas pueden seguir en la cola de otro worker: limpiar antes
+        # borraria lo que todavia no registran. El cliente reintenta despues.
+        pendientes = crud_sync.subidas_pendientes(corrida)
+        if pendientes:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=pendientes)
+        corte = None
+    else:
+        corte = crud_sync.calcular_corte_limpieza(last_sync.last_sync)
+    no_sincronizado = crud_sync.condiciones_no_sincronizados(db, corte, last_sync.run_id)
+    msg = crud_sync.verificar_seguridad_limpieza(db, no_sincronizado.get(crud_sync.RUN_PRODUCTOS), last_sync.force)
+    if msg:
+        logger.warning(msg)
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error al limpiar items no sincronizados: {str(error)}"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Operación cancelada por seguridad: se desactivarían demasiados productos. Use force=true para confirmar."
         )
-    
-    return last_sync
+
+    # Una sola limpieza a la vez: si ya hay una en cola o en curso se devuelve esa
+    job = sync_jobs.find_active_job(db, "cleanup")
+    if job is None:
+        job = sync_jobs.create_job(db, "cleanup", {
+            "last_sync": last_sync.last_sync.isoformat() if last_sync.last_sync else None,
+            "run_id": last_sync.run_id,
+            "force": last_sync.force
+        })
+        sync_jobs.submit(job.job_id, _cleanup_job)
+    return job
+
+
+""" GET /jobs/{job_id} - Estado y progreso de un trabajo de sincronizacion """
+@router.get("/jobs/{job_id}", response_model=TrabajoSincronizacion)
+def obtener_trabajo(
+    job_id: int,
+    usuario_actual: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    job = sync_jobs.get_job(db, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Trabajo no encontrado"
+        )
+    return job
@@ -1,27 +1,40 @@
 """
 API routes for production-optimized DBF sync.
 
-Utiliza ThreadPoolExecutor para procesamiento independiente de workers.
+Utiliza el hilo de sincronizacion de core/sync_jobs.py (ThreadPoolExecutor).
 Los workers de Uvicorn responden inmediatamente y quedan libres.
-Los syncs se procesan en threads dedicados del pool.
+Los syncs se procesan en orden en ese hilo dedicado.
+
+Subidas por chunks (productos, listas e items), para conexiones inestables:
+1. POST /sessions {"entidad": "productos", "run_id": 12}     -> upload_id
+2. PUT  /sessions/{upload_id}/chunks/{seq}  (NDJSON o columnar, gzip) -> ack cuando el chunk ya se aplico
+3. POST /sessions/{upload_id}/complete {"total_chunks": n}   -> 409 con los faltantes si hay huecos
+Si un chunk falla solo se reenvia ese chunk; la memoria queda acotada al tamano del chunk.
 """
 
+import asyncio
 import gzip
 import json
 import logging
 import time
 import traceback
-from concurrent.futures import ThreadPoolExecutor
-from typing import List, Dict, Any
+import zlib
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Literal, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
+from core.config import settings
 from dependencies import get_db, get_current_admin_user
-from db.base import User
+from db.base import SyncJobStatus, SyncUploadChunk, User
 from db.session import SessionLocal
-from crud import crud_dbf_upload
+from core import realtime, sync_jobs
+from crud import crud_dbf_upload, crud_sync
+from utils.columnar import MEDIA_TYPE_COLUMNAR, decodificar_columnar
 
 # Configurar logger
 logger = logging.getLogger(__name__)
@@ -29,14 +42,9 @@ logger = logging.getLogger(__name__)
 # ==========================================
 # THREAD POOL DEDICADO (independiente de workers Uvicorn)
 # ==========================================
-# Este pool ejecuta syncs en threads separados
-# max_workers=2: Máximo 2 syncs simultáneos, el resto espera en cola
-executor = ThreadPoolExecutor(
-    max_workers=1,
-    thread_name_prefix="sync_thread_"
-)
-
-logger.info(f"ThreadPoolExecutor iniciado con max_workers=2")
+# Compartido con los trabajos de sincronizacion (core/sync_jobs.py): un solo hilo,
+# los syncs se procesan en orden y la limpieza final espera a que terminen
+executor = sync_jobs.executor
 
 
 # Response schema
@@ -72,7 +80,50 @@ async def decompress_request(request: Request) -> Dict[str, Any]:
         raise HTTPException(status_code=400, detail=f"Decompression/JSON error: {str(e)}")
 
 
-def _process_productos_thread(categorias: list, productos: list):
+def _notify_sync_step(db: Session, step: str, resultado: dict) -> None:
+    """Avisa a los dashboards internos (SSE) que termino un paso de la sincronizacion"""
+    realtime.publish(db, "sync.completed", {
+        "step": step,
+        "creados": resultado.get("creados", 0),
+        "actualizados": resultado.get("actualizados", 0),
+        "errores": resultado.get("errores", 0),
+    }, ["staff"])
+    db.commit()
+
+
+def _corrida_abierta(db: Session, run_id: Optional[int]) -> Optional[int]:
+    """
+    run_id de la corrida si sigue abierta. Si no existe o ya se cerro, el lote se
+    procesa como antes (por updated_at) para no perderlo.
+    """
+    if run_id is None:
+        return None
+    if crud_sync.obtener_corrida_abierta(db, run_id) is None:
+        logger.warning(f"[THREAD-SYNC] Corrida {run_id} no existe o ya se cerro; se procesa sin corrida")
+        return None
+    return run_id
+
+
+def _aceptar_subida(db: Session, run_id: Optional[int]) -> Optional[int]:
+    """Cuenta la subida en su corrida antes de encolarla (ver crud_sync.subidas_pendientes)."""
+    run_id = crud_sync.aceptar_subida_en_corrida(db, run_id)
+    db.commit()
+    return run_id
+
+
+def _subida_fallida(db: Session, run_id: Optional[int]) -> None:
+    """La subida no quedo aplicada completa: la limpieza de su corrida queda bloqueada."""
+    if run_id is None:
+        return
+    try:
+        db.rollback()
+        crud_sync.terminar_subida_en_corrida(db, run_id, aplicada=False)
+        db.commit()
+    except Exception as e:
+        logger.error(f"[THREAD-SYNC] No se pudo registrar la subida fallida en la corrida {run_id}: {str(e)}")
+
+
+def _process_productos_thread(categorias: list, productos: list, run_id: Optional[int] = None):
     """Ejecuta en thread separado del ThreadPool"""
     db = SessionLocal()
     try:
@@ -82,9 +133,12 @@ def _process_productos_thread(categorias: list, productos: list):
         resultado = crud_dbf_upload.process_productos_from_json(
             categorias=categorias,
             productos=productos,
-            db=db
+            db=db,
+            run_id=_corrida_abierta(db, run_id)
         )
         
+        crud_sync.terminar_subida_en_corrida(db, run_id)
+        _notify_sync_step(db, "productos", resultado)
         elapsed = time.time() - start
         logger.info(
             f"[THREAD-SYNC] Productos completado en {elapsed:.2f}s - "
@@ -93,17 +147,19 @@ def _process_productos_thread(categorias: list, productos: list):
     except Exception as e:
         logger.error(f"[THREAD-SYNC] Error fatal en productos: {str(e)}")
         traceback.print_exc()
+        _subida_fallida(db, run_id)
     finally:
         db.close()
 
 @router.post("/productos-json", status_code=202)
 async def upload_productos_json(
     request: Request,
-    usuario_actual: User = Depends(get_current_admin_user)
+    usuario_actual: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
 ):
     """
     Step 1: Upload Products and Categories
-    Payload: { "categorias": [...], "productos": [...] }
+    Payload: { "categorias": [...], "productos": [...], "run_id": 12 (opcional, POST /sync/runs) }
     """
     try:
         data = await decompress_request(request)
@@ -115,7 +171,8 @@ async def upload_productos_json(
         productos = data["productos"]
         
         # Encolar en ThreadPool (worker se libera inmediatamente)
-        executor.submit(_process_productos_thread, categorias, productos)
+        run_id = await run_in_threadpool(_aceptar_subida, db, data.get("run_id"))
+        executor.submit(_process_productos_thread, categorias, productos, run_id)
         
         return {
             "status": "sync_initiated",
@@ -130,7 +187,7 @@ async def upload_productos_json(
         raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
 
 
-def _process_listas_thread(listas: list):
+def _process_listas_thread(listas: list, run_id: Optional[int] = None):
     """Ejecuta en thread separado del ThreadPool"""
     db = SessionLocal()
     try:
@@ -139,9 +196,12 @@ def _process_listas_thread(listas: list):
         
         resultado = crud_dbf_upload.process_listas_precios_from_json(
             listas=listas,
-            db=db
+            db=db,
+            run_id=_corrida_abierta(db, run_id)
         )
         
+        crud_sync.terminar_subida_en_corrida(db, run_id)
+        _notify_sync_step(db, "listas", resultado)
         elapsed = time.time() - start
         logger.info(
             f"[THREAD-SYNC] Listas completado en {elapsed:.2f}s - "
@@ -150,17 +210,19 @@ def _process_listas_thread(listas: list):
     except Exception as e:
         logger.error(f"[THREAD-SYNC] Error fatal en listas: {str(e)}")
         traceback.print_exc()
+        _subida_fallida(db, run_id)
     finally:
         db.close()
 
 @router.post("/listas-precios-json", status_code=202)
 async def upload_listas_precios_json(
     request: Request,
-    usuario_actual: User = Depends(get_current_admin_user)
+    usuario_actual: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
 ):
     """
     Step 2: Upload Unique Price Lists (Headers)
-    Payload: { "listas": [ {"price_list_id": 1, "name": "Lista A"}, ... ] }
+    Payload: { "listas": [ {"price_list_id": 1, "name": "Lista A"}, ... ], "run_id": 12 (opcional) }
     """
     try:
         data = await decompress_request(request)
@@ -170,7 +232,8 @@ async def upload_listas_precios_json(
         
         listas = data["listas"]
         
-        executor.submit(_process_listas_thread, listas)
+        run_id = await run_in_threadpool(_aceptar_subida, db, data.get("run_id"))
+        executor.submit(_process_listas_thread, listas, run_id)
         
         return {
             "status": "sync_initiated",
@@ -186,7 +249,7 @@ async def upload_listas_precios_json(
 
 
 
-def _process_items_thread(items: list):
+def _process_items_thread(items: list, run_id: Optional[int] = None):
     """Ejecuta en thread separado del ThreadPool (operación más pesada - ~18k items)"""
     db = SessionLocal()
     try:
@@ -195,9 +258,12 @@ def _process_items_thread(items: list):
         
         resultado = crud_dbf_upload.process_items_precios_from_json(
             items=items,
-            db=db
+            db=db,
+            run_id=_corrida_abierta(db, run_id)
         )
         
+        crud_sync.terminar_subida_en_corrida(db, run_id)
+        _notify_sync_step(db, "items", resultado)
         elapsed = time.time() - start
         logger.info(
             f"[THREAD-SYNC] Items completado en {elapsed:.2f}s - "
@@ -209,17 +275,19 @@ def _process_items_thread(items: list):
     except Exception as e:
         logger.error(f"[THREAD-SYNC] Error fatal en items: {str(e)}")
         traceback.print_exc()
+        _subida_fallida(db, run_id)
     finally:
         db.close()
 
 @router.post("/items-precios-json", status_code=202)
 async def upload_items_precios_json(
     request: Request,
-    usuario_actual: User = Depends(get_current_admin_user)
+    usuario_actual: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
 ):
     """
     Step 3: Upload Price List Items (Relations)
-    Payload: { "items": [ {"price_list_id": 1, "product_id": "...", ...}, ... ] }
+    Payload: { "items": [ {"price_list_id": 1, "product_id": "...", ...}, ... ], "run_id": 12 (opcional) }
     """
     try:
         data = await decompress_request(request)
@@ -229,7 +297,8 @@ async def upload_items_precios_json(
         
         items = data["items"]
         
-        executor.submit(_process_items_thread, items)
+        run_id = await run_in_threadpool(_aceptar_subida, db, data.get("run_id"))
+        executor.submit(_process_items_thread, items, run_id)
         
         return {
             "status": "sync_initiated",
@@ -256,6 +325,7 @@ def _process_sellers_thread(sellers: list):
             db=db
         )
         
+        _notify_sync_step(db, "sellers", resultado)
         elapsed = time.time() - start
         logger.info(
             f"[THREAD-SYNC] Sellers completado en {elapsed:.2f}s - "
@@ -311,6 +381,7 @@ def _process_customers_thread(customers: list):
             db=db
         )
         
+        _notify_sync_step(db, "customers", resultado)
         elapsed = time.time() - start
         logger.info(
             f"[THREAD-SYNC] Customers completado en {elapsed:.2f}s - "
@@ -351,4 +422,217 @@ async def upload_customers_json(
     except Exception as e:
         logger.error(f"Error en upload_customers_json: {str(e)}")
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+
+
+# ==========================================
+# SUBIDAS POR CHUNKS (NDJSON)
+# ==========================================
+
+class SesionSubida(BaseModel):
+    entidad: Literal["productos", "listas", "items"]
+    run_id: Optional[int] = None  # Corrida de sincronizacion (POST /sync/runs)
+
+
+class SesionSubidaCreada(BaseModel):
+    upload_id: int
+    entidad: str
+    max_chunk_bytes: int  # Tamano maximo descomprimido de cada chunk
+
+
+class FinSubida(BaseModel):
+    total_chunks: int = Field(..., ge=0)
+
+
+_KIND_SUBIDA = "upload_"
+
+
+def _error_413():
+    return HTTPException(
+        status_code=413,
+        detail=f"Chunk mayor a {settings.SYNC_UPLOAD_MAX_CHUNK_BYTES} bytes descomprimido; envie chunks mas chicos"
+    )
+
+
+def _parse_lineas(lineas: List[bytes], primera: int, filas: list) -> None:
+    """Parsea las lineas completas de una parte (primera = numero de la primera linea)."""
+    validas = [linea for linea in lineas if linea.strip()]
+    if not validas:
+        return
+    try:
+        # Un solo json.loads por parte de red (como arreglo) en lugar de uno por linea;
+        # errors='replace' para no fallar por caracteres de FoxPro (igual que decompress_request)
+        filas.extend(json.loads(b"[" + b",".join(validas).decode('utf-8', errors='replace').encode() + b"]"))
+        return
+    except json.JSONDecodeError:
+        pass
+    # Hay una linea invalida: localizarla para el mensaje de error
+    for numero, linea in enumerate(lineas, start=primera):
+        if not linea.strip():
+            continue
+        try:
+            json.loads(linea.decode('utf-8', errors='replace'))
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"NDJSON invalido en la linea {numero}: {e}")
+    raise HTTPException(status_code=400, detail="NDJSON invalido (una fila por linea)")
+
+
+async def _partes_descomprimidas(request: Request, max_bytes: int):
+    """
+    Entrega el cuerpo por partes conforme llega, descomprimido si viene con
+    Content-Encoding: gzip. Corta con 413 en cuanto pasa de max_bytes descomprimido.
+    """
+    descompresor = zlib.decompressobj(wbits=31) if request.headers.get("Content-Encoding") == "gzip" else None
+    total = 0
+    try:
+        async for parte in request.stream():
+            if descompresor is not None:
+                # max_length: no descomprimir mas de lo permitido (gzip bombs)
+                parte = descompresor.decompress(parte, max_bytes - total + 1)
+                if descompresor.unconsumed_tail:
+                    raise _error_413()
+            total += len(parte)
+            if total > max_bytes:
+                raise _error_413()
+            yield parte
+        if descompresor is not None:
+            resto = descompresor.flush()
+            if not descompresor.eof:
+                raise HTTPException(status_code=400, detail="Chunk GZIP incompleto")
+            yield resto
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Chunk GZIP corrupto: {e}")
+
+
+async def leer_ndjson(request: Request, max_bytes: int) -> List[Dict]:
+    """
+    Parsea el NDJSON conforme llega el cuerpo, por lineas completas: nunca se
+    arma el cuerpo completo en memoria.
+    """
+    filas: List[Dict] = []
+    pendiente = b""
+    numero = 0
+    async for parte in _partes_descomprimidas(request, max_bytes):
+        *lineas, pendiente = (pendiente + parte).split(b"\n")
+        _parse_lineas(lineas, numero + 1, filas)
+        numero += len(lineas)
+    _parse_lineas([pendiente], numero + 1, filas)
+    return filas
+
+
+async def leer_columnar(request: Request, max_bytes: int) -> List[Dict]:
+    """Chunk en formato columnar (utils/columnar.py); a lo mas max_bytes en memoria."""
+    datos = b"".join([parte async for parte in _partes_descomprimidas(request, max_bytes)])
+    try:
+        return decodificar_columnar(datos)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Chunk columnar invalido: {e}")
+
+
+def _sesion_abierta(db: Session, upload_id: int, bloquear: bool = False):
+    job = sync_jobs.get_job(db, upload_id)
+    if job is None or not job.kind.startswith(_KIND_SUBIDA):
+        raise HTTPException(status_code=404, detail="Sesion de subida no encontrada")
+    if bloquear:
+        # FOR UPDATE: dos complete simultaneos (en distintos workers) no cuentan la subida dos veces
+        db.refresh(job, with_for_update=True)
+    if job.status != SyncJobStatus.running:
+        raise HTTPException(status_code=409, detail=f"La sesion de subida ya no acepta chunks ({job.status.value})")
+    return job
+
+
+def _aplicar_chunk_thread(upload_id: int, seq: int, filas: list) -> dict:
+    """Ejecuta en el hilo de sincronizacion (en orden con el resto de la sync)"""
+    db = SessionLocal()
+    try:
+        job = _sesion_abierta(db, upload_id)
+        run_id = _corrida_abierta(db, job.params.get("run_id"))
+        try:
+            return crud_dbf_upload.aplicar_chunk_subida(db, job, seq, filas, run_id)
+        except IntegrityError:
+            # Otro worker registro el mismo chunk al mismo tiempo
+            db.rollback()
+            if db.get(SyncUploadChunk, (upload_id, seq)) is not None:
+                return {"seq": seq, "estado": "duplicado"}
+            raise
+    finally:
+        db.close()
+
+
+""" POST /sessions - Abrir una subida por chunks """
+@router.post("/sessions", response_model=SesionSubidaCreada, status_code=201)
+def abrir_sesion_subida(
+    sesion: SesionSubida,
+    usuario_actual: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    # La sesion cuenta como subida de la corrida hasta que se complete (POST .../complete)
+    params = {**sesion.model_dump(), "run_id": crud_sync.aceptar_subida_en_corrida(db, sesion.run_id)}
+    # La sesion es un trabajo de sincronizacion: progreso en GET /sync/jobs/{upload_id}
+    job = sync_jobs.create_job(db, f"{_KIND_SUBIDA}{sesion.entidad}", params)
+    job.status = SyncJobStatus.running
+    job.started_at = datetime.now(timezone.utc)
+    db.commit()
+    return {"upload_id": job.job_id, "entidad": sesion.entidad, "max_chunk_bytes": settings.SYNC_UPLOAD_MAX_CHUNK_BYTES}
+
+
+""" PUT /sessions/{upload_id}/chunks/{seq} - Subir un chunk NDJSON """
+@router.put("/sessions/{upload_id}/chunks/{seq}")
+async def subir_chunk(
+    upload_id: int,
+    seq: int,
+    request: Request,
+    usuario_actual: User = Depends(get_current_admin_user)
+):
+    """
+    Cuerpo: una fila JSON por linea (mismo formato que los payloads de *-json), o
+    con Content-Type: application/x-farmacruz-columnar el formato columnar de
+    utils/columnar.py. Opcionalmente con Content-Encoding: gzip.
+
+    Responde cuando el chunk ya quedo aplicado en la base de datos (ack); si el
+    cliente no recibe respuesta puede reenviar el mismo seq sin duplicar nada.
+    """
+    if seq < 0:
+        raise HTTPException(status_code=400, detail="seq debe ser >= 0")
+    if request.headers.get("Content-Type", "").startswith(MEDIA_TYPE_COLUMNAR):
+        filas = await leer_columnar(request, settings.SYNC_UPLOAD_MAX_CHUNK_BYTES)
+    else:
+        filas = await leer_ndjson(request, settings.SYNC_UPLOAD_MAX_CHUNK_BYTES)
+
+    # Se aplica en el hilo de sincronizacion; el worker de Uvicorn solo espera el resultado
+    try:
+        return await asyncio.wrap_future(executor.submit(_aplicar_chunk_thread, upload_id, seq, filas))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"[THREAD-SYNC] Error en el chunk {seq} de la subida {upload_id}: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+
+
+""" POST /sessions/{upload_id}/complete - Cerrar una subida por chunks """
+@router.post("/sessions/{upload_id}/complete")
+def completar_sesion_subida(
+    upload_id: int,
+    fin: FinSubida,
+    usuario_actual: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    job = _sesion_abierta(db, upload_id, bloquear=True)
+    faltantes = crud_dbf_upload.chunks_faltantes(db, upload_id, fin.total_chunks)
+    if faltantes:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Faltan chunks por subir", "faltantes": faltantes}
+        )
+
+    job.status = SyncJobStatus.completed
+    job.step = None
+    job.finished_at = datetime.now(timezone.utc)
+    # Los chunks recibidos solo sirven para deduplicar reintentos mientras la sesion esta abierta
+    db.query(SyncUploadChunk).filter(SyncUploadChunk.job_id == upload_id).delete(synchronize_session=False)
+    progreso = dict(job.progress or {})
+    crud_sync.terminar_subida_en_corrida(db, job.params.get("run_id"))
+    _notify_sync_step(db, job.params["entidad"], progreso)
+    logger.info(f"[THREAD-SYNC] Subida {upload_id} ({job.params['entidad']}) completa: {progreso}")
+    return {"upload_id": upload_id, "status": "completed", "progress": progreso}
@@ -1,14 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from typing import List, Optional
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
 from dependencies import get_db, get_current_user, get_current_active_user, get_current_admin_user
-from db.base import TicketStatus, TicketPriority, CreatorType, SenderType, User, Customer, UserRole
-from schemas.ticket import TicketCreate, TicketUpdate, TicketResponse, TicketDetailResponse, TicketMessageCreate, TicketMessageResponse, TicketPaginatedResponse
+from db.base import Ticket, TicketStatus, TicketPriority, CreatorType, SenderType, User, Customer, UserRole
+from schemas.ticket import TicketCreate, TicketUpdate, TicketResponse, TicketDetailResponse, TicketMessageCreate, TicketMessageResponse, TicketMessagePage, TicketPaginatedResponse
 from crud.crud_ticket import (
     create_ticket, get_ticket, update_ticket, add_ticket_message, attach_names_to_tickets, attach_names_to_ticket_messages,
-    get_tickets_for_admin, get_tickets_for_marketing, get_tickets_for_user_or_customer
+    get_tickets_for_admin, get_tickets_for_marketing, get_tickets_for_user_or_customer,
+    get_ticket_messages, TICKET_MESSAGES_PAGE_SIZE
 )
 
 router = APIRouter()
@@ -53,7 +54,16 @@ def create_new_ticket(
     return attach_names_to_tickets(db, [ticket])[0]
 
 
-""" GET /{id} - Ver detalle de ticket y mensajes """
+def check_ticket_access(ticket, current_user):
+    # Customers y sellers solo ven sus propios tickets
+    if not hasattr(current_user, 'role') or current_user.role == UserRole.seller:
+        entity_id, c_type = get_sender_info(current_user)
+        if ticket.creator_id != entity_id or ticket.creator_type != c_type:
+            raise HTTPException(status_code=403, detail="No tienes permiso para ver este ticket")
+    # Nota: para hacerlo 100% seguro habria que verificar si Marketing tiene permiso sobre el customer/seller del ticket.
+    # Por ahora permitimos que puedan ver el detalle si tienen el ID (es a traves del dashboard).
+
+""" GET /{id} - Ver detalle de ticket y sus mensajes mas recientes """
 @router.get("/{ticket_id}", response_model=TicketDetailResponse)
 def read_ticket_detail(
     ticket_id: int,
@@ -64,15 +74,41 @@ def read_ticket_detail(
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket no encontrado")
     
-    # Validar permisos
-    if not hasattr(current_user, 'role') or current_user.role == UserRole.seller:
-        entity_id, c_type = get_sender_info(current_user)
-        if ticket.creator_id != entity_id or ticket.creator_type != c_type:
-            raise HTTPException(status_code=403, detail="No tienes permiso para ver este ticket")
-    # Nota: para hacerlo 100% seguro habria que verificar si Marketing tiene permiso sobre el customer/seller del ticket.
-    # Por ahora permitimos que puedan ver el detalle si tienen el ID (es a traves del dashboard).
-    
-    return ticket
+    check_ticket_access(ticket, current_user)
+
+    # Solo la ultima pagina del hilo; las anteriores se piden con GET /{id}/messages?before=
+    messages, has_more = get_ticket_messages(db, ticket_id)
+    return TicketDetailResponse(
+        **TicketResponse.model_validate(ticket).model_dump(),
+        messages=messages,
+        has_more_messages=has_more
+    )
+
+
+""" GET /{id}/messages - Mensajes paginados por cursor (before: anteriores, since: nuevos para polling) """
+@router.get("/{ticket_id}/messages", response_model=TicketMessagePage)
+def read_ticket_messages(
+    ticket_id: int,
+    before: Optional[str] = None,
+    since: Optional[str] = None,
+    limit: int = Query(TICKET_MESSAGES_PAGE_SIZE, ge=1, le=200),
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if before and since:
+        raise HTTPException(status_code=400, detail="Usa solo uno de 'before' o 'since'")
+
+    ticket = db.get(Ticket, ticket_id)
+    if not ticket:
+        raise HTTPException(status_code=404, detail="Ticket no encontrado")
+
+    check_ticket_access(ticket, current_user)
+
+    try:
+        messages, has_more = get_ticket_messages(db, ticket_id, limit=limit, before=before, since=since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": messages, "has_more": has_more}
 
 
 """ POST /{id}/messages - Agregar mensaje al ticket """
@@ -83,7 +119,7 @@ def add_message(
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    ticket = get_ticket(db, ticket_id)
+    ticket = db.get(Ticket, ticket_id)
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket no encontrado")
         
@@ -92,9 +128,7 @@ def add_message(
     
     msg = add_ticket_message(db, ticket_id, sender_id=entity_id, sender_type=sender_type, content=msg_in.content)
     # Return formatted message with name
-    ticket.messages.append(msg)
-    ticket = attach_names_to_ticket_messages(db, ticket)
-    return ticket.messages[-1]
+    return attach_names_to_ticket_messages(db, [msg])[0]
 
 
 class TicketStatusUpdate(BaseModel):
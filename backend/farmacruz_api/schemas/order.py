@@ -165,6 +165,7 @@ class Order(OrderBase):
     created_at: datetime  # Cuando se creo el pedido
     assigned_at: Optional[datetime] = None  # Cuando se asigno vendedor
     validated_at: Optional[datetime] = None  # Cuando el vendedor lo aprobo
+    version: int = 1  # Token de concurrencia: se envia de vuelta al editar el pedido
     
     # Relaciones
     items: List[OrderItem] = []  # Lista de productos en el pedido
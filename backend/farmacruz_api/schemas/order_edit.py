@@ -38,10 +38,14 @@ class OrderEditRequest(BaseModel):
     - Modificar costo de envío
     
     Los precios se recalculan automaticamente segun la lista del cliente.
+
+    version: la del pedido cuando se abrio el editor. Si otro usuario lo
+    modifico despues, la edicion se rechaza con 409 en lugar de sobrescribirlo.
     """
     items: List[OrderItemEdit] = Field(..., description="Lista de items del pedido")
     shipping_cost: Optional[float] = Field(None, ge=0, description="Costo de envío")
     assignment_notes: Optional[str] = Field(None, description="Notas al vendedor (solo staff interno)")
+    version: Optional[int] = Field(None, description="Version del pedido que se edito (concurrencia optimista)")
 
     model_config = {
         "json_schema_extra": {
@@ -50,7 +54,8 @@ class OrderEditRequest(BaseModel):
                     {"order_item_id": None, "product_id": "PROD123", "quantity": 5},
                     {"order_item_id": "550e8400-e29b-41d4-a716-446655440000", "product_id": "PROD456", "quantity": 3}
                 ],
-                "shipping_cost": 150.00
+                "shipping_cost": 150.00,
+                "version": 3
             }
         }
     }
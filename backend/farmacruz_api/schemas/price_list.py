@@ -17,7 +17,7 @@ Ejemplo:
 """
 
 from pydantic import BaseModel, Field, field_validator
-from typing import Optional, List
+from typing import Literal, Optional, List
 from datetime import datetime
 from decimal import Decimal
 
@@ -168,6 +168,62 @@ class PriceListItemsBulkUpdate(BaseModel):
     items: List[PriceListItemCreate]  # Lista de items a actualizar
 
 
+class PriceListItemsBulkResult(BaseModel):
+    """
+    Resultado de la actualizacion masiva
+
+    Los productos que no existen en el catalogo se omiten y se reportan.
+    """
+    procesados: int  # Items creados o actualizados
+    no_encontrados: List[str] = []  # product_id que no existen
+
+
+class PriceListRepricing(BaseModel):
+    """
+    Regla de repreciado masivo de una lista de precios
+
+    Operaciones sobre el markup actual de cada item:
+    - set: markup = value
+    - add: markup = markup + value (ej: +3 puntos a un laboratorio)
+    - multiply: markup = markup * value (ej: 1.10 = +10% del markup)
+
+    El resultado se redondea a 2 decimales y se limita a 0 - 999.99.
+    Filtros opcionales (se combinan con AND): categoria, busqueda y productos.
+    """
+    operation: Literal["set", "add", "multiply"]
+    value: Decimal = Field(..., decimal_places=4)
+    category_id: Optional[int] = None  # Solo productos de esta categoria
+    search: Optional[str] = None  # Misma busqueda que el administrador de la lista
+    product_ids: Optional[List[str]] = None  # Solo estos productos
+    keep_erp_price: bool = True  # Solo cambia el markup; final_price (ERP) queda y se aplica max(calculado, ERP) al leer
+    dry_run: bool = False  # Solo contar y mostrar una muestra, sin modificar
+
+    @field_validator('value')
+    @classmethod
+    def validate_value(cls, v, info):
+        """set y multiply no aceptan valores negativos"""
+        if info.data.get('operation') in ('set', 'multiply') and v < 0:
+            raise ValueError('El valor no puede ser negativo para set/multiply')
+        return v
+
+
+class PriceListRepricingSample(BaseModel):
+    """Un item afectado por el repreciado (antes y despues)"""
+    product_id: str
+    name: str
+    markup_percentage: Decimal  # Markup actual
+    new_markup_percentage: Decimal
+    final_price: Decimal  # final_price (sin IVA) actual
+    new_final_price: Decimal
+
+
+class PriceListRepricingResult(BaseModel):
+    """Resultado del repreciado (o de la simulacion con dry_run)"""
+    afectados: int  # Items que cambian de markup o de precio
+    dry_run: bool
+    muestra: List[PriceListRepricingSample] = []  # Primeros items afectados (solo en dry_run)
+
+
 # PRECIO CALCULATION (Calculo de precio final)
 
 class PriceCalculation(BaseModel):
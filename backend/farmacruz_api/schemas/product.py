@@ -12,7 +12,7 @@ Sistema de precios:
 
 from datetime import datetime
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, List, Optional
 from decimal import Decimal
 
 
@@ -170,4 +170,23 @@ class CatalogProduct(Product):
     final_price: Decimal = Field(..., description="Precio final con markup e IVA")
     markup_percentage: Decimal = Field(..., description="% de markup del cliente")
     
-    model_config = {"from_attributes": True}
\ No newline at end of file
+    model_config = {"from_attributes": True}
+
+class ImageVersionBulkUpdate(BaseModel):
+    """
+    Subir la version de imagen de muchos productos en una sola peticion
+
+    Se puede enviar una lista de IDs o un mapa {product_id: hash del archivo original}.
+    Con hash, los productos cuyo hash ya estaba registrado se omiten (la imagen no cambio).
+    Si viene image_base_url, image_url queda como "{image_base_url}/{product_id}.webp".
+    """
+    product_ids: List[str] = Field(default_factory=list, max_length=10000)  # IDs sin hash
+    hashes: Dict[str, str] = Field(default_factory=dict, max_length=10000)  # {product_id: hash}
+    image_base_url: Optional[str] = Field(None, max_length=150)  # Ej: "https://img.farmacruz.com.mx"
+
+
+class ImageVersionBulkResult(BaseModel):
+    """Resultado del update masivo de versiones de imagen"""
+    actualizados: List[str]  # Productos cuya version se incremento
+    sin_cambios: List[str]  # Existen pero el hash no cambio
+    no_encontrados: List[str]  # IDs que no existen en la BD
@@ -18,6 +18,7 @@ class TicketMessageResponse(TicketMessageBase):
     sender_type: SenderType
     sender_name: Optional[str] = None
     created_at: datetime
+    cursor: Optional[str] = None  # Para ?before= / ?since= en GET /tickets/{id}/messages
 
     class Config:
         from_attributes = True
@@ -52,7 +53,12 @@ class TicketResponse(TicketBase):
         from_attributes = True
 
 class TicketDetailResponse(TicketResponse):
-    messages: List[TicketMessageResponse] = []
+    messages: List[TicketMessageResponse] = []  # Solo la pagina mas reciente
+    has_more_messages: bool = False
+
+class TicketMessagePage(BaseModel):
+    items: List[TicketMessageResponse]
+    has_more: bool
 
 class TicketPaginatedResponse(BaseModel):
     items: List[TicketResponse]
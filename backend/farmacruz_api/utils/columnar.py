@@ -0,0 +1,127 @@
+"""
+Formato columnar de los chunks de sincronizacion (Content-Type: application/x-farmacruz-columnar).
+
+En lugar de repetir las llaves de cada fila como en JSON, cada columna va una
+sola vez con sus valores en binario; los textos repetidos (listas, categorias,
+updated_at, ...) se codifican con diccionario. El cliente lo arma con
+sync_functions/columnar.py (misma especificacion).
+
+Especificacion (little endian), version 1:
+    b"FCOL" | version u8 | filas u32 | columnas u16
+    por columna:
+        largo_nombre u16 | nombre utf-8 | tipo u8 | tiene_nulos u8
+        [mascara de nulos: filas x u8 (1 = nulo)]  si tiene_nulos
+        tipo 1 (float64): filas x f8
+        tipo 2 (int64):   filas x i8
+        tipo 3 (bool):    filas x u8
+        tipo 4 (texto):   valores u32 | ancho_indice u8 (0, 2 o 4)
+                          | largos valores x u32 | bytes utf-8 | [filas x indice]
+    Con ancho_indice 0 no hay diccionario: valores == filas, en orden de fila
+    (columnas casi sin repetidos como nombres o codigos de barras).
+"""
+
+import struct
+from typing import Dict, List
+
+import numpy as np
+
+MEDIA_TYPE_COLUMNAR = "application/x-farmacruz-columnar"
+
+MAGIC = b"FCOL"
+VERSION = 1
+
+TIPO_FLOAT = 1
+TIPO_INT = 2
+TIPO_BOOL = 3
+TIPO_TEXTO = 4
+
+_NUMERICOS = {TIPO_FLOAT: "<f8", TIPO_INT: "<i8", TIPO_BOOL: "u1"}
+_INDICES = {0: None, 2: "<u2", 4: "<u4"}
+
+
+class _Lector:
+    def __init__(self, datos: bytes):
+        self.datos = memoryview(datos)
+        self.pos = 0
+
+    def struct(self, formato: str):
+        valores = struct.unpack_from(formato, self.datos, self.pos)
+        self.pos += struct.calcsize(formato)
+        return valores
+
+    def arreglo(self, dtype: str, cantidad: int) -> np.ndarray:
+        if self.pos + np.dtype(dtype).itemsize * cantidad > len(self.datos):
+            raise ValueError("Payload columnar truncado")
+        arreglo = np.frombuffer(self.datos, dtype=dtype, count=cantidad, offset=self.pos)
+        self.pos += arreglo.nbytes
+        return arreglo
+
+    def bytes(self, cantidad: int) -> bytes:
+        if self.pos + cantidad > len(self.datos):
+            raise ValueError("Payload columnar truncado")
+        valor = self.datos[self.pos:self.pos + cantidad].tobytes()
+        self.pos += cantidad
+        return valor
+
+
+def _leer_columna(lector: _Lector, filas: int) -> List:
+    tipo, tiene_nulos = lector.struct("<BB")
+    nulos = lector.arreglo("u1", filas) if tiene_nulos else None
+
+    if tipo in _NUMERICOS:
+        valores = lector.arreglo(_NUMERICOS[tipo], filas)
+        if tipo == TIPO_BOOL:
+            valores = valores.astype(bool)
+        valores = valores.tolist()
+    elif tipo == TIPO_TEXTO:
+        cantidad, ancho = lector.struct("<IB")
+        if ancho not in _INDICES:
+            raise ValueError(f"Ancho de indice invalido: {ancho}")
+        if ancho == 0 and cantidad != filas:
+            raise ValueError("Columna de texto sin diccionario con cantidad de valores invalida")
+        offsets = [0] + np.cumsum(lector.arreglo("<u4", cantidad), dtype=np.int64).tolist()
+        texto = lector.bytes(offsets[-1])
+        # errors='replace' para no fallar por caracteres de FoxPro (igual que el JSON)
+        diccionario = np.array(
+            [texto[offsets[i]:offsets[i + 1]].decode("utf-8", errors="replace") for i in range(cantidad)] + [None],
+            dtype=object
+        )
+        indices = lector.arreglo(_INDICES[ancho], filas) if ancho else np.arange(filas)
+        # Los nulos pueden traer cualquier indice: se apuntan al None del final
+        if nulos is not None:
+            indices = np.where(nulos == 1, cantidad, indices)
+        if indices.size and int(indices.max()) > cantidad - (nulos is None):
+            raise ValueError("Indice de diccionario fuera de rango")
+        valores = diccionario[indices].tolist()
+    else:
+        raise ValueError(f"Tipo de columna desconocido: {tipo}")
+
+    if nulos is not None:
+        for i in np.flatnonzero(nulos).tolist():
+            valores[i] = None
+    return valores
+
+
+def decodificar_columnar(datos: bytes) -> List[Dict]:
+    """
+    Convierte un payload columnar en la lista de filas (dicts) que reciben
+    los process_*_from_json de crud_dbf_upload.
+
+    Raises:
+        ValueError: si el payload no es columnar valido
+    """
+    lector = _Lector(datos)
+    try:
+        magic, version, filas, columnas = lector.struct("<4sBIH")
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("No es un payload columnar FCOL v1")
+        nombres, valores = [], []
+        for _ in range(columnas):
+            (largo,) = lector.struct("<H")
+            nombres.append(lector.bytes(largo).decode("utf-8"))
+            valores.append(_leer_columna(lector, filas))
+    except struct.error as e:
+        raise ValueError(f"Payload columnar truncado: {e}")
+    if lector.pos != len(lector.datos):
+        raise ValueError("Bytes sobrantes al final del payload columnar")
+    return [dict(zip(nombres, fila)) for fila in zip(*valores)] if nombres else []
@@ -0,0 +1,212 @@
+"""
+Cola persistente de correos salientes (tabla outbound_emails)
+
+Flujo:
+1. Los endpoints llaman enqueue_email(db, ...) -> INSERT y despiertan al worker
+2. Un unico worker por proceso (hilo daemon iniciado en el lifespan) reclama lotes
+   de pendientes vencidos (status=sending, commit) y los envia fuera de la
+   transaccion con un SMTPMailer que mantiene la conexion abierta
+3. El resultado de cada correo se guarda en su propia transaccion corta
+4. Fallos -> reintento con backoff exponencial; tras EMAIL_QUEUE_MAX_ATTEMPTS -> failed
+
+Con varios workers de gunicorn solo uno envia a la vez: cada lote toma
+pg_try_advisory_lock en una conexion en autocommit, y las filas se reclaman con
+FOR UPDATE SKIP LOCKED.
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from db.base import OutboundEmail, EmailStatus
+from db.session import SessionLocal
+from utils.email_utils import SMTPMailer, build_message, get_sender_email
+
+logger = logging.getLogger(__name__)
+
+# Llave del advisory lock de Postgres para el envio de correos (arbitraria, unica en la app)
+EMAIL_QUEUE_LOCK_KEY = 728_001
+
+# Backoff: 1 min, 2 min, 4 min ... hasta 1 hora
+BACKOFF_BASE_SECONDS = 60
+BACKOFF_MAX_SECONDS = 3600
+
+# Plazo de un correo reclamado (status=sending) antes de volver a tomarse si el
+# proceso murio a mitad del lote (un lote de 20 a 0.5 msg/s tarda ~40s)
+SENDING_LEASE = timedelta(minutes=10)
+
+_wake_event = threading.Event()
+_worker: Optional["EmailQueueWorker"] = None
+
+
+""" Encolar un correo (no bloquea: el envio lo hace el worker) """
+def enqueue_email(db: Session, to_email: str, subject: str, html_body: str,
+                  reply_to: str = None, commit: bool = True) -> OutboundEmail:
+    email = OutboundEmail(
+        to_email=to_email,
+        subject=subject[:255],
+        html_body=html_body,
+        reply_to=reply_to,
+        status=EmailStatus.pending,
+    )
+    db.add(email)
+    if commit:
+        db.commit()
+        wake_worker()
+    return email
+
+
+def wake_worker() -> None:
+    _wake_event.set()
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** max(0, attempts - 1), BACKOFF_MAX_SECONDS))
+
+
+def _claim_batch(db: Session, batch_size: int) -> List[dict]:
+    """
+    Reclama pendientes vencidos (status=sending) en una transaccion corta. Con
+    next_attempt_at = ahora + SENDING_LEASE: si el proceso muere a mitad del
+    envio, el correo vuelve a tomarse cuando vence el plazo.
+    """
+    now = datetime.now(timezone.utc)
+    emails = db.execute(
+        select(OutboundEmail)
+        .where(
+            OutboundEmail.status.in_([EmailStatus.pending, EmailStatus.sending]),
+            OutboundEmail.next_attempt_at <= now,
+        )
+        .order_by(OutboundEmail.next_attempt_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+
+    claimed = []
+    for email in emails:
+        email.status = EmailStatus.sending
+        email.attempts += 1
+        email.next_attempt_at = now + SENDING_LEASE
+        claimed.append({
+            "email_id": email.email_id, "to_email": email.to_email, "subject": email.subject,
+            "html_body": email.html_body, "reply_to": email.reply_to, "attempts": email.attempts,
+        })
+    db.commit()
+    return claimed
+
+
+def _set_result(db: Session, email_id: int, **values) -> None:
+    """Resultado de un correo en su propia transaccion corta."""
+    db.execute(update(OutboundEmail).where(OutboundEmail.email_id == email_id).values(**values))
+    db.commit()
+
+
+def _send_claimed(db: Session, mailer: SMTPMailer, emails: List[dict]) -> Tuple[int, int]:
+    sender_email = get_sender_email()
+    sent = failed = 0
+    for email in emails:
+        try:
+            msg = build_message(sender_email, email["to_email"], email["subject"], email["html_body"], email["reply_to"])
+            mailer.send(sender_email, email["to_email"], msg)
+        except Exception as e:
+            # La conexion puede haber quedado en mal estado: se reabre en el siguiente envio
+            mailer.close()
+            attempts = email["attempts"]
+            error = f"{type(e).__name__}: {e}"[:1000]
+            if attempts >= settings.EMAIL_QUEUE_MAX_ATTEMPTS:
+                _set_result(db, email["email_id"], status=EmailStatus.failed, last_error=error)
+                logger.error(f"Correo {email['email_id']} a {email['to_email']} descartado tras {attempts} intentos: {e}")
+            else:
+                _set_result(db, email["email_id"], status=EmailStatus.pending, last_error=error,
+                            next_attempt_at=datetime.now(timezone.utc) + _backoff(attempts))
+                logger.warning(f"Correo {email['email_id']} fallo (intento {attempts}), reintento en {_backoff(attempts)}: {e}")
+            failed += 1
+            continue
+
+        _set_result(db, email["email_id"], status=EmailStatus.sent, sent_at=datetime.now(timezone.utc), last_error=None)
+        sent += 1
+    return sent, failed
+
+
+""" Enviar un lote de pendientes vencidos """
+def process_batch(db: Session, mailer: SMTPMailer, batch_size: int = None) -> Tuple[int, int]:
+    """
+    Retorna (enviados, fallidos_en_este_lote). (0, 0) si no hay pendientes
+    o si otro proceso tiene el lock de envio.
+
+    El envio SMTP corre fuera de cualquier transaccion: las filas se reclaman y
+    se confirman antes, y el resultado de cada correo se guarda por separado
+    (un commit fallido ya no reenvia el lote completo).
+    """
+    batch_size = batch_size or settings.EMAIL_QUEUE_BATCH_SIZE
+
+    # Lock de sesion en una conexion aparte en autocommit: asegura un solo proceso
+    # enviando sin dejar una transaccion abierta mientras dura el lote
+    with db.get_bind().connect() as lock_conn:
+        lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        if not lock_conn.execute(select(func.pg_try_advisory_lock(EMAIL_QUEUE_LOCK_KEY))).scalar():
+            return 0, 0
+        try:
+            emails = _claim_batch(db, batch_size)
+            if not emails:
+                return 0, 0
+            sent, failed = _send_claimed(db, mailer, emails)
+        finally:
+            lock_conn.execute(select(func.pg_advisory_unlock(EMAIL_QUEUE_LOCK_KEY)))
+
+    if sent:
+        logger.info(f"Cola de correos: {sent} enviados, {failed} con error")
+    return sent, failed
+
+
+class EmailQueueWorker(threading.Thread):
+    """Hilo que vacia la cola por lotes y duerme hasta que lo despierten o pase el poll."""
+
+    def __init__(self):
+        super().__init__(name="email-queue", daemon=True)
+        self._stop_event = threading.Event()
+        self.mailer = SMTPMailer()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            _wake_event.clear()
+            try:
+                while not self._stop_event.is_set():
+                    db = SessionLocal()
+                    try:
+                        sent, failed = process_batch(db, self.mailer)
+                    finally:
+                        db.close()
+                    if sent + failed == 0:
+                        break
+            except Exception as e:
+                logger.error(f"Error en el worker de correos: {e}", exc_info=True)
+            self.mailer.close_if_idle()
+            _wake_event.wait(timeout=settings.EMAIL_QUEUE_POLL_SECONDS)
+        self.mailer.close()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        _wake_event.set()
+
+
+def start_worker() -> None:
+    """Inicia el worker de la cola (llamado desde el lifespan)."""
+    global _worker
+    if settings.EMAIL_WORKER_ENABLED and _worker is None:
+        _worker = EmailQueueWorker()
+        _worker.start()
+
+
+def stop_worker() -> None:
+    """Detiene el worker y cierra la conexion SMTP (llamado desde el lifespan)."""
+    global _worker
+    if _worker is not None:
+        _worker.stop()
+        _worker.join(timeout=5)
+        _worker = None
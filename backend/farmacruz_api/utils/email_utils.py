@@ -1,7 +1,15 @@
 """
 Utilidades para envío de Correos Electrónicos
+
+- build_message: arma el MIME (remitente segun proveedor Gmail/SES)
+- SMTPMailer: conexion SMTP persistente (TLS + login una sola vez) con rate limit por proveedor
+
+Los endpoints NO envian directamente: encolan con utils.email_queue.enqueue_email
+y el worker de la cola usa SMTPMailer para enviar por lotes.
 """
 import smtplib
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import logging
@@ -11,83 +19,136 @@ from core.config import settings
 # Configurar logging
 logger = logging.getLogger(__name__)
 
-def send_email_background(to_email: str, subject: str, html_body: str, reply_to: str = None):
+# Envios por segundo por defecto segun proveedor (SMTP_RATE_PER_SECOND=0)
+# - Gmail: ~2,000/dia en Workspace y bloqueos por rafagas -> conservador
+# - SES: cuota de produccion por defecto de 14 msg/s
+PROVIDER_RATES = {"gmail": 0.5, "ses": 14.0, "default": 2.0}
+
+# Segundos sin actividad tras los cuales se cierra la conexion SMTP
+SMTP_IDLE_TIMEOUT = 60
+
+
+def detect_provider(host: str) -> str:
+    host = (host or "").lower()
+    if "gmail" in host:
+        return "gmail"
+    if "amazonaws" in host:
+        return "ses"
+    return "default"
+
+
+def get_sender_email() -> str:
+    # Lógica híbrida para determinar el "From" (Remitente)
+    # 1. Si estás usando Gmail, el remitente oficial DEBE SER el correo de Gmail.
+    # 2. Si estás usando Amazon SES, usamos el SENDER (porque el user es un API Key de AWS).
+    if detect_provider(settings.SMTP_HOST) == "gmail":
+        return settings.SMTP_USER
+    return getattr(settings, 'SENDER', settings.SMTP_USER)
+
+
+def build_message(sender_email: str, to_email: str, subject: str, html_body: str, reply_to: str = None) -> MIMEMultipart:
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = sender_email
+    msg["To"] = to_email
+    if reply_to:
+        msg["Reply-To"] = reply_to  # Para responder directamente a un cliente (ej. forms)
+    msg.attach(MIMEText(html_body, "html"))
+    return msg
+
+
+class RateLimiter:
+    """Token bucket sencillo: acquire() duerme lo necesario para respetar rate/s."""
+
+    def __init__(self, rate_per_second: float, burst: int = 1):
+        self.rate = rate_per_second
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                wait = (1 - self.tokens) / self.rate
+                time.sleep(wait)
+                self.tokens = 0.0
+                self.updated = time.monotonic()
+            else:
+                self.tokens -= 1
+
+
+class SMTPMailer:
     """
-    Función genérica para enviar emails en segundo plano.
-    
-    :param to_email: Correo destinatario
-    :param subject: Asunto del correo
-    :param html_body: Cuerpo del correo en HTML
-    :param reply_to: Correo para responder iterativo al contacto (opcional)
+    Conexion SMTP reutilizable.
+
+    Abre TLS + login en el primer envio y mantiene la conexion viva entre lotes;
+    si el servidor la cerro (o quedo inactiva mas de SMTP_IDLE_TIMEOUT) reconecta.
     """
-    try:
-        # === VALIDAR CONFIGURACIÓN ===
-        if not settings.SMTP_USER or not settings.SMTP_PASSWORD:
-            logger.error("SMTP_USER o SMTP_PASSWORD no están configurados en .env")
-            raise ValueError("Configuración SMTP incompleta")
-            
-        if not settings.CONTACT_EMAIL:
-            logger.error("CONTACT_EMAIL no está configurado en .env")
-            raise ValueError("CONTACT_EMAIL no configurado")
-        
-        logger.info(f"Intentando enviar email a {to_email}")
-        logger.info(f"SMTP Host: {settings.SMTP_HOST}:{settings.SMTP_PORT}")
-        logger.info(f"SMTP User (Oculto): ***{str(settings.SMTP_USER)[-4:] if len(settings.SMTP_USER)>4 else '***'}")
-        
-        # === CONFIGURACION DEL EMAIL ===
-        password = settings.SMTP_PASSWORD
-        
-        # Lógica híbrida para determinar el "From" (Remitente)
-        # 1. Si estás usando Gmail, el remitente oficial DEBE SER el correo de Gmail.
-        # 2. Si estás usando Amazon SES, usamos el SENDER (porque el user es un API Key de AWS).
-        if "gmail" in settings.SMTP_HOST.lower():
-            sender_email = settings.SMTP_USER
-        else:
-            sender_email = getattr(settings, 'SENDER', settings.SMTP_USER)
-        
-        # === CREAR MENSAJE ===
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = subject
-        msg["From"] = sender_email
-        msg["To"] = to_email
-        
-        if reply_to:
-            msg["Reply-To"] = reply_to  # Para responder directamente a un cliente (ej. forms)
-            
-        # === ADJUNTAR HTML ===
-        part = MIMEText(html_body, "html")
-        msg.attach(part)
-        
-        # === ENVIAR EMAIL ===
-        logger.info("Conectando al servidor SMTP...")
-        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=10) as server:
-            logger.info("Iniciando TLS...")
-            server.starttls()  # Habilitar TLS
-            
-            logger.info("Autenticando...")
-            server.login(settings.SMTP_USER, password)
-            
-            logger.info("Enviando mensaje...")
-            server.sendmail(sender_email, to_email, msg.as_string())
-            
-        logger.info(f"✅ Email enviado exitosamente a {to_email}")
-        print(f"✅ Email enviado exitosamente a {to_email}")
-        
-    except smtplib.SMTPAuthenticationError as e:
-        error_msg = f"❌ Error de autenticación SMTP: {str(e)}"
-        logger.error(error_msg)
-        print(error_msg)
-        raise
-        
-    except smtplib.SMTPException as e:
-        error_msg = f"❌ Error SMTP: {str(e)}"
-        logger.error(error_msg)
-        print(error_msg)
-        raise
-        
-    except Exception as e:
-        error_msg = f"❌ Error enviando email a {to_email}: {str(e)}"
-        logger.error(error_msg)
-        print(error_msg)
-        raise
 
+    def __init__(self, host: str = None, port: int = None, user: str = None,
+                 password: str = None, use_tls: bool = None, rate_per_second: float = None):
+        self.host = host or settings.SMTP_HOST
+        self.port = port or settings.SMTP_PORT
+        self.user = settings.SMTP_USER if user is None else user
+        self.password = settings.SMTP_PASSWORD if password is None else password
+        self.use_tls = settings.SMTP_USE_TLS if use_tls is None else use_tls
+        self.provider = detect_provider(self.host)
+
+        rate = settings.SMTP_RATE_PER_SECOND if rate_per_second is None else rate_per_second
+        rate = rate or PROVIDER_RATES[self.provider]
+        self.limiter = RateLimiter(rate, burst=max(1, int(rate)))
+
+        self._server = None
+        self._last_used = 0.0
+
+    def _connect(self) -> None:
+        if not self.user or not self.password:
+            raise ValueError("Configuración SMTP incompleta (SMTP_USER / SMTP_PASSWORD)")
+        logger.info(f"Conectando a SMTP {self.host}:{self.port} ({self.provider})")
+        server = smtplib.SMTP(self.host, self.port, timeout=10)
+        if self.use_tls:
+            server.starttls()
+        server.login(self.user, self.password)
+        self._server = server
+
+    def _ensure_connection(self) -> None:
+        if self._server is not None and time.monotonic() - self._last_used > SMTP_IDLE_TIMEOUT:
+            # Conexion ociosa: verificar que siga viva antes de mandar el lote
+            try:
+                if self._server.noop()[0] != 250:
+                    self.close()
+            except smtplib.SMTPException:
+                self.close()
+        if self._server is None:
+            self._connect()
+
+    def send(self, sender_email: str, to_email: str, msg) -> None:
+        """Envia un mensaje; reconecta una vez si el servidor cerro la conexion."""
+        self.limiter.acquire()
+        for attempt in range(2):
+            self._ensure_connection()
+            try:
+                self._server.sendmail(sender_email, to_email, msg.as_string())
+                self._last_used = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected:
+                self._server = None
+                if attempt == 1:
+                    raise
+
+    def close_if_idle(self) -> None:
+        # Evita dejar una sesion SMTP abierta cuando no hay correos por enviar
+        if self._server is not None and time.monotonic() - self._last_used > SMTP_IDLE_TIMEOUT:
+            self.close()
+
+    def close(self) -> None:
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
@@ -4,91 +4,102 @@ Utilidades para manejo de grupos de ventas
 Funciones para gestionar la asignación automática de clientes a grupos de vendedores.
 """
 
-from typing import Optional, List
+from typing import Dict, Optional, List
+from sqlalchemy import Integer, column, update, values
 from sqlalchemy.orm import Session
 from sqlalchemy.dialects.postgresql import insert
-from db.base import User, SalesGroup, GroupSeller, CustomerInfo
-from crud.crud_sales_group import create_sales_group, assign_seller_to_group, assign_customer_to_sales_group, remove_customer_from_sales_group
+from core import group_membership
+from db.base import User, UserRole, SalesGroup, GroupSeller, CustomerInfo
+from crud.crud_sales_group import assign_customer_to_sales_group, remove_customer_from_sales_group
+from crud.crud_ticket import refresh_ticket_visibility
 
+# Filas por sentencia al reasignar clientes (2 parametros por fila, lejos del limite de 65535 de Postgres)
+GROUP_ASSIGN_CHUNK_SIZE = 5000
 
 
-
-def bulk_ensure_seller_groups(db: Session, seller_ids: List[int]) -> None:
+def bulk_ensure_seller_groups(db: Session, seller_ids: List[int]) -> Dict[int, int]:
     """
     Asegura que existan grupos y asignaciones para una lista de sellers.
     Crea los grupos faltantes y asigna los sellers a ellos.
+
+    El grupo de cada vendedor se identifica por salesgroups.owner_seller_id
+    (no por el nombre "Grupo {full_name}", que cambia si se renombra al vendedor).
+    Grupos viejos sin dueño que coincidan por nombre se adoptan (migracion automatica).
     
     Args:
         db: Sesión de base de datos
         seller_ids: Lista de IDs de vendedores
+
+    Returns:
+        {seller_id: sales_group_id}
     """
     if not seller_ids:
-        return
+        return {}
 
     # 1. Obtener todos los sellers en una sola query
     sellers = db.query(User).filter(User.user_id.in_(seller_ids)).all()
     if not sellers:
-        return
-        
-    seller_map = {s.user_id: s for s in sellers}
-    
-    # 2. Crear nombres de grupos esperados
-    expected_group_names = [f"Grupo {seller.full_name}" for seller in sellers]
-    
-    # 3. Obtener grupos existentes en una sola query
-    existing_groups = db.query(SalesGroup).filter(
-        SalesGroup.group_name.in_(expected_group_names)
-    ).all()
-    group_name_map = {g.group_name: g for g in existing_groups}
-    
+        return {}
+
+    # 2. Grupos que ya tienen dueño
+    group_by_seller = dict(db.query(SalesGroup.owner_seller_id, SalesGroup.sales_group_id).filter(
+        SalesGroup.owner_seller_id.in_([s.user_id for s in sellers])
+    ).all())
+
+    # 3. Adoptar grupos legacy (creados por nombre, sin owner_seller_id)
+    missing = [s for s in sellers if s.user_id not in group_by_seller]
+    if missing:
+        legacy_groups = db.query(SalesGroup).filter(
+            SalesGroup.owner_seller_id.is_(None),
+            SalesGroup.group_name.in_([f"Grupo {s.full_name}" for s in missing])
+        ).order_by(SalesGroup.sales_group_id).all()
+        legacy_by_name = {}
+        for group in legacy_groups:
+            legacy_by_name.setdefault(group.group_name, group)
+        for seller in missing:
+            group = legacy_by_name.pop(f"Grupo {seller.full_name}", None)
+            if group:
+                group.owner_seller_id = seller.user_id
+                group_by_seller[seller.user_id] = group.sales_group_id
+        db.flush()
+
     # 4. Crear grupos faltantes en bulk
-    groups_to_create = []
-    for seller in sellers:
-        group_name = f"Grupo {seller.full_name}"
-        if group_name not in group_name_map:
-            groups_to_create.append({
-                'group_name': group_name,
-                'description': f"Grupo automático para el vendedor {seller.username}",
-                'is_active': True
-            })
-    
+    groups_to_create = [
+        {
+            'group_name': f"Grupo {seller.full_name}",
+            'description': f"Grupo automático para el vendedor {seller.username}",
+            'is_active': True,
+            'owner_seller_id': seller.user_id
+        }
+        for seller in sellers if seller.user_id not in group_by_seller
+    ]
     if groups_to_create:
         stmt = insert(SalesGroup).values(groups_to_create)
+        stmt = stmt.on_conflict_do_nothing(index_elements=['owner_seller_id'])
         db.execute(stmt)
-        # db.flush() # flush no es suficiente si queremos que la siguiente query los vea si no hacemos commit? 
-        # En la misma transaccion deberia verse.
-        
-        # Re-fetch newly created groups to get proper ORM objects
-        new_group_names = [g['group_name'] for g in groups_to_create]
-        new_groups = db.query(SalesGroup).filter(
-            SalesGroup.group_name.in_(new_group_names)
-        ).all()
-        for group in new_groups:
-            group_name_map[group.group_name] = group
-            
-    # 5. Ensure all expected groups are in the map (already done by update)
-    
-    # 6. Asignar sellers a sus grupos (bulk upsert)
+        # Releer (incluye los que otro proceso haya creado en paralelo)
+        group_by_seller.update(db.query(SalesGroup.owner_seller_id, SalesGroup.sales_group_id).filter(
+            SalesGroup.owner_seller_id.in_([g['owner_seller_id'] for g in groups_to_create])
+        ).all())
+
+    # 5. Asignar sellers a sus grupos (bulk upsert)
     # IMPORTANTE: Solo asignar como GroupSeller si el usuario SIGUE siendo seller
     # Si fue promovido a marketing, no re-crear la entrada de GroupSeller
-    seller_assignments = []
-    for seller in sellers:
-        if seller.role != 'seller':
-            continue  # Skip usuarios promovidos a marketing
-        group_name = f"Grupo {seller.full_name}"
-        group = group_name_map.get(group_name)
-        if group:
-            seller_assignments.append({
-                'sales_group_id': group.sales_group_id,
-                'seller_id': seller.user_id
-            })
+    seller_assignments = [
+        {'sales_group_id': group_by_seller[seller.user_id], 'seller_id': seller.user_id}
+        for seller in sellers
+        if seller.role == UserRole.seller and seller.user_id in group_by_seller
+    ]
     
     if seller_assignments:
         stmt = insert(GroupSeller).values(seller_assignments)
         stmt = stmt.on_conflict_do_nothing(index_elements=['sales_group_id', 'seller_id'])
-        db.execute(stmt)
+        if db.execute(stmt).rowcount:
+            group_membership.mark_dirty(db)
         db.commit()
 
+    return group_by_seller
+
 
 def auto_crear_grupo_seller(db: Session, user: User) -> None:
     """
@@ -101,7 +112,7 @@ def auto_crear_grupo_seller(db: Session, user: User) -> None:
 def assign_customer_to_agent_group(db: Session, customer_id: int, agent_id: int) -> None:
     """
     Asigna un cliente al grupo del seller (agent).
-    Si el agente no tiene grupo, busca/crea uno llamado 'Grupo {seller.full_name}'.
+    Si el agente no tiene grupo, se crea uno llamado 'Grupo {seller.full_name}'.
     
     Args:
         db: Sesión de base de datos
@@ -113,30 +124,17 @@ def assign_customer_to_agent_group(db: Session, customer_id: int, agent_id: int)
     if not seller:
         return  # Agent no existe, no hacer nada
     
-    # Buscar grupo del seller por nombre
-    group_name = f"Grupo {seller.full_name}"
-    group = db.query(SalesGroup).filter(SalesGroup.group_name == group_name).first()
-    
-    if not group:
-        # Crear grupo
-        group = create_sales_group(db, SalesGroupCreate(
-            group_name=group_name,
-            description=f"Grupo automático para el vendedor {seller.username}",
-            is_active=True
-        ))
-        
-        # Asignar seller al grupo
-        try:
-            assign_seller_to_group(db, group.sales_group_id, seller.user_id)
-        except:
-            pass  # Ya está asignado
+    # Grupo del seller (por owner_seller_id; se crea si no existe)
+    group_id = bulk_ensure_seller_groups(db, [seller.user_id]).get(seller.user_id)
+    if not group_id:
+        return
     
     # Asignar cliente al grupo
     # Si ya tiene un grupo asignado y es diferente, removerlo primero
     customer_info = db.query(CustomerInfo).filter(CustomerInfo.customer_id == customer_id).first()
     
     if customer_info and customer_info.sales_group_id:
-        if customer_info.sales_group_id == group.sales_group_id:
+        if customer_info.sales_group_id == group_id:
             return # Ya esta en el grupo correcto
             
         # Remover del grupo anterior
@@ -157,58 +155,71 @@ def assign_customer_to_agent_group(db: Session, customer_id: int, agent_id: int)
             db.add(new_info)
             db.commit()
             
-        assign_customer_to_sales_group(db, group.sales_group_id, customer_id)
+        assign_customer_to_sales_group(db, group_id, customer_id)
     except Exception as e:
         print(f"Error assigning customer to group: {e}")
         # Fallback: actualizacion directa si falla lo anterior
         if customer_info:
-            customer_info.sales_group_id = group.sales_group_id
+            customer_info.sales_group_id = group_id
+            db.flush()
+            refresh_ticket_visibility(db, [customer_id])
             db.commit()
 
 
-def bulk_assign_customers_to_agent_groups(db: Session, customer_agent_pairs: List[dict]) -> None:
+def bulk_assign_customers_to_agent_groups(db: Session, customer_agent_pairs: List[dict]) -> Dict[str, int]:
     """
     Asigna múltiples clientes a grupos de sellers de forma optimizada (BULK).
+
+    Un solo UPDATE ... FROM (VALUES ...) por lote; solo toca las filas cuyo grupo cambia.
     
     Args:
         db: Sesión de base de datos
         customer_agent_pairs: Lista de dicts con {'customer_id': int, 'agent_id': int}
+
+    Returns:
+        {"solicitados": n, "reasignados": filas cambiadas, "sin_grupo": pares cuyo agente no existe}
     """
+    counts = {"solicitados": len(customer_agent_pairs), "reasignados": 0, "sin_grupo": 0}
     if not customer_agent_pairs:
-        return
+        return counts
     
     # 1. Obtener todos los agent_ids únicos
     unique_agent_ids = list({pair['agent_id'] for pair in customer_agent_pairs if pair.get('agent_id')})
     if not unique_agent_ids:
-        return
+        counts["sin_grupo"] = len(customer_agent_pairs)
+        return counts
     
-    # 2. Asegurar grupos y asignaciones de sellers (Reutilizamos logica)
-    bulk_ensure_seller_groups(db, unique_agent_ids)
-    
-    # 3. Obtener sellers y grupos para mapeo (necesario para asignar clientes)
-    sellers = db.query(User).filter(User.user_id.in_(unique_agent_ids)).all()
-    seller_map = {s.user_id: s for s in sellers}
-    
-    expected_group_names = [f"Grupo {seller.full_name}" for seller in sellers]
-    existing_groups = db.query(SalesGroup).filter(
-        SalesGroup.group_name.in_(expected_group_names)
-    ).all()
-    group_name_map = {g.group_name: g for g in existing_groups}
-    
-    # 8. Asignar clientes a grupos (bulk update de CustomerInfo)
+    # 2. Asegurar grupos y asignaciones de sellers: {seller_id: sales_group_id}
+    group_by_seller = bulk_ensure_seller_groups(db, unique_agent_ids)
+
+    # 3. Pares (cliente, grupo) — si un cliente se repite gana el ultimo
+    target_groups = {}
     for pair in customer_agent_pairs:
-        agent_id = pair.get('agent_id')
-        if not agent_id:
+        group_id = group_by_seller.get(pair.get('agent_id'))
+        if group_id is None:
+            counts["sin_grupo"] += 1
             continue
-        
-        seller = seller_map.get(agent_id)
-        if not seller:
-            continue
-        
-        group_name = f"Grupo {seller.full_name}"
-        group = group_name_map.get(group_name)
-        if group:
-            # Update CustomerInfo con el sales_group_id
-            db.query(CustomerInfo).filter(
-                CustomerInfo.customer_id == pair['customer_id']
-            ).update({'sales_group_id': group.sales_group_id})
+        target_groups[pair['customer_id']] = group_id
+
+    # 4. UPDATE customerinfo SET sales_group_id = v.sales_group_id FROM (VALUES ...) v
+    #    RETURNING: solo los clientes que realmente cambiaron de grupo
+    rows = list(target_groups.items())
+    reassigned_ids = []
+    for start in range(0, len(rows), GROUP_ASSIGN_CHUNK_SIZE):
+        targets = values(
+            column('customer_id', Integer), column('sales_group_id', Integer), name='targets'
+        ).data(rows[start:start + GROUP_ASSIGN_CHUNK_SIZE]).cte('targets')
+        reassigned_ids += db.execute(
+            update(CustomerInfo).where(
+                CustomerInfo.customer_id == targets.c.customer_id,
+                CustomerInfo.sales_group_id.is_distinct_from(targets.c.sales_group_id)
+            ).values(sales_group_id=targets.c.sales_group_id).returning(CustomerInfo.customer_id),
+            execution_options={"synchronize_session": False}
+        ).scalars().all()
+    counts["reasignados"] = len(reassigned_ids)
+
+    # Tickets de los clientes que cambiaron de grupo (sin reasignados no se toca tickets)
+    for start in range(0, len(reassigned_ids), GROUP_ASSIGN_CHUNK_SIZE):
+        refresh_ticket_visibility(db, reassigned_ids[start:start + GROUP_ASSIGN_CHUNK_SIZE])
+
+    return counts
@@ -0,0 +1,74 @@
+"""
+Benchmark de carga del carrito (GET /orders/cart) con 10 / 100 / 500 lineas
+
+Compara:
+- anterior: joinedload de productos + get_catalog_product_info por linea (1 query extra por item)
+- actual:   crud_cart.get_cart_snapshot (una sola query con precios y totales)
+
+Uso (desde la carpeta backend):
+    python tests/bench_cart_load.py
+    BENCH_DATABASE_URL=postgresql://... python tests/bench_cart_load.py
+"""
+from decimal import Decimal
+
+from bench_utils import bench_session, timed
+
+from sqlalchemy.orm import joinedload
+
+from crud.crud_cart import get_cart_snapshot
+from db.base import CartCache, Category, Customer, CustomerInfo, PriceList, PriceListItem, Product
+from utils.price_utils import get_catalog_product_info
+
+TABLES = ["users", "customers", "salesgroups", "categories", "products", "pricelists",
+          "pricelistitems", "customerinfo", "cartcache"]
+SIZES = (10, 100, 500)
+CUSTOMER_ID = 990001
+
+
+def legacy_get_cart(db, customer_id):
+    # Implementacion anterior (referencia para comparar)
+    cart_items = db.query(CartCache).options(
+        joinedload(CartCache.product).joinedload(Product.category)
+    ).filter(CartCache.customer_id == customer_id).all()
+    customer_info = db.query(CustomerInfo).filter(CustomerInfo.customer_id == customer_id).first()
+    result = []
+    for item in cart_items:
+        product_data = get_catalog_product_info(db, item.product, customer_info.price_list_id)
+        result.append({"cart_cache_id": item.cart_cache_id, "product": product_data})
+    return result
+
+
+def seed(db, lines: int):
+    db.query(CartCache).filter(CartCache.customer_id == CUSTOMER_ID).delete()
+    for i in range(lines):
+        pid = f"BENCH{i:05d}"
+        if db.get(Product, pid) is None:
+            db.add(Product(product_id=pid, name=f"Producto {i}", base_price=Decimal("10.00") + i,
+                           iva_percentage=Decimal("16.00"), stock_count=100, is_active=True,
+                           category_id=990001))
+            db.add(PriceListItem(price_list_id=990001, product_id=pid, markup_percentage=Decimal("25.00"),
+                                 final_price=Decimal("12.00") + i))
+        db.add(CartCache(customer_id=CUSTOMER_ID, product_id=pid, quantity=1 + i % 5))
+    db.flush()
+
+
+def main():
+    with bench_session(TABLES) as db:
+        db.add(Category(category_id=990001, name="Bench"))
+        db.add(PriceList(price_list_id=990001, list_name="Bench"))
+        db.add(Customer(customer_id=CUSTOMER_ID, username="bench.cart", password_hash="x"))
+        db.flush()
+        db.add(CustomerInfo(customer_id=CUSTOMER_ID, business_name="Bench", price_list_id=990001))
+        db.flush()
+
+        print(f"{'lineas':>7} | {'anterior ms':>11} {'queries':>7} | {'actual ms':>9} {'queries':>7}")
+        for lines in SIZES:
+            seed(db, lines)
+            old_ms, old_q, _ = timed(legacy_get_cart, db, CUSTOMER_ID)
+            new_ms, new_q, snapshot = timed(get_cart_snapshot, db, CUSTOMER_ID)
+            assert snapshot["item_count"] == lines
+            print(f"{lines:>7} | {old_ms:>11.1f} {old_q:>7} | {new_ms:>9.1f} {new_q:>7}")
+
+
+if __name__ == "__main__":
+    main()
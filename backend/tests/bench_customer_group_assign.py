@@ -0,0 +1,109 @@
+"""
+Benchmark de la asignacion cliente -> grupo del agente durante la sync (10,000 clientes)
+
+Compara:
+- anterior: un UPDATE customerinfo por cliente, grupo buscado por nombre "Grupo {full_name}"
+- actual:   sales_group_utils.bulk_assign_customers_to_agent_groups
+            (UPDATE ... FROM (VALUES ...) por lotes, grupo por salesgroups.owner_seller_id)
+
+Escenarios: sync inicial (todos cambian de grupo) y re-sync sin cambios.
+Tambien verifica que renombrar a un vendedor NO crea un grupo nuevo.
+
+Uso (desde la carpeta backend):
+    python tests/bench_customer_group_assign.py
+    BENCH_DATABASE_URL=postgresql://... python tests/bench_customer_group_assign.py
+"""
+from bench_utils import bench_session, timed
+
+from db.base import Customer, CustomerInfo, SalesGroup, User, UserRole
+from utils.sales_group_utils import bulk_assign_customers_to_agent_groups, bulk_ensure_seller_groups
+
+TABLES = ["users", "customers", "salesgroups", "groupsellers", "pricelists", "customerinfo", "tickets",
+          "cache_versions"]
+CUSTOMERS = 10_000
+SELLERS = 40
+BASE_ID = 880000
+
+
+def legacy_assign(db, customer_agent_pairs):
+    # Implementacion anterior (referencia para comparar)
+    unique_agent_ids = list({pair['agent_id'] for pair in customer_agent_pairs if pair.get('agent_id')})
+    bulk_ensure_seller_groups(db, unique_agent_ids)
+    sellers = db.query(User).filter(User.user_id.in_(unique_agent_ids)).all()
+    seller_map = {s.user_id: s for s in sellers}
+    group_name_map = {g.group_name: g for g in db.query(SalesGroup).filter(
+        SalesGroup.group_name.in_([f"Grupo {s.full_name}" for s in sellers])).all()}
+    for pair in customer_agent_pairs:
+        seller = seller_map.get(pair['agent_id'])
+        group = group_name_map.get(f"Grupo {seller.full_name}") if seller else None
+        if group:
+            db.query(CustomerInfo).filter(
+                CustomerInfo.customer_id == pair['customer_id']
+            ).update({'sales_group_id': group.sales_group_id})
+
+
+def seed(db):
+    db.add_all([User(user_id=BASE_ID + s, username=f"bench.seller{s}", email=f"seller{s}@bench.local",
+                     full_name=f"Vendedor {s}", password_hash="x", role=UserRole.seller)
+                for s in range(SELLERS)])
+    db.flush()
+    db.add_all([Customer(customer_id=BASE_ID + c, username=f"bench.cust{c}", password_hash="x",
+                         agent_id=BASE_ID + c % SELLERS) for c in range(CUSTOMERS)])
+    db.flush()
+    db.add_all([CustomerInfo(customer_id=BASE_ID + c, business_name=f"Farmacia {c}") for c in range(CUSTOMERS)])
+    db.commit()
+    return [{'customer_id': BASE_ID + c, 'agent_id': BASE_ID + c % SELLERS}
+            for c in range(CUSTOMERS)]
+
+
+def reset_groups(db):
+    db.query(CustomerInfo).filter(CustomerInfo.customer_id >= BASE_ID).update(
+        {'sales_group_id': None}, synchronize_session=False)
+    db.commit()
+
+
+def measure(fn, db, pairs, reset: bool, repeat: int = 3):
+    best, queries = float("inf"), 0
+    for _ in range(repeat):
+        if reset:
+            reset_groups(db)
+        ms, queries, _ = timed(fn, db, pairs, repeat=1)
+        best = min(best, ms)
+    return best, queries
+
+
+def main():
+    with bench_session(TABLES) as db:
+        pairs = seed(db)
+        bulk_ensure_seller_groups(db, [BASE_ID + s for s in range(SELLERS)])
+
+        print(f"{'escenario':>16} | {'anterior ms':>11} {'queries':>7} | {'actual ms':>9} {'queries':>7}")
+        for name, reset in (("sync inicial", True), ("re-sync igual", False)):
+            old_ms, old_q = measure(legacy_assign, db, pairs, reset)
+            old_state = sorted(db.query(CustomerInfo.customer_id, CustomerInfo.sales_group_id).all())
+            new_ms, new_q = measure(bulk_assign_customers_to_agent_groups, db, pairs, reset)
+            assert sorted(db.query(CustomerInfo.customer_id, CustomerInfo.sales_group_id).all()) == old_state
+            print(f"{name:>16} | {old_ms:>11.1f} {old_q:>7} | {new_ms:>9.1f} {new_q:>7}")
+
+        # rowcount de UPDATE ... FROM con CTE solo es confiable en Postgres (sqlite3 reporta -1)
+        exact_counts = db.get_bind().dialect.name == "postgresql"
+        reset_groups(db)
+        counts = bulk_assign_customers_to_agent_groups(db, pairs)
+        assert not exact_counts or counts["reasignados"] == CUSTOMERS, counts
+        counts = bulk_assign_customers_to_agent_groups(db, pairs)
+        assert not exact_counts or counts["reasignados"] == 0, counts
+
+        # Renombrar un vendedor: el grupo sigue siendo el mismo (antes se creaba "Grupo <nuevo nombre>")
+        groups_before = db.query(SalesGroup).count()
+        state_before = sorted(db.query(CustomerInfo.customer_id, CustomerInfo.sales_group_id).all())
+        db.get(User, BASE_ID).full_name = "Vendedor Renombrado"
+        db.commit()
+        counts = bulk_assign_customers_to_agent_groups(db, pairs)
+        assert not exact_counts or counts["reasignados"] == 0, counts
+        assert db.query(SalesGroup).count() == groups_before
+        assert sorted(db.query(CustomerInfo.customer_id, CustomerInfo.sales_group_id).all()) == state_before
+        print("renombrar un vendedor no crea grupo nuevo ni mueve a sus clientes: OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark de "cargar lista de favoritos al carrito" con 50 / 200 / 1000 items
+
+Compara:
+- anterior: por item una query al carrito + add_to_cart (re-lee producto y carrito, commit por item)
+- actual:   crud_favorite.load_favorite_list_to_cart (una query unida + un upsert + un commit)
+
+Cada corrida parte del mismo carrito (la mitad de los productos ya estan en el carrito
+y algunos quedan topados por stock) y se verifica que ambas versiones generen las
+mismas notificaciones y el mismo carrito final.
+
+Uso (desde la carpeta backend):
+    python tests/bench_favorites_to_cart.py
+    BENCH_DATABASE_URL=postgresql://... python tests/bench_favorites_to_cart.py
+"""
+import uuid
+from decimal import Decimal
+
+from bench_utils import bench_session, timed
+
+from crud.crud_favorite import get_favorite_list, load_favorite_list_to_cart
+from db.base import CartCache, Customer, FavoriteList, FavoriteListItem, Product
+
+TABLES = ["users", "customers", "salesgroups", "categories", "products", "cartcache",
+          "favoritelists", "favoritelistitems"]
+SIZES = (50, 200, 1000)
+CUSTOMER_ID = 990002
+
+
+def legacy_add_to_cart(db, customer_id, product_id, quantity):
+    # crud_cart.add_to_cart(cap_at_stock=True) anterior: 2 queries + commit por llamada
+    product = db.query(Product).filter(Product.product_id == product_id).first()
+    if not product or not product.is_active:
+        raise ValueError("Producto no disponible")
+    cart_item = db.query(CartCache).filter(
+        CartCache.customer_id == customer_id, CartCache.product_id == product_id
+    ).first()
+    current_qty = cart_item.quantity if cart_item else 0
+    total_qty = current_qty + quantity
+    if total_qty > product.stock_count:
+        total_qty = product.stock_count
+        if total_qty == current_qty:
+            raise ValueError("Ya tienes el máximo stock disponible en el carrito")
+    if cart_item:
+        cart_item.quantity = total_qty
+    else:
+        cart_item = CartCache(customer_id=customer_id, product_id=product_id, quantity=total_qty)
+        db.add(cart_item)
+    db.commit()
+    db.refresh(cart_item)
+    return cart_item
+
+
+def legacy_load_favorite_list_to_cart(db, list_id, customer_id):
+    # Implementacion anterior (referencia para comparar)
+    fav_list = get_favorite_list(db, list_id, customer_id)
+    notifications = []
+    added_count = 0
+    for item in fav_list.items:
+        try:
+            prod_name = item.product.name if item.product else item.product_id
+            current_cart_item = db.query(CartCache).filter(
+                CartCache.customer_id == customer_id, CartCache.product_id == item.product_id
+            ).first()
+            current_qty = current_cart_item.quantity if current_cart_item else 0
+            db_cart = legacy_add_to_cart(db, customer_id, item.product_id, item.quantity)
+            if db_cart.quantity < (current_qty + item.quantity):
+                notifications.append(f"⚠️ '{prod_name}': Cantidad ajustada al máximo disponible ({db_cart.quantity}).")
+            else:
+                notifications.append(f"✅ '{prod_name}' agregado al carrito.")
+            added_count += 1
+        except ValueError as e:
+            notifications.append(f"❌ No se pudo agregar '{item.product_id}': {str(e)}")
+    return {"added_count": added_count, "notifications": notifications}
+
+
+def seed(db, items: int):
+    fav_list = FavoriteList(list_id=uuid.uuid4(), customer_id=CUSTOMER_ID, name=f"Bench {items}")
+    db.add(fav_list)
+    db.flush()
+    for i in range(items):
+        pid = f"FAV{i:05d}"
+        if db.get(Product, pid) is None:
+            # Cada 7o producto inactivo, cada 5o con poco stock
+            db.add(Product(product_id=pid, name=f"Producto {i}", base_price=Decimal("10.00"),
+                           stock_count=4 if i % 5 == 0 else 100, is_active=i % 7 != 3))
+        db.add(FavoriteListItem(list_item_id=uuid.uuid4(), list_id=fav_list.list_id,
+                                product_id=pid, quantity=1 + i % 3))
+    db.commit()
+    return fav_list.list_id
+
+
+def reset_cart(db, items: int):
+    db.query(CartCache).filter(CartCache.customer_id == CUSTOMER_ID).delete()
+    for i in range(0, items, 2):
+        db.add(CartCache(customer_id=CUSTOMER_ID, product_id=f"FAV{i:05d}", quantity=4 if i % 5 == 0 else 2))
+    db.commit()
+
+
+def cart_state(db):
+    return sorted(db.query(CartCache.product_id, CartCache.quantity)
+                  .filter(CartCache.customer_id == CUSTOMER_ID).all())
+
+
+def measure(fn, db, list_id, items, repeat=3):
+    # El carrito se restaura antes de cada corrida (fuera de la medicion)
+    best, queries, result = float("inf"), 0, None
+    for _ in range(repeat):
+        reset_cart(db, items)
+        ms, queries, result = timed(fn, db, list_id, CUSTOMER_ID, repeat=1)
+        best = min(best, ms)
+    return best, queries, result
+
+
+def main():
+    with bench_session(TABLES) as db:
+        db.add(Customer(customer_id=CUSTOMER_ID, username="bench.fav", password_hash="x"))
+        db.commit()
+
+        print(f"{'items':>6} | {'anterior ms':>11} {'queries':>7} | {'actual ms':>9} {'queries':>7}")
+        for items in SIZES:
+            list_id = seed(db, items)
+            old_ms, old_q, old = measure(legacy_load_favorite_list_to_cart, db, list_id, items)
+            old_cart = cart_state(db)
+            new_ms, new_q, new = measure(load_favorite_list_to_cart, db, list_id, items)
+            assert sorted(new["notifications"]) == sorted(old["notifications"])
+            assert new["added_count"] == old["added_count"]
+            assert cart_state(db) == old_cart
+            print(f"{items:>6} | {old_ms:>11.1f} {old_q:>7} | {new_ms:>9.1f} {new_q:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark de la verificacion de imagenes durante la sync (carpeta con 30,000 WebP)
+
+Compara, para 40,000 productos (30,000 con imagen):
+- anterior: verificar_imagen_existe -> un Path.exists (stat) por producto
+- actual:   crear_verificador_imagenes -> un solo os.scandir + busqueda en memoria
+
+Tambien verifica que:
+- ambos devuelven exactamente las mismas URLs
+- la segunda corrida detecta solo las imagenes nuevas/modificadas/borradas
+- si la carpeta no se puede leer, se usa el inventario anterior (no se pierden image_url)
+
+En una unidad de red la diferencia es mucho mayor: cada stat es un viaje por la red.
+
+Uso (desde la carpeta backend):
+    python tests/bench_image_manifest.py
+    BENCH_IMAGES_FOLDER=Z:\\compressedIMG python tests/bench_image_manifest.py   (carpeta real, solo lectura)
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "ecommerce", "servicios"))
+
+from sync_functions import image_manifest  # noqa: E402
+from sync_functions.api_helpers import verificar_imagen_existe  # noqa: E402
+
+IMAGES = 30_000
+PRODUCTS = 40_000
+CDN_URL = "https://img.example.com"
+
+
+def crear_carpeta(folder):
+    for i in range(IMAGES):
+        (folder / f"FAR{i}.webp").write_bytes(b"x" * (i % 50))
+    (folder / "notas.txt").write_text("no es imagen")
+
+
+def medir(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    tmp = Path(tempfile.mkdtemp(prefix="bench_img_"))
+    real_folder = os.environ.get("BENCH_IMAGES_FOLDER")
+    folder = Path(real_folder) if real_folder else tmp / "img"
+    cache_path = tmp / "manifest.json"
+    try:
+        if not real_folder:
+            folder.mkdir()
+            crear_carpeta(folder)
+        product_ids = [f"FAR{i}" for i in range(PRODUCTS)]
+
+        def anterior():
+            return [verificar_imagen_existe(pid, folder, CDN_URL) for pid in product_ids]
+
+        def actual():
+            image_manifest._manifiestos.clear()
+            check_img = image_manifest.crear_verificador_imagenes(folder, CDN_URL, cache_path)
+            return [check_img(pid) for pid in product_ids]
+
+        old_ms, old_urls = medir(anterior)
+        new_ms, new_urls = medir(actual)
+        assert old_urls == new_urls
+        print(f"{PRODUCTS} productos: anterior {old_ms:.1f} ms ({PRODUCTS} stats) | actual {new_ms:.1f} ms (1 scandir)")
+
+        if real_folder:
+            return
+
+        # Segunda corrida: 1 nueva, 1 modificada, 1 borrada
+        (folder / "NUEVA1.webp").write_bytes(b"n")
+        (folder / "FAR1.webp").write_bytes(b"modificada")
+        (folder / "FAR2.webp").unlink()
+        anterior_manifiesto = image_manifest._leer_cache(cache_path, str(folder))
+        image_manifest._manifiestos.clear()
+        manifiesto = image_manifest.cargar_manifiesto_imagenes(folder, cache_path)
+        nuevas, modificadas, eliminadas = image_manifest.comparar_manifiestos(anterior_manifiesto, manifiesto)
+        assert (nuevas, modificadas, eliminadas) == (["NUEVA1"], ["FAR1"], ["FAR2"]), (nuevas, modificadas, eliminadas)
+        print("segunda corrida detecta 1 nueva, 1 modificada, 1 borrada: OK")
+
+        # Carpeta inaccesible: se conserva el inventario anterior
+        shutil.rmtree(folder)
+        image_manifest._manifiestos.clear()
+        check_img = image_manifest.crear_verificador_imagenes(folder, CDN_URL, cache_path)
+        assert check_img("FAR3") == f"{CDN_URL}/FAR3.webp"
+        print("carpeta inaccesible usa el inventario anterior: OK")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
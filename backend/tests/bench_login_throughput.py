@@ -0,0 +1,87 @@
+"""
+Benchmark de throughput de login (Argon2)
+
+Compara el flujo anterior (hasta 2 verificaciones Argon2 por login; /auth/login era un
+`def` sincrono y corria en el threadpool de Starlette, hasta 40 hilos) contra el flujo
+actual (1 verificacion en el executor dedicado de core.security).
+
+Mide:
+- logins/s con N logins concurrentes
+- latencia maxima del event loop mientras se verifican hashes (un ping cada 10ms)
+
+Uso (desde la carpeta backend):
+    python tests/bench_login_throughput.py [concurrencia] [workers]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "farmacruz_api"))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("FRONTEND_URL", "*")
+
+from starlette.concurrency import run_in_threadpool  # noqa: E402
+
+from core import security  # noqa: E402
+
+PASSWORD = "farmacruz-bench"
+
+
+async def _loop_lag(stop: asyncio.Event) -> float:
+    # Retraso maximo observado del event loop (ms)
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        worst = max(worst, (time.perf_counter() - start - 0.01) * 1000)
+    return worst
+
+
+async def run_old(hashed: str, concurrency: int) -> tuple:
+    # Flujo anterior: customer con password incorrecto -> segundo Argon2 contra users,
+    # todo dentro del endpoint sincrono (threadpool de Starlette, como lo ejecutaba FastAPI)
+    def one():
+        security.verify_password("incorrecta", hashed)
+        security.verify_password("incorrecta", hashed)
+
+    stop = asyncio.Event()
+    lag = asyncio.create_task(_loop_lag(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(run_in_threadpool(one) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return elapsed, await lag
+
+
+async def run_new(hashed: str, concurrency: int) -> tuple:
+    # Flujo actual: un solo Argon2 en el executor acotado
+    stop = asyncio.Event()
+    lag = asyncio.create_task(_loop_lag(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        security.verify_and_update_password_async("incorrecta", hashed) for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return elapsed, await lag
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    if len(sys.argv) > 2:
+        security.PASSWORD_HASH_WORKERS = int(sys.argv[2])
+
+    hashed = security.get_password_hash(PASSWORD)
+    print(f"Logins concurrentes: {concurrency} | workers Argon2: {security.PASSWORD_HASH_WORKERS}")
+
+    for name, runner in (("anterior (2 hashes, threadpool)", run_old), ("actual (1 hash, executor)", run_new)):
+        elapsed, lag = asyncio.run(runner(hashed, concurrency))
+        print(f"  {name:<34} {concurrency / elapsed:8.1f} logins/s | lag max loop {lag:8.1f} ms")
+
+    security.shutdown_hash_executor()
+
+
+if __name__ == "__main__":
+    main()
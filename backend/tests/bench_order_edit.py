@@ -0,0 +1,155 @@
+"""
+Benchmark de la edicion de pedidos con 20 / 100 / 400 lineas
+
+Compara:
+- anterior: por linea una query a Product y otra a PriceListItem, reescribe todas las lineas
+- actual:   crud_order_edit.edit_order_items (precios de todas las lineas en una query,
+            diff de items y sentencias bulk solo para lo que cambia)
+
+Edicion tipica: se cambia la cantidad de 5 lineas, se borran 2 y se agregan 2.
+Se verifica que ambas versiones dejen el mismo pedido (items, total y ganancia)
+y que una edicion con una version vieja se rechace con 409.
+
+Uso (desde la carpeta backend):
+    python tests/bench_order_edit.py
+    BENCH_DATABASE_URL=postgresql://... python tests/bench_order_edit.py
+"""
+from decimal import Decimal
+
+from fastapi import HTTPException
+
+from bench_utils import bench_session, timed
+
+from crud.crud_order_edit import edit_order_items
+from db.base import Customer, CustomerInfo, Order, OrderItem, OrderStatus, PriceList, PriceListItem, Product
+from schemas.order_edit import OrderItemEdit
+from utils.price_utils import apply_iva, calculate_final_price_with_markup
+
+TABLES = ["users", "customers", "salesgroups", "categories", "products", "pricelists", "pricelistitems",
+          "customerinfo", "orders", "orderitems"]
+SIZES = (20, 100, 400)
+CUSTOMER_ID = 990003
+PRICE_LIST_ID = 990003
+PRODUCTS = 420
+
+
+def legacy_edit_order_items(db, order_id, items, customer_id):
+    # Implementacion anterior (referencia para comparar)
+    order = db.query(Order).filter(Order.order_id == order_id).first()
+    price_list_id = db.query(CustomerInfo).filter(CustomerInfo.customer_id == customer_id).first().price_list_id
+    existing_items = {item.order_item_id: item for item in order.items}
+    items_to_keep = set()
+    new_total, new_profit = Decimal("0.00"), Decimal("0.00")
+    for item_data in items:
+        product = db.query(Product).filter(Product.product_id == item_data.product_id).first()
+        price_item = db.query(PriceListItem).filter(
+            PriceListItem.price_list_id == price_list_id, PriceListItem.product_id == item_data.product_id
+        ).first()
+        base_price = Decimal(str(product.base_price or 0))
+        markup_percentage = Decimal(str(price_item.markup_percentage or 0))
+        iva_percentage = Decimal(str(product.iva_percentage or 0))
+        price_without_iva = calculate_final_price_with_markup(base_price, markup_percentage, Decimal(str(price_item.final_price)))
+        final_price = apply_iva(price_without_iva, iva_percentage)
+        values = dict(product_id=item_data.product_id, quantity=item_data.quantity, base_price=base_price,
+                      markup_percentage=markup_percentage, iva_percentage=iva_percentage,
+                      price_without_iva=price_without_iva, final_price=final_price)
+        if item_data.order_item_id in existing_items:
+            for field, value in values.items():
+                setattr(existing_items[item_data.order_item_id], field, value)
+            items_to_keep.add(item_data.order_item_id)
+        else:
+            db.add(OrderItem(order_id=order_id, **values))
+        new_total += final_price * item_data.quantity
+        new_profit += (price_without_iva - base_price) * item_data.quantity
+    for item_id, item in existing_items.items():
+        if item_id not in items_to_keep:
+            db.delete(item)
+    order.total_amount = new_total + Decimal(str(order.shipping_cost or 0))
+    order.order_profit = new_profit
+    db.commit()
+    db.refresh(order)
+    return order
+
+
+def seed(db):
+    db.add(Customer(customer_id=CUSTOMER_ID, username="bench_edit", email="bench_edit@example.com",
+                    password_hash="x", full_name="Cliente Bench"))
+    db.add(PriceList(price_list_id=PRICE_LIST_ID, list_name="Bench edicion"))
+    db.flush()
+    db.add(CustomerInfo(customer_id=CUSTOMER_ID, business_name="Bench", price_list_id=PRICE_LIST_ID))
+    for i in range(PRODUCTS):
+        base_price = Decimal(10 + i % 90)
+        db.add(Product(product_id=f"BEDIT{i}", name=f"Producto {i}", base_price=base_price,
+                       iva_percentage=Decimal("16.00"), stock_count=1000, is_active=True))
+        db.add(PriceListItem(price_list_id=PRICE_LIST_ID, product_id=f"BEDIT{i}",
+                             markup_percentage=Decimal("25.00"), final_price=(base_price * Decimal("1.25")).quantize(Decimal("0.01"))))
+    db.commit()
+
+
+def reset_order(db, order_id, lines):
+    db.query(OrderItem).filter(OrderItem.order_id == order_id).delete(synchronize_session=False)
+    db.query(Order).filter(Order.order_id == order_id).delete(synchronize_session=False)
+    db.expunge_all()
+    db.add(Order(order_id=order_id, customer_id=CUSTOMER_ID, status=OrderStatus.approved, shipping_cost=Decimal("50.00")))
+    db.flush()
+    for i in range(lines):
+        db.add(OrderItem(order_id=order_id, product_id=f"BEDIT{i}", quantity=1 + i % 3,
+                         base_price=Decimal(10 + i % 90), markup_percentage=Decimal("25.00"), iva_percentage=Decimal("16.00"),
+                         price_without_iva=(Decimal(10 + i % 90) * Decimal("1.25")).quantize(Decimal("0.01")),
+                         final_price=apply_iva((Decimal(10 + i % 90) * Decimal("1.25")).quantize(Decimal("0.01")), Decimal("16.00"))))
+    db.commit()
+    db.expire_all()
+
+
+def typical_edit(db, order_id, lines):
+    # Cambia 5 cantidades, borra las 2 ultimas lineas y agrega 2 productos nuevos
+    current = db.query(OrderItem.order_item_id, OrderItem.product_id, OrderItem.quantity).filter(
+        OrderItem.order_id == order_id).order_by(OrderItem.product_id).all()
+    current.sort(key=lambda row: int(row.product_id[5:]))
+    items = [OrderItemEdit(order_item_id=row.order_item_id, product_id=row.product_id,
+                           quantity=row.quantity + (10 if i < 5 else 0))
+             for i, row in enumerate(current[:-2])]
+    items += [OrderItemEdit(product_id=f"BEDIT{lines + j}", quantity=4) for j in range(2)]
+    return items
+
+
+def snapshot(db, order_id):
+    order = db.get(Order, order_id)
+    items = sorted((i.product_id, i.quantity, i.final_price) for i in db.query(OrderItem).filter(OrderItem.order_id == order_id))
+    return order.total_amount, order.order_profit, items
+
+
+def main():
+    with bench_session(TABLES) as db:
+        seed(db)
+        print(f"{'lineas':>7} | {'anterior ms':>11} {'queries':>7} | {'actual ms':>9} {'queries':>7}")
+        for size in SIZES:
+            order_id = 990000 + size
+            reset_order(db, order_id, size)
+            items = typical_edit(db, order_id, size)
+
+            old_ms, old_q, _ = timed(legacy_edit_order_items, db, order_id, items, CUSTOMER_ID, repeat=1)
+            old_state = snapshot(db, order_id)
+
+            reset_order(db, order_id, size)
+            items = typical_edit(db, order_id, size)
+            new_ms, new_q, _ = timed(edit_order_items, db, order_id, items, CUSTOMER_ID, repeat=1)
+            assert snapshot(db, order_id) == old_state
+            print(f"{size:>7} | {old_ms:>11.1f} {old_q:>7} | {new_ms:>9.1f} {new_q:>7}")
+
+        # Dos usuarios abren la version 2; el primero guarda (version 3) y el segundo recibe 409
+        order_id = 990000 + SIZES[0]
+        version = db.get(Order, order_id).version
+        items = typical_edit(db, order_id, SIZES[0])
+        edit_order_items(db, order_id, items, CUSTOMER_ID, expected_version=version)
+        try:
+            edit_order_items(db, order_id, items, CUSTOMER_ID, expected_version=version)
+            raise AssertionError("la segunda edicion con version vieja debio fallar")
+        except HTTPException as e:
+            assert e.status_code == 409, e.status_code
+            db.rollback()
+        print("edicion con version vieja rechazada con 409: OK")
+
+
+if __name__ == "__main__":
+    main()
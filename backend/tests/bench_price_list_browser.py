@@ -0,0 +1,117 @@
+"""
+Benchmark del administrador de listas de precios (lista con 20,000 items)
+
+Compara:
+- detalle:     items-with-details ordenado por precio final (anterior: trae toda la lista
+               y calcula/ordena en Python; actual: precios y ORDER BY en SQL, solo la pagina)
+- disponibles: available-products con NOT IN (subquery) vs NOT EXISTS
+- masivo:      bulk de 4,000 markups (anterior: create_price_list_item con un commit por item;
+               actual: un INSERT ... ON CONFLICT por lote y un solo commit)
+
+Se verifica que ambas versiones devuelvan los mismos precios y dejen la lista igual.
+
+Uso (desde la carpeta backend):
+    python tests/bench_price_list_browser.py
+    BENCH_DATABASE_URL=postgresql://... python tests/bench_price_list_browser.py
+"""
+from decimal import Decimal
+
+from bench_utils import bench_session, timed
+
+from crud import crud_price_list
+from db.base import PriceList, PriceListItem, Product
+from schemas.price_list import PriceListItemCreate
+from utils.price_utils import calculate_catalog_price, calculate_final_price_with_markup
+
+TABLES = ["categories", "products", "pricelists", "pricelistitems"]
+PRICE_LIST_ID = 990043
+ITEMS = 20_000
+FREE_PRODUCTS = 2_000
+BULK = 4_000
+PAGE = 50
+
+
+def seed(db):
+    db.add(PriceList(price_list_id=PRICE_LIST_ID, list_name="Bench administrador"))
+    products, items = [], []
+    for i in range(ITEMS + FREE_PRODUCTS):
+        base_price = Decimal(10 + i % 997) + Decimal(i % 100) / 100
+        products.append({"product_id": f"BPL{i:06d}", "name": f"Producto {i % 5000:04d}", "base_price": base_price,
+                         "iva_percentage": Decimal("16.00") if i % 3 else Decimal("0.00"), "stock_count": 10, "is_active": True})
+        if i < ITEMS:
+            markup = Decimal(5 + i % 40)
+            # Algunos items con precio del ERP mayor al calculado (proteccion de margen)
+            stored = calculate_final_price_with_markup(base_price, markup) + (Decimal("3.00") if i % 7 == 0 else 0)
+            items.append({"price_list_id": PRICE_LIST_ID, "product_id": f"BPL{i:06d}",
+                          "markup_percentage": markup, "final_price": stored})
+    db.flush()
+    db.bulk_insert_mappings(Product, products)
+    db.bulk_insert_mappings(PriceListItem, items)
+    db.commit()
+
+
+def legacy_details_sorted(db, price_list_id, skip, limit):
+    # Sin ORDER BY en SQL: para ordenar por precio hay que calcular toda la lista en Python
+    rows = db.query(PriceListItem, Product).join(Product, PriceListItem.product_id == Product.product_id).filter(
+        PriceListItem.price_list_id == price_list_id, Product.is_active == True).all()
+    results = []
+    for price_list_item, product in rows:
+        final_price = calculate_catalog_price(product, price_list_item)
+        results.append((round(float(final_price), 2), product.product_id))
+    results.sort(key=lambda r: (-r[0], r[1]))
+    return results[skip:skip + limit]
+
+
+def legacy_not_in(db, price_list_id, skip, limit):
+    in_list = db.query(PriceListItem.product_id).filter(PriceListItem.price_list_id == price_list_id).scalar_subquery()
+    return db.query(Product).filter(~Product.product_id.in_(in_list), Product.is_active == True).order_by(
+        Product.product_id).offset(skip).limit(limit).all()
+
+
+def legacy_bulk(db, price_list_id, items):
+    return [crud_price_list.create_price_list_item(db, price_list_id, item) for item in items]
+
+
+def snapshot(db):
+    return sorted(db.query(PriceListItem.product_id, PriceListItem.markup_percentage, PriceListItem.final_price).filter(
+        PriceListItem.price_list_id == PRICE_LIST_ID).all())
+
+
+def main():
+    with bench_session(TABLES) as db:
+        seed(db)
+        print(f"{'operacion':<12} | {'anterior ms':>11} {'queries':>7} | {'actual ms':>9} {'queries':>7}")
+
+        skip = 10 * PAGE
+        old_ms, old_q, old_page = timed(legacy_details_sorted, db, PRICE_LIST_ID, skip, PAGE)
+        new_ms, new_q, new_page = timed(crud_price_list.get_products_in_price_list_with_details, db, PRICE_LIST_ID,
+                                        skip, PAGE, None, "final_price", "desc")
+        assert [(r["final_price"], r["product"]["product_id"]) for r in new_page] == old_page
+        print(f"{'detalle':<12} | {old_ms:>11.1f} {old_q:>7} | {new_ms:>9.1f} {new_q:>7}")
+
+        old_ms, old_q, old_free = timed(legacy_not_in, db, PRICE_LIST_ID, 0, PAGE)
+        new_ms, new_q, new_free = timed(crud_price_list.get_products_not_in_price_list, db, PRICE_LIST_ID, 0, PAGE)
+        assert [p.product_id for p in old_free] == [p.product_id for p in new_free]
+        print(f"{'disponibles':<12} | {old_ms:>11.1f} {old_q:>7} | {new_ms:>9.1f} {new_q:>7}")
+
+        # Mitad productos ya en la lista (update) y mitad nuevos (insert), mas uno inexistente
+        items = [PriceListItemCreate(product_id=f"BPL{ITEMS - BULK // 2 + i:06d}", markup_percentage=Decimal("33.50"))
+                 for i in range(BULK)]
+        before = snapshot(db)
+        old_ms, old_q, _ = timed(legacy_bulk, db, PRICE_LIST_ID, items, repeat=1)
+        old_state = snapshot(db)
+
+        # Restaurar la lista y repetir con el upsert masivo
+        db.query(PriceListItem).filter(PriceListItem.price_list_id == PRICE_LIST_ID).delete(synchronize_session=False)
+        db.bulk_insert_mappings(PriceListItem, [{"price_list_id": PRICE_LIST_ID, "product_id": pid,
+                                                 "markup_percentage": m, "final_price": f} for pid, m, f in before])
+        db.commit()
+        items.append(PriceListItemCreate(product_id="NO_EXISTE", markup_percentage=Decimal("10.00")))
+        new_ms, new_q, result = timed(crud_price_list.bulk_update_price_list_items, db, PRICE_LIST_ID, items, repeat=1)
+        assert snapshot(db) == old_state
+        assert result == {"procesados": BULK, "no_encontrados": ["NO_EXISTE"]}, result
+        print(f"{'masivo':<12} | {old_ms:>11.1f} {old_q:>7} | {new_ms:>9.1f} {new_q:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark del repreciado masivo de una lista de precios (50,000 items)
+
+Compara, para "+3 puntos de markup a una categoria" y "x1.10 a toda la lista":
+- anterior: cargar items y productos con el ORM, calcular con calculate_final_price_with_markup
+            en Python y guardar (ya con un solo commit, mejor caso de item por item)
+- actual:   crud_price_list.reprice_price_list (un UPDATE ... FROM products)
+
+Se verifica que ambas versiones dejen la lista igual, que dry_run no modifique nada
+y que con keep_erp_price solo cambie el markup: el final_price del ERP se conserva y
+la proteccion de margen max(calculado, ERP) se aplica al leer, asi que subir y luego
+bajar el markup regresa el precio efectivo al original.
+
+Uso (desde la carpeta backend):
+    python tests/bench_price_list_repricing.py
+    BENCH_DATABASE_URL=postgresql://... python tests/bench_price_list_repricing.py
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from bench_utils import bench_session, timed
+
+from crud.crud_price_list import MAX_MARKUP_PERCENTAGE, reprice_price_list
+from db.base import Category, PriceList, PriceListItem, Product
+from schemas.price_list import PriceListRepricing
+from utils.price_utils import calculate_final_price_with_markup
+
+TABLES = ["categories", "products", "pricelists", "pricelistitems"]
+PRICE_LIST_ID = 990044
+ITEMS = 50_000
+CATEGORIES = 10
+RULES = [
+    ("+3 categoria", PriceListRepricing(operation="add", value=Decimal("3"), category_id=990001)),
+    ("x1.10 lista", PriceListRepricing(operation="multiply", value=Decimal("1.10"))),
+]
+
+
+def seed(db):
+    for c in range(CATEGORIES):
+        db.add(Category(category_id=990000 + c, name=f"Bench categoria {c}"))
+    db.add(PriceList(price_list_id=PRICE_LIST_ID, list_name="Bench repreciado"))
+    db.flush()
+    products, items = [], []
+    for i in range(ITEMS):
+        base_price = Decimal(10 + i % 997) + Decimal(i % 100) / 100
+        markup = Decimal(5 + i % 40) + Decimal(i % 4) / 4
+        products.append({"product_id": f"BRP{i:06d}", "name": f"Producto {i}", "base_price": base_price,
+                         "category_id": 990000 + i % CATEGORIES, "iva_percentage": Decimal("16.00"),
+                         "stock_count": 10, "is_active": True})
+        # 1 de cada 7 con precio del ERP arriba del calculado (proteccion de margen)
+        stored = calculate_final_price_with_markup(base_price, markup) + (Decimal("9.00") if i % 7 == 0 else 0)
+        items.append({"price_list_id": PRICE_LIST_ID, "product_id": f"BRP{i:06d}",
+                      "markup_percentage": markup, "final_price": stored})
+    db.bulk_insert_mappings(Product, products)
+    db.bulk_insert_mappings(PriceListItem, items)
+    db.commit()
+
+
+def legacy_reprice(db, price_list_id, rule):
+    rows = db.query(PriceListItem, Product).join(Product, PriceListItem.product_id == Product.product_id).filter(
+        PriceListItem.price_list_id == price_list_id)
+    if rule.category_id is not None:
+        rows = rows.filter(Product.category_id == rule.category_id)
+    affected = 0
+    for item, product in rows.all():
+        markup = Decimal(str(item.markup_percentage))
+        if rule.operation == "set":
+            new_markup = rule.value
+        elif rule.operation == "add":
+            new_markup = markup + rule.value
+        else:
+            new_markup = markup * rule.value
+        new_markup = min(max(new_markup.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP), Decimal("0")), MAX_MARKUP_PERCENTAGE)
+        if rule.keep_erp_price:
+            # El final_price del ERP no se toca
+            if new_markup != markup:
+                item.markup_percentage = new_markup
+                affected += 1
+            continue
+        new_final = calculate_final_price_with_markup(Decimal(str(product.base_price or 0)), new_markup)
+        if new_markup != markup or new_final != item.final_price:
+            item.markup_percentage = new_markup
+            item.final_price = new_final
+            affected += 1
+    db.commit()
+    return affected
+
+
+def snapshot(db):
+    return db.query(PriceListItem.product_id, PriceListItem.markup_percentage, PriceListItem.final_price).filter(
+        PriceListItem.price_list_id == PRICE_LIST_ID).order_by(PriceListItem.product_id).all()
+
+
+def effective_prices(db):
+    """ Precio que ve el cliente: max(calculado con el markup, final_price guardado) """
+    rows = db.query(PriceListItem.product_id, Product.base_price, PriceListItem.markup_percentage,
+                    PriceListItem.final_price).join(Product, PriceListItem.product_id == Product.product_id).filter(
+        PriceListItem.price_list_id == PRICE_LIST_ID).order_by(PriceListItem.product_id).all()
+    return [(pid, calculate_final_price_with_markup(Decimal(str(base)), Decimal(str(markup)), Decimal(str(final))))
+            for pid, base, markup, final in rows]
+
+
+def restore(db, state):
+    db.query(PriceListItem).filter(PriceListItem.price_list_id == PRICE_LIST_ID).delete(synchronize_session=False)
+    db.bulk_insert_mappings(PriceListItem, [{"price_list_id": PRICE_LIST_ID, "product_id": pid,
+                                             "markup_percentage": m, "final_price": f} for pid, m, f in state])
+    db.commit()
+    db.expunge_all()
+
+
+def main():
+    with bench_session(TABLES) as db:
+        seed(db)
+        original = snapshot(db)
+        print(f"{'regla':<13} | {'afectados':>9} | {'anterior ms':>11} {'queries':>7} | {'actual ms':>9} {'queries':>7}")
+        for label, rule in RULES:
+            preview = reprice_price_list(db, PRICE_LIST_ID, rule.model_copy(update={"dry_run": True}))
+            assert snapshot(db) == original, "dry_run modifico la lista"
+
+            old_ms, old_q, old_affected = timed(legacy_reprice, db, PRICE_LIST_ID, rule, repeat=1)
+            old_state = snapshot(db)
+            restore(db, original)
+
+            new_ms, new_q, result = timed(reprice_price_list, db, PRICE_LIST_ID, rule, repeat=1)
+            assert snapshot(db) == old_state
+            assert result["afectados"] == old_affected == preview["afectados"], (result, old_affected, preview["afectados"])
+            restore(db, original)
+            print(f"{label:<13} | {old_affected:>9} | {old_ms:>11.1f} {old_q:>7} | {new_ms:>9.1f} {new_q:>7}")
+
+        print(f"muestra dry_run: {preview['muestra'][0]}")
+
+        # Subir y luego bajar el markup debe regresar el precio efectivo al original
+        before = effective_prices(db)
+        reprice_price_list(db, PRICE_LIST_ID, PriceListRepricing(operation="add", value=Decimal("10")))
+        raised = effective_prices(db)
+        assert raised != before, "subir el markup no cambio el precio efectivo"
+        reprice_price_list(db, PRICE_LIST_ID, PriceListRepricing(operation="add", value=Decimal("-10")))
+        db.expire_all()
+        assert effective_prices(db) == before, "bajar el markup no regreso el precio efectivo"
+        assert snapshot(db) == original
+        print("subir y bajar markup: precio efectivo regresa al original")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Prueba/benchmark de la limpieza post-sincronizacion con 200,000 items de precios
+
+Compara:
+- anterior: 2 COUNT + 4 UPDATE/DELETE sin limite en UNA transaccion (locks sobre
+            todas las filas afectadas hasta el commit)
+- actual:   crud_sync.limpiar_items_no_sincronizados por lotes en orden de llave
+            primaria, un commit por lote y progreso guardado en sync_jobs
+
+Verifica que ambas dejen exactamente el mismo estado, que el progreso del trabajo
+cuadre con lo eliminado y que se respete el limite de seguridad del 20%.
+Lo importante es la columna "transaccion mas larga": es el tiempo maximo que un
+lote mantiene locks mientras los clientes navegan el catalogo.
+
+Uso (desde la carpeta backend):
+    python tests/bench_sync_cleanup.py
+    BENCH_DATABASE_URL=postgresql://... python tests/bench_sync_cleanup.py
+"""
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import event, select
+
+from bench_utils import bench_session
+
+from crud import crud_sync
+from db.base import Category, PriceList, PriceListItem, Product, SyncJob, SyncJobStatus
+
+TABLES = ["categories", "products", "pricelists", "pricelistitems", "sync_jobs"]
+PRODUCTS = 20_000
+PRICE_LISTS = 10  # 20,000 productos x 10 listas = 200,000 items
+CATEGORIES = 50
+CHUNK_SIZE = 5000
+
+NOW = datetime.utcnow().replace(microsecond=0)
+STALE = NOW - timedelta(days=2)
+
+
+def legacy_cleanup(db, last_sync):
+    # Implementacion anterior (referencia para comparar)
+    corte = last_sync - timedelta(minutes=20)
+    total_products = db.query(Product).count()
+    to_deactivate = db.query(Product).filter(Product.updated_at < corte, Product.is_active == True).count()
+    if total_products > 100 and to_deactivate > (total_products * 0.20):
+        return False
+    db.query(Product).filter(Product.updated_at < corte).update({Product.is_active: False})
+    db.query(Category).filter(
+        Category.updated_at < corte, ~Category.category_id.in_(select(Product.category_id).distinct())
+    ).delete(synchronize_session=False)
+    db.query(PriceListItem).filter(PriceListItem.updated_at < corte).delete(synchronize_session=False)
+    db.query(PriceList).filter(PriceList.updated_at < corte).update({PriceList.is_active: False})
+    db.commit()
+    return True
+
+
+def seed(db):
+    # Categorias 0-44 con productos; 45-49 sin productos (las viejas se eliminan)
+    db.bulk_insert_mappings(Category, [{"category_id": 990000 + c, "name": f"Bench limpieza {c}",
+                                        "updated_at": STALE if c % 5 == 0 else NOW} for c in range(CATEGORIES)])
+    # La ultima lista ya no viene en el DBF
+    db.bulk_insert_mappings(PriceList, [{"price_list_id": 990000 + l, "list_name": f"Lista {l}", "is_active": True,
+                                         "updated_at": STALE if l == PRICE_LISTS - 1 else NOW} for l in range(PRICE_LISTS)])
+    # 1 de cada 10 productos ya no viene en el DBF (10% < limite de 20%)
+    db.bulk_insert_mappings(Product, [{"product_id": f"BCL{i:06d}", "name": f"Producto {i}", "base_price": Decimal("10.00"),
+                                       "category_id": 990000 + i % (CATEGORIES - 5), "is_active": True,
+                                       "updated_at": STALE if i % 10 == 0 else NOW} for i in range(PRODUCTS)])
+    items = []
+    for l in range(PRICE_LISTS):
+        for i in range(PRODUCTS):
+            stale = i % 10 == 0 or i % 7 == l or l == PRICE_LISTS - 1
+            items.append({"price_list_id": 990000 + l, "product_id": f"BCL{i:06d}", "markup_percentage": Decimal("20.00"),
+                          "final_price": Decimal("12.00"), "updated_at": STALE if stale else NOW})
+    db.bulk_insert_mappings(PriceListItem, items)
+    db.commit()
+
+
+def snapshot(db):
+    return (
+        db.query(Product.product_id).filter(Product.is_active == True).order_by(Product.product_id).all(),
+        db.query(Category.category_id).order_by(Category.category_id).all(),
+        db.query(PriceListItem.price_list_id, PriceListItem.product_id).order_by(
+            PriceListItem.price_list_id, PriceListItem.product_id).all(),
+        db.query(PriceList.price_list_id).filter(PriceList.is_active == True).order_by(PriceList.price_list_id).all(),
+    )
+
+
+class TransactionTimer:
+    """Mide cuantas transacciones hubo y la mas larga (primer statement -> commit)."""
+
+    def __init__(self, session):
+        self.session = session
+        self.longest = 0.0
+        self.count = 0
+        self._started = None
+
+    def _begin(self, *args):
+        self._started = time.perf_counter()
+
+    def _commit(self, *args):
+        if self._started is not None:
+            self.longest = max(self.longest, (time.perf_counter() - self._started) * 1000)
+            self.count += 1
+            self._started = None
+
+    def __enter__(self):
+        event.listen(self.session, "after_begin", self._begin)
+        event.listen(self.session, "after_commit", self._commit)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.session, "after_begin", self._begin)
+        event.remove(self.session, "after_commit", self._commit)
+
+
+def run(db, fn, *args, **kwargs):
+    db.commit()
+    with TransactionTimer(db) as timer:
+        start = time.perf_counter()
+        result = fn(db, *args, **kwargs)
+        total = (time.perf_counter() - start) * 1000
+    return result, total, timer
+
+
+def main():
+    with bench_session(TABLES) as db:
+        seed(db)
+        before = snapshot(db)
+        print(f"items de precios: {len(before[2])}")
+
+        ok, old_ms, old_timer = run(db, legacy_cleanup, NOW)
+        assert ok
+        old_state = snapshot(db)
+
+        # Volver al estado inicial
+        for model in (PriceListItem, Product, PriceList, Category):
+            db.query(model).delete(synchronize_session=False)
+        db.commit()
+        seed(db)
+        assert snapshot(db) == before
+
+        job = SyncJob(kind="cleanup", status=SyncJobStatus.running, params={}, progress={})
+        db.add(job)
+        resultado, new_ms, new_timer = run(db, crud_sync.limpiar_items_no_sincronizados, NOW,
+                                           chunk_size=CHUNK_SIZE, job=job)
+        assert snapshot(db) == old_state
+        db.refresh(job)
+        assert job.progress == resultado, (job.progress, resultado)
+        assert resultado["items_eliminados"] == len(before[2]) - len(old_state[2])
+        assert resultado["productos_desactivados"] == len(before[0]) - len(old_state[0])
+
+        print(f"{'version':<9} | {'total ms':>9} | {'transacciones':>13} | {'transaccion mas larga ms':>24}")
+        print(f"{'anterior':<9} | {old_ms:>9.1f} | {old_timer.count:>13} | {old_timer.longest:>24.1f}")
+        print(f"{'actual':<9} | {new_ms:>9.1f} | {new_timer.count:>13} | {new_timer.longest:>24.1f}")
+        print(f"resultado: {resultado}")
+
+        # Limite de seguridad: con 30% del catalogo viejo se aborta sin force
+        db.query(Product).filter(Product.product_id < "BCL006000").update(
+            {Product.updated_at: STALE, Product.is_active: True}, synchronize_session=False)
+        db.commit()
+        assert crud_sync.limpiar_items_no_sincronizados(db, NOW, chunk_size=CHUNK_SIZE) is False
+        assert crud_sync.limpiar_items_no_sincronizados(db, NOW, force=True, chunk_size=CHUNK_SIZE)["productos_desactivados"] == 6000
+        print("limite de seguridad del 20% (y force=True): OK")
+
+
+if __name__ == "__main__":
+    main()
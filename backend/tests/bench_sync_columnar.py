@@ -0,0 +1,142 @@
+"""
+Benchmark del formato columnar de los chunks de sincronizacion vs JSON con GZIP
+
+Usa los archivos de muestra de backend/dbfs (producto, existencias, descripciones
+y precios) y los mismos builders que el cliente de sincronizacion (sync_functions).
+
+Compara por entidad:
+- json:     json.dumps + gzip (cliente) / gzip.decompress + json.loads (servidor)
+- columnar: codificar_columnar + gzip (cliente) / leer_columnar (servidor)
+y la sincronizacion completa (codificar + decodificar + process_*_from_json de
+productos, listas e items) en chunks de 5,000 filas.
+
+Verifica que ambos formatos entreguen exactamente las mismas filas al servidor.
+
+Uso (desde la carpeta backend):
+    python tests/bench_sync_columnar.py
+    BENCH_DATABASE_URL=postgresql://... python tests/bench_sync_columnar.py
+"""
+import asyncio
+import gzip
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from bench_utils import bench_session
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "ecommerce", "servicios"))
+
+import pandas as pd  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+from sync_functions import (  # noqa: E402
+    build_item_lista_dict, build_lista_precios_dict, build_producto_dict, cargar_descripciones_extra,
+    cargar_existencias, codificar_columnar, limpiar_texto
+)
+
+from crud import crud_dbf_upload  # noqa: E402
+from db.base import Category, PriceList, PriceListItem, Product  # noqa: E402
+from routes.sync_dbf_upload import leer_columnar  # noqa: E402
+
+TABLES = ["categories", "products", "pricelists", "pricelistitems"]
+DBF_DIR = Path(__file__).resolve().parent.parent / "dbfs"
+CHUNK_ROWS = 5000
+MAX_CHUNK_BYTES = 16 * 1024 * 1024
+SYNC_TIME = "2026-01-15T08:00:00"
+
+
+def cargar_muestra():
+    """Filas de productos, listas e items como las arma upload_dbf_sync.py."""
+    descripciones = cargar_descripciones_extra(DBF_DIR / "pro_desc.dbf")
+    stock_map = cargar_existencias(DBF_DIR / "existe.dbf")
+    df_prod = pd.read_csv(DBF_DIR / "producto.csv", dtype=str, keep_default_na=False)
+    productos = [build_producto_dict(row, descripciones, stock_map, lambda pid: None, SYNC_TIME)
+                 for _, row in df_prod.iterrows() if limpiar_texto(row.get("CVE_PROD"))]
+
+    df_precios = pd.read_csv(DBF_DIR / "precios.csv", dtype=str, keep_default_na=False)
+    listas = [build_lista_precios_dict(lista_id, SYNC_TIME) for lista_id in df_precios["NLISPRE"].unique() if lista_id]
+    items = [build_item_lista_dict(row, SYNC_TIME) for _, row in df_precios.iterrows()
+             if limpiar_texto(row.get("CVE_PROD")) and limpiar_texto(row.get("NLISPRE"))]
+    return {"productos": productos, "listas": listas, "items": items}
+
+
+def chunks(filas):
+    return [filas[i:i + CHUNK_ROWS] for i in range(0, len(filas), CHUNK_ROWS)]
+
+
+def fake_request(body: bytes) -> Request:
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+    return Request({"type": "http", "method": "PUT", "path": "/", "headers": [(b"content-encoding", b"gzip")]}, receive)
+
+
+# Codificacion (cliente) y decodificacion (servidor) de cada formato
+FORMATOS = {
+    "json": (
+        lambda chunk: gzip.compress(json.dumps(chunk).encode("utf-8")),
+        lambda cuerpo: json.loads(gzip.decompress(cuerpo).decode("utf-8", errors="replace")),
+    ),
+    "columnar": (
+        lambda chunk: gzip.compress(codificar_columnar(chunk)),
+        lambda cuerpo: asyncio.run(leer_columnar(fake_request(cuerpo), MAX_CHUNK_BYTES)),
+    ),
+}
+
+
+def medir(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def reset(db):
+    for model in (PriceListItem, Product, PriceList, Category):
+        db.query(model).delete(synchronize_session=False)
+    db.commit()
+
+
+def sincronizar(db, muestra, formato):
+    """Sincronizacion completa por chunks; retorna (ms, bytes enviados)."""
+    codificar, decodificar = FORMATOS[formato]
+    procesar = {
+        "productos": lambda filas: crud_dbf_upload._procesar_filas("productos", filas, db, None),
+        "listas": lambda filas: crud_dbf_upload._procesar_filas("listas", filas, db, None),
+        "items": lambda filas: crud_dbf_upload._procesar_filas("items", filas, db, None),
+    }
+    enviados = 0
+    start = time.perf_counter()
+    for entidad in ("productos", "listas", "items"):
+        for chunk in chunks(muestra[entidad]):
+            cuerpo = codificar(chunk)
+            enviados += len(cuerpo)
+            procesar[entidad](decodificar(cuerpo))
+    return (time.perf_counter() - start) * 1000, enviados
+
+
+def main():
+    muestra = cargar_muestra()
+    print(f"muestra: {len(muestra['productos'])} productos, {len(muestra['listas'])} listas, {len(muestra['items'])} items")
+    print(f"{'entidad':<10} {'formato':<9} | {'bytes':>9} | {'codificar ms':>12} | {'decodificar ms':>14}")
+    for entidad in ("productos", "items"):
+        filas = muestra[entidad]
+        for formato, (codificar, decodificar) in FORMATOS.items():
+            enc_ms, cuerpos = medir(lambda: [codificar(chunk) for chunk in chunks(filas)])
+            dec_ms, decodificadas = medir(lambda: [fila for cuerpo in cuerpos for fila in decodificar(cuerpo)])
+            assert decodificadas == json.loads(json.dumps(filas)), f"{formato} cambio las filas de {entidad}"
+            print(f"{entidad:<10} {formato:<9} | {sum(map(len, cuerpos)):>9} | {enc_ms:>12.1f} | {dec_ms:>14.1f}")
+
+    with bench_session(TABLES) as db:
+        resultados = {}
+        for formato in FORMATOS:
+            reset(db)
+            ms, enviados = sincronizar(db, muestra, formato)
+            resultados[formato] = db.query(PriceListItem.price_list_id, PriceListItem.product_id,
+                                           PriceListItem.final_price).order_by(
+                PriceListItem.price_list_id, PriceListItem.product_id).all()
+            print(f"sincronizacion completa {formato:<9}: {ms:>8.1f} ms, {enviados / 1024:>7.1f} KB enviados")
+        assert resultados["json"] == resultados["columnar"]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Benchmark de unified_dbf_sync: orquestacion secuencial vs pipeline por etapas
+
+Convierte las muestras de backend/dbfs (producto, precios y clientes en CSV; agentes,
+existe y pro_desc ya en DBF) a archivos DBF temporales y corre la sincronizacion
+completa contra un backend de prueba local (http.server) que tarda PROCESO_MS por
+lote mas ROW_MS por fila, como los upserts del API real.
+
+Compara:
+- anterior: un paso a la vez (leer el DBF completo a DataFrame, armar todo,
+            subir, y hasta entonces leer el siguiente)
+- actual:   unified_dbf_sync.main (PipelineSync: un hilo por DBF, colas acotadas
+            y subidas traslapadas con la lectura)
+
+Verifica que:
+- cada DBF se lea exactamente una vez
+- el servidor reciba las mismas filas en ambas versiones
+- el orden de llaves foraneas se respete: ningun producto llega antes que su
+  categoria, ningun item antes que su producto y su lista, ningun cliente antes
+  que su vendedor y su lista
+
+Uso (desde la carpeta backend):
+    python tests/bench_sync_pipeline.py
+"""
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "ecommerce", "servicios", "sync_multithread"))
+
+import pandas as pd  # noqa: E402
+import unified_dbf_sync  # noqa: E402
+from sync_functions import loaders  # noqa: E402
+
+DBF_DIR = Path(__file__).resolve().parent.parent / "dbfs"
+PROCESO_MS = 25
+ROW_MS = 0.02
+
+# --- Backend de prueba ---------------------------------------------------------
+
+# endpoint -> (llaves que confirma, llaves que referencia)
+LLAVES = {
+    "categories": (lambda f: [("cat", f["name"])], lambda f: []),
+    "products": (lambda f: [("prod", f["product_id"])],
+                 lambda f: [("cat", f["category_name"])] if f.get("category_name") else []),
+    "price-lists": (lambda f: [("lista", f["price_list_id"])], lambda f: []),
+    "price-list-items": (lambda f: [], lambda f: [("prod", f["product_id"]), ("lista", f["price_list_id"])]),
+    "sellers": (lambda f: [("vend", str(f["user_id"]))], lambda f: []),
+    "customers": (lambda f: [], lambda f: [("vend", f["agent_id"])] * bool(f.get("agent_id"))
+                  + [("lista", f["price_list_id"])] * bool(f.get("price_list_id"))),
+}
+
+estado = {"confirmadas": set(), "antes_de_tiempo": [], "filas": Counter()}
+lock = threading.Lock()
+
+
+class SyncHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def responder(self, cuerpo):
+        datos = json.dumps(cuerpo).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_POST(self):
+        cuerpo = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.endswith("/auth/login/sync"):
+            return self.responder({"access_token": "tok"})
+        entidad = self.path.rsplit("/", 1)[-1]
+        if entidad not in LLAVES:
+            return self.responder({})  # cleanup
+        filas = json.loads(cuerpo)
+        confirma, referencia = LLAVES[entidad]
+        with lock:
+            estado["antes_de_tiempo"] += [llave for f in filas for llave in referencia(f)
+                                          if llave not in estado["confirmadas"]]
+        time.sleep((PROCESO_MS + ROW_MS * len(filas)) / 1000)
+        with lock:
+            estado["confirmadas"].update(llave for f in filas for llave in confirma(f))
+            estado["filas"][entidad] += len(filas)
+        self.responder({"creados": 0, "actualizados": len(filas), "errores": 0})
+
+    def log_message(self, *args):
+        pass
+
+
+def violaciones():
+    """Referencias que llegaron antes que la fila que las confirma (si es que llego)."""
+    return sum(1 for llave in estado["antes_de_tiempo"] if llave in estado["confirmadas"])
+
+
+# --- DBFs de muestra -------------------------------------------------------------
+
+def escribir_dbf(df, path):
+    """dBase III minimo (todos los campos tipo C) para que dbfread lo lea como el DBF real."""
+    columnas = [c for c in df.columns if len(c) <= 10]
+    valores = [[str(v).encode("latin1", errors="replace")[:254] for v in df[c]] for c in columnas]
+    anchos = [max([1] + [len(v) for v in col]) for col in valores]
+    largo_registro = 1 + sum(anchos)
+    largo_header = 32 + 32 * len(columnas) + 1
+    hoy = date.today()
+    with open(path, "wb") as f:
+        f.write(struct.pack("<BBBBIHH20x", 3, hoy.year - 1900, hoy.month, hoy.day, len(df), largo_header, largo_registro))
+        for nombre, ancho in zip(columnas, anchos):
+            f.write(struct.pack("<11sc4xBB14x", nombre.encode("ascii"), b"C", ancho, 0))
+        f.write(b"\r")
+        for fila in zip(*valores):
+            f.write(b" " + b"".join(v.ljust(ancho) for v, ancho in zip(fila, anchos)))
+        f.write(b"\x1a")
+
+
+def preparar_dbfs(carpeta):
+    rutas = {}
+    for csv, nombre in (("producto.csv", "producto.dbf"), ("precios.csv", "PRECIPROD.DBF"), ("clientes.csv", "clientes.dbf")):
+        escribir_dbf(pd.read_csv(DBF_DIR / csv, dtype=str, keep_default_na=False), carpeta / nombre)
+        rutas[nombre] = carpeta / nombre
+    for nombre in ("agentes.dbf", "existe.dbf", "pro_desc.dbf"):
+        shutil.copy(DBF_DIR / nombre, carpeta / nombre)
+        rutas[nombre] = carpeta / nombre
+    return rutas
+
+
+# --- Versiones ---------------------------------------------------------------------
+
+def anterior(transporte, sync_time):
+    """Pasos estrictamente secuenciales (main de unified_dbf_sync antes del pipeline)."""
+    m = unified_dbf_sync
+    lotes = m.BATCH_SIZE
+    df_prod = loaders.dbf_to_dataframe(m.PRODUCTOS_DBF)
+    df_prod = df_prod[df_prod['CSE_PROD'].astype(str).str.upper().str.strip() != m.CATEGORIA_BLOQUEADA]
+    df_prod = df_prod[~df_prod['CSE_PROD'].astype(str).str.strip().isin(m.PRODUCTOS_BLOQUEADOS)]
+    df_prod = df_prod[~df_prod['CVE_TIAL'].astype(str).str.strip().isin(m.PRODUCTOS_BLOQUEADOS)]
+    cats = [m.build_categoria_dict(c, sync_time) for c in df_prod['CSE_PROD'].dropna().apply(m.limpiar_texto).unique() if c]
+    transporte.enviar_en_lotes(cats, lotes['categorias'], "sync/categories", "Categories")
+
+    stock_map = loaders.cargar_existencias(m.EXISTENCIAS_DBF)
+    desc_map = loaders.cargar_descripciones_extra(m.DESCRIPCIONES_DBF)
+    check_img = m.crear_verificador_imagenes(m.IMAGES_FOLDER, m.CDN_URL)
+    prods = [m.build_producto_dict(r, desc_map, stock_map, check_img, sync_time)
+             for _, r in df_prod.iterrows() if m.limpiar_texto(r['CVE_PROD'])]
+    transporte.enviar_en_lotes(prods, lotes['productos'], "sync/products", "Products")
+
+    df_price = loaders.dbf_to_dataframe(m.PRECIOS_DBF)
+    listas = {}
+    for i in df_price['NLISPRE'].dropna().unique():
+        if i:
+            lista = m.build_lista_precios_dict(i, sync_time)
+            listas.setdefault(lista["price_list_id"], lista)
+    transporte.enviar_en_lotes(list(listas.values()), lotes['listas'], "sync/price-lists", "PriceLists")
+    items = [m.build_item_lista_dict(r, sync_time) for _, r in df_price.iterrows()
+             if m.limpiar_texto(r.get('CVE_PROD')) and m.limpiar_texto(r.get('NLISPRE'))]
+    transporte.enviar_en_lotes(items, lotes['items'], "sync/price-list-items", "PriceItems")
+
+    df_agents = loaders.dbf_to_dataframe(m.AGENTES_DBF)
+    sellers = [m.build_vendedor_dict(r, sync_time) for _, r in df_agents[df_agents['CVE_AGE'].notna()].iterrows()]
+    transporte.enviar_en_lotes(sellers, lotes['users'], "sync/sellers", "Sellers")
+    df_cust = loaders.dbf_to_dataframe(m.CLIENTES_DBF)
+    customers = []
+    for _, r in df_cust[df_cust['CVE_CTE'].notna()].iterrows():
+        try:
+            customers.append(m.build_cliente_dict(r, sync_time))
+        except Exception:
+            continue
+    transporte.enviar_en_lotes(customers, lotes['users'], "sync/customers", "Customers")
+
+
+def contar_lecturas():
+    """Cuenta las aperturas de cada DBF (todas las lecturas pasan por sync_functions.loaders)."""
+    lecturas = Counter()
+    original = loaders.DBF
+
+    def DBF(path, *args, **kwargs):
+        lecturas[Path(path).name] += 1
+        return original(path, *args, **kwargs)
+
+    loaders.DBF = DBF
+    return lecturas
+
+
+def medir(fn):
+    with lock:
+        estado.update(confirmadas=set(), antes_de_tiempo=[], filas=Counter())
+    lecturas = contar_lecturas()
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000, dict(estado["filas"]), violaciones(), dict(lecturas)
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SyncHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    carpeta = Path(tempfile.mkdtemp(prefix="bench_pipeline_"))
+    dbf_original = loaders.DBF
+    try:
+        rutas = preparar_dbfs(carpeta)
+        m = unified_dbf_sync
+        m.BACKEND_URL = f"http://127.0.0.1:{server.server_port}"
+        m.PRODUCTOS_DBF, m.PRECIOS_DBF = rutas["producto.dbf"], rutas["PRECIPROD.DBF"]
+        m.EXISTENCIAS_DBF, m.DESCRIPCIONES_DBF = rutas["existe.dbf"], rutas["pro_desc.dbf"]
+        m.AGENTES_DBF, m.CLIENTES_DBF = rutas["agentes.dbf"], rutas["clientes.dbf"]
+        m.crear_verificador_imagenes = lambda *args: (lambda producto_id: None)
+
+        def secuencial():
+            transporte = m.TransporteSync(m.BACKEND_URL, "u", "p", max_workers=m.SYNC_MAX_WORKERS)
+            anterior(transporte, "2026-01-15T08:00:00")
+
+        old_ms, old_filas, old_violaciones, old_lecturas = medir(secuencial)
+        loaders.DBF = dbf_original
+        new_ms, new_filas, new_violaciones, new_lecturas = medir(m.main)
+    finally:
+        loaders.DBF = dbf_original
+        server.shutdown()
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    assert new_filas == old_filas, (new_filas, old_filas)
+    assert new_violaciones == old_violaciones == 0, (new_violaciones, old_violaciones)
+    assert all(n == 1 for n in new_lecturas.values()) and len(new_lecturas) == 6, new_lecturas
+
+    print(f"\nfilas recibidas: {new_filas}")
+    print(f"lecturas de DBF: anterior {old_lecturas}, actual {new_lecturas}")
+    print(f"{'version':<9} | {'ms':>8} | {'llaves foraneas fuera de orden':>30}")
+    print(f"{'anterior':<9} | {old_ms:>8.1f} | {old_violaciones:>30}")
+    print(f"{'actual':<9} | {new_ms:>8.1f} | {new_violaciones:>30}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Prueba/benchmark de las corridas de sincronizacion (sync_runs) contra la limpieza por fecha
+
+Escenario: catalogo ya sincronizado (20,000 productos, 5 listas = 100,000 items) y
+una segunda sincronizacion donde faltan 10% de los productos y una lista, 5%
+cambia de existencia y 2% de los items cambia de precio.
+
+Compara:
+- anterior: uploads sin run_id (todas las filas se reescriben para mover updated_at)
+            y limpieza por updated_at < last_sync - 20 min
+- actual:   POST /sync/runs + uploads con run_id (solo se reescribe lo que cambio,
+            las llaves quedan en sync_run_items) y limpieza por anti-join con la corrida
+
+Verifica que ambas dejen el mismo estado y que, con el reloj del cliente adelantado
+una hora, la limpieza por fecha aborte (o con force desactive todo) mientras que la
+corrida no depende del reloj. Ademas, que una corrida con una subida fallida se
+pueda abortar y que una abierta por mas de SYNC_RUN_STALE_MINUTES se aborte sola.
+
+Uso (desde la carpeta backend):
+    python tests/bench_sync_runs.py
+    BENCH_DATABASE_URL=postgresql://... python tests/bench_sync_runs.py
+"""
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from bench_utils import bench_session
+
+from core.config import settings
+from crud import crud_dbf_upload, crud_sync
+from db.base import Category, PriceList, PriceListItem, Product, SyncRun, SyncRunItem, SyncRunStatus
+
+TABLES = ["categories", "products", "pricelists", "pricelistitems", "sync_runs", "sync_run_items", "sync_jobs"]
+PRODUCTS = 20_000
+PRICE_LISTS = 5
+CATEGORIES = 40
+CHUNK_SIZE = 5000
+
+STALE = datetime.utcnow().replace(microsecond=0) - timedelta(days=2)
+
+
+def payloads(segunda: bool):
+    """Payloads del DBF (mismo formato que manda upload_dbf_sync.py)."""
+    categorias = [f"BENCH CAT {c}" for c in range(CATEGORIES)]
+    productos, items = [], []
+    for i in range(PRODUCTS):
+        if segunda and i % 10 == 0:
+            continue  # Ya no viene en el DBF
+        productos.append({"product_id": f"BSR{i:06d}", "name": f"Producto {i}", "base_price": 10 + i % 90,
+                          "iva_percentage": 16.0, "category_name": categorias[i % CATEGORIES],
+                          "stock_count": 5 + (7 if segunda and i % 20 == 1 else 0)})
+        for l in range(PRICE_LISTS):
+            if segunda and l == PRICE_LISTS - 1:
+                continue
+            cambio = segunda and (i + l) % 50 == 0
+            items.append({"price_list_id": 990000 + l, "product_id": f"BSR{i:06d}", "markup_percentage": 20.0,
+                          "final_price": round((10 + i % 90) * 1.2 + (1 if cambio else 0), 2)})
+    listas = [{"price_list_id": 990000 + l, "list_name": f"Lista {l}"}
+              for l in range(PRICE_LISTS) if not (segunda and l == PRICE_LISTS - 1)]
+    return categorias, productos, listas, items
+
+
+def subir(db, datos, run_id=None):
+    categorias, productos, listas, items = datos
+    return (
+        crud_dbf_upload.process_productos_from_json(categorias, productos, db, run_id=run_id),
+        crud_dbf_upload.process_listas_precios_from_json(listas, db, run_id=run_id),
+        crud_dbf_upload.process_items_precios_from_json(items, db, run_id=run_id),
+    )
+
+
+def reset(db):
+    for model in (SyncRunItem, SyncRun, PriceListItem, Product, PriceList, Category):
+        db.query(model).delete(synchronize_session=False)
+    db.commit()
+    subir(db, payloads(segunda=False))
+    # La sincronizacion anterior fue hace dos dias
+    for model in (Category, Product, PriceList, PriceListItem):
+        db.query(model).update({model.updated_at: STALE}, synchronize_session=False)
+    db.commit()
+    db.expunge_all()
+
+
+def snapshot(db):
+    return (
+        db.query(Product.product_id, Product.stock_count).filter(Product.is_active == True).order_by(Product.product_id).all(),
+        db.query(Category.name).order_by(Category.name).all(),
+        db.query(PriceListItem.price_list_id, PriceListItem.product_id, PriceListItem.final_price).order_by(
+            PriceListItem.price_list_id, PriceListItem.product_id).all(),
+        db.query(PriceList.price_list_id).filter(PriceList.is_active == True).order_by(PriceList.price_list_id).all(),
+    )
+
+
+def ms_desde(start):
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    with bench_session(TABLES) as db:
+        segunda = payloads(segunda=True)
+        reset(db)
+        print(f"items de precios: {db.query(func.count(PriceListItem.price_list_item_id)).scalar()}")
+
+        # Anterior: todo se reescribe y la limpieza decide por updated_at
+        start = time.perf_counter()
+        antes = datetime.utcnow()
+        old_uploads = subir(db, segunda)
+        old_upload_ms = ms_desde(start)
+        start = time.perf_counter()
+        old_result = crud_sync.limpiar_items_no_sincronizados(db, antes, chunk_size=CHUNK_SIZE)
+        old_cleanup_ms = ms_desde(start)
+        old_state = snapshot(db)
+        old_written = sum(r["actualizados"] for r in old_uploads)
+
+        # Actual: corrida de sincronizacion
+        reset(db)
+        start = time.perf_counter()
+        run_id = crud_sync.abrir_corrida(db).run_id
+        new_uploads = subir(db, segunda, run_id)
+        new_upload_ms = ms_desde(start)
+        start = time.perf_counter()
+        new_result = crud_sync.limpiar_items_no_sincronizados(db, run_id=run_id, chunk_size=CHUNK_SIZE)
+        crud_sync.cerrar_corrida(db, run_id)
+        new_cleanup_ms = ms_desde(start)
+        new_written = sum(r["actualizados"] for r in new_uploads)
+
+        assert snapshot(db) == old_state
+        assert new_result == old_result, (new_result, old_result)
+        assert db.query(SyncRunItem).count() == 0, "la corrida cerrada debe vaciar sus llaves"
+        assert new_uploads[0]["actualizados"] == PRODUCTS // 20, new_uploads[0]
+        assert new_uploads[1]["sin_cambios"] == PRICE_LISTS - 1, new_uploads[1]
+
+        print(f"{'version':<9} | {'filas reescritas':>16} | {'uploads ms':>10} | {'limpieza ms':>11}")
+        print(f"{'anterior':<9} | {old_written:>16} | {old_upload_ms:>10.1f} | {old_cleanup_ms:>11.1f}")
+        print(f"{'actual':<9} | {new_written:>16} | {new_upload_ms:>10.1f} | {new_cleanup_ms:>11.1f}")
+        print(f"resultado: {new_result}")
+
+        # Reloj del cliente adelantado una hora: por fecha todo parece viejo
+        reset(db)
+        subir(db, segunda)
+        adelantado = datetime.utcnow() + timedelta(hours=1)
+        assert crud_sync.limpiar_items_no_sincronizados(db, adelantado, chunk_size=CHUNK_SIZE) is False
+        reset(db)
+        run_id = crud_sync.abrir_corrida(db).run_id
+        subir(db, segunda, run_id)
+        assert crud_sync.limpiar_items_no_sincronizados(db, adelantado, run_id=run_id, chunk_size=CHUNK_SIZE) == old_result
+        print("reloj del cliente adelantado 1h: por fecha aborta, por corrida limpia lo correcto: OK")
+
+        # Una subida fallida deja la corrida sin poder limpiarse: se aborta sin desactivar nada
+        reset(db)
+        activos = db.query(func.count(Product.product_id)).filter(Product.is_active.is_(True)).scalar()
+        fallida = crud_sync.abrir_corrida(db).run_id
+        subir(db, segunda, fallida)
+        crud_sync.aceptar_subida_en_corrida(db, fallida)
+        crud_sync.terminar_subida_en_corrida(db, fallida, aplicada=False)
+        db.commit()
+        assert crud_sync.subidas_pendientes(crud_sync.obtener_corrida_abierta(db, fallida))
+        assert crud_sync.abortar_corrida(db, fallida).status == SyncRunStatus.aborted
+        assert crud_sync.abortar_corrida(db, fallida) is None
+        assert crud_sync.aceptar_subida_en_corrida(db, fallida) is None, "una corrida abortada no acepta subidas"
+        assert db.query(SyncRunItem).filter(SyncRunItem.run_id == fallida).count() == 0
+        assert db.query(func.count(Product.product_id)).filter(Product.is_active.is_(True)).scalar() == activos
+
+        # Corrida abandonada (el cliente nunca termino): la siguiente la aborta al abrirse
+        vieja = crud_sync.abrir_corrida(db)
+        crud_sync.aceptar_subida_en_corrida(db, vieja.run_id)
+        vieja.started_at = datetime.utcnow() - timedelta(minutes=settings.SYNC_RUN_STALE_MINUTES + 1)
+        db.commit()
+        nueva = crud_sync.abrir_corrida(db)
+        db.refresh(vieja)
+        assert vieja.status == SyncRunStatus.aborted and nueva.status == SyncRunStatus.open
+        print("subida fallida: corrida abortada sin limpieza; corrida vencida abortada al abrir otra: OK")
+
+
+if __name__ == "__main__":
+    main()
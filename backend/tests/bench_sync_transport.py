@@ -0,0 +1,204 @@
+"""
+Benchmark del transporte de sync_multithread (TransporteSync) contra requests.post por lote
+
+Levanta un backend de prueba local (http.server) que imita /sync/price-list-items;
+cada conexion nueva cuesta HANDSHAKE_MS (como el handshake TLS contra el API real).
+Dos escenarios:
+- normal:    el servidor atiende todos los lotes que le lleguen
+- saturado:  solo atiende 4 lotes a la vez (los demas reciben 503) y el token de
+             sync expira cada 1.5s (401), como el token de 5 minutos a mitad de corrida
+
+Compara el envio de LOTES lotes:
+- anterior: requests.post sin sesion, 10 hilos fijos, sin timeout ni reintentos
+            (send_batch/sync_in_parallel de unified_dbf_sync.py)
+- actual:   TransporteSync.enviar_en_lotes (pool keep-alive, reintentos con espera,
+            renovacion del token y concurrencia AIMD)
+
+Reporta conexiones abiertas, filas perdidas, 503 recibidos y tiempo total.
+
+Ademas sube por chunks (subir_por_chunks, /sync-upload/sessions) en el escenario
+saturado: la subida dura mas que el token y debe terminar completa sin errores.
+
+Uso (desde la carpeta backend):
+    python tests/bench_sync_transport.py
+"""
+import contextlib
+import gzip
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "ecommerce", "servicios"))
+
+from sync_functions.api_helpers import TransporteSync, subir_por_chunks  # noqa: E402
+
+LOTES = 300
+FILAS_POR_LOTE = 20
+HANDSHAKE_MS = 15
+PROCESO_MS = 20
+ESCENARIOS = {
+    "normal": {"capacidad": 1000, "token_segundos": 3600},
+    "saturado": {"capacidad": 4, "token_segundos": 1.5},
+}
+
+escenario = dict(ESCENARIOS["normal"])
+estado = {"conexiones": 0, "en_curso": 0, "rechazos": 0, "tokens": {}, "filas": 0, "chunks": {}}
+lock = threading.Lock()
+
+
+class SyncHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # TCP_NODELAY como uvicorn (si no, cada respuesta espera el ACK retrasado)
+
+    def setup(self):
+        super().setup()
+        with lock:
+            estado["conexiones"] += 1
+        time.sleep(HANDSHAKE_MS / 1000)
+
+    def responder(self, status, cuerpo):
+        datos = json.dumps(cuerpo).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_PUT(self):
+        self.do_POST()
+
+    def do_POST(self):
+        cuerpo = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/auth/login/sync":
+            token = f"tok-{time.monotonic()}"
+            with lock:
+                estado["tokens"][token] = time.monotonic()
+            return self.responder(200, {"access_token": token})
+
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        emitido = estado["tokens"].get(token)
+        if emitido is None or time.monotonic() - emitido > escenario["token_segundos"]:
+            return self.responder(401, {"detail": "Token expirado"})
+        with lock:
+            saturado = estado["en_curso"] >= escenario["capacidad"]
+            if saturado:
+                estado["rechazos"] += 1
+            else:
+                estado["en_curso"] += 1
+        if saturado:
+            return self.responder(503, {"detail": "Servidor saturado"})
+        try:
+            time.sleep(PROCESO_MS / 1000)
+            if self.path.startswith("/sync-upload/"):
+                return self.subida_por_chunks(cuerpo)
+            filas = len(json.loads(cuerpo))
+            with lock:
+                estado["filas"] += filas
+        finally:
+            with lock:
+                estado["en_curso"] -= 1
+        self.responder(200, {"creados": 0, "actualizados": filas, "errores": 0})
+
+    def subida_por_chunks(self, cuerpo):
+        partes = self.path.split("/")
+        if self.path == "/sync-upload/sessions":
+            return self.responder(201, {"upload_id": 1, "entidad": json.loads(cuerpo)["entidad"]})
+        if partes[-2] == "chunks":
+            filas = gzip.decompress(cuerpo).count(b"\n") + 1
+            with lock:
+                # Reenviar el mismo seq no duplica filas (como SyncUploadChunk)
+                estado["chunks"][int(partes[-1])] = filas
+            return self.responder(200, {"seq": int(partes[-1]), "estado": "aplicado"})
+        return self.responder(200, {"status": "completed", "progress": {"filas": sum(estado["chunks"].values())}})
+
+    def log_message(self, *args):
+        pass
+
+
+def reiniciar():
+    with lock:
+        estado.update(conexiones=0, en_curso=0, rechazos=0, filas=0, chunks={})
+
+
+def anterior(backend_url, datos):
+    """send_batch + sync_in_parallel de unified_dbf_sync.py antes del transporte."""
+    token = requests.post(f"{backend_url}/auth/login/sync", data={"username": "u", "password": "p"}).json()["access_token"]
+
+    def send_batch(lote):
+        try:
+            response = requests.post(f"{backend_url}/sync/price-list-items", json=lote,
+                                     headers={"Authorization": f"Bearer {token}"})
+            response.raise_for_status()
+            return response.json()
+        except Exception:
+            return {"creados": 0, "actualizados": 0, "errores": len(lote)}
+
+    lotes = [datos[i:i + FILAS_POR_LOTE] for i in range(0, len(datos), FILAS_POR_LOTE)]
+    stats = {"creados": 0, "actualizados": 0, "errores": 0}
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        for future in as_completed([executor.submit(send_batch, lote) for lote in lotes]):
+            for llave in stats:
+                stats[llave] += future.result().get(llave, 0)
+    return stats
+
+
+def actual(backend_url, datos):
+    transporte = TransporteSync(backend_url, "u", "p", max_workers=10, latencia_objetivo=0.5, reintentos=6)
+    assert transporte.token()
+    return transporte.enviar_en_lotes(datos, FILAS_POR_LOTE, "sync/price-list-items", "PriceItems"), transporte
+
+
+def medir(fn, *args):
+    reiniciar()
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result, dict(estado)
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SyncHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    backend_url = f"http://127.0.0.1:{server.server_port}"
+    datos = [{"price_list_id": 1 + i % 10, "product_id": f"P{i:06d}", "markup_percentage": 20.0,
+              "final_price": 12.0} for i in range(LOTES * FILAS_POR_LOTE)]
+
+    print(f"{LOTES} lotes de {FILAS_POR_LOTE} filas")
+    print(f"{'escenario':<9} {'version':<9} | {'conexiones':>10} | {'filas perdidas':>14} | {'503 recibidos':>13} | {'ms':>8}")
+    try:
+        for nombre, config in ESCENARIOS.items():
+            escenario.update(config)
+            old_ms, old_stats, old_srv = medir(anterior, backend_url, datos)
+            new_ms, (new_stats, transporte), new_srv = medir(actual, backend_url, datos)
+
+            assert new_stats["errores"] == 0, new_stats
+            assert new_srv["filas"] == len(datos), "todas las filas deben llegar al servidor"
+            assert new_srv["conexiones"] <= 10 + 2, "el pool debe reutilizar conexiones"
+
+            for version, ms, stats, srv in (("anterior", old_ms, old_stats, old_srv),
+                                            ("actual", new_ms, new_stats, new_srv)):
+                print(f"{nombre:<9} {version:<9} | {srv['conexiones']:>10} | {stats['errores']:>14} | "
+                      f"{srv['rechazos']:>13} | {ms:>8.1f}")
+            print(f"{nombre:<9} concurrencia AIMD al final: {int(transporte.concurrencia.limite)}")
+
+        # Subida por chunks mas larga que el token (escenario saturado): renueva y reenvia el chunk
+        transporte = TransporteSync(backend_url, "u", "p", max_workers=1, reintentos=6)
+        reiniciar()
+        tokens_antes = len(estado["tokens"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            progreso = subir_por_chunks(transporte, "items", datos, filas_por_chunk=FILAS_POR_LOTE)
+        assert progreso["filas"] == len(datos), progreso
+        print(f"chunks    {len(estado['chunks'])} chunks, {progreso['filas']} filas, "
+              f"{len(estado['tokens']) - tokens_antes} logins")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
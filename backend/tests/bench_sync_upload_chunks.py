@@ -0,0 +1,97 @@
+"""
+Benchmark de memoria: payload completo vs subida por chunks NDJSON (100,000 items de precios)
+
+Compara el pico de memoria del servidor al recibir el upload de items:
+- anterior: decompress_request (cuerpo completo + gzip.decompress + json.loads de todo)
+- actual:   leer_ndjson por chunk de 5,000 filas (descompresion y parseo en streaming)
+
+Tambien verifica que el parseo en streaming de partes de red arbitrarias (cortes a
+mitad de linea y de bloque gzip) de exactamente las mismas filas, y que un chunk que
+pasa del limite se corte con 413 sin descomprimirse completo.
+
+Uso (desde la carpeta backend):
+    python tests/bench_sync_upload_chunks.py
+"""
+import asyncio
+import gzip
+import json
+import time
+import tracemalloc
+
+import bench_utils  # noqa: F401  (configura sys.path y variables de entorno)
+
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from routes.sync_dbf_upload import decompress_request, leer_ndjson
+
+ITEMS = 100_000
+CHUNK_ROWS = 5000
+NETWORK_PART = 64 * 1024  # Tamano de cada parte que entrega el servidor ASGI
+MAX_CHUNK_BYTES = 16 * 1024 * 1024
+
+
+def fake_request(body: bytes) -> Request:
+    partes = [body[i:i + NETWORK_PART] for i in range(0, len(body), NETWORK_PART)] or [b""]
+
+    async def receive():
+        parte = partes.pop(0)
+        return {"type": "http.request", "body": parte, "more_body": bool(partes)}
+
+    scope = {"type": "http", "method": "PUT", "path": "/", "headers": [(b"content-encoding", b"gzip")]}
+    return Request(scope, receive)
+
+
+def medir(fn):
+    # Tiempo sin tracemalloc (lo hace mucho mas lento); memoria en una segunda corrida
+    start = time.perf_counter()
+    result = fn()
+    elapsed = (time.perf_counter() - start) * 1000
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024, result
+
+
+def main():
+    items = [{"price_list_id": 1 + i % 10, "product_id": f"P{i:06d}", "markup_percentage": 20.0,
+              "final_price": round(10 + i % 997 * 1.2, 2)} for i in range(ITEMS)]
+    payload = gzip.compress(json.dumps({"items": items}).encode())
+    chunks = [gzip.compress("\n".join(json.dumps(fila) for fila in items[i:i + CHUNK_ROWS]).encode())
+              for i in range(0, ITEMS, CHUNK_ROWS)]
+
+    def anterior():
+        return asyncio.run(decompress_request(fake_request(payload)))["items"]
+
+    def actual():
+        # El servidor solo tiene un chunk en memoria a la vez
+        total = 0
+        for chunk in chunks:
+            total += len(asyncio.run(leer_ndjson(fake_request(chunk), MAX_CHUNK_BYTES)))
+        return total
+
+    old_ms, old_mb, old_rows = medir(anterior)
+    new_ms, new_mb, new_rows = medir(actual)
+    assert len(old_rows) == new_rows == ITEMS
+
+    # Mismas filas que el payload completo, aun con partes de red cortadas a mitad de linea
+    primer_chunk = asyncio.run(leer_ndjson(fake_request(chunks[0]), MAX_CHUNK_BYTES))
+    assert primer_chunk == items[:CHUNK_ROWS]
+
+    # Limite por chunk: se corta sin descomprimir todo
+    try:
+        asyncio.run(leer_ndjson(fake_request(chunks[0]), 10_000))
+        raise AssertionError("el chunk mayor al limite debio rechazarse")
+    except HTTPException as e:
+        assert e.status_code == 413
+
+    print(f"{'version':<9} | {'pico de memoria MB':>18} | {'ms':>8}")
+    print(f"{'anterior':<9} | {old_mb:>18.1f} | {old_ms:>8.1f}")
+    print(f"{'actual':<9} | {new_mb:>18.1f} | {new_ms:>8.1f}")
+    print(f"payload: {len(payload)/1024:.0f}KB gzip en 1 POST vs {len(chunks)} chunks de ~{len(chunks[0])/1024:.0f}KB")
+    print("parseo en streaming y limite 413: OK")
+
+
+if __name__ == "__main__":
+    main()
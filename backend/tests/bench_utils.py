@@ -0,0 +1,85 @@
+"""
+Utilidades compartidas por los benchmarks de tests/bench_*.py
+
+- Por defecto usan SQLite en memoria con solo las tablas necesarias, para poder
+  correrlos en cualquier maquina (los tiempos absolutos NO son los de produccion,
+  lo que importa es la comparacion anterior vs actual y el numero de queries).
+- Con BENCH_DATABASE_URL=postgresql://... corren contra Postgres (esquema de
+  database/db_init.sql ya creado) dentro de una transaccion que se revierte al final.
+"""
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "farmacruz_api"))
+# db.session crea su engine al importarse (con opciones de pool que SQLite en memoria no acepta);
+# los benchmarks no lo usan, solo necesita una URL valida
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "farmacruz_bench.db"))
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("FRONTEND_URL", "*")
+os.environ.setdefault("EMAIL_WORKER_ENABLED", "false")
+
+from sqlalchemy import create_engine, event  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from db.base import Base  # noqa: E402
+
+
+@contextmanager
+def bench_session(tables):
+    """Session sobre SQLite en memoria (o BENCH_DATABASE_URL) que se revierte al salir."""
+    url = os.environ.get("BENCH_DATABASE_URL")
+    if url:
+        engine = create_engine(url)
+    else:
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(engine, tables=[Base.metadata.tables[t] for t in tables])
+
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+        engine.dispose()
+
+
+class QueryCounter:
+    """Cuenta los statements enviados a la base de datos dentro del bloque with."""
+
+    def __init__(self, session: Session):
+        self.engine = session.get_bind().engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def timed(fn, *args, repeat: int = 5, **kwargs):
+    """Ejecuta fn `repeat` veces; retorna (mejor tiempo en ms, queries de una corrida, resultado)."""
+    best = float("inf")
+    result = None
+    queries = 0
+    session = args[0]
+    for _ in range(repeat):
+        session.expire_all()
+        with QueryCounter(session) as counter:
+            start = time.perf_counter()
+            result = fn(*args, **kwargs)
+            elapsed = (time.perf_counter() - start) * 1000
+        best = min(best, elapsed)
+        queries = counter.count
+    return best, queries, result
@@ -0,0 +1,151 @@
+"""
+Servidor SMTP local (stand-in de Gmail/SES) para probar la cola de correos.
+
+Acepta cualquier AUTH PLAIN/LOGIN, guarda los mensajes en memoria y cuenta
+cuantas conexiones se abrieron (para comprobar que el worker reutiliza la conexion).
+No soporta STARTTLS: usar SMTP_USE_TLS=false contra este servidor.
+
+Uso (desde la carpeta backend):
+    python tests/smtp_stub_server.py --port 8025
+    # y en el .env del backend:
+    SMTP_HOST=127.0.0.1  SMTP_PORT=8025  SMTP_USE_TLS=false  SMTP_USER=x  SMTP_PASSWORD=x
+
+    python tests/smtp_stub_server.py --selftest
+    # Ejercita utils/email_utils.SMTPMailer (reuso de conexion, reconexion y rate limit)
+"""
+import argparse
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+messages = []       # (mail_from, rcpt_to, data)
+connections = []    # handlers abiertos (para contar y poder cortarlos)
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str) -> None:
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        connections.append(self)
+        self.reply("220 farmacruz-stub ESMTP")
+        mail_from, rcpt_to = None, []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode(errors="replace").rstrip("\r\n")
+            cmd = line.split(" ", 1)[0].upper()
+
+            if cmd in ("EHLO", "HELO"):
+                self.wfile.write(b"250-farmacruz-stub\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif cmd == "AUTH":
+                if line.upper().startswith("AUTH LOGIN"):
+                    self.reply("334 VXNlcm5hbWU6")
+                    self.rfile.readline()
+                    self.reply("334 UGFzc3dvcmQ6")
+                    self.rfile.readline()
+                self.reply("235 2.7.0 Authentication successful")
+            elif cmd == "MAIL":
+                mail_from, rcpt_to = line[10:].strip("<>"), []
+                self.reply("250 OK")
+            elif cmd == "RCPT":
+                rcpt_to.append(line[8:].strip("<>"))
+                self.reply("250 OK")
+            elif cmd == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while True:
+                    chunk = self.rfile.readline().decode(errors="replace")
+                    if chunk in (".\r\n", ".\n", ""):
+                        break
+                    data.append(chunk)
+                messages.append((mail_from, rcpt_to, "".join(data)))
+                self.reply("250 OK queued")
+            elif cmd in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif cmd == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class ThreadingSMTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def start_server(port: int) -> ThreadingSMTPServer:
+    server = ThreadingSMTPServer(("127.0.0.1", port), SMTPHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def selftest(port: int) -> None:
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    os.environ.setdefault("SECRET_KEY", "selftest")
+    os.environ.setdefault("FRONTEND_URL", "*")
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "farmacruz_api"))
+    from utils.email_utils import SMTPMailer, build_message
+
+    server = start_server(port)
+    try:
+        mailer = SMTPMailer(host="127.0.0.1", port=port, user="stub", password="stub",
+                            use_tls=False, rate_per_second=50)
+
+        # 1. Un lote de 10 correos usa UNA sola conexion (TLS + login una vez)
+        for i in range(10):
+            msg = build_message("noreply@farmacruz.com", f"cliente{i}@example.com", f"Pedido {i}", "<p>ok</p>")
+            mailer.send("noreply@farmacruz.com", f"cliente{i}@example.com", msg)
+        assert len(messages) == 10, messages
+        assert len(connections) == 1, len(connections)
+
+        # 2. Si el servidor corta la conexion, el siguiente envio reconecta solo
+        connections[0].connection.shutdown(socket.SHUT_RDWR)
+        time.sleep(0.05)
+        msg = build_message("noreply@farmacruz.com", "otro@example.com", "Reconexion", "<p>ok</p>")
+        mailer.send("noreply@farmacruz.com", "otro@example.com", msg)
+        assert len(messages) == 11
+        assert len(connections) == 2, len(connections)
+
+        # 3. Rate limit: 5 envios a 10/s tardan ~0.4s (el primero sale con el token inicial)
+        slow = SMTPMailer(host="127.0.0.1", port=port, user="stub", password="stub",
+                          use_tls=False, rate_per_second=10)
+        slow.limiter.capacity = slow.limiter.tokens = 1
+        start = time.perf_counter()
+        for i in range(5):
+            slow.send("noreply@farmacruz.com", "rate@example.com", msg)
+        elapsed = time.perf_counter() - start
+        assert elapsed >= 0.35, elapsed
+
+        mailer.close()
+        slow.close()
+    finally:
+        server.shutdown()
+    print("SMTP selftest OK")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor SMTP local para tests")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--selftest", action="store_true")
+    args = parser.parse_args()
+
+    if args.selftest:
+        selftest(args.port)
+        return
+
+    server = ThreadingSMTPServer(("127.0.0.1", args.port), SMTPHandler)
+    print(f"Stub SMTP en 127.0.0.1:{args.port} (Ctrl+C para salir)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"{len(messages)} mensajes recibidos en {len(connections)} conexiones")
+
+
+if __name__ == "__main__":
+    main()
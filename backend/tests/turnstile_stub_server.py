@@ -0,0 +1,146 @@
+"""
+Servidor local que imita el endpoint siteverify de Cloudflare Turnstile.
+
+Permite probar el login sin salir a internet y simular caidas/lentitud de Cloudflare.
+- Token "valid-token" -> success: true
+- Cualquier otro token -> success: false (error-codes: invalid-input-response)
+
+Uso (desde la carpeta backend):
+    python tests/turnstile_stub_server.py --port 8788 [--delay 3] [--status 503]
+    # y en el .env del backend:
+    TURNSTILE_VERIFY_URL=http://127.0.0.1:8788/siteverify
+
+    python tests/turnstile_stub_server.py --selftest
+    # Ejercita core/turnstile.py (token valido/invalido/faltante, timeouts y circuit breaker)
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+VALID_TOKEN = "valid-token"
+
+# Comportamiento configurable en caliente (lo usa --selftest)
+behavior = {"delay": 0.0, "status": 200}
+
+
+class SiteverifyHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        token = form.get("response", [""])[0]
+
+        if behavior["delay"]:
+            time.sleep(behavior["delay"])
+
+        if behavior["status"] != 200:
+            self.send_response(behavior["status"])
+            self.end_headers()
+            return
+
+        if token == VALID_TOKEN:
+            body = {"success": True, "error-codes": []}
+        else:
+            body = {"success": False, "error-codes": ["invalid-input-response"]}
+
+        payload = json.dumps(body).encode()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # El cliente ya se fue por timeout (caso simulado de Cloudflare lento)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), SiteverifyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def selftest(port: int) -> None:
+    os.environ.update({
+        "DATABASE_URL": os.environ.get("DATABASE_URL", "sqlite://"),
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "selftest"),
+        "FRONTEND_URL": "*",
+        "TURNSTILE_SECRET_KEY": "stub-secret",
+        "TURNSTILE_VERIFY_URL": f"http://127.0.0.1:{port}/siteverify",
+        "TURNSTILE_TIMEOUT_SECONDS": "0.5",
+        "TURNSTILE_BREAKER_FAILURES": "2",
+        "TURNSTILE_BREAKER_COOLDOWN_SECONDS": "1",
+    })
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "farmacruz_api"))
+    from core import turnstile
+
+    server = start_server(port)
+
+    async def run():
+        turnstile.startup()
+        assert await turnstile.verify(VALID_TOKEN) == turnstile.OK
+        assert await turnstile.verify("otro") == turnstile.INVALID
+        assert await turnstile.verify("") == turnstile.MISSING
+
+        # Cloudflare lento: cada login espera como maximo el timeout y el circuito se abre
+        behavior["delay"] = 2.0
+        for _ in range(2):
+            start = time.perf_counter()
+            assert await turnstile.verify(VALID_TOKEN) == turnstile.BYPASS
+            assert time.perf_counter() - start < 1.0
+        assert not turnstile.is_healthy()
+
+        # Circuito abierto: no hay llamada remota
+        start = time.perf_counter()
+        assert await turnstile.verify("") == turnstile.BYPASS
+        assert time.perf_counter() - start < 0.05
+
+        # Cloudflare se recupera: tras el cooldown la prueba half-open cierra el circuito
+        behavior["delay"] = 0.0
+        await asyncio.sleep(1.1)
+        assert await turnstile.verify(VALID_TOKEN) == turnstile.OK
+        assert turnstile.is_healthy()
+
+        # 5xx cuenta como fallo pero permite el login
+        behavior["status"] = 503
+        assert await turnstile.verify(VALID_TOKEN) == turnstile.BYPASS
+        await turnstile.shutdown()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
+    print("Turnstile selftest OK")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub local de Cloudflare Turnstile")
+    parser.add_argument("--port", type=int, default=8788)
+    parser.add_argument("--delay", type=float, default=0.0, help="Segundos de espera por respuesta")
+    parser.add_argument("--status", type=int, default=200, help="Status HTTP a devolver")
+    parser.add_argument("--selftest", action="store_true")
+    args = parser.parse_args()
+
+    if args.selftest:
+        selftest(args.port)
+        return
+
+    behavior.update(delay=args.delay, status=args.status)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), SiteverifyHandler)
+    print(f"Stub Turnstile en http://127.0.0.1:{args.port}/siteverify (delay={args.delay}s, status={args.status})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
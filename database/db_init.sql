@@ -3,6 +3,18 @@
 -- =====================================================
 
 -- Eliminar tablas existentes si las hay (cuidado en producción)
+DROP TABLE IF EXISTS cache_versions CASCADE;
+
+DROP TABLE IF EXISTS outbound_emails CASCADE;
+
+DROP TABLE IF EXISTS sync_upload_chunks CASCADE;
+
+DROP TABLE IF EXISTS sync_jobs CASCADE;
+
+DROP TABLE IF EXISTS sync_run_items CASCADE;
+
+DROP TABLE IF EXISTS sync_runs CASCADE;
+
 DROP TABLE IF EXISTS ticket_messages CASCADE;
 
 DROP TABLE IF EXISTS tickets CASCADE;
@@ -104,6 +116,8 @@ CREATE TABLE salesgroups (
     group_name VARCHAR(255) NOT NULL,
     description TEXT,
     is_active BOOLEAN DEFAULT TRUE,
+    -- Vendedor dueño del grupo automatico (la sync asigna clientes por este id, no por el nombre)
+    owner_seller_id INTEGER UNIQUE REFERENCES users (user_id) ON DELETE SET NULL,
     created_at TIMESTAMP
     WITH
         TIME ZONE DEFAULT CURRENT_TIMESTAMP
@@ -176,6 +190,7 @@ CREATE TABLE products (
     iva_percentage NUMERIC(5, 2) DEFAULT 0.00,
     image_url VARCHAR(255),
     image_version INTEGER DEFAULT 1,
+    image_hash VARCHAR(64),
     stock_count INTEGER DEFAULT 0,
     is_active BOOLEAN DEFAULT TRUE,
     category_id INTEGER REFERENCES categories (category_id),
@@ -298,7 +313,11 @@ CREATE TABLE orders (
         TIME ZONE,
         validated_at TIMESTAMP
     WITH
-        TIME ZONE
+        TIME ZONE,
+        exported_at TIMESTAMP
+    WITH
+        TIME ZONE,
+        version INTEGER NOT NULL DEFAULT 1
 );
 
 CREATE INDEX idx_orders_customer ON orders (customer_id);
@@ -311,6 +330,8 @@ CREATE INDEX idx_orders_created ON orders (created_at);
 
 CREATE INDEX idx_orders_seller_status ON orders (assigned_seller_id, status);
 
+CREATE INDEX idx_orders_export ON orders (status, exported_at, created_at);
+
 -- =====================================================
 -- TABLA: orderitems (Items de pedidos)
 -- =====================================================
@@ -437,6 +458,8 @@ CREATE TABLE tickets (
         creator_type IN ('customer', 'user')
     ),
     assigned_to INTEGER REFERENCES users (user_id) ON DELETE SET NULL,
+    -- Grupo del cliente creador (visibilidad para Marketing), mantenido por la app
+    visible_group_id INTEGER REFERENCES salesgroups (sales_group_id) ON DELETE SET NULL,
     created_at TIMESTAMP
     WITH
         TIME ZONE DEFAULT CURRENT_TIMESTAMP,
@@ -447,6 +470,11 @@ CREATE TABLE tickets (
 
 CREATE INDEX idx_tickets_creator ON tickets (creator_id, creator_type);
 
+-- Bandeja de Marketing (UNION ALL: por grupo visible / por asignado), ya ordenadas por fecha
+CREATE INDEX idx_tickets_visibility ON tickets (visible_group_id, status, created_at DESC);
+
+CREATE INDEX idx_tickets_assigned_status ON tickets (assigned_to, status, created_at DESC);
+
 CREATE INDEX idx_tickets_assigned ON tickets (assigned_to);
 
 CREATE INDEX idx_tickets_status ON tickets (status);
@@ -469,7 +497,7 @@ CREATE TABLE ticket_messages (
         TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
-CREATE INDEX idx_ticket_messages_ticket ON ticket_messages (ticket_id);
+CREATE INDEX idx_ticket_messages_thread ON ticket_messages (ticket_id, created_at, message_id);
 
 CREATE INDEX idx_ticket_messages_created_at ON ticket_messages (created_at ASC);
 
@@ -505,6 +533,99 @@ CREATE TABLE favoritelistitems (
 
 CREATE INDEX idx_favoritelistitems_list ON favoritelistitems (list_id);
 
+-- =====================================================
+-- TABLA: outbound_emails (Cola persistente de correos salientes)
+-- =====================================================
+CREATE TABLE outbound_emails (
+    email_id BIGSERIAL PRIMARY KEY,
+    to_email VARCHAR(255) NOT NULL,
+    subject VARCHAR(255) NOT NULL,
+    html_body TEXT NOT NULL,
+    reply_to VARCHAR(255),
+    status VARCHAR(50) NOT NULL DEFAULT 'pending' CHECK (
+        status IN ('pending', 'sending', 'sent', 'failed')
+    ),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP WITH TIME ZONE
+);
+
+-- El worker solo busca pendientes ya vencidos
+CREATE INDEX idx_outbound_emails_pending ON outbound_emails (status, next_attempt_at);
+
+-- =====================================================
+-- TABLA: sync_jobs (Trabajos de sincronizacion en segundo plano)
+-- =====================================================
+CREATE TABLE sync_jobs (
+    job_id SERIAL PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    status VARCHAR(50) NOT NULL DEFAULT 'pending' CHECK (
+        status IN ('pending', 'running', 'completed', 'failed')
+    ),
+    params JSONB,
+    step VARCHAR(50),
+    progress JSONB,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Busqueda del trabajo activo de cada tipo
+CREATE INDEX idx_sync_jobs_kind_status ON sync_jobs (kind, status);
+
+-- =====================================================
+-- TABLA: sync_upload_chunks (Chunks aplicados de subidas por partes)
+-- =====================================================
+-- La sesion de subida es un sync_job; un chunk reintentado que ya estaba
+-- aplicado se confirma sin procesarse de nuevo
+CREATE TABLE sync_upload_chunks (
+    job_id INTEGER NOT NULL REFERENCES sync_jobs (job_id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    received_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (job_id, seq)
+);
+
+-- =====================================================
+-- TABLA: sync_runs (Corridas de sincronizacion)
+-- =====================================================
+CREATE TABLE sync_runs (
+    run_id SERIAL PRIMARY KEY,
+    status VARCHAR(50) NOT NULL DEFAULT 'open' CHECK (
+        status IN ('open', 'closed', 'aborted')
+    ),
+    started_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    closed_at TIMESTAMP WITH TIME ZONE,
+    -- Subidas con este run_id: la limpieza responde 409 mientras haya aceptadas sin aplicar
+    uploads_accepted INTEGER NOT NULL DEFAULT 0,
+    uploads_applied INTEGER NOT NULL DEFAULT 0,
+    uploads_failed INTEGER NOT NULL DEFAULT 0
+);
+
+-- Filas recibidas en cada corrida. UNLOGGED: se llena y se vacia en cada
+-- sincronizacion, no necesita WAL (si el servidor se cae solo se pierde la corrida en curso).
+-- Sin llave foranea a sync_runs: se revisaria en cada fila y cerrar_corrida ya vacia las llaves
+CREATE UNLOGGED TABLE sync_run_items (
+    run_id INTEGER NOT NULL,
+    entity VARCHAR(20) NOT NULL,
+    item_key VARCHAR(120) NOT NULL,
+    PRIMARY KEY (run_id, entity, item_key)
+);
+
+-- =====================================================
+-- TABLA: cache_versions (Version de caches en memoria por proceso)
+-- =====================================================
+-- Se incrementa en la misma transaccion que modifica los datos; cada worker
+-- valida su cache contra este contador (ej: group_membership)
+CREATE TABLE cache_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
 -- =====================================================
 -- MAINTENANCE & AUTOVACUUM TUNING
 -- =====================================================
@@ -512,4 +633,5 @@ CREATE INDEX idx_favoritelistitems_list ON favoritelistitems (list_id);
 -- Reducing the scale factor to 5% prevents Dead Tuple accumulation, 
 -- ensuring optimal disk usage and query latency.
 ALTER TABLE orders SET (autovacuum_vacuum_scale_factor = 0.05);
-ALTER TABLE cartcache SET (autovacuum_vacuum_scale_factor = 0.05);
\ No newline at end of file
+ALTER TABLE cartcache SET (autovacuum_vacuum_scale_factor = 0.05);
+ALTER TABLE outbound_emails SET (autovacuum_vacuum_scale_factor = 0.05);
\ No newline at end of file
@@ -5,7 +5,11 @@ Este módulo provee funciones reutilizables para:
 - Limpieza de datos (texto, números, teléfonos, usernames)
 - Construcción de diccionarios (productos, clientes, vendedores, listas)
 - Carga de datos auxiliares (DBFs, descripciones, stock)
-- Helpers de API (login, verificación de imágenes)
+- Helpers de API (login, verificación de imágenes, subidas por chunks,
+  transporte con pool de conexiones y concurrencia adaptativa)
+- Inventario de imágenes (una sola lectura de la carpeta por corrida)
+- Formato columnar de los chunks de sincronizacion
+- Pipeline por etapas (lectura de DBFs y subidas traslapadas)
 """
 
 from .data_cleaning import (
@@ -31,12 +35,29 @@ from .builders import (
 from .loaders import (
     cargar_descripciones_extra,
     cargar_existencias,
+    iterar_dbf,
     dbf_to_dataframe
 )
 
 from .api_helpers import (
     login,
-    verificar_imagen_existe
+    verificar_imagen_existe,
+    subir_por_chunks,
+    TransporteSync
+)
+
+from .image_manifest import (
+    cargar_manifiesto_imagenes,
+    crear_verificador_imagenes
+)
+
+from .columnar import (
+    codificar_columnar
+)
+
+from .pipeline import (
+    PipelineSync,
+    EtapaSync
 )
 
 __all__ = [
@@ -59,8 +80,19 @@ __all__ = [
     # Loaders
     'cargar_descripciones_extra',
     'cargar_existencias',
+    'iterar_dbf',
     'dbf_to_dataframe',
     # API helpers
     'login',
     'verificar_imagen_existe',
+    'subir_por_chunks',
+    'TransporteSync',
+    # Image manifest
+    'cargar_manifiesto_imagenes',
+    'crear_verificador_imagenes',
+    # Columnar
+    'codificar_columnar',
+    # Pipeline
+    'PipelineSync',
+    'EtapaSync',
 ]
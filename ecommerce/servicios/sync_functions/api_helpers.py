@@ -2,13 +2,24 @@
 API Helpers - Utilidades para comunicación con el backend API.
 """
 
+import gzip
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from .columnar import MEDIA_TYPE_COLUMNAR, codificar_columnar
 
 
-def login(backend_url, username, password):
+def login(backend_url, username, password, session=None):
     """Hace login y retorna el token"""
     try:
-        response = requests.post(
+        response = (session or requests).post(
             f"{backend_url}/auth/login/sync",
             data={"username": username, "password": password},
             timeout=30
@@ -30,3 +41,224 @@ def verificar_imagen_existe(producto_id, images_folder, cdn_url):
     if imagen_path.exists():
         return f"{cdn_url}/{producto_id}.webp"
     return None
+
+
+class ConcurrenciaAdaptativa:
+    """
+    Limite de peticiones simultaneas con AIMD (como el control de congestion de TCP):
+    - cada respuesta rapida suma 1/limite (≈ +1 por cada ronda completa de peticiones)
+    - un 429/503, un timeout o una respuesta mas lenta que latencia_objetivo parte
+      el limite a la mitad, una sola vez por ventana: solo cuentan las peticiones
+      que salieron despues del ultimo recorte (las que ya estaban en vuelo vieron
+      la misma saturacion)
+    """
+
+    def __init__(self, minimo=1, maximo=8, latencia_objetivo=2.0):
+        self.minimo = minimo
+        self.maximo = maximo
+        self.latencia_objetivo = latencia_objetivo
+        self.limite = float(max(minimo, maximo // 2))
+        self.en_vuelo = 0
+        self._ultimo_recorte = 0.0
+        self._cond = threading.Condition()
+
+    def adquirir(self):
+        """Espera un lugar libre; retorna el inicio de la peticion (para liberar)."""
+        with self._cond:
+            while self.en_vuelo >= int(self.limite):
+                self._cond.wait()
+            self.en_vuelo += 1
+            return time.monotonic()
+
+    def liberar(self, inicio, saturado=False):
+        with self._cond:
+            self.en_vuelo -= 1
+            if saturado or time.monotonic() - inicio > self.latencia_objetivo:
+                if inicio > self._ultimo_recorte:
+                    self.limite = max(self.minimo, self.limite / 2)
+                    self._ultimo_recorte = time.monotonic()
+            else:
+                self.limite = min(self.maximo, self.limite + 1 / self.limite)
+            self._cond.notify_all()
+
+
+def _espera_reintento(intento, response=None):
+    """Espera exponencial con jitter; respeta Retry-After si el servidor lo manda."""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(int(retry_after), 60)
+    return min(2 ** intento, 30) * random.uniform(0.5, 1.0)
+
+
+class TransporteSync:
+    """
+    Transporte compartido de los scripts de sincronizacion (sync_multithread):
+    - una requests.Session con pool de conexiones: keep-alive, un handshake TLS
+      por conexion en lugar de uno por lote
+    - timeout en todas las peticiones
+    - reintentos con espera exponencial ante cortes de red, 429 y 5xx (los
+      endpoints /sync/* son upserts: reenviar un lote es seguro)
+    - renovacion del token de sync (dura 5 minutos) antes de que expire o ante un 401
+    - concurrencia adaptativa (AIMD) segun la latencia y los 429/503 del servidor
+    """
+
+    def __init__(self, backend_url, username, password, max_workers=8, min_workers=1,
+                 latencia_objetivo=2.0, timeout=(10, 120), reintentos=5, vida_token=240):
+        self.backend_url = backend_url
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.reintentos = reintentos
+        self.vida_token = vida_token
+        self.concurrencia = ConcurrenciaAdaptativa(min_workers, max_workers, latencia_objetivo)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._credenciales = (username, password)
+        self._token = None
+        self._token_obtenido = 0.0
+        self._lock_token = threading.Lock()
+
+    def token(self, vencido=None):
+        """
+        Token vigente; hace login si no hay, si esta por expirar o si `vencido`
+        (el token que recibio un 401) sigue siendo el actual.
+        """
+        with self._lock_token:
+            expirado = time.monotonic() - self._token_obtenido > self.vida_token
+            if self._token is None or expirado or (vencido is not None and vencido == self._token):
+                token = login(self.backend_url, *self._credenciales, session=self.session)
+                if token:
+                    self._token, self._token_obtenido = token, time.monotonic()
+            return self._token
+
+    def post(self, endpoint, datos, timeout=None):
+        """
+        POST con reintentos. Retorna el JSON de la respuesta; lanza HTTPError si el
+        servidor rechaza los datos (4xx) o RuntimeError si se agotan los reintentos.
+        """
+        return self.enviar("POST", endpoint, timeout=timeout, json=datos)
+
+    def enviar(self, metodo, endpoint, headers=None, timeout=None, reintentar=True, **kwargs):
+        """
+        Peticion autenticada por la sesion compartida (kwargs van a requests: json=, data=).
+        Un 401 renueva el token y reenvia; con reintentar=False no se reenvia ante
+        cortes de red, 429 ni 5xx (peticiones que no son seguras de repetir).
+        """
+        url = f"{self.backend_url}/{endpoint}"
+        error = None
+        for intento in range(self.reintentos + 1):
+            token = self.token()
+            response, saturado = None, False
+            inicio = self.concurrencia.adquirir()
+            try:
+                response = self.session.request(
+                    metodo, url, headers={**(headers or {}), "Authorization": f"Bearer {token}"},
+                    timeout=timeout or self.timeout, **kwargs
+                )
+                saturado = response.status_code in (429, 503)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = str(e)
+                saturado = isinstance(e, requests.Timeout)
+            finally:
+                self.concurrencia.liberar(inicio, saturado=saturado)
+
+            if response is not None:
+                if response.status_code == 401:
+                    # Token vencido a mitad de la corrida: renovar y reenviar sin esperar
+                    error = "HTTP 401"
+                    self.token(vencido=token)
+                    continue
+                if response.status_code < 500 and response.status_code != 429:
+                    response.raise_for_status()
+                    return response.json()
+                error = f"HTTP {response.status_code}"
+
+            if not reintentar:
+                if response is not None:
+                    response.raise_for_status()
+                raise RuntimeError(f"{endpoint}: sin respuesta ({error})")
+            if intento < self.reintentos:
+                espera = _espera_reintento(intento, response)
+                print(f"  ⚠ {endpoint}: {error}; reintento en {espera:.1f}s")
+                time.sleep(espera)
+        raise RuntimeError(f"{endpoint}: sin confirmar tras {self.reintentos} reintentos ({error})")
+
+    def enviar_en_lotes(self, datos, batch_size, endpoint, nombre):
+        """
+        Divide datos en lotes y los envia en paralelo; la cantidad de lotes en
+        vuelo la decide la concurrencia adaptativa. Retorna los totales.
+        """
+        stats = {"creados": 0, "actualizados": 0, "errores": 0}
+        if not datos:
+            print(f"[{nombre}] No data to sync.")
+            return stats
+
+        lotes = [datos[i:i + batch_size] for i in range(0, len(datos), batch_size)]
+        print(f"[{nombre}] Syncing {len(datos)} records -> {len(lotes)} batches "
+              f"(hasta {self.max_workers} en paralelo, actual {int(self.concurrencia.limite)})...")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.post, endpoint, lote): lote for lote in lotes}
+            for future in as_completed(futures):
+                try:
+                    resultado = future.result()
+                    for llave in stats:
+                        stats[llave] += resultado.get(llave, 0)
+                except Exception as e:
+                    print(f"  [ERR] {nombre} batch failed: {e}")
+                    stats["errores"] += len(futures[future])
+
+        print(f"[{nombre}] DONE: {stats['creados']} created, {stats['actualizados']} updated, "
+              f"{stats['errores']} errors (concurrencia final {int(self.concurrencia.limite)})")
+        return stats
+
+
+def _codificar_chunk(chunk, formato):
+    """Cuerpo (sin comprimir) y Content-Type de un chunk."""
+    if formato == "columnar":
+        return codificar_columnar(chunk), MEDIA_TYPE_COLUMNAR
+    return "\n".join(json.dumps(fila) for fila in chunk).encode("utf-8"), "application/x-ndjson"
+
+
+def subir_por_chunks(transporte, entidad, filas, run_id=None, filas_por_chunk=5000, formato="ndjson"):
+    """
+    Sube filas (iterable de dicts) en chunks comprimidos con GZIP, en NDJSON o en
+    formato columnar (formato="columnar", ver columnar.py: mas chico y rapido de decodificar):
+    POST /sync-upload/sessions -> PUT .../chunks/{seq} -> POST .../complete
+
+    Cada chunk se confirma cuando el servidor ya lo aplico; si la conexion falla
+    solo se reenvia ese chunk. En memoria solo hay un chunk serializado a la vez.
+    Todo pasa por el TransporteSync: sesion compartida, reintentos con espera y
+    renovacion del token (una subida grande dura mas que el token de 5 minutos).
+
+    Retorna el progreso final de la subida, o None si el servidor no soporta
+    subidas por chunks (usar el upload de un solo payload).
+    """
+    try:
+        # Sin reintentos (salvo 401): una sesion duplicada quedaria abierta en la corrida
+        sesion = transporte.enviar("POST", "sync-upload/sessions", json={"entidad": entidad, "run_id": run_id},
+                                   timeout=30, reintentar=False)
+    except requests.HTTPError as e:
+        if e.response.status_code in (404, 405):
+            return None
+        raise
+    upload_id = sesion["upload_id"]
+
+    filas = iter(filas)
+    seq = 0
+    while True:
+        chunk = list(islice(filas, filas_por_chunk))
+        if not chunk:
+            break
+        cuerpo, content_type = _codificar_chunk(chunk, formato)
+        cuerpo = gzip.compress(cuerpo)
+        # Reenviar el mismo seq es seguro: el servidor deduplica por (upload_id, seq)
+        transporte.enviar("PUT", f"sync-upload/sessions/{upload_id}/chunks/{seq}", data=cuerpo,
+                          headers={"Content-Encoding": "gzip", "Content-Type": content_type})
+        seq += 1
+        print(f"  ✓ {entidad}: chunk {seq} ({len(chunk)} filas, {len(cuerpo)/1024:.0f}KB)")
+
+    fin = transporte.enviar("POST", f"sync-upload/sessions/{upload_id}/complete", json={"total_chunks": seq},
+                            timeout=30)
+    return fin["progress"]
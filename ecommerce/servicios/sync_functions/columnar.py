@@ -0,0 +1,108 @@
+"""
+Columnar - Codificacion columnar de los chunks de sincronizacion.
+
+Misma especificacion que backend/farmacruz_api/utils/columnar.py (el servidor
+la decodifica): cada columna va una sola vez con sus valores en binario y los
+textos repetidos (listas, categorias, updated_at, ...) con diccionario, en lugar
+de repetir las llaves de cada fila como en JSON.
+
+    b"FCOL" | version u8 | filas u32 | columnas u16
+    por columna:
+        largo_nombre u16 | nombre utf-8 | tipo u8 | tiene_nulos u8
+        [mascara de nulos: filas x u8 (1 = nulo)]  si tiene_nulos
+        tipo 1 (float64): filas x f8
+        tipo 2 (int64):   filas x i8
+        tipo 3 (bool):    filas x u8
+        tipo 4 (texto):   valores u32 | ancho_indice u8 (0, 2 o 4)
+                          | largos valores x u32 | bytes utf-8 | [filas x indice]
+    Con ancho_indice 0 no hay diccionario: valores == filas, en orden de fila.
+"""
+
+import struct
+
+import numpy as np
+
+MEDIA_TYPE_COLUMNAR = "application/x-farmacruz-columnar"
+
+MAGIC = b"FCOL"
+VERSION = 1
+
+TIPO_FLOAT = 1
+TIPO_INT = 2
+TIPO_BOOL = 3
+TIPO_TEXTO = 4
+
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def _clase(valor):
+    # bool antes que int (bool es subclase de int); acepta escalares de numpy/pandas
+    if isinstance(valor, (bool, np.bool_)):
+        return TIPO_BOOL
+    if isinstance(valor, (int, np.integer)):
+        return TIPO_INT
+    if isinstance(valor, (float, np.floating)):
+        return TIPO_FLOAT
+    return TIPO_TEXTO
+
+
+def _tipo_columna(valores):
+    """Tipo de la columna segun sus valores no nulos (texto si hay mezcla)."""
+    clases = {_clase(v) for v in valores if v is not None}
+    if clases == {TIPO_BOOL}:
+        return TIPO_BOOL
+    if clases == {TIPO_INT}:
+        # Enteros fuera de int64 van como texto (como float perderian digitos)
+        return TIPO_INT if all(_INT64_MIN <= v <= _INT64_MAX for v in valores if v is not None) else TIPO_TEXTO
+    if clases and clases <= {TIPO_INT, TIPO_FLOAT}:
+        return TIPO_FLOAT
+    return TIPO_TEXTO
+
+
+def _codificar_columna(nombre, valores):
+    nombre = nombre.encode("utf-8")
+    tipo = _tipo_columna(valores)
+    nulos = np.fromiter((v is None for v in valores), dtype="u1", count=len(valores))
+    tiene_nulos = bool(nulos.any())
+
+    partes = [struct.pack("<H", len(nombre)), nombre, struct.pack("<BB", tipo, tiene_nulos)]
+    if tiene_nulos:
+        partes.append(nulos.tobytes())
+
+    if tipo == TIPO_TEXTO:
+        diccionario = {}
+        indices = np.fromiter(
+            (0 if v is None else diccionario.setdefault(str(v), len(diccionario)) for v in valores),
+            dtype="<u4", count=len(valores)
+        )
+        if len(diccionario) > len(valores) // 2:
+            # Casi sin repetidos: el diccionario solo agregaria los indices
+            textos = [("" if v is None else str(v)).encode("utf-8") for v in valores]
+            ancho = 0
+        else:
+            textos = [t.encode("utf-8") for t in diccionario]
+            ancho = 2 if len(textos) <= 0xFFFF else 4
+        partes += [
+            struct.pack("<IB", len(textos), ancho),
+            np.array([len(t) for t in textos], dtype="<u4").tobytes(),
+            b"".join(textos),
+        ]
+        if ancho:
+            partes.append(indices.astype("<u2" if ancho == 2 else "<u4").tobytes())
+    else:
+        dtype = {TIPO_FLOAT: "<f8", TIPO_INT: "<i8", TIPO_BOOL: "u1"}[tipo]
+        relleno = 0 if tipo != TIPO_FLOAT else np.nan
+        partes.append(np.array([relleno if v is None else v for v in valores], dtype=dtype).tobytes())
+    return partes
+
+
+def codificar_columnar(filas):
+    """
+    Codifica una lista de dicts (las filas de un chunk) en formato columnar.
+    Las columnas son la union de las llaves, en orden de aparicion.
+    """
+    nombres = list(dict.fromkeys(llave for fila in filas for llave in fila))
+    partes = [MAGIC, struct.pack("<BIH", VERSION, len(filas), len(nombres))]
+    for nombre in nombres:
+        partes += _codificar_columna(nombre, [fila.get(nombre) for fila in filas])
+    return b"".join(partes)
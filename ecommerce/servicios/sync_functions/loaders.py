@@ -70,6 +70,12 @@ def cargar_existencias(dbf_path):
         return {}
 
 
+def iterar_dbf(dbf_path):
+    """Recorre los registros del DBF (dicts) sin cargar el archivo completo en memoria."""
+    print(f"Reading {dbf_path.name}...")
+    yield from DBF(dbf_path, encoding='latin1', ignore_missing_memofile=True)
+
+
 def dbf_to_dataframe(dbf_path):
     """Convierte DBF a DataFrame de pandas."""
     print(f"Reading {dbf_path.name}...")
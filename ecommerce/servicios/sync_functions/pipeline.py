@@ -0,0 +1,213 @@
+"""
+Pipeline - Sincronizacion por etapas que traslapa la lectura de los DBFs con las subidas.
+
+Cada entidad es una EtapaSync: un productor (un hilo por DBF) arma las filas y
+las agrega a la etapa, que las junta en lotes dentro de una cola acotada; los
+hilos consumidores de la etapa suben los lotes por el TransporteSync compartido
+(la concurrencia total la sigue decidiendo su AIMD).
+
+El orden de llaves foraneas se respeta con barreras entre etapas:
+- requiere: los lotes de la etapa no salen hasta que la otra etapa termino
+  completa (items espera a productos; clientes a vendedores y listas).
+- marca: para entidades que salen del mismo DBF y las alimenta el mismo
+  productor (categorias de producto.dbf, listas de PRECIPROD.DBF). Antes de
+  encolar un lote, las filas pendientes de la dependencia se encolan y el lote
+  solo espera a que esos lotes esten confirmados, sin esperar a terminar de
+  leer el DBF.
+"""
+
+import queue
+import threading
+import time
+
+_FIN = object()
+
+
+class EtapaSync:
+    """Una entidad del pipeline: lotes en una cola acotada y subida concurrente."""
+
+    def __init__(self, nombre, endpoint, batch_size, requiere=(), marca=(), hilos=4, max_en_cola=4):
+        self.nombre = nombre
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.requiere = list(requiere)
+        self.marca = list(marca)
+        self.hilos = hilos
+        self.cola = queue.Queue(maxsize=max_en_cola)
+        self.stats = {"creados": 0, "actualizados": 0, "errores": 0}
+        self.filas = 0
+        self.encolados = 0
+        self.cerrada = False
+        # Tiempos (time.monotonic) para el reporte
+        self.bloqueado = 0.0  # productor esperando lugar en la cola
+        self.espera = 0.0     # lotes esperando barreras (suma de todos los hilos)
+        self.inicio = None
+        self.fin = None
+        self._pendientes = []
+        self._confirmados = set()
+        self._prefijo = 0  # los lotes 0.._prefijo-1 ya estan confirmados
+        self._cond = threading.Condition()
+
+    # --- Productor ---
+
+    def agregar(self, fila):
+        self._pendientes.append(fila)
+        if len(self._pendientes) >= self.batch_size:
+            self._encolar()
+
+    def marcar(self):
+        """Encola las filas pendientes; retorna cuantos lotes hay que esperar."""
+        self._encolar()
+        return self.encolados
+
+    def cerrar(self):
+        """Fin de las filas de la etapa (tambien si el productor fallo)."""
+        if self.cerrada:
+            return
+        self._encolar()
+        with self._cond:
+            self.cerrada = True
+            self._cond.notify_all()
+        for _ in range(self.hilos):
+            self.cola.put(_FIN)
+
+    def _encolar(self):
+        if not self._pendientes:
+            return
+        lote, self._pendientes = self._pendientes, []
+        marcas = [(dep, dep.marcar()) for dep in self.marca]
+        with self._cond:
+            seq = self.encolados
+            self.encolados += 1
+            self.filas += len(lote)
+        inicio = time.monotonic()
+        self.cola.put((seq, lote, marcas))
+        self.bloqueado += time.monotonic() - inicio
+
+    # --- Barreras ---
+
+    def esperar(self, hasta=None):
+        """Espera a que los primeros `hasta` lotes (o la etapa completa) esten confirmados."""
+        with self._cond:
+            if hasta is None:
+                self._cond.wait_for(lambda: self.cerrada and self._prefijo == self.encolados)
+            else:
+                self._cond.wait_for(lambda: self._prefijo >= hasta)
+
+    def _confirmar(self, seq, resultado):
+        with self._cond:
+            for llave in self.stats:
+                self.stats[llave] += resultado.get(llave, 0)
+            self._confirmados.add(seq)
+            while self._prefijo in self._confirmados:
+                self._confirmados.remove(self._prefijo)
+                self._prefijo += 1
+            self.fin = time.monotonic()
+            self._cond.notify_all()
+
+    # --- Consumidor ---
+
+    def consumir(self, transporte):
+        while True:
+            item = self.cola.get()
+            if item is _FIN:
+                return
+            seq, lote, marcas = item
+
+            inicio = time.monotonic()
+            for dep in self.requiere:
+                dep.esperar()
+            for dep, hasta in marcas:
+                dep.esperar(hasta)
+            ahora = time.monotonic()
+            with self._cond:
+                self.espera += ahora - inicio
+                self.inicio = min(self.inicio or ahora, ahora)
+
+            try:
+                resultado = transporte.post(self.endpoint, lote)
+            except Exception as e:
+                # El lote se da por terminado para no bloquear a las etapas que dependen de esta
+                print(f"  [ERR] {self.nombre} batch failed: {e}")
+                resultado = {"errores": len(lote)}
+            self._confirmar(seq, resultado)
+
+
+class PipelineSync:
+    """
+    Orquestador: productores (uno por DBF) -> etapas con cola acotada -> subidas.
+
+        pipeline = PipelineSync(transporte)
+        categorias = pipeline.etapa("Categories", "sync/categories", 100, hilos=1)
+        productos = pipeline.etapa("Products", "sync/products", 500, marca=[categorias])
+        pipeline.productor("producto.dbf", leer_productos, [categorias, productos])
+        pipeline.ejecutar()
+    """
+
+    def __init__(self, transporte, max_en_cola=4):
+        self.transporte = transporte
+        self.max_en_cola = max_en_cola
+        self.etapas = []
+        self.productores = []
+        self.fallidos = []  # productores que no pudieron leer su DBF completo
+
+    def etapa(self, nombre, endpoint, batch_size, requiere=(), marca=(), hilos=None):
+        etapa = EtapaSync(
+            nombre, endpoint, batch_size, requiere, marca,
+            hilos=hilos or self.transporte.max_workers, max_en_cola=self.max_en_cola
+        )
+        self.etapas.append(etapa)
+        return etapa
+
+    def productor(self, nombre, leer, etapas):
+        """`leer()` agrega las filas a `etapas`; al terminar (o fallar) se cierran."""
+        self.productores.append({"nombre": nombre, "leer": leer, "etapas": etapas, "segundos": 0.0, "error": None})
+
+    def _producir(self, productor):
+        inicio = time.monotonic()
+        try:
+            productor["leer"]()
+        except Exception as e:
+            productor["error"] = e
+            self.fallidos.append(productor["nombre"])
+            print(f"  [ERR] {productor['nombre']}: {e}")
+        finally:
+            for etapa in productor["etapas"]:
+                etapa.cerrar()
+            productor["segundos"] = time.monotonic() - inicio
+
+    def ejecutar(self):
+        self.inicio = time.monotonic()
+        hilos = [
+            threading.Thread(target=etapa.consumir, args=(self.transporte,), name=f"sync-{etapa.nombre}-{i}")
+            for etapa in self.etapas for i in range(etapa.hilos)
+        ]
+        hilos += [
+            threading.Thread(target=self._producir, args=(productor,), name=f"dbf-{productor['nombre']}")
+            for productor in self.productores
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.fin = time.monotonic()
+        self.imprimir_tiempos()
+        return {etapa.nombre: dict(etapa.stats, filas=etapa.filas) for etapa in self.etapas}
+
+    def imprimir_tiempos(self):
+        """Reporte por etapa: lectura de cada DBF y ventana de subida de cada entidad."""
+        print(f"\n{'lectura':<22} | {'s':>6} | {'bloqueado en cola s':>19}")
+        for productor in self.productores:
+            bloqueado = sum(etapa.bloqueado for etapa in productor["etapas"])
+            estado = " (ERROR)" if productor["error"] else ""
+            print(f"{productor['nombre']:<22} | {productor['segundos']:>6.2f} | {bloqueado:>19.2f}{estado}")
+
+        print(f"\n{'etapa':<22} | {'filas':>7} | {'errores':>7} | {'espera barrera s':>16} | {'subida (inicio-fin) s':>21}")
+        for etapa in self.etapas:
+            if etapa.inicio is None:
+                ventana = "-"
+            else:
+                ventana = f"{etapa.inicio - self.inicio:.2f} - {etapa.fin - self.inicio:.2f}"
+            print(f"{etapa.nombre:<22} | {etapa.filas:>7} | {etapa.stats['errores']:>7} | "
+                  f"{etapa.espera:>16.2f} | {ventana:>21}")
+        print(f"total: {self.fin - self.inicio:.2f}s")
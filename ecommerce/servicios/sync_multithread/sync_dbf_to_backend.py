@@ -16,11 +16,9 @@ Autor: Farmacruz Team
 
 from datetime import datetime, timezone
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import sys
 
 import pandas as pd
-import requests
 from dbfread import DBF
 
 # Importar configuración centralizada
@@ -29,7 +27,8 @@ from config import (
     BACKEND_URL, ADMIN_USERNAME, ADMIN_PASSWORD,
     DBF_DIR, IMAGES_FOLDER, CDN_URL,
     PRODUCTOS_BLOQUEADOS, CATEGORIA_BLOQUEADA,
-    PRODUCTO_DBF, PRECIPROD_DBF, EXISTE_DBF, PRO_DESC_DBF, BATCH_SIZE
+    PRODUCTO_DBF, PRECIPROD_DBF, EXISTE_DBF, PRO_DESC_DBF, BATCH_SIZE,
+    SYNC_MIN_WORKERS, SYNC_MAX_WORKERS, SYNC_LATENCIA_OBJETIVO, SYNC_REINTENTOS
 )
 
 # Importar funciones compartidas
@@ -38,7 +37,7 @@ from sync_functions import (
     build_producto_dict, build_categoria_dict,
     build_lista_precios_dict, build_item_lista_dict,
     cargar_descripciones_extra, cargar_existencias,
-    login, verificar_imagen_existe
+    crear_verificador_imagenes, TransporteSync
 )
 
 # Local aliases
@@ -55,87 +54,18 @@ PASSWORD = ADMIN_PASSWORD
 # API - Comunicacion con el backend
 # ============================================================================
 
-def enviar_batch(datos, endpoint, token, nombre):
-    """Envia un lote de datos al backend"""
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    
-    try:
-        response = requests.post(
-            f"{BACKEND_URL}/{endpoint}",
-            json=datos,
-            headers=headers
-        )
-        
-        if response.status_code != 200:
-            print(f"  DEBUG {nombre}: Status {response.status_code}, Content: {response.text[:300]}")
-        
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        print(f"Error in {nombre}: {e}")
-        if 'response' in locals():
-            print(f"  Response status: {response.status_code}")
-            print(f"  Response content (first 500 chars): {response.text[:500]}")
-        return {"creados": 0, "actualizados": 0, "errores": len(datos)}
+def enviar_en_lotes(datos, batch_size, endpoint, transporte, nombre):
+    """
+    Divide datos en lotes y los envia al backend en paralelo por el transporte
+    compartido (conexiones reutilizadas, reintentos y concurrencia adaptativa)
+    """
+    return transporte.enviar_en_lotes(datos, batch_size, endpoint, nombre)
 
 
-def enviar_en_lotes(datos, batch_size, endpoint, token, nombre, max_workers=5):
-    """Divide datos en lotes y los envia al backend en paralelo"""
-    if not datos:
-        print(f"{nombre}: No data to sync")
-        return
-    
-    total = len(datos)
-    num_batches = (total + batch_size - 1) // batch_size
-    
-    print(f"{nombre}: Syncing {total} records ({num_batches} batches, {max_workers} workers)")
-    
-    batches = []
-    for i in range(0, total, batch_size):
-        lote = datos[i:i + batch_size]
-        batches.append((lote, endpoint, token, nombre))
-    
-    creados = 0
-    actualizados = 0
-    errores = 0
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-            executor.submit(enviar_batch, lote, ep, tk, nm): i 
-            for i, (lote, ep, tk, nm) in enumerate(batches)
-        }
-        
-        for future in as_completed(futures):
-            batch_num = futures[future]
-            try:
-                resultado = future.result()
-                creados += resultado.get('creados', 0)
-                actualizados += resultado.get('actualizados', 0)
-                errores += resultado.get('errores', 0)
-            except Exception as e:
-                print(f"  Batch {batch_num + 1}/{num_batches} failed: {e}")
-                errores += len(batches[batch_num][0])
-    
-    print(f"  Done: {creados} created, {actualizados} updated, {errores} errors")
-
-
-def enviar_fecha_limpieza(fecha, token):
+def enviar_fecha_limpieza(fecha, transporte):
     """Envia la fecha de sync al backend"""
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    
     try:
-        response = requests.post(
-            f"{BACKEND_URL}/sync/cleanup",
-            json={"last_sync": fecha},
-            headers=headers
-        )
-        response.raise_for_status()
+        transporte.post("sync/cleanup", {"last_sync": fecha}, timeout=30)
         print("Cleaned up old records")
     except Exception as e:
         print(f"Cleanup warning: {e}")
@@ -162,8 +92,8 @@ def procesar_productos(df_productos, descripciones_extra, stock_map, fecha_sync)
     print("Processing products...")
     productos = []
     
-    def check_img(pid):
-        return verificar_imagen_existe(pid, IMAGES_FOLDER, CDN_URL)
+    # Una sola lectura de la carpeta de imágenes (en lugar de un stat por producto)
+    check_img = crear_verificador_imagenes(IMAGES_FOLDER, CDN_URL)
     
     for _, row in df_productos.iterrows():
         categoria = limpiar_texto(row.get('CSE_PROD'))
@@ -213,9 +143,13 @@ def main():
     print(f"DBF Sync - {inicio.strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"{'='*60}\n")
     
-    # 1. Login
-    token = login(BACKEND_URL, USERNAME, PASSWORD)
-    if not token:
+    # 1. Login (el transporte renueva el token de sync si expira a mitad de la corrida)
+    transporte = TransporteSync(
+        BACKEND_URL, USERNAME, PASSWORD,
+        max_workers=SYNC_MAX_WORKERS, min_workers=SYNC_MIN_WORKERS,
+        latencia_objetivo=SYNC_LATENCIA_OBJETIVO, reintentos=SYNC_REINTENTOS
+    )
+    if not transporte.token():
         print("Authentication failed. Aborting.\n")
         return
     
@@ -236,31 +170,22 @@ def main():
     print()
     
     categorias = procesar_categorias(df_productos, fecha_sync)
-    enviar_en_lotes(categorias, BATCH_SIZE["categorias"], "sync/categories", token, "Categorías", max_workers=5)
+    enviar_en_lotes(categorias, BATCH_SIZE["categorias"], "sync/categories", transporte, "Categorías")
     
     productos = procesar_productos(df_productos, descripciones_extra, stock_map, fecha_sync)
-    enviar_en_lotes(productos, BATCH_SIZE["productos"], "sync/products", token, "Productos", max_workers=8)
+    enviar_en_lotes(productos, BATCH_SIZE["productos"], "sync/products", transporte, "Productos")
     
     listas, listas_ids = procesar_listas_precios(df_precios, fecha_sync), df_precios['NLISPRE'].dropna().apply(limpiar_texto).unique()
-    enviar_en_lotes(listas, BATCH_SIZE["listas"], "sync/price-lists", token, "Listas de Precios", max_workers=5)
+    enviar_en_lotes(listas, BATCH_SIZE["listas"], "sync/price-lists", transporte, "Listas de Precios")
     
     items = procesar_items_listas(df_precios, listas_ids, fecha_sync)
-    enviar_en_lotes(items, BATCH_SIZE["items"], "sync/price-list-items", token, "Items de Listas", max_workers=10)
+    enviar_en_lotes(items, BATCH_SIZE["items"], "sync/price-list-items", transporte, "Items de Listas")
     
     # 5. Limpieza
     print()
     print("--- CLEANUP: PRODUCTS ---")
-    try:
-        response = requests.post(
-            f"{BACKEND_URL}/sync/cleanup",
-            json={"last_sync": fecha_sync},
-            headers={"Authorization": f"Bearer {token}"},
-            timeout=30
-        )
-        response.raise_for_status()
-        print("  ✓ Productos/categorias/listas limpiados\n")
-    except Exception as e:
-        print(f"  ⚠ Cleanup warning: {e}\n")
+    enviar_fecha_limpieza(fecha_sync, transporte)
+    print()
     
     # 6. Resumen final
     fin = datetime.now(timezone.utc)
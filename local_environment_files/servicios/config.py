@@ -61,3 +61,16 @@ BATCH_SIZE = {
     "items": 2000,
     "users": 200
 }
+
+# Transporte de sync_multithread: lotes en paralelo entre SYNC_MIN_WORKERS y
+# SYNC_MAX_WORKERS; arriba de SYNC_LATENCIA_OBJETIVO (segundos por lote) o con
+# 429/503 del servidor se reduce la concurrencia
+SYNC_MIN_WORKERS = 1
+SYNC_MAX_WORKERS = 10
+SYNC_LATENCIA_OBJETIVO = 2.0
+SYNC_REINTENTOS = 5
+
+# Filas por chunk en las subidas por partes de sync_zip (/sync-upload/sessions)
+UPLOAD_CHUNK_ROWS = 5000
+# Formato de los chunks: "columnar" (binario por columnas) o "ndjson"
+UPLOAD_FORMAT = "columnar"
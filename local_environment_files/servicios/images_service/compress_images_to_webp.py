@@ -1,20 +1,27 @@
 #!/usr/bin/env python3
 """
-Compresor de Imágenes a WebP - COMPRESIÓN ADAPTATIVA
-=====================================================
+Compresor de Imágenes a WebP - COMPRESIÓN ADAPTATIVA EN PARALELO
+=================================================================
 
-Convierte imágenes JPG/PNG a WebP con compresión ADAPTATIVA:
-- Imágenes GRANDES (>100KB): Comprime MUY agresivamente hasta <50KB
-- Imágenes normales: Compresión estándar
+Convierte imágenes JPG/PNG a WebP buscando que cada una quede en <50KB:
+- Se procesan en paralelo (un proceso por núcleo del CPU)
+- La calidad se busca con búsqueda binaria EN MEMORIA (BytesIO), sin escribir
+  ni hacer stat al disco por cada intento; solo se escribe el resultado final
+- Si ni con la calidad mínima cabe, se reduce la dimensión según la proporción
+  entre el tamaño obtenido y el objetivo (en lugar de bajar 20% a ciegas)
 
-OPTIMIZACIONES:
-1. Redimensiona imágenes grandes progresivamente
-2. Reduce calidad iterativamente hasta alcanzar objetivo
-3. Convierte todo a RGB para mejor compresión
+MANIFIESTO (.compress_manifest.json en la carpeta destino):
+    nombre -> hash del original + parámetros de salida (calidad, dimensiones, bytes)
+    Si el hash del original no cambió y el WebP existe, la imagen se salta
+    (no depende de la fecha de modificación: copiar la carpeta no recomprime todo).
 """
 
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
 from pathlib import Path
 from PIL import Image
+import hashlib
+import json
 import os
 import sys
 
@@ -34,8 +41,12 @@ SOURCE_FOLDER= IMAGES_FOLDER_INPUT
 # OUTPUT_FOLDER = Path("/Users/bernardoorozco/Downloads/CompressedImg")
 OUTPUT_FOLDER = IMAGES_FOLDER
 
-# Calidad de compresión WebP inicial (0-100)
+# Manifiesto de imágenes ya comprimidas (hash del original -> parámetros de salida)
+MANIFEST_PATH = OUTPUT_FOLDER / ".compress_manifest.json"
+
+# Calidad de compresión WebP inicial (0-100) y mínima aceptable
 WEBP_QUALITY = 70
+MIN_QUALITY = 45
 
 # Dimensiones máximas iniciales
 MAX_DIMENSION = 1200
@@ -43,211 +54,292 @@ MAX_DIMENSION = 1200
 # OBJETIVO: Todas las imágenes < 50KB
 TARGET_SIZE_KB = 50
 
+# Máximo de reducciones de dimensión antes de aceptar el mejor resultado
+MAX_RESIZES = 3
+
+# method=6 es el más lento y compacto: se usa solo en el encode final.
+# La búsqueda usa method=4 (mucho más rápido, tamaño muy parecido).
+SEARCH_METHOD = 4
+FINAL_METHOD = 6
+
+# Procesos en paralelo (uno por núcleo)
+WORKERS = os.cpu_count() or 2
+
 # Formatos de imagen soportados
 SUPPORTED_FORMATS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif'}
 
 # ============================================================================
 # FUNCIONES
 # ============================================================================
-
 def crear_carpeta_destino():
     """Crea la carpeta de salida si no existe"""
     OUTPUT_FOLDER.mkdir(parents=True, exist_ok=True)
     print(f"[OK] Carpeta destino: {OUTPUT_FOLDER}")
 
 
-def obtener_tamaño_mb(ruta):
-    """Retorna el tamaño del archivo en MB"""
-    return os.path.getsize(ruta) / (1024 * 1024)
+def cargar_manifiesto():
+    """Lee el manifiesto de la corrida anterior ({} si no existe o está dañado)"""
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def guardar_manifiesto(manifiesto):
+    """Escribe el manifiesto de forma atómica (un corte a medias no lo corrompe)"""
+    tmp_path = MANIFEST_PATH.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=0, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def hash_archivo(ruta):
+    """Hash del contenido del original (blake2b, rápido y suficiente para detectar cambios)"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+def a_rgb(img):
+    """Convierte a RGB (fondo blanco para imágenes con transparencia)"""
+    if img.mode in ('RGBA', 'LA', 'P'):
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
 
+def redimensionar(img, dimension):
+    """Escala para que el lado mayor no exceda `dimension`"""
+    if max(img.size) <= dimension:
+        return img
+    escala = dimension / max(img.size)
+    nuevo = (max(1, int(img.width * escala)), max(1, int(img.height * escala)))
+    return img.resize(nuevo, Image.Resampling.LANCZOS)
 
-def obtener_tamaño_kb(ruta):
-    """Retorna el tamaño del archivo en KB"""
-    return os.path.getsize(ruta) / 1024
 
+def codificar(img, calidad, method):
+    """Codifica a WebP en memoria y regresa los bytes"""
+    buffer = BytesIO()
+    img.save(buffer, 'WEBP', quality=calidad, method=method)
+    return buffer.getvalue()
 
-def comprimir_a_webp_adaptativo(imagen_path):
+
+def buscar_parametros(img, objetivo_bytes):
     """
-    Convierte una imagen a WebP con compresión ADAPTATIVA
-    - Imágenes grandes: comprime más agresivamente hasta <50KB
-    - Imágenes normales: compresión estándar
-    Retorna (exito: bool, tamaño_original_mb, tamaño_final_mb)
+    Busca la mayor calidad (y dimensión) que deja la imagen bajo el objetivo.
+    Retorna (imagen_redimensionada, calidad, cumple_objetivo, encodes_realizados).
     """
+    dimension = MAX_DIMENSION
+    encodes = 0
+    for _ in range(MAX_RESIZES + 1):
+        procesada = redimensionar(img, dimension)
+
+        # Caso común: a calidad inicial ya cabe (1 solo encode)
+        tamaño = len(codificar(procesada, WEBP_QUALITY, SEARCH_METHOD))
+        encodes += 1
+        if tamaño <= objetivo_bytes:
+            return procesada, WEBP_QUALITY, True, encodes
+
+        # ¿Cabe con la calidad mínima? Si no, hay que reducir dimensión
+        tamaño_min = len(codificar(procesada, MIN_QUALITY, SEARCH_METHOD))
+        encodes += 1
+        if tamaño_min <= objetivo_bytes:
+            # Búsqueda binaria de la mayor calidad que cabe en (MIN_QUALITY, WEBP_QUALITY)
+            lo, hi = MIN_QUALITY + 1, WEBP_QUALITY - 1
+            mejor = MIN_QUALITY
+            while lo <= hi:
+                mid = (lo + hi) // 2
+                encodes += 1
+                if len(codificar(procesada, mid, SEARCH_METHOD)) <= objetivo_bytes:
+                    mejor, lo = mid, mid + 1
+                else:
+                    hi = mid - 1
+            return procesada, mejor, True, encodes
+
+        # El tamaño crece ~ con el número de pixeles: escalar el lado por sqrt(objetivo/tamaño)
+        factor = (objetivo_bytes / tamaño_min) ** 0.5 * 0.95
+        dimension = max(64, int(max(procesada.size) * min(factor, 0.9)))
+
+    return procesada, MIN_QUALITY, False, encodes
+
+
+def comprimir_a_webp_adaptativo(imagen_path, output_folder, hash_original):
+    """
+    Convierte una imagen a WebP (se ejecuta en un proceso del pool).
+    Retorna dict con el resultado; 'error' si algo falló.
+    """
+    nombre_base = imagen_path.stem
+    webp_path = output_folder / f"{nombre_base}.webp"
     try:
-        # Nombre del archivo sin extensión
-        nombre_base = imagen_path.stem
-        webp_path = OUTPUT_FOLDER / f"{nombre_base}.webp"
-        
-        # Si ya existe, verificar si el original es más reciente
-        if webp_path.exists():
-            if webp_path.stat().st_mtime >= imagen_path.stat().st_mtime:
-                # El archivo comprimido ya está actualizado, saltar silenciosamente
-                return False, 0, 0
-            else:
-                print(f"[UPDATE] Actualizando: {nombre_base}.webp (el original es más reciente)")
-        
-        # Abrir imagen
+        tamaño_original = os.path.getsize(imagen_path)
         with Image.open(imagen_path) as img:
-            # Tamaño original
-            tamaño_original_mb = obtener_tamaño_mb(imagen_path)
-            ancho_original, alto_original = img.size
-            
-            # Convertir a RGB primero
-            if img.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
-            elif img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # ============================================================
-            # COMPRESIÓN ADAPTATIVA CON OBJETIVO <50KB
-            # ============================================================
-            current_dimension = MAX_DIMENSION
-            current_quality = WEBP_QUALITY
-            intento = 0
-            max_intentos = 6
-            
-            while intento < max_intentos:
-                # Crear copia de la imagen para este intento
-                img_procesada = img.copy()
-                redimensionado = False
-                
-                # Redimensionar si excede la dimensión actual
-                if max(img_procesada.size) > current_dimension:
-                    if img_procesada.width > img_procesada.height:
-                        nuevo_ancho = current_dimension
-                        nuevo_alto = int((current_dimension / img_procesada.width) * img_procesada.height)
-                    else:
-                        nuevo_alto = current_dimension
-                        nuevo_ancho = int((current_dimension / img_procesada.height) * img_procesada.width)
-                    
-                    img_procesada = img_procesada.resize((nuevo_ancho, nuevo_alto), Image.Resampling.LANCZOS)
-                    redimensionado = True
-                
-                # Guardar con calidad actual
-                img_procesada.save(
-                    webp_path,
-                    'WEBP',
-                    quality=current_quality,
-                    method=6
-                )
-                
-                # Verificar tamaño resultante
-                tamaño_final_kb = obtener_tamaño_kb(webp_path)
-                
-                # ¿Alcanzamos el objetivo?
-                if tamaño_final_kb <= TARGET_SIZE_KB:
-                    tamaño_final_mb = obtener_tamaño_mb(webp_path)
-                    reduccion = ((tamaño_original_mb - tamaño_final_mb) / tamaño_original_mb) * 100
-                    
-                    # Mostrar resultado exitoso
-                    if tamaño_original_mb >= 0.1:
-                        print(f"[OK] {nombre_base}: {tamaño_original_mb:.2f}MB -> {tamaño_final_kb:.1f}KB ({reduccion:.0f}%)", end="")
-                    else:
-                        orig_kb = obtener_tamaño_kb(imagen_path)
-                        print(f"[OK] {nombre_base}: {orig_kb:.1f}KB -> {tamaño_final_kb:.1f}KB ({reduccion:.0f}%)", end="")
-                    
-                    # Mostrar optimizaciones aplicadas
-                    if redimensionado or intento > 0:
-                        extras = []
-                        if redimensionado:
-                            extras.append(f"{img_procesada.width}x{img_procesada.height}")
-                        if intento > 0:
-                            extras.append(f"q:{current_quality}")
-                        print(f" [{', '.join(extras)}]")
-                    else:
-                        print()
-                    
-                    return True, tamaño_original_mb, tamaño_final_mb
-                
-                # No alcanzamos el objetivo, siguiente intento
-                intento += 1
-                
-                # ESTRATEGIA DE COMPRESIÓN PROGRESIVA:
-                # Intentos 1-2: Reducir calidad
-                # Intentos 3+: Reducir dimensiones además de calidad
-                if intento <= 2:
-                    current_quality = max(45, current_quality - 12)
-                else:
-                    current_dimension = int(current_dimension * 0.80)  # 80% de la dimensión anterior
-                    current_quality = max(45, current_quality - 8)
-            
-            # Si después de todos los intentos aún excede, aceptar el mejor resultado
-            tamaño_final_mb = obtener_tamaño_mb(webp_path)
-            tamaño_final_kb = obtener_tamaño_kb(webp_path)
-            reduccion = ((tamaño_original_mb - tamaño_final_mb) / tamaño_original_mb) * 100
-            
-            print(f"[WARN] {nombre_base}: {tamaño_original_mb:.2f}MB -> {tamaño_final_kb:.1f}KB ({reduccion:.0f}%) [excede {TARGET_SIZE_KB}KB]")
-            
-            return True, tamaño_original_mb, tamaño_final_mb
-            
+            img = a_rgb(img)
+            procesada, calidad, cumple, encodes = buscar_parametros(img, TARGET_SIZE_KB * 1024)
+
+        # Encode final con method=6 (normalmente igual o menor que en la búsqueda)
+        datos = codificar(procesada, calidad, FINAL_METHOD)
+        if cumple and len(datos) > TARGET_SIZE_KB * 1024:
+            datos = codificar(procesada, calidad, SEARCH_METHOD)
+
+        # Escritura atómica: el sync nunca ve un WebP a medias
+        tmp_path = webp_path.with_suffix(".webp.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(datos)
+        os.replace(tmp_path, webp_path)
+
+        return {
+            "nombre": nombre_base,
+            "hash": hash_original,
+            "calidad": calidad,
+            "ancho": procesada.width,
+            "alto": procesada.height,
+            "bytes": len(datos),
+            "bytes_original": tamaño_original,
+            "cumple": cumple,
+            "encodes": encodes,
+        }
     except Exception as e:
-        print(f"[ERROR] Error con {imagen_path.name}: {e}")
-        return False, 0, 0
+        return {"nombre": nombre_base, "error": str(e)}
+
+
+def procesar_imagen(imagen_path, output_folder, entrada_manifiesto):
+    """Tarea del pool: hashea el original y solo comprime si cambió"""
+    try:
+        hash_original = hash_archivo(imagen_path)
+    except OSError as e:
+        return {"nombre": imagen_path.stem, "error": str(e)}
+
+    webp_path = output_folder / f"{imagen_path.stem}.webp"
+    if entrada_manifiesto and entrada_manifiesto.get("hash") == hash_original and webp_path.exists():
+        return {"nombre": imagen_path.stem, "sin_cambios": True}
+
+    return comprimir_a_webp_adaptativo(imagen_path, output_folder, hash_original)
+
+
+def unicas_por_nombre(imagenes):
+    """
+    Una imagen por nombre base: foo.jpg y foo.png escribirían el mismo foo.webp y
+    la misma entrada del manifiesto desde procesos distintos. Se queda la primera
+    (orden alfabético); retorna (unicas, [(omitida, usada), ...]).
+    """
+    unicas = {}
+    duplicadas = []
+    for imagen in imagenes:
+        if imagen.stem in unicas:
+            duplicadas.append((imagen, unicas[imagen.stem]))
+        else:
+            unicas[imagen.stem] = imagen
+    return list(unicas.values()), duplicadas
+
+
+def imprimir_resultado(r):
+    orig_kb = r["bytes_original"] / 1024
+    final_kb = r["bytes"] / 1024
+    reduccion = (1 - r["bytes"] / r["bytes_original"]) * 100 if r["bytes_original"] else 0
+    origen = f"{orig_kb / 1024:.2f}MB" if orig_kb >= 100 else f"{orig_kb:.1f}KB"
+    extras = f" [{r['ancho']}x{r['alto']}, q:{r['calidad']}, {r['encodes']} encodes]"
+    if r["cumple"]:
+        print(f" [OK] {r['nombre']}: {origen} -> {final_kb:.1f}KB ({reduccion:.0f}%){extras}")
+    else:
+        print(f" [!] {r['nombre']}: {origen} -> {final_kb:.1f}KB ({reduccion:.0f}%){extras} [excede {TARGET_SIZE_KB}KB]")
 
 
 def main():
     """Función principal"""
     print("="*70)
-    print("Compresor ADAPTATIVO de Imagenes a WebP")
-    print(f"   Objetivo: <{TARGET_SIZE_KB}KB por imagen")
+    print(" [IMG] Compresor ADAPTATIVO de Imágenes a WebP")
+    print(f"   Objetivo: <{TARGET_SIZE_KB}KB por imagen  |  Procesos: {WORKERS}")
     print("="*70)
     print()
-    
+
     # Verificar que existe la carpeta origen
     if not SOURCE_FOLDER.exists():
         print(f"[ERROR] No existe la carpeta {SOURCE_FOLDER}")
         return
-    
+
     # Crear carpeta destino
     crear_carpeta_destino()
     print()
-    
-    # Obtener todas las imágenes
-    imagenes = []
-    for ext in SUPPORTED_FORMATS:
-        imagenes.extend(SOURCE_FOLDER.glob(f"*{ext}"))
-        imagenes.extend(SOURCE_FOLDER.glob(f"*{ext.upper()}"))
-    
+
+    # Obtener todas las imágenes (una sola pasada por la carpeta)
+    imagenes = sorted(
+        Path(entry.path) for entry in os.scandir(SOURCE_FOLDER)
+        if entry.is_file() and os.path.splitext(entry.name)[1].lower() in SUPPORTED_FORMATS
+    )
+
     if not imagenes:
-        print(f"[WARN] No se encontraron imagenes en {SOURCE_FOLDER}")
+        print(f" [!] No se encontraron imágenes en {SOURCE_FOLDER}")
         return
-    
+
+    imagenes, duplicadas = unicas_por_nombre(imagenes)
+    for omitida, usada in duplicadas:
+        print(f" [!] Se omite {omitida.name}: {usada.name} ya genera {omitida.stem}.webp")
+
     print(f"[INFO] Encontradas {len(imagenes)} imagenes")
     print()
-    
-    # Comprimir cada imagen
-    exitos = 0
+
+    manifiesto = cargar_manifiesto()
+    # Entradas de originales que ya no existen (no se vuelven a usar)
+    obsoletas = manifiesto.keys() - {imagen.stem for imagen in imagenes}
+    for nombre in obsoletas:
+        del manifiesto[nombre]
+    if obsoletas:
+        print(f"[INFO] {len(obsoletas)} entradas del manifiesto sin original, eliminadas")
+    cambiadas = []
+    errores = 0
+    sin_cambios = 0
     tamaño_total_original = 0
     tamaño_total_final = 0
     imagenes_bajo_objetivo = 0
-    
-    for imagen in sorted(imagenes):
-        exito, orig, final = comprimir_a_webp_adaptativo(imagen)
-        if exito:
-            exitos += 1
-            tamaño_total_original += orig
-            tamaño_total_final += final
-            
-            # Verificar si está bajo el objetivo
-            webp_path = OUTPUT_FOLDER / f"{imagen.stem}.webp"
-            if webp_path.exists() and obtener_tamaño_kb(webp_path) <= TARGET_SIZE_KB:
-                imagenes_bajo_objetivo += 1
-    
+
+    with ProcessPoolExecutor(max_workers=WORKERS) as pool:
+        futuros = [
+            pool.submit(procesar_imagen, imagen, OUTPUT_FOLDER, manifiesto.get(imagen.stem))
+            for imagen in imagenes
+        ]
+        for i, futuro in enumerate(as_completed(futuros), 1):
+            r = futuro.result()
+            if r.get("sin_cambios"):
+                sin_cambios += 1
+            elif "error" in r:
+                errores += 1
+                print(f" [ERR] Error con {r['nombre']}: {r['error']}")
+            else:
+                imprimir_resultado(r)
+                cambiadas.append(r["nombre"])
+                tamaño_total_original += r["bytes_original"]
+                tamaño_total_final += r["bytes"]
+                imagenes_bajo_objetivo += 1 if r["cumple"] else 0
+                manifiesto[r["nombre"]] = {k: r[k] for k in ("hash", "calidad", "ancho", "alto", "bytes")}
+
+            # Guardar avance cada tanto: si se interrumpe, lo ya comprimido no se repite
+            if cambiadas and i % 500 == 0:
+                guardar_manifiesto(manifiesto)
+
+    guardar_manifiesto(manifiesto)
+
+    # Resumen
+    exitos = len(cambiadas)
     print()
     print("="*70)
-    print(f"[OK] Compresion completada")
-    print(f"   Procesadas: {exitos}/{len(imagenes)} imagenes")
+    print(f" [OK] Compresión completada")
+    print(f"   Comprimidas: {exitos}  |  Sin cambios: {sin_cambios}  |  Errores: {errores}  (de {len(imagenes)})")
     if exitos > 0:
+        mb = 1024 * 1024
         print(f"   Bajo objetivo (<{TARGET_SIZE_KB}KB): {imagenes_bajo_objetivo}/{exitos} ({imagenes_bajo_objetivo*100/exitos:.0f}%)")
-        print(f"   Tamano original total: {tamaño_total_original:.2f} MB")
-        print(f"   Tamano final total: {tamaño_total_final:.2f} MB")
+        print(f"   Tamaño original total: {tamaño_total_original / mb:.2f} MB")
+        print(f"   Tamaño final total: {tamaño_total_final / mb:.2f} MB")
         reduccion_total = ((tamaño_total_original - tamaño_total_final) / tamaño_total_original) * 100
-        print(f"   Reduccion total: {reduccion_total:.1f}%")
-        print(f"   Ahorro: {tamaño_total_original - tamaño_total_final:.2f} MB")
+        print(f"   Reducción total: {reduccion_total:.1f}%")
+        print(f"   Ahorro: {(tamaño_total_original - tamaño_total_final) / mb:.2f} MB")
     print("="*70)
 
 
@@ -0,0 +1,129 @@
+"""
+Image Manifest - Inventario de imágenes WebP para las sincronizaciones.
+
+En lugar de hacer un stat (Path.exists) por producto sobre la carpeta compartida,
+se lista la carpeta UNA vez con os.scandir y se guarda {producto_id: (bytes, mtime)}.
+Todos los builders de la corrida consultan ese inventario en memoria.
+
+El inventario se guarda entre corridas (IMAGES_MANIFEST_CACHE):
+- Se informa qué imágenes son nuevas, cuáles se modificaron y cuáles se borraron.
+- Si la carpeta no se puede leer (unidad de red caída) o aparece vacía cuando
+  antes tenía imágenes, se usa el inventario anterior: un corte de red no deja
+  a todos los productos con image_url = None.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+
+# Inventario de la corrida anterior (junto a config.py)
+IMAGES_MANIFEST_CACHE = Path(__file__).resolve().parent.parent / ".images_manifest.json"
+
+IMAGE_EXTENSION = ".webp"
+
+_manifiestos = {}   # carpeta -> inventario ya cargado en este proceso
+_lock = threading.Lock()
+
+
+def _clave(producto_id):
+    # En Windows el sistema de archivos no distingue mayúsculas (igual que Path.exists)
+    return os.path.normcase(producto_id)
+
+
+def escanear_imagenes(images_folder):
+    """
+    Lista la carpeta en una sola pasada.
+    Retorna {producto_id: [bytes, mtime_ns]} de los archivos .webp.
+    """
+    archivos = {}
+    with os.scandir(images_folder) as entradas:
+        for entrada in entradas:
+            nombre, extension = os.path.splitext(entrada.name)
+            if extension.lower() != IMAGE_EXTENSION or not entrada.is_file():
+                continue
+            # En Windows scandir ya trae tamaño y fecha: stat() no vuelve a tocar el disco
+            info = entrada.stat()
+            archivos[_clave(nombre)] = [info.st_size, info.st_mtime_ns]
+    return archivos
+
+
+def _leer_cache(cache_path, images_folder):
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cache.get("folder") != str(images_folder):
+        return None
+    return cache.get("archivos", {})
+
+
+def _guardar_cache(cache_path, images_folder, archivos):
+    tmp_path = Path(cache_path).with_suffix(".tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"folder": str(images_folder), "archivos": archivos}, f, separators=(",", ":"))
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f" [IMG] No se pudo guardar el inventario de imágenes: {e}")
+
+
+def comparar_manifiestos(anterior, actual):
+    """Retorna (nuevas, modificadas, eliminadas) entre dos inventarios."""
+    nuevas = [pid for pid in actual if pid not in anterior]
+    eliminadas = [pid for pid in anterior if pid not in actual]
+    modificadas = [pid for pid, datos in actual.items() if pid in anterior and list(anterior[pid]) != list(datos)]
+    return nuevas, modificadas, eliminadas
+
+
+def cargar_manifiesto_imagenes(images_folder, cache_path=IMAGES_MANIFEST_CACHE):
+    """
+    Inventario de imágenes de la carpeta (una sola vez por proceso y carpeta).
+
+    Returns:
+        dict: {producto_id: [bytes, mtime_ns]}
+    """
+    folder = str(images_folder)
+    with _lock:
+        if folder in _manifiestos:
+            return _manifiestos[folder]
+
+        anterior = _leer_cache(cache_path, folder) if cache_path else None
+        try:
+            actual = escanear_imagenes(folder)
+        except OSError as e:
+            actual = None
+            print(f" [IMG] No se pudo leer {folder}: {e}")
+
+        if actual is None or (not actual and anterior):
+            # Carpeta inaccesible (o vacía de golpe): conservar las imágenes conocidas
+            actual = anterior or {}
+            print(f" [IMG] Usando inventario anterior ({len(actual)} imágenes)")
+        else:
+            if anterior is not None:
+                nuevas, modificadas, eliminadas = comparar_manifiestos(anterior, actual)
+                print(f" [IMG] {len(actual)} imágenes: {len(nuevas)} nuevas, "
+                      f"{len(modificadas)} modificadas, {len(eliminadas)} eliminadas")
+            else:
+                print(f" [IMG] {len(actual)} imágenes (sin inventario anterior)")
+            if cache_path and actual != anterior:
+                _guardar_cache(cache_path, folder, actual)
+
+        _manifiestos[folder] = actual
+        return actual
+
+
+def crear_verificador_imagenes(images_folder, cdn_url, cache_path=IMAGES_MANIFEST_CACHE):
+    """
+    Retorna una función producto_id -> URL del CDN (o None) para build_producto_dict.
+    Reemplaza a verificar_imagen_existe sin hacer un stat por producto.
+    """
+    manifiesto = cargar_manifiesto_imagenes(images_folder, cache_path)
+
+    def verificar(producto_id):
+        if producto_id and _clave(producto_id) in manifiesto:
+            return f"{cdn_url}/{producto_id}{IMAGE_EXTENSION}"
+        return None
+
+    return verificar
@@ -1,25 +1,25 @@
 """
-Unified DBF Sync Client (Sequential Flow + Cached Threading)
-============================================================
+Unified DBF Sync Client (Pipelined Flow + Cached Threading)
+===========================================================
 Refactored to use centralized sync_functions module.
-
-Order of Operations (Strictly Sequential):
-1. Categories       (Threaded Batches)
-2. Products         (Threaded Batches)
-3. Price Lists      (Threaded Batches)
-4. Price Items      (Threaded Batches)
-5. Sellers          (Threaded Batches)
-6. Customers        (Threaded Batches)
-7. Global Cleanup   (Deactivates records not updated in this run)
+Batches go through TransporteSync (pooled connections, retries, token refresh
+and adaptive concurrency) instead of a fixed thread count per entity.
+
+Each DBF is read exactly once, streaming, by its own producer thread, while
+the batches already built are being uploaded (sync_functions.pipeline).
+Foreign keys are still honored by stage barriers:
+1. Categories   -> Products        (producto.dbf; each product batch waits only
+                                    for the categories seen before it)
+2. Price Lists  -> Price Items     (PRECIPROD.DBF; same, per batch)
+3. Products     -> Price Items     (items wait for all products)
+4. Sellers      -> Customers       (customers wait for all sellers...)
+5. Price Lists  -> Customers       (...and all price lists)
+6. Global Cleanup (after every stage; deactivates records not updated in this run,
+                  skipped if any DBF could not be read completely)
 """
 
 from datetime import datetime, timezone
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import time
-import requests
-import pandas as pd
-from dbfread import DBF
 import sys
 
 # Importar configuración centralizada
@@ -29,7 +29,8 @@ from config import (
     DBF_DIR, IMAGES_FOLDER, CDN_URL,
     CLIENTES_DBF, AGENTES_DBF,
     PRODUCTOS_BLOQUEADOS, CATEGORIA_BLOQUEADA,
-    PRODUCTO_DBF, PRECIPROD_DBF, EXISTE_DBF, PRO_DESC_DBF, BATCH_SIZE
+    PRODUCTO_DBF, PRECIPROD_DBF, EXISTE_DBF, PRO_DESC_DBF, BATCH_SIZE,
+    SYNC_MIN_WORKERS, SYNC_MAX_WORKERS, SYNC_LATENCIA_OBJETIVO, SYNC_REINTENTOS
 )
 
 # Importar funciones compartidas
@@ -39,7 +40,7 @@ from sync_functions import (
     build_vendedor_dict, build_cliente_dict,
     build_lista_precios_dict, build_item_lista_dict,
     cargar_descripciones_extra, cargar_existencias,
-    dbf_to_dataframe, login, verificar_imagen_existe
+    iterar_dbf, crear_verificador_imagenes, TransporteSync, PipelineSync
 )
 
 # Local aliases
@@ -50,44 +51,65 @@ EXISTENCIAS_DBF = EXISTE_DBF
 DESCRIPCIONES_DBF = PRO_DESC_DBF
 
 # ============================================================================
-# API HELPERS
+# PRODUCERS (una lectura por DBF)
 # ============================================================================
 
-def send_batch(endpoint, data, token, name):
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    try:
-        response = requests.post(f"{BACKEND_URL}/{endpoint}", json=data, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        print(f"  [ERR] {name} Batch Failed: {e}")
-        return {"creados": 0, "actualizados": 0, "errores": len(data)}
-
-def sync_in_parallel(data, batch_size, endpoint, token, name, workers=5):
-    """Splits data into batches and sends them using threads."""
-    if not data:
-        print(f"[{name}] No data to sync.")
-        return
-    
-    total = len(data)
-    batches = [data[i:i + batch_size] for i in range(0, total, batch_size)]
-    print(f"[{name}] Syncing {total} records -> {len(batches)} batches ({workers} threads)...")
-    
-    stats = {"creados": 0, "actualizados": 0, "errores": 0}
-    
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        futures = {executor.submit(send_batch, endpoint, batch, token, name): i for i, batch in enumerate(batches)}
-        
-        for future in as_completed(futures):
+def leer_productos(categorias, productos, sync_time):
+    """producto.dbf (+ existe.dbf y pro_desc.dbf) -> categorias y productos."""
+    stock_map = cargar_existencias(EXISTENCIAS_DBF)
+    desc_map = cargar_descripciones_extra(DESCRIPCIONES_DBF)
+    # Una sola lectura de la carpeta de imágenes (en lugar de un stat por producto)
+    check_img = crear_verificador_imagenes(IMAGES_FOLDER, CDN_URL)
+
+    vistas = set()
+    for r in iterar_dbf(PRODUCTOS_DBF):
+        # Global Filters
+        if str(r.get('CSE_PROD')).upper().strip() == CATEGORIA_BLOQUEADA:
+            continue
+        if str(r.get('CSE_PROD')).strip() in PRODUCTOS_BLOQUEADOS or str(r.get('CVE_TIAL')).strip() in PRODUCTOS_BLOQUEADOS:
+            continue
+
+        cat = limpiar_texto(r.get('CSE_PROD')) if r.get('CSE_PROD') is not None else None
+        if cat and cat not in vistas:
+            vistas.add(cat)
+            categorias.agregar(build_categoria_dict(cat, sync_time))
+
+        if not limpiar_texto(r.get('CVE_PROD')): continue
+        productos.agregar(build_producto_dict(r, desc_map, stock_map, check_img, sync_time))
+
+
+def leer_precios(listas, items, sync_time):
+    """PRECIPROD.DBF -> listas de precios e items (una sola lectura para ambas)."""
+    vistas = set()
+    for r in iterar_dbf(PRECIOS_DBF):
+        lid = r.get('NLISPRE')
+        if lid:
             try:
-                res = future.result()
-                stats["creados"] += res.get("creados", 0)
-                stats["actualizados"] += res.get("actualizados", 0)
-                stats["errores"] += res.get("errores", 0)
-            except Exception as e:
-                print(f"  Batch future failed: {e}")
-                
-    print(f"[{name}] DONE: {stats['creados']} created, {stats['actualizados']} updated, {stats['errores']} errors")
+                lista = build_lista_precios_dict(lid, sync_time)
+            except (ValueError, TypeError):
+                lista = None
+            if lista and lista['price_list_id'] not in vistas:
+                vistas.add(lista['price_list_id'])
+                listas.agregar(lista)
+
+        if limpiar_texto(r.get('CVE_PROD')) and limpiar_texto(r.get('NLISPRE')):
+            items.agregar(build_item_lista_dict(r, sync_time))
+
+
+def leer_vendedores(vendedores, sync_time):
+    for r in iterar_dbf(AGENTES_DBF):
+        if r.get('CVE_AGE') is None: continue
+        try:
+            vendedores.agregar(build_vendedor_dict(r, sync_time))
+        except: continue
+
+
+def leer_clientes(clientes, sync_time):
+    for r in iterar_dbf(CLIENTES_DBF):
+        if r.get('CVE_CTE') is None: continue
+        try:
+            clientes.agregar(build_cliente_dict(r, sync_time))
+        except: continue
 
 
 # ============================================================================
@@ -98,122 +120,57 @@ def main():
     start_total = datetime.now()
     sync_time = datetime.now(timezone.utc).isoformat()
     
-    print(f"=== UNIFIED SEQUENTIAL SYNC START: {start_total} ===")
+    print(f"=== UNIFIED PIPELINED SYNC START: {start_total} ===")
     print(f"=== SYNC TIMESTAMP: {sync_time} ===")
     
-    # 0. Auth
-    token = login(BACKEND_URL, ADMIN_USERNAME, ADMIN_PASSWORD)
-    if not token: return
-
-    # --- STEP 1: CATEGORIES ---
-    print("\n--- STEP 1: CATEGORIES ---")
-    df_prod = dbf_to_dataframe(PRODUCTOS_DBF)
-    cats_data = []
-    if not df_prod.empty:
-        # Global Filters
-        df_prod = df_prod[df_prod['CSE_PROD'].astype(str).str.upper().str.strip() != CATEGORIA_BLOQUEADA]
-        df_prod = df_prod[~df_prod['CSE_PROD'].astype(str).str.strip().isin(PRODUCTOS_BLOQUEADOS)]
-        if 'CVE_TIAL' in df_prod.columns:
-            df_prod = df_prod[~df_prod['CVE_TIAL'].astype(str).str.strip().isin(PRODUCTOS_BLOQUEADOS)]
-        
-        cats_uniq = df_prod['CSE_PROD'].dropna().apply(limpiar_texto).unique()
-        cats_data = [build_categoria_dict(c, sync_time) for c in cats_uniq if c]
-        sync_in_parallel(cats_data, BATCH_SIZE['categorias'], "sync/categories", token, "Categories", 1)
-    
-    # --- STEP 2: PRODUCTS ---
-    print("\n--- STEP 2: PRODUCTS ---")
-    stock_map = {}
-    desc_map = {}
-    
-    if not df_prod.empty:
-        stock_map = cargar_existencias(EXISTENCIAS_DBF)
-        desc_map = cargar_descripciones_extra(DESCRIPCIONES_DBF)
-        
-        prods_list = []
-        
-        def check_img(pid):
-            return verificar_imagen_existe(pid, IMAGES_FOLDER, CDN_URL)
-        
-        for _, r in df_prod.iterrows():
-            pid = limpiar_texto(r['CVE_PROD'])
-            if not pid: continue
-            
-            prods_list.append(build_producto_dict(r, desc_map, stock_map, check_img, sync_time))
-        
-        sync_in_parallel(prods_list, BATCH_SIZE['productos'], "sync/products", token, "Products", 8)
-
-    # --- STEP 3: PRICE LISTS ---
-    print("\n--- STEP 3: PRICE LISTS ---")
-    df_price = dbf_to_dataframe(PRECIOS_DBF)
-    if not df_price.empty:
-        lids = df_price['NLISPRE'].dropna().unique()
-        lists_data = [build_lista_precios_dict(i, sync_time) for i in lids if i]
-        sync_in_parallel(lists_data, BATCH_SIZE['listas'], "sync/price-lists", token, "PriceLists", 1)
-
-    # --- STEP 4: PRICE ITEMS ---
-    print("\n--- STEP 4: PRICE ITEMS ---")
-    if not df_price.empty:
-        items_data = []
-        for _, r in df_price.iterrows():
-            pid = limpiar_texto(r.get('CVE_PROD'))
-            lid = limpiar_texto(r.get('NLISPRE'))
-            if pid and lid:
-                items_data.append(build_item_lista_dict(r, sync_time))
-        sync_in_parallel(items_data, BATCH_SIZE['items'], "sync/price-list-items", token, "PriceItems", 10)
-
-
-    # --- STEP 5: SELLERS (AGENTS) ---
-    print("\n--- STEP 5: SELLERS ---")
-    df_agents = dbf_to_dataframe(AGENTES_DBF)
-    if not df_agents.empty and 'CVE_AGE' in df_agents.columns:
-        df_agents = df_agents[df_agents['CVE_AGE'].notna()]
-        sellers_list = []
-        for _, r in df_agents.iterrows():
-            try:
-                sellers_list.append(build_vendedor_dict(r, sync_time))
-            except: continue
-        sync_in_parallel(sellers_list, BATCH_SIZE['users'], "sync/sellers", token, "Sellers", 1)
-
-    # --- STEP 6: CUSTOMERS ---
-    print("\n--- STEP 6: CUSTOMERS ---")
-    df_cust = dbf_to_dataframe(CLIENTES_DBF)
-    if not df_cust.empty and 'CVE_CTE' in df_cust.columns:
-        df_cust = df_cust[df_cust['CVE_CTE'].notna()]
-        customers_list = []
-        for _, r in df_cust.iterrows():
-            try:
-                customers_list.append(build_cliente_dict(r, sync_time))
-            except: continue
-        sync_in_parallel(customers_list, BATCH_SIZE['users'], "sync/customers", token, "Customers", 5)
+    # 0. Auth (el transporte renueva el token de sync si expira a mitad de la corrida)
+    transporte = TransporteSync(
+        BACKEND_URL, ADMIN_USERNAME, ADMIN_PASSWORD,
+        max_workers=SYNC_MAX_WORKERS, min_workers=SYNC_MIN_WORKERS,
+        latencia_objetivo=SYNC_LATENCIA_OBJETIVO, reintentos=SYNC_REINTENTOS
+    )
+    if not transporte.token(): return
+
+    # --- STEPS 1-6: PIPELINE ---
+    pipeline = PipelineSync(transporte)
+    categorias = pipeline.etapa("Categories", "sync/categories", BATCH_SIZE['categorias'], hilos=1)
+    productos = pipeline.etapa("Products", "sync/products", BATCH_SIZE['productos'], marca=[categorias])
+    listas = pipeline.etapa("PriceLists", "sync/price-lists", BATCH_SIZE['listas'], hilos=1)
+    items = pipeline.etapa("PriceItems", "sync/price-list-items", BATCH_SIZE['items'],
+                           requiere=[productos], marca=[listas])
+    vendedores = pipeline.etapa("Sellers", "sync/sellers", BATCH_SIZE['users'], hilos=1)
+    clientes = pipeline.etapa("Customers", "sync/customers", BATCH_SIZE['users'], requiere=[vendedores, listas])
+
+    pipeline.productor(PRODUCTOS_DBF.name, lambda: leer_productos(categorias, productos, sync_time),
+                       [categorias, productos])
+    pipeline.productor(PRECIOS_DBF.name, lambda: leer_precios(listas, items, sync_time), [listas, items])
+    pipeline.productor(AGENTES_DBF.name, lambda: leer_vendedores(vendedores, sync_time), [vendedores])
+    pipeline.productor(CLIENTES_DBF.name, lambda: leer_clientes(clientes, sync_time), [clientes])
+
+    print("\n--- STEPS 1-6: CATEGORIES, PRODUCTS, PRICE LISTS, PRICE ITEMS, SELLERS, CUSTOMERS ---")
+    pipeline.ejecutar()
 
     # --- STEP 7: CLEANUP ---
     print("\n--- STEP 7: CLEANUP ---")
     
-    # Cleanup productos/categorias/listas
-    try:
-        response = requests.post(
-            f"{BACKEND_URL}/sync/cleanup",
-            json={"last_sync": sync_time},
-            headers={"Authorization": f"Bearer {token}"},
-            timeout=30
-        )
-        response.raise_for_status()
-        print("  ✓ Productos/categorias/listas limpiados")
-    except Exception as e:
-        print(f"  ⚠ Products cleanup failed: {e}")
+    if pipeline.fallidos:
+        # Sin el DBF completo la limpieza desactivaria registros que si existen
+        print(f"  ⚠ Cleanup skipped, could not read: {', '.join(pipeline.fallidos)}")
+    else:
+        # Cleanup productos/categorias/listas
+        try:
+            transporte.post("sync/cleanup", {"last_sync": sync_time}, timeout=30)
+            print("  ✓ Productos/categorias/listas limpiados")
+        except Exception as e:
+            print(f"  ⚠ Products cleanup failed: {e}")
     
-    # Cleanup usuarios
-    try:
-        response = requests.post(
-            f"{BACKEND_URL}/sync/cleanup-users",
-            json={"last_sync": sync_time},
-            headers={"Authorization": f"Bearer {token}"},
-            timeout=30
-        )
-        response.raise_for_status()
-        print("  ✓ Usuarios limpiados")
-    except Exception as e:
-        print(f"  ⚠ Users cleanup failed: {e}")
+        # Cleanup usuarios
+        try:
+            transporte.post("sync/cleanup-users", {"last_sync": sync_time}, timeout=30)
+            print("  ✓ Usuarios limpiados")
+        except Exception as e:
+            print(f"  ⚠ Users cleanup failed: {e}")
+
 
     end_total = datetime.now()
     print(f"\n{'='*60}")
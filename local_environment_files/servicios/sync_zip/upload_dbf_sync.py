@@ -3,15 +3,16 @@ Production-optimized DBF sync client.
 Refactored to use centralized sync_functions module.
 
 Pipeline:
-1. Parse Products -> JSON -> GZIP -> Upload
-2. Parse Unique Price Lists -> JSON -> GZIP -> Upload
-3. Parse Price Items -> JSON -> GZIP -> Upload
+1. Parse Products -> chunks columnares -> GZIP -> Upload (resumible por chunk)
+2. Parse Unique Price Lists -> chunks columnares -> GZIP -> Upload
+3. Parse Price Items -> chunks columnares -> GZIP -> Upload
 4. Parse Sellers -> JSON -> GZIP -> Upload
 5. Parse Customers -> JSON -> GZIP -> Upload
 """
 
 import gzip
 import json
+import time
 from datetime import datetime
 import sys
 from pathlib import Path
@@ -26,22 +27,23 @@ from config import (
     BACKEND_URL, ADMIN_USERNAME, ADMIN_PASSWORD,
     DBF_DIR, IMAGES_FOLDER, CDN_URL,
     CLIENTES_DBF, AGENTES_DBF,
-    PRODUCTOS_BLOQUEADOS, CATEGORIA_BLOQUEADA
+    PRODUCTOS_BLOQUEADOS, CATEGORIA_BLOQUEADA,
+    UPLOAD_CHUNK_ROWS, UPLOAD_FORMAT
 )
 
 # Importar funciones compartidas
 from sync_functions import (
     build_producto_dict, build_lista_precios_dict, build_item_lista_dict,
     build_vendedor_dict, build_cliente_dict,
-    cargar_descripciones_extra, cargar_existencias, dbf_to_dataframe, login, verificar_imagen_existe,
-    limpiar_texto, limpiar_numero
+    cargar_descripciones_extra, cargar_existencias, dbf_to_dataframe, crear_verificador_imagenes,
+    limpiar_texto, limpiar_numero, subir_por_chunks, TransporteSync
 )
 
 # ============================================================================
 # UPLOAD HELPERS
 # ============================================================================
 
-def upload_compressed_json(endpoint, data, token):
+def upload_compressed_json(endpoint, data, transporte):
     json_str = json.dumps(data)
     original_size = len(json_str.encode('utf-8'))
     compressed = gzip.compress(json_str.encode('utf-8'))
@@ -51,21 +53,14 @@ def upload_compressed_json(endpoint, data, token):
     print(f"  Size: {original_size/1024/1024:.2f}MB -> {compressed_size/1024/1024:.2f}MB ({100 - (compressed_size/original_size)*100:.1f}% savings)")
 
     headers = {
-        "Authorization": f"Bearer {token}",
         "Content-Encoding": "gzip",
         "Content-Type": "application/json"
     }
     
-    response = requests.post(f"{BACKEND_URL}{endpoint}", data=compressed, headers=headers, timeout=300)
+    # Reintentos y token renovado por el transporte (los uploads son upserts: reenviar es seguro)
+    result = transporte.enviar("POST", endpoint.lstrip("/"), data=compressed, headers=headers, timeout=(10, 300))
     
-    # DEBUG
-    print(f"  Response status: {response.status_code}")
-    
-    response.raise_for_status()
-    
-    result = response.json()
-    
-    if response.status_code == 202 or 'status' in result:
+    if 'status' in result:
         print(f"  ✓ Encolado: {result.get('message', 'Procesando en background')}")
     elif 'actualizados' in result:
         print(f"  ✓ Completado: {result['actualizados']} actualizados")
@@ -73,11 +68,76 @@ def upload_compressed_json(endpoint, data, token):
     return result
 
 
+def abrir_corrida(transporte):
+    """
+    Abre una corrida de sincronizacion (POST /sync/runs). El servidor registra lo
+    recibido con este run_id y la limpieza quita exactamente lo que no llego.
+    Retorna None si el servidor no la soporta (se limpia por fecha como antes).
+    """
+    try:
+        run_id = transporte.enviar("POST", "sync/runs", timeout=30)["run_id"]
+        print(f"  Corrida de sincronizacion: {run_id}")
+        return run_id
+    except Exception as e:
+        print(f"  ⚠ Sin corrida de sincronizacion ({e}); limpieza por fecha")
+        return None
+
+
+def solicitar_limpieza(transporte, run_id, cleanup_time, intentos=10, espera=15):
+    """
+    POST /sync/cleanup. Con corrida, el servidor responde 409 mientras alguna
+    subida aceptada siga en cola (en cualquier worker): se espera y se reintenta.
+    """
+    payload = {"run_id": run_id} if run_id is not None else {"last_sync": cleanup_time}
+    for intento in range(intentos):
+        try:
+            # Sin reenvio ante cortes de red: la limpieza se pide una sola vez (el 401 si renueva)
+            return transporte.enviar("POST", "sync/cleanup", json=payload, timeout=30, reintentar=False)
+        except requests.HTTPError as e:
+            if e.response.status_code != 409 or intento == intentos - 1:
+                raise
+            print(f"  ... {e.response.json().get('detail')}; reintento en {espera}s")
+            time.sleep(espera)
+
+
+def abortar_corrida(transporte, run_id):
+    """
+    POST /sync/runs/{run_id}/abort. Si la corrida no se pudo limpiar (una subida fallo)
+    se abandona sin desactivar nada, en lugar de dejarla abierta.
+    """
+    if run_id is None:
+        return
+    try:
+        transporte.enviar("POST", f"sync/runs/{run_id}/abort", timeout=30, reintentar=False)
+        print(f"  Corrida {run_id} abortada (sin limpieza)")
+    except Exception as e:
+        print(f"  ⚠ No se pudo abortar la corrida {run_id} ({e})")
+
+
+def con_corrida(payload, run_id):
+    if run_id is not None:
+        payload["run_id"] = run_id
+    return payload
+
+
+def upload_por_chunks(entidad, filas, transporte, run_id):
+    """
+    Sube por chunks (reintenta solo el chunk que falle). Retorna False si el
+    servidor no soporta subidas por chunks y hay que usar upload_compressed_json.
+    """
+    print(f"  Uploading {entidad} en chunks de {UPLOAD_CHUNK_ROWS} filas ({UPLOAD_FORMAT})...")
+    progreso = subir_por_chunks(transporte, entidad, filas, run_id, UPLOAD_CHUNK_ROWS, formato=UPLOAD_FORMAT)
+    if progreso is None:
+        return False
+    print(f"  ✓ Aplicado: {progreso}")
+    return True
+
+
 # ============================================================================
 # PROCESSORS
 # ============================================================================
 
-def process_and_upload_products(token, sync_time):
+def process_and_upload_products(transporte, sync_time, run_id=None):
     print("\n--- STEP 1: PRODUCTS ---")
     
     df_prod = dbf_to_dataframe(DBF_DIR / "producto.dbf")
@@ -99,8 +159,8 @@ def process_and_upload_products(token, sync_time):
     productos_list = []
     categorias = set()
     
-    def check_img(pid):
-        return verificar_imagen_existe(pid, IMAGES_FOLDER, CDN_URL)
+    # Una sola lectura de la carpeta de imágenes (en lugar de un stat por producto)
+    check_img = crear_verificador_imagenes(IMAGES_FOLDER, CDN_URL)
     
     for _, row in df_prod.iterrows():
         pid = limpiar_texto(row.get('CVE_PROD'))
@@ -111,13 +171,15 @@ def process_and_upload_products(token, sync_time):
         
         productos_list.append(build_producto_dict(row, descripciones, stock_map, check_img, sync_time))
     
-    payload = {"categorias": list(categorias), "productos": productos_list}
-    upload_compressed_json("/sync-upload/productos-json", payload, token)
+    if not upload_por_chunks("productos", productos_list, transporte, run_id):
+        payload = con_corrida({"categorias": list(categorias), "productos": productos_list}, run_id)
+        upload_compressed_json("/sync-upload/productos-json", payload, transporte)
 
 
-def process_and_upload_pricelists(token, sync_time):
+def process_and_upload_pricelists(transporte, sync_time, run_id=None, df=None):
     print("\n--- STEP 2: PRICE LISTS (HEADERS) ---")
-    df = dbf_to_dataframe(DBF_DIR / "PRECIPROD.DBF")
+    if df is None:
+        df = dbf_to_dataframe(DBF_DIR / "PRECIPROD.DBF")
     
     unique_ids = df['NLISPRE'].unique()
     
@@ -129,13 +191,15 @@ def process_and_upload_pricelists(token, sync_time):
         except ValueError:
             continue
     
-    payload = {"listas": listas_payload}
-    upload_compressed_json("/sync-upload/listas-precios-json", payload, token)
+    if not upload_por_chunks("listas", listas_payload, transporte, run_id):
+        payload = con_corrida({"listas": listas_payload}, run_id)
+        upload_compressed_json("/sync-upload/listas-precios-json", payload, transporte)
 
 
-def process_and_upload_items(token, sync_time):
+def process_and_upload_items(transporte, sync_time, run_id=None, df=None):
     print("\n--- STEP 3: PRICE LIST ITEMS ---")
-    df = dbf_to_dataframe(DBF_DIR / "PRECIPROD.DBF")
+    if df is None:
+        df = dbf_to_dataframe(DBF_DIR / "PRECIPROD.DBF")
     
     items_payload = []
     for _, row in df.iterrows():
@@ -146,11 +210,12 @@ def process_and_upload_items(token, sync_time):
         
         items_payload.append(build_item_lista_dict(row, sync_time))
 
-    payload = {"items": items_payload}
-    upload_compressed_json("/sync-upload/items-precios-json", payload, token)
+    if not upload_por_chunks("items", items_payload, transporte, run_id):
+        payload = con_corrida({"items": items_payload}, run_id)
+        upload_compressed_json("/sync-upload/items-precios-json", payload, transporte)
 
 
-def process_and_upload_sellers(token, sync_time):
+def process_and_upload_sellers(transporte, sync_time):
     print("\n--- STEP 4: SELLERS (AGENTS) ---")
     df_agents = dbf_to_dataframe(AGENTES_DBF)
     
@@ -165,12 +230,12 @@ def process_and_upload_sellers(token, sync_time):
             
     if sellers_list:
         payload = {"sellers": sellers_list}
-        upload_compressed_json("/sync-upload/sellers-json", payload, token)
+        upload_compressed_json("/sync-upload/sellers-json", payload, transporte)
     else:
         print("  No sellers found.")
 
 
-def process_and_upload_customers(token):
+def process_and_upload_customers(transporte):
     print("\n--- STEP 5: CUSTOMERS ---")
     df_cust = dbf_to_dataframe(CLIENTES_DBF)
     
@@ -185,7 +250,7 @@ def process_and_upload_customers(token):
             
     if customers_list:
         payload = {"customers": customers_list}
-        upload_compressed_json("/sync-upload/customers-json", payload, token)
+        upload_compressed_json("/sync-upload/customers-json", payload, transporte)
     else:
         print("  No customers found.")
 
@@ -199,44 +264,40 @@ def main():
     print(f"STARTING SYNC {start}")
     sync_time = datetime.now().isoformat()
     
-    token = login(BACKEND_URL, ADMIN_USERNAME, ADMIN_PASSWORD)
-    if not token: return
+    # Todas las peticiones van por el transporte: renueva el token de sync (5 minutos) y reintenta
+    transporte = TransporteSync(BACKEND_URL, ADMIN_USERNAME, ADMIN_PASSWORD, max_workers=1)
+    if not transporte.token(): return
     
+    run_id = None
     try:
-        process_and_upload_products(token, sync_time)
-        process_and_upload_pricelists(token, sync_time)
-        process_and_upload_items(token, sync_time)
-        process_and_upload_sellers(token, sync_time)
-        process_and_upload_customers(token)
+        run_id = abrir_corrida(transporte)
+        process_and_upload_products(transporte, sync_time, run_id)
+        # PRECIPROD.DBF se lee una sola vez para encabezados e items
+        df_precios = dbf_to_dataframe(DBF_DIR / "PRECIPROD.DBF")
+        process_and_upload_pricelists(transporte, sync_time, run_id, df_precios)
+        process_and_upload_items(transporte, sync_time, run_id, df_precios)
+        process_and_upload_sellers(transporte, sync_time)
+        process_and_upload_customers(transporte)
         
         # IMPORTANTE: Restamos 5 minutos para dar tiempo al procesamiento de la cola
+        # (solo se usa si no hay corrida)
         from datetime import timedelta
         cleanup_time = (start - timedelta(minutes=5)).isoformat()
         
         # Cleanup productos/categorias/listas no sincronizados
         print("\n--- CLEANUP: PRODUCTS ---")
         try:
-            response = requests.post(
-                f"{BACKEND_URL}/sync/cleanup",
-                json={"last_sync": cleanup_time},
-                headers={"Authorization": f"Bearer {token}"},
-                timeout=30
-            )
-            response.raise_for_status()
+            solicitar_limpieza(transporte, run_id, cleanup_time)
             print("  ✓ Productos/categorias/listas limpiados")
         except Exception as e:
             print(f"  ⚠ Cleanup warning: {e}")
+            abortar_corrida(transporte, run_id)
         
         # Cleanup usuarios no sincronizados
         print("\n--- CLEANUP: USERS ---")
         try:
-            response = requests.post(
-                f"{BACKEND_URL}/sync/cleanup-users",
-                json={"last_sync": cleanup_time},
-                headers={"Authorization": f"Bearer {token}"},
-                timeout=30
-            )
-            response.raise_for_status()
+            transporte.enviar("POST", "sync/cleanup-users", json={"last_sync": cleanup_time}, timeout=30,
+                              reintentar=False)
             print("  ✓ Usuarios limpiados")
         except Exception as e:
             print(f"  ⚠ Cleanup warning: {e}")
@@ -245,6 +306,7 @@ def main():
         print(f"\nCRITICAL FAILURE: {e}")
         import traceback
         traceback.print_exc()
+        abortar_corrida(transporte, run_id)
     
     end = datetime.now()
     print(f"\nCOMPLETED IN {(end - start).total_seconds():.2f}s")
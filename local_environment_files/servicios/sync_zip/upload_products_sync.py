@@ -30,7 +30,7 @@ from sync_functions import (
     cargar_existencias,
     dbf_to_dataframe,
     login,
-    verificar_imagen_existe,
+    crear_verificador_imagenes,
     limpiar_texto,
     limpiar_numero
 )
@@ -101,9 +101,8 @@ def process_and_upload_products(token, sync_time):
     productos_list = []
     categorias = set()
     
-    # Helper closure for image verification
-    def check_img(pid):
-        return verificar_imagen_existe(pid, IMAGES_FOLDER, CDN_URL)
+    # Una sola lectura de la carpeta de imágenes (en lugar de un stat por producto)
+    check_img = crear_verificador_imagenes(IMAGES_FOLDER, CDN_URL)
     
     for _, row in df_prod.iterrows():
         pid = limpiar_texto(row.get('CVE_PROD'))
@@ -2,11 +2,12 @@ import { formatCurrency } from '../../utils/formatUtils';
 
 export default function CartSummary({
   items,
+  totals = null,
   onCheckout,
   processingCheckout = false
 }) {
-  // Calcula el subtotal sumando todos los items
-  const subtotal = items.reduce((sum, item) => {
+  // Usa el total calculado por el backend; si no llegó, suma los items como respaldo
+  const subtotal = totals ? totals.total : items.reduce((sum, item) => {
     const product = item.product || {};
     const price = product.final_price || product.base_price || 0;
     return sum + price * item.quantity;
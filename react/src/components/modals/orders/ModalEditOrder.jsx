@@ -123,7 +123,9 @@ export default function ModalEditOrder({ visible, order, onClose, onSave }) {
                     quantity: item.quantity
                 })),
                 shipping_cost: shippingCost,
-                assignment_notes: assignmentNotes
+                assignment_notes: assignmentNotes,
+                // Si otro usuario guardo el pedido despues de abrirlo, el backend responde 409
+                version: order.version
             });
             onClose();
         } catch (err) { setError(err.message || 'Error al guardar cambios'); }
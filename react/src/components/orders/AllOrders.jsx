@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import { FontAwesomeIcon } from '@fortawesome/react-fontawesome';
-import { faSearch, faSpinner, faSync, faFileAlt, faEdit, faPlus } from '@fortawesome/free-solid-svg-icons';
+import { faSearch, faSpinner, faSync, faFileAlt, faEdit, faPlus, faFileArchive } from '@fortawesome/free-solid-svg-icons';
 import orderService from '../../services/orderService';
 import LoadingSpinner from '../common/LoadingSpinner';
 import ErrorMessage from '../common/ErrorMessage';
@@ -10,6 +10,7 @@ import ModalEditOrder from '../modals/orders/ModalEditOrder';
 import ModalCreateOrder from '../modals/orders/ModalCreateOrder';
 import PaginationButtons from '../common/PaginationButtons';
 import { useAuth } from '../../context/AuthContext';
+import useRealtimeEvent from '../../hooks/useRealtimeEvent';
 import { formatCurrency } from '../../utils/formatUtils';
 
 export default function AllOrders() {
@@ -36,6 +37,7 @@ export default function AllOrders() {
   const [orderToEdit, setOrderToEdit] = useState(null);
 
   const [showCreateModal, setShowCreateModal] = useState(false);
+  const [exporting, setExporting] = useState(false);
 
   useEffect(() => {
     const timer = setTimeout(() => { setDebouncedSearchTerm(searchTerm); setPage(0); }, 2500);
@@ -44,22 +46,19 @@ export default function AllOrders() {
 
   useEffect(() => { loadOrders(); }, [page, statusFilter, debouncedSearchTerm]);
 
-  // Auto-refresh interval (every 60s)
-  useEffect(() => {
-    const interval = setInterval(() => {
-      // Only refresh if tab is visible and no modals are open
-      if (
-        document.visibilityState === 'visible' &&
-        !showModal &&
-        !showAssignModal &&
-        !showEditModal &&
-        !showCreateModal
-      ) {
-        loadOrders(true); // silent refresh
-      }
-    }, 60000);
-    return () => clearInterval(interval);
-  }, [page, statusFilter, debouncedSearchTerm, showModal, showAssignModal, showEditModal, showCreateModal]);
+  // Recarga silenciosa cuando el servidor avisa de cambios en pedidos visibles (SSE, sin polling)
+  useRealtimeEvent(['order.created', 'order.updated', 'order.assigned', 'order.cancelled', 'resync'], () => {
+    // No recargar con modales abiertos ni con la pestaña oculta
+    if (
+      document.visibilityState === 'visible' &&
+      !showModal &&
+      !showAssignModal &&
+      !showEditModal &&
+      !showCreateModal
+    ) {
+      loadOrders(true); // silent refresh
+    }
+  });
 
   const loadOrders = async (silent = false) => {
     try {
@@ -131,6 +130,13 @@ export default function AllOrders() {
     finally { setActionLoading(null); }
   };
 
+  // ZIP con los TXT de los pedidos aprobados que aun no se exportaron al ERP
+  const handleExportTXT = async () => {
+    try { setExporting(true); await orderService.exportOrdersTXT({ status: 'approved' }); }
+    catch (err) { setError(err.message || 'Error al exportar pedidos.'); }
+    finally { setExporting(false); }
+  };
+
   const handleEditOrder = async (order) => {
     try { setActionLoading(order.order_id); const details = await orderService.getOrderById(order.order_id); setOrderToEdit(details); setShowEditModal(true); }
     catch (err) { setError('Error al cargar pedido para editar'); console.error(err); }
@@ -166,6 +172,12 @@ export default function AllOrders() {
           </button>
         )}
 
+        {(user?.role === 'admin' || user?.role === 'marketing') && (
+          <button className="btn btn--secondary btn--sm" onClick={handleExportTXT} disabled={exporting} title="Descargar TXT de los pedidos aprobados no exportados">
+            <FontAwesomeIcon icon={exporting ? faSpinner : faFileArchive} spin={exporting} /> Exportar TXT
+          </button>
+        )}
+
         <form className="search-bar" onSubmit={handleSearch}>
           <input className="input" type="search" placeholder="Buscar por N° de Pedido, Cliente o Vendedor..." value={searchTerm} onChange={(e) => setSearchTerm(e.target.value)} />
           <button type="submit" className="btn btn--primary" aria-label="Buscar">
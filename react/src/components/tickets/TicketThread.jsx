@@ -3,6 +3,7 @@ import { FontAwesomeIcon } from '@fortawesome/react-fontawesome';
 import { faArrowLeft, faPaperPlane, faUserCircle, faExclamationTriangle, faCheck, faBan, faUserPlus, faTimes, faArrowDown } from '@fortawesome/free-solid-svg-icons';
 import { ticketService } from '../../services/ticketService';
 import LoadingSpinner from '../common/LoadingSpinner';
+import useRealtimeEvent from '../../hooks/useRealtimeEvent';
 
 export default function TicketThread({ ticketId, onClose, currentUser }) {
   const [ticket, setTicket] = useState(null);
@@ -10,17 +11,64 @@ export default function TicketThread({ ticketId, onClose, currentUser }) {
   const [message, setMessage] = useState('');
   const [sending, setSending] = useState(false);
   const [updating, setUpdating] = useState(false);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const messagesEndRef = useRef(null);
+  const skipScrollRef = useRef(false);
 
   useEffect(() => {
     loadTicket();
   }, [ticketId]);
 
   useEffect(() => {
-    // Scroll to bottom when ticket messages load/change
+    // Scroll to bottom when ticket messages load/change (no al cargar mensajes anteriores)
+    if (skipScrollRef.current) {
+      skipScrollRef.current = false;
+      return;
+    }
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
   }, [ticket?.messages]);
 
+  // Cuando el servidor avisa de un mensaje nuevo en este ticket (SSE), pedir solo los posteriores al ultimo
+  const lastCursor = ticket?.messages?.length ? ticket.messages[ticket.messages.length - 1].cursor : null;
+  useRealtimeEvent(['ticket.message', 'resync'], async (data) => {
+    if (!ticket || (data.ticket_id && data.ticket_id !== ticketId)) return;
+    if (data.message_id && ticket.messages.some(m => m.message_id === data.message_id)) return;
+    try {
+      const page = await ticketService.getMessages(ticketId, { since: lastCursor });
+      if (page.items.length) appendMessages(page.items);
+    } catch (err) {
+      console.error(err);
+    }
+  });
+
+  // Agrega mensajes al final evitando duplicados (el propio mensaje enviado tambien llega por SSE)
+  const appendMessages = (newMessages) => {
+    setTicket(prev => {
+      const seen = new Set(prev.messages.map(m => m.message_id));
+      const fresh = newMessages.filter(m => !seen.has(m.message_id));
+      return fresh.length ? { ...prev, messages: [...prev.messages, ...fresh] } : prev;
+    });
+  };
+
+  const loadOlderMessages = async () => {
+    if (!ticket?.messages?.length) return;
+    try {
+      setLoadingOlder(true);
+      const page = await ticketService.getMessages(ticketId, { before: ticket.messages[0].cursor });
+      skipScrollRef.current = true;
+      setTicket(prev => ({
+        ...prev,
+        messages: [...page.items, ...prev.messages],
+        has_more_messages: page.has_more
+      }));
+    } catch (err) {
+      console.error(err);
+      alert('Error al cargar mensajes anteriores');
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
   const loadTicket = async () => {
     try {
       setLoading(true);
@@ -42,10 +90,7 @@ export default function TicketThread({ ticketId, onClose, currentUser }) {
     try {
       setSending(true);
       const newMsg = await ticketService.addMessage(ticketId, message.trim());
-      setTicket(prev => ({
-        ...prev,
-        messages: [...prev.messages, newMsg]
-      }));
+      appendMessages([newMsg]);
       setMessage('');
     } catch (err) {
       console.error(err);
@@ -166,6 +211,11 @@ export default function TicketThread({ ticketId, onClose, currentUser }) {
 
       {/* Chat Messages */}
       <div className="ticket-thread__messages">
+        {ticket.has_more_messages && (
+          <button className="btn btn--outline btn--sm" onClick={loadOlderMessages} disabled={loadingOlder} style={{ alignSelf: 'center' }}>
+            {loadingOlder ? 'Cargando...' : 'Ver mensajes anteriores'}
+          </button>
+        )}
         {ticket.messages.length === 0 ? (
           <div className="ticket-thread__messages-empty">No hay mensajes adicionales en este ticket.</div>
         ) : (
@@ -8,6 +8,7 @@ const CartContext = createContext(null);
 export const CartProvider = ({ children }) => {
   const { isAuthenticated, user } = useAuth();
   const [items, setItems] = useState([]);
+  const [totals, setTotals] = useState(null);
   const [loading, setLoading] = useState(false);
 
   // Load cart only for customers (not for admin, seller, marketing)
@@ -16,14 +17,16 @@ export const CartProvider = ({ children }) => {
       loadCart();
     } else {
       setItems([]);
+      setTotals(null);
     }
   }, [isAuthenticated, user]);
 
   const loadCart = async () => {
     try {
       setLoading(true);
-      const cartData = await orderService.getCart();
-      setItems(cartData);
+      const { items: cartItems, ...cartTotals } = await orderService.getCartSummary();
+      setItems(cartItems);
+      setTotals(cartTotals);
     } catch (error) {
       console.error('Failed to load cart:', error);
     } finally {
@@ -118,6 +121,7 @@ export const CartProvider = ({ children }) => {
     try {
       await orderService.clearCart();
       setItems([]);
+      setTotals(null);
     } catch (error) {
       console.error('Failed to clear cart:', error);
       throw error;
@@ -128,6 +132,7 @@ export const CartProvider = ({ children }) => {
     try {
       const order = await orderService.checkout(shippingAddressNumber, orderNotes);
       setItems([]);
+      setTotals(null);
       return order;
     } catch (error) {
       console.error('Checkout failed:', error);
@@ -141,6 +146,7 @@ export const CartProvider = ({ children }) => {
       const result = await orderService.importCartExcel(file);
       if (result.cart) {
         setItems(result.cart);
+        setTotals(result.cart_totals || null);
       } else {
         await loadCart();
       }
@@ -163,6 +169,7 @@ export const CartProvider = ({ children }) => {
 
   const value = {
     items,
+    totals,
     loading,
     itemCount,
     total,
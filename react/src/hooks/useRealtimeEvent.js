@@ -0,0 +1,16 @@
+import { useEffect, useRef } from 'react';
+import realtimeService from '../services/realtimeService';
+
+// Ejecuta `handler` cada vez que llega alguno de los eventos indicados.
+// El handler puede cambiar en cada render sin volver a suscribirse.
+export function useRealtimeEvent(types, handler) {
+  const handlerRef = useRef(handler);
+  handlerRef.current = handler;
+  const key = Array.isArray(types) ? types.join(',') : types;
+
+  useEffect(() => {
+    return realtimeService.subscribe(key.split(','), (data) => handlerRef.current(data));
+  }, [key]);
+}
+
+export default useRealtimeEvent;
@@ -41,7 +41,7 @@ export default function Cart() {
   // ============================================
   // HOOKS & STATE
   // ============================================
-  const { items, loading, updateQuantity, removeItem, clearCart, checkout, refreshCart, importFromExcel } = useCart();
+  const { items, totals, loading, updateQuantity, removeItem, clearCart, checkout, refreshCart, importFromExcel } = useCart();
   const { user } = useAuth();
   const navigate = useNavigate();
   const location = useLocation();
@@ -348,6 +348,7 @@ export default function Cart() {
               <div className="cart__summary">
                 <CartSummary
                   items={items}
+                  totals={totals}
                   onCheckout={handleCheckoutClick}
                   processingCheckout={processingCheckout}
                 />
@@ -11,6 +11,11 @@ export const orderService = {
     return apiService.get('/orders/cart')
   },
 
+  // Obtener el carrito junto con sus totales (calculados en el backend)
+  async getCartSummary() {
+    return apiService.get('/orders/cart/summary')
+  },
+
   // Agregar un producto al carrito (por defecto añade 1)
   async addToCart(productId, quantity = 1) {
     return apiService.post('/orders/cart', {
@@ -121,6 +126,37 @@ export const orderService = {
     a.click()
     document.body.removeChild(a)
     window.URL.revokeObjectURL(url)
+  },
+
+  // Exportar en un ZIP los TXT de los pedidos aun no exportados (los marca como exportados)
+  // params: { status, date_from, date_to, seller_id, only_new, mark_exported }
+  async exportOrdersTXT(params = {}) {
+    const token = localStorage.getItem('token')
+    const query = new URLSearchParams(
+      Object.entries(params).filter(([, value]) => value !== undefined && value !== null && value !== '')
+    ).toString()
+
+    const response = await fetch(`${API_BASE}/orders/export-txt${query ? `?${query}` : ''}`, {
+      method: 'POST',
+      headers: {
+        'Authorization': `Bearer ${token}`
+      }
+    })
+
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({ detail: 'Error desconocido' }))
+      throw new Error(errorData.detail || 'Error al exportar los pedidos')
+    }
+
+    const blob = await response.blob()
+    const url = window.URL.createObjectURL(blob)
+    const a = document.createElement('a')
+    a.href = url
+    a.download = `pedidos_${new Date().toISOString().slice(0, 10)}.zip`
+    document.body.appendChild(a)
+    a.click()
+    document.body.removeChild(a)
+    window.URL.revokeObjectURL(url)
   }
 }
 
@@ -60,11 +60,21 @@ const priceListService = {
 
   /**
    * Bulk update price list items
+   * @returns {object} { procesados, no_encontrados }
    */
   async bulkUpdatePriceListItems(priceListId, items) {
     return apiService.post(`/price-lists/${priceListId}/items/bulk`, { items });
   },
 
+  /**
+   * Mass repricing of a price list
+   * @param {object} rule - { operation: 'set'|'add'|'multiply', value, category_id, search, product_ids, keep_erp_price, dry_run }
+   * @returns {object} { afectados, dry_run, muestra }
+   */
+  async repricePriceList(priceListId, rule) {
+    return apiService.post(`/price-lists/${priceListId}/reprice`, rule);
+  },
+
   /**
    * Update a specific price list item
    */
@@ -96,7 +106,7 @@ const priceListService = {
    * Get products that ARE in the price list with full details
    * Returns product info + markup percentage
    * @param {number} priceListId - The price list ID
-   * @param {object} params - Query params: { skip, limit, search }
+   * @param {object} params - Query params: { skip, limit, search, sort_by, sort_order }
    */
   async getItemsWithDetails(priceListId, params = {}) {
     return apiService.get(`/price-lists/${priceListId}/items-with-details`, params);
@@ -0,0 +1,62 @@
+import { API_BASE } from '../config/api'
+
+// Notificaciones en tiempo real (Server-Sent Events).
+// Una sola conexión compartida por toda la app; los componentes se suscriben
+// por tipo de evento ('order.updated', 'ticket.message', 'resync', ...).
+// El backend cierra el stream cada ~15 min y EventSource reconecta solo.
+const EVENT_TYPES = ['order.created', 'order.updated', 'order.assigned', 'order.cancelled', 'ticket.message', 'sync.completed', 'resync']
+
+class RealtimeService {
+  constructor() {
+    this.source = null
+    this.token = null
+    this.listeners = new Map() // tipo → Set(callback)
+  }
+
+  connect() {
+    const token = localStorage.getItem('token')
+    if (!token || typeof EventSource === 'undefined') return
+    if (this.source && this.token === token && this.source.readyState !== EventSource.CLOSED) return
+
+    this.disconnect()
+    this.token = token
+    this.source = new EventSource(`${API_BASE}/events/stream?token=${encodeURIComponent(token)}`)
+    EVENT_TYPES.forEach(type => {
+      this.source.addEventListener(type, (e) => this.emit(type, e.data ? JSON.parse(e.data) : {}))
+    })
+    this.source.onerror = () => {
+      // Sin token (logout / expiró) no tiene caso seguir reintentando
+      if (!localStorage.getItem('token')) this.disconnect()
+    }
+  }
+
+  disconnect() {
+    if (this.source) this.source.close()
+    this.source = null
+    this.token = null
+  }
+
+  emit(type, data) {
+    const callbacks = this.listeners.get(type)
+    if (callbacks) callbacks.forEach(cb => cb(data))
+  }
+
+  // Suscribirse a uno o varios tipos; regresa la función para desuscribirse
+  subscribe(types, callback) {
+    const list = Array.isArray(types) ? types : [types]
+    list.forEach(type => {
+      if (!this.listeners.has(type)) this.listeners.set(type, new Set())
+      this.listeners.get(type).add(callback)
+    })
+    this.connect()
+
+    return () => {
+      list.forEach(type => this.listeners.get(type)?.delete(callback))
+      const active = [...this.listeners.values()].some(set => set.size > 0)
+      if (!active) this.disconnect()
+    }
+  }
+}
+
+export const realtimeService = new RealtimeService()
+export default realtimeService
@@ -6,11 +6,16 @@ export const ticketService = {
     return apiService.get('/tickets', params);
   },
 
-  // Obtener un ticket especifico con todos sus mensajes
+  // Obtener un ticket especifico con sus mensajes mas recientes
   async getTicket(id) {
     return apiService.get(`/tickets/${id}`);
   },
 
+  // Mensajes paginados por cursor: { before } = anteriores, { since } = nuevos (polling)
+  async getMessages(id, params = {}) {
+    return apiService.get(`/tickets/${id}/messages`, params);
+  },
+
   // Crear un nuevo ticket
   async createTicket(ticketData) {
     return apiService.post('/tickets', ticketData);